@@ -0,0 +1,37 @@
+"""Time to compare two runs whose counters have many laps.
+
+usage: python benchmarks/bench_compare.py [num_laps]
+"""
+import random
+import sys
+import time
+from array import array
+from itertools import accumulate
+
+from perfcounters import TimeCounters
+from perfcounters.compare import compare
+
+
+def run(n: int, scale: float, seed: int) -> TimeCounters:
+    "a run with lognormal laps durations"
+    rnd = random.Random(seed)
+    durations = [int(rnd.lognormvariate(13, 0.3) * scale) for _ in range(n)]
+    laps = array('q', accumulate(durations))
+    cnts = TimeCounters(compact=True)
+    cnts.ingest_laps('loop', laps, start_ts=0, stop_ts=laps[-1] + 400_000)
+    return cnts
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    a = run(n, 1, seed=0)
+    b = run(n, 1.01, seed=1)
+    start = time.perf_counter()
+    diff = compare(a, b, seed=0)
+    elapsed = time.perf_counter() - start
+    print(f"{n} laps per run, compared in {elapsed * 1000:.0f} ms")
+    diff.report(format='us')
+
+
+if __name__ == '__main__':
+    main()
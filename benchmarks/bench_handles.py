@@ -0,0 +1,115 @@
+"""Operations/sec of name based updates vs handles and batch updates.
+
+Handles returned by `handle()` skip the per call name lookup and validation.
+`inc_many()` updates a batch of counters in a single call. Counter families
+resolve label values to their child counter without formatting a name.
+
+usage: python benchmarks/bench_handles.py [operations]
+"""
+import sys
+from time import perf_counter_ns
+
+from perfcounters import ThreadSafeValueCounters, TimeCounters, ValueCounters
+from perfcounters.format import format_counters
+
+NAMES = [f"counter_{i}" for i in range(10)]
+
+
+def ops(func, n: int, repeat: int = 5) -> float:
+    "return the best operations per second out of repeat runs"
+    best = None
+    for _ in range(repeat):
+        start = perf_counter_ns()
+        func(n)
+        elapsed = perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return n / best * 1e9
+
+
+def inc_name(cnts):
+    def run(n):
+        for _ in range(n):
+            cnts.inc('hits')
+    return run
+
+
+def inc_handle(cnts):
+    hits = cnts.handle('hits')
+
+    def run(n):
+        for _ in range(n):
+            hits.inc()
+    return run
+
+
+def inc_attribute(n):
+    hits = ValueCounters().handle('hits')
+    for _ in range(n):
+        hits.value += 1
+
+
+def inc_names_loop(n):
+    cnts = ValueCounters()
+    for _ in range(n // len(NAMES)):
+        for name in NAMES:
+            cnts.inc(name)
+
+
+def inc_many(n):
+    cnts = ValueCounters()
+    batch = dict.fromkeys(NAMES, 1)
+    for _ in range(n // len(NAMES)):
+        cnts.inc_many(batch)
+
+
+def inc_formatted_name(n):
+    cnts = ValueCounters()
+    status, route = 200, "/api"
+    for _ in range(n):
+        cnts.inc(f"http_{status}_{route}")
+
+
+def inc_family_labels(n):
+    http = ValueCounters().family("http", labels=("status", "route"))
+    status, route = 200, "/api"
+    for _ in range(n):
+        http.labels(status, route).inc()
+
+
+def lap_name(n):
+    cnts = TimeCounters()
+    cnts.start('loop')
+    for _ in range(n):
+        cnts.lap('loop')
+
+
+def lap_handle(n):
+    cnts = TimeCounters()
+    cnts.start('loop')
+    loop = cnts.handle('loop')
+    for _ in range(n):
+        loop.lap()
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    results = {
+        "ValueCounters.inc(name)": ops(inc_name(ValueCounters()), n),
+        "handle.inc()": ops(inc_handle(ValueCounters()), n),
+        "handle.value += 1": ops(inc_attribute, n),
+        "inc(name) x 10 names": ops(inc_names_loop, n),
+        "inc_many() x 10 names": ops(inc_many, n),
+        "ThreadSafe inc(name)": ops(inc_name(ThreadSafeValueCounters()), n),
+        "ThreadSafe handle.inc()": ops(
+            inc_handle(ThreadSafeValueCounters()), n),
+        "inc(f'http_{status}_{route}')": ops(inc_formatted_name, n),
+        "family.labels(status, route).inc()": ops(inc_family_labels, n),
+        "TimeCounters.lap(name)": ops(lap_name, n),
+        "handle.lap()": ops(lap_handle, n),
+    }
+    results = {k: round(v) for k, v in results.items()}
+    print(format_counters(results, headers=['API', 'Ops/sec']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Time to load recorded laps timestamps, one lap() at a time vs ingested.
+
+usage: python benchmarks/bench_ingest.py [num_laps]
+"""
+import sys
+import time
+from array import array
+
+from perfcounters import TimeCounters
+from perfcounters.format import format_counters
+from perfcounters.optional import get_numpy
+
+
+def replay(timestamps) -> None:
+    "reference: one lap per timestamp with a replayed clock"
+    cnts = TimeCounters(compact=True)
+    cnts.start('a')
+    cnt = cnts.counters['a']
+    it = iter(timestamps)
+    cnt.clock = it.__next__
+    for _ in range(len(timestamps)):
+        cnt.lap()
+
+
+def ingest(timestamps) -> None:
+    cnts = TimeCounters(compact=True)
+    cnts.ingest_laps('a', timestamps, start_ts=0)
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    timestamps = list(range(1, n + 1))
+    inputs = {
+        'list': timestamps,
+        'array': array('q', timestamps),
+        'generator': lambda: (ts for ts in range(1, n + 1)),
+    }
+    np = get_numpy()
+    if np is not None:
+        inputs['numpy'] = np.arange(1, n + 1, dtype=np.int64)
+
+    results = {}
+    start = time.perf_counter()
+    replay(timestamps)
+    results['lap() replay'] = round((time.perf_counter() - start) * 1000, 1)
+    for label, data in inputs.items():
+        start = time.perf_counter()
+        ingest(data() if callable(data) else data)
+        elapsed = (time.perf_counter() - start) * 1000
+        results[f"ingest_laps({label})"] = round(elapsed, 1)
+    print(f"{n} laps")
+    print(format_counters(results, headers=['Method', 'Time (ms)']))
+
+
+if __name__ == '__main__':
+    main()
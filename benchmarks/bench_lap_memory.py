@@ -0,0 +1,55 @@
+"""Memory used by laps with the default list storage vs compact storage.
+
+usage: python benchmarks/bench_lap_memory.py [num_laps]
+"""
+import sys
+import tracemalloc
+
+from perfcounters import TimeCounters, ValueCounters
+from perfcounters.format import format_counters
+
+
+def measure(cnts, record, n: int) -> int:
+    "return the number of bytes allocated to record n laps"
+    tracemalloc.start()
+    record(cnts, n)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+
+def time_laps(cnts, n: int) -> None:
+    cnts.start('loop')
+    lap = cnts.counters['loop'].lap
+    for _ in range(n):
+        lap()
+    cnts.stop('loop')
+
+
+def value_laps(cnts, n: int) -> None:
+    cnts.set('v', 0)
+    cnt = cnts.counters['v']
+    for i in range(n):
+        cnt.value = i * 0.5
+        cnt.lap()
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    mb = 1024 * 1024
+    results = {}
+    for label, collection, record in [
+            ('TimeCounters', TimeCounters, time_laps),
+            ('ValueCounters', ValueCounters, value_laps)]:
+        default = measure(collection(), record, n)
+        compact = measure(collection(compact=True), record, n)
+        results[label] = [round(default / mb, 1), round(compact / mb, 1),
+                          round(default / n, 1), round(compact / n, 1)]
+    print(f"{n} laps")
+    print(format_counters(results, headers=['Collection', 'List (MB)',
+                                            'Compact (MB)', 'List (B/lap)',
+                                            'Compact (B/lap)']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Cost of an OpenMetrics scrape of a large collection.
+
+The first scrape renders every counter, the following ones only re-render
+the counters that changed.
+
+usage: python benchmarks/bench_openmetrics.py [num_counters]
+"""
+import sys
+from time import perf_counter_ns
+
+from perfcounters import TimeCounters, ValueCounters
+from perfcounters.format import format_counters
+from perfcounters.openmetrics import OpenMetricsRenderer
+
+
+def scrape(renderer) -> float:
+    "return the scrape time in ms"
+    start = perf_counter_ns()
+    renderer.render()
+    return round((perf_counter_ns() - start) / 1e6, 2)
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    vcnts = ValueCounters(prefix='app_')
+    tcnts = TimeCounters(prefix='app_')
+    for i in range(n // 2):
+        vcnts.inc(f"value_{i}")
+        tcnts.start(f"time_{i}")
+        tcnts.lap(f"time_{i}")
+        tcnts.stop(f"time_{i}")
+    renderer = OpenMetricsRenderer(vcnts, tcnts)
+
+    results = {'first scrape': scrape(renderer),
+               'unchanged': scrape(renderer)}
+    for i in range(0, n // 2, 100):
+        vcnts.inc(f"value_{i}")
+    results['1% changed'] = scrape(renderer)
+    print(f"{n} counters")
+    print(format_counters(results, headers=['Scrape', 'Time (ms)']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Report rendering time of a large counter set.
+
+Compares tabulate, the built-in table writer rendering from scratch, and
+the collection renderer reusing the rows that didn't change since the
+previous report (1% of the counters updated between reports).
+
+usage: python benchmarks/bench_render.py [counters]
+"""
+import sys
+from time import perf_counter_ns
+
+from tabulate import tabulate
+
+from perfcounters import ValueCounters
+from perfcounters.format import format_counters
+from perfcounters.render import FAST_FORMATS
+
+
+def best_ms(func, repeat: int = 5) -> float:
+    "return the best run time in milliseconds out of repeat runs"
+    best = None
+    for _ in range(repeat):
+        start = perf_counter_ns()
+        func()
+        elapsed = perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / 1e6
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    cnts = ValueCounters()
+    for i in range(n):
+        cnts.set(f"requests.endpoint_{i}", i * 7 % 1000 + 0.25)
+
+    def update():
+        for i in range(0, n, 100):
+            cnts.inc(f"requests.endpoint_{i}")
+
+    results = {}
+    for fmt in FAST_FORMATS:
+        cnts._format(fmt, rounding=2)  # warm the rows cache
+
+        def with_tabulate():
+            rows = [[k, v] for k, v in cnts.get_all().items()]
+            tabulate(rows, headers=['Name', 'Value'], tablefmt=fmt)
+
+        def from_scratch():
+            format_counters(cnts.get_all(), headers=['Name', 'Value'],
+                            format=fmt)
+
+        def cached():
+            update()
+            cnts._format(fmt, rounding=2)
+
+        results[fmt] = [round(best_ms(with_tabulate), 1),
+                        round(best_ms(from_scratch), 1),
+                        round(best_ms(cached), 1)]
+    print(f"{n} counters")
+    print(format_counters(results, headers=['Format', 'tabulate (ms)',
+                                            'from scratch (ms)',
+                                            'cached (ms)']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Increments/sec of ThreadSafeValueCounters vs a naive locked ValueCounters.
+
+Each thread performs the same number of increments on a shared counter.
+
+usage: python benchmarks/bench_thread_contention.py [increments_per_thread]
+"""
+import sys
+import threading
+from time import perf_counter_ns
+
+from perfcounters import ThreadSafeValueCounters, ValueCounters
+from perfcounters.format import format_counters
+
+THREADS = [1, 2, 4, 8, 16, 32]
+
+
+class LockedValueCounters(ValueCounters):
+    "naive thread safe implementation: a global lock around every inc"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value=1):
+        with self._lock:
+            return super().inc(name, value)
+
+
+def run(cnts, num_threads: int, n: int) -> float:
+    "return increments per second"
+    barrier = threading.Barrier(num_threads + 1)
+
+    def work():
+        barrier.wait()
+        for _ in range(n):
+            cnts.inc('hits')
+
+    threads = [threading.Thread(target=work) for _ in range(num_threads)]
+    for t in threads:
+        t.start()
+    start = perf_counter_ns()
+    barrier.wait()
+    for t in threads:
+        t.join()
+    elapsed = perf_counter_ns() - start
+    assert cnts.get('hits') == num_threads * n, "lost increments"
+    return num_threads * n / elapsed * 1e9
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    results = {}
+    for num_threads in THREADS:
+        sharded = run(ThreadSafeValueCounters(), num_threads, n)
+        locked = run(LockedValueCounters(), num_threads, n)
+        results[str(num_threads)] = [round(sharded), round(locked),
+                                     round(sharded / locked, 2)]
+    print(format_counters(results, headers=['Threads', 'Sharded (inc/s)',
+                                            'Locked (inc/s)', 'Speedup']))
+
+
+if __name__ == '__main__':
+    main()
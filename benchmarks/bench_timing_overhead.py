@@ -0,0 +1,152 @@
+"""Measure per enter/exit overhead of the TimeCounters timing APIs.
+
+Compares `with cnts.time(...)`, a hoisted timer and `@cnts.timed` against the
+legacy `start()`/`stop()` path which creates a new TimeCounter per region,
+and the sampled timer and laps paths which only time one entry every 100.
+A no-op context manager is reported as a reference of the cost of the `with`
+statement itself on the running interpreter. Each benchmark keeps the best of
+REPEAT runs to filter out scheduling noise.
+
+The 200ns budget is not met by the pure Python timer: entering and leaving
+it costs two Python method calls, two clock reads and the count, total, min
+and max updates. On CPython 3.11 a hoisted timer measures about 580-920ns,
+3 to 5 times the no-op context manager (about 180-320ns) on the same run.
+
+usage: python benchmarks/bench_timing_overhead.py [iterations]
+"""
+import sys
+from time import perf_counter_ns
+
+from perfcounters import TimeCounters
+from perfcounters.format import format_counters
+
+BUDGET_NS = 200
+REPEAT = 5
+
+
+def empty_loop(n: int) -> int:
+    start = perf_counter_ns()
+    for _ in range(n):
+        pass
+    return perf_counter_ns() - start
+
+
+class NoOp():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+def bench_noop(n: int) -> int:
+    noop = NoOp()
+    start = perf_counter_ns()
+    for _ in range(n):
+        with noop:
+            pass
+    return perf_counter_ns() - start
+
+
+def bench_time(n: int) -> int:
+    cnts = TimeCounters()
+    start = perf_counter_ns()
+    for _ in range(n):
+        with cnts.time('db'):
+            pass
+    return perf_counter_ns() - start
+
+
+def bench_hoisted(n: int) -> int:
+    cnts = TimeCounters()
+    timer = cnts.time('db')
+    start = perf_counter_ns()
+    for _ in range(n):
+        with timer:
+            pass
+    return perf_counter_ns() - start
+
+
+def bench_timed(n: int) -> int:
+    cnts = TimeCounters()
+
+    def plain():
+        pass
+
+    @cnts.timed('parse')
+    def decorated():
+        pass
+
+    start = perf_counter_ns()
+    for _ in range(n):
+        plain()
+    plain_ns = perf_counter_ns() - start
+
+    start = perf_counter_ns()
+    for _ in range(n):
+        decorated()
+    # only account for the decorator overhead, not the call itself
+    return perf_counter_ns() - start - plain_ns
+
+
+def bench_sampled(n: int) -> int:
+    cnts = TimeCounters(sample_every=100)
+    timer = cnts.time('db')
+    start = perf_counter_ns()
+    for _ in range(n):
+        with timer:
+            pass
+    return perf_counter_ns() - start
+
+
+def bench_laps(n: int, sample_every=None) -> int:
+    cnts = TimeCounters(sample_every=sample_every)
+    cnts.start('loop')
+    cnt = cnts.counters['loop']
+    start = perf_counter_ns()
+    for _ in range(n):
+        cnt.lap()
+    return perf_counter_ns() - start
+
+
+def bench_start_stop(n: int) -> int:
+    cnts = TimeCounters()
+    names = [str(i) for i in range(n)]
+    start = perf_counter_ns()
+    for name in names:
+        cnts.start(name)
+        cnts.stop(name)
+    return perf_counter_ns() - start
+
+
+def main() -> int:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    baseline = min(empty_loop(n) for _ in range(REPEAT))
+    benchmarks = {
+        "no-op context manager": bench_noop,
+        "with cnts.time()": bench_time,
+        "with timer (hoisted)": bench_hoisted,
+        "with timer (sampled 1/100)": bench_sampled,
+        "lap()": bench_laps,
+        "lap() (sampled 1/100)": lambda n: bench_laps(n, 100),
+        "start()/stop()": bench_start_stop,
+    }
+    results = {}
+    for name, bench in benchmarks.items():
+        results[name] = (min(bench(n) for _ in range(REPEAT)) - baseline) / n
+    # the decorator benchmark already subtracts the plain call
+    results["@cnts.timed"] = min(bench_timed(n) for _ in range(REPEAT)) / n
+    results = {k: round(v, 1) for k, v in results.items()}
+    print(format_counters(results, headers=['API', 'Overhead (ns)']))
+
+    overhead = results["with timer (hoisted)"]
+    noop = results["no-op context manager"]
+    status = "OK" if overhead < BUDGET_NS else "OVER BUDGET"
+    print(f"timer enter/exit overhead: {overhead}ns "
+          f"(budget {BUDGET_NS}ns) {status}, "
+          f"{round(overhead / noop, 1)}x a no-op context manager")
+    return 0 if overhead < BUDGET_NS else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,28 @@
+from typing import TYPE_CHECKING, Any
+
 from .time_counters import TimeCounters  # noqa
 from .value_counters import ValueCounters  # noqa
+from .threadsafe import ThreadSafeValueCounters  # noqa
+from .spans import SpanCounters  # noqa
+from .window import WindowedCounters  # noqa
+from .memory_counters import MemoryCounters  # noqa
+
+if TYPE_CHECKING:
+    from .shared import SharedCounters  # noqa
+    from .async_counters import AsyncTimeCounters  # noqa
+
+# collections pulling heavy standard library modules (multiprocessing,
+# asyncio) are imported on first access to keep `import perfcounters` fast.
+_LAZY = {
+    'SharedCounters': '.shared',
+    'AsyncTimeCounters': '.async_counters',
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY:
+        from importlib import import_module
+        value = getattr(import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
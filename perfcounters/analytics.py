@@ -0,0 +1,248 @@
+"""Lap series analytics.
+
+Every function accepts lists, arrays, memoryviews or NumPy arrays and returns
+a list. When NumPy is installed large series are processed vectorized,
+otherwise the pure Python path validates its arguments once per series and
+not once per element.
+"""
+import math
+from typing import Any, List, Optional, Sequence, Union
+
+from .clocks import get_unit
+from .optional import get_numpy
+from .sketch import percentiles
+
+AnyNum = Union[int, float]
+Serie = Sequence[AnyNum]
+
+# below this size the NumPy conversion overhead outweighs its speedup
+NUMPY_MIN_SIZE = 256
+
+
+def _np(values: Any) -> Any:
+    "return numpy if the serie is worth being processed vectorized"
+    np = get_numpy()
+    if np is None:
+        return None
+    if isinstance(values, np.ndarray) or len(values) >= NUMPY_MIN_SIZE:
+        return np
+    return None
+
+
+def durations(start_ts: int, laps: Sequence[int],
+              stop_ts: int) -> List[int]:
+    """Compute laps durations from laps timestamps
+
+    Args:
+        start_ts: counter start timestamp.
+
+        laps: laps timestamps.
+
+        stop_ts: counter stop timestamp, closing the final lap.
+
+    Returns:
+        laps durations, including the final lap.
+    """
+    np = _np(laps)
+    if np is not None:
+        ts = np.empty(len(laps) + 2, dtype=np.int64)
+        ts[0] = start_ts
+        ts[1:-1] = laps
+        ts[-1] = stop_ts
+        return np.diff(ts).tolist()
+
+    serie: List[int] = []
+    prev_ts = start_ts
+    for ts in laps:
+        serie.append(ts - prev_ts)
+        prev_ts = ts
+    serie.append(stop_ts - prev_ts)
+    return serie
+
+
+def diff(values: Serie) -> List[AnyNum]:
+    """Difference between consecutive values
+
+    Args:
+        values: values serie.
+
+    Returns:
+        serie one element shorter than values.
+    """
+    np = _np(values)
+    if np is not None:
+        return np.diff(np.asarray(values)).tolist()
+    return [b - a for a, b in zip(values, values[1:])]
+
+
+def convert(values: Serie, format: str, rounding: int) -> List[AnyNum]:
+    """Convert nanoseconds durations into the requested unit
+
+    Args:
+        values: durations in nanoseconds.
+
+        format: time unit. m for minute, s for second, ms for millisecond,
+        us for microsecond and ns for nanosecond.
+
+        rounding: rounding. 0 returns ints.
+
+    Returns:
+        converted durations.
+    """
+    unit = get_unit(format)
+    np = _np(values)
+    if np is not None:
+        arr = np.asarray(values)
+        if unit == 1 and arr.dtype.kind in 'iu':
+            return arr.tolist()
+        arr = arr / unit
+        if not rounding:
+            return np.trunc(arr).astype(np.int64).tolist()
+        return np.round(arr, rounding).tolist()
+
+    # nanoseconds are already exact integers
+    if unit == 1 and all(type(v) is int for v in values):
+        return list(values)
+    if not rounding:
+        return [int(v / unit) for v in values]
+    return [round(v / unit, rounding) for v in values]
+
+
+def round_values(values: Serie, rounding: int) -> List[AnyNum]:
+    """Round the float values of a serie, leaving ints untouched
+
+    Args:
+        values: values serie.
+
+        rounding: rounding.
+
+    Returns:
+        rounded values.
+    """
+    np = _np(values)
+    if np is not None:
+        arr = np.asarray(values)
+        if arr.dtype.kind == 'f':
+            return np.round(arr, rounding).tolist()
+        if arr.dtype.kind in 'iu':
+            return arr.tolist()
+    return [round(v, rounding) if type(v) is float else v for v in values]
+
+
+def rolling_mean(values: Serie, window: int) -> List[float]:
+    """Mean over a sliding window
+
+    Args:
+        values: values serie.
+
+        window: window size.
+
+    Returns:
+        means of each full window, len(values) - window + 1 elements.
+    """
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    if len(values) < window:
+        return []
+    np = _np(values)
+    if np is not None:
+        csum = np.cumsum(np.asarray(values, dtype=np.float64))
+        csum = np.concatenate(([0.0], csum))
+        return ((csum[window:] - csum[:-window]) / window).tolist()
+
+    means: List[float] = []
+    total = float(sum(values[:window]))
+    means.append(total / window)
+    for i in range(window, len(values)):
+        total += values[i] - values[i - window]
+        means.append(total / window)
+    return means
+
+
+def rate_of_change(values: Serie,
+                   periods: Optional[Serie] = None) -> List[float]:
+    """Change of the values per period
+
+    Args:
+        values: values serie.
+
+        periods: duration between consecutive values, one element shorter
+        than values. Defaults to 1 per value, the change per lap.
+
+    Returns:
+        serie one element shorter than values.
+    """
+    if periods is not None and len(periods) != len(values) - 1:
+        raise ValueError("periods must be one element shorter than values")
+    np = _np(values)
+    if np is not None:
+        deltas = np.diff(np.asarray(values, dtype=np.float64))
+        if periods is None:
+            return deltas.tolist()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (deltas / np.asarray(periods, dtype=np.float64)).tolist()
+
+    changes = [float(b - a) for a, b in zip(values, values[1:])]
+    if periods is None:
+        return changes
+    rates: List[float] = []
+    for change, period in zip(changes, periods):
+        if period:
+            rates.append(change / period)
+        else:
+            rates.append(math.copysign(math.inf, change) if change
+                         else math.nan)
+    return rates
+
+
+def outliers(values: Serie, threshold: float = 3.5,
+             method: str = 'mad') -> List[int]:
+    """Detect outliers
+
+    Args:
+        values: values serie.
+
+        threshold: for mad, the modified z-score above which a value is an
+        outlier. Defaults to 3.5. For iqr, the number of interquartile
+        ranges outside the quartiles, typically 1.5.
+
+        method: mad (median absolute deviation) or iqr (interquartile
+        range). Defaults to mad.
+
+    Returns:
+        indexes of the outliers.
+    """
+    if method not in ('mad', 'iqr'):
+        raise ValueError("Unsupported method. Valid: mad and iqr")
+    if not len(values):
+        return []
+
+    np = _np(values)
+    if np is not None:
+        arr = np.asarray(values, dtype=np.float64)
+        if method == 'mad':
+            median = np.median(arr)
+            mad = np.median(np.abs(arr - median))
+            if not mad:
+                return []
+            mask = 0.6745 * np.abs(arr - median) / mad > threshold
+        else:
+            q1, q3 = np.percentile(arr, [25, 75])
+            iqr = q3 - q1
+            mask = (arr < q1 - threshold * iqr) | (arr > q3 + threshold * iqr)
+        return np.flatnonzero(mask).tolist()
+
+    if method == 'mad':
+        median = percentiles(values, [50])[0]
+        deviations = [abs(v - median) for v in values]
+        mad = percentiles(deviations, [50])[0]
+        if not mad:
+            return []
+        limit = threshold * mad / 0.6745
+        return [i for i, d in enumerate(deviations) if d > limit]
+
+    q1, q3 = percentiles(values, [25, 75])
+    iqr = q3 - q1
+    low = q1 - threshold * iqr
+    high = q3 + threshold * iqr
+    return [i for i, v in enumerate(values) if v < low or v > high]
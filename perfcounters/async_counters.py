@@ -0,0 +1,320 @@
+import asyncio
+import types
+from contextvars import ContextVar
+from typing import Any, Coroutine, Dict, List, Optional, Union
+
+from .clocks import DEFAULT_CLOCK, Clock, convert_ns, get_clock
+from .format import format_counters
+
+AnyNum = Union[int, float]
+
+
+class TaskClock():
+    "Running time of an instrumented task, stored in a context variable"
+    __slots__ = ('clock', 'running', 'step_start')
+
+    def __init__(self, clock: Clock):
+        self.clock = clock
+        self.running = 0
+        self.step_start = 0
+
+    def running_now(self) -> int:
+        "running time including the current step"
+        return self.running + self.clock() - self.step_start
+
+
+# task local clock of the task currently running on the loop
+_task_clock: ContextVar[Optional[TaskClock]] = ContextVar(
+    'perfcounters_task_clock', default=None)
+
+
+@types.coroutine
+def _drive(coro: Coroutine, task_clock: TaskClock):
+    """Drive a coroutine step by step, timing each step.
+
+    Each step, from resuming the coroutine until it yields back to the event
+    loop, is time actually spent running. Everything else is time suspended
+    in awaits.
+    """
+    clock = task_clock.clock
+    value: Any = None
+    error: Optional[BaseException] = None
+    while True:
+        task_clock.step_start = clock()
+        try:
+            if error is not None:
+                future = coro.throw(error)
+            else:
+                future = coro.send(value)
+        except StopIteration as e:
+            task_clock.running += clock() - task_clock.step_start
+            return e.value
+        except BaseException:
+            task_clock.running += clock() - task_clock.step_start
+            raise
+        task_clock.running += clock() - task_clock.step_start
+
+        try:
+            value = yield future
+            error = None
+        except GeneratorExit:
+            coro.close()
+            raise
+        except BaseException as e:
+            value = None
+            error = e
+
+
+class AsyncCounter():
+    "Aggregated wall and running time of a coroutine or region"
+    __slots__ = ('name', 'prefix', 'count', 'wall', 'running')
+
+    def __init__(self, name: str, prefix: str = ""):
+        self.name = name
+        self.prefix = prefix
+        self.count = 0
+        self.wall = 0
+        self.running = 0
+
+    def add(self, wall: int, running: int) -> None:
+        "record a wall and running time in nanoseconds"
+        self.count += 1
+        self.wall += wall
+        self.running += running
+
+    def reset(self) -> None:
+        "Reset counter"
+        self.count = 0
+        self.wall = 0
+        self.running = 0
+
+    def get(self, format: str = 's', rounding: int = 2) -> List[AnyNum]:
+        """Report count, wall, running and suspended times
+
+        Args:
+            format: reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            [count, wall, running, suspended]
+        """
+        return [self.count,
+                convert_ns(self.wall, format=format, rounding=rounding),
+                convert_ns(self.running, format=format, rounding=rounding),
+                convert_ns(self.wall - self.running, format=format,
+                           rounding=rounding)]
+
+    def __str__(self) -> str:
+        return f"{self.prefix}{self.name}"
+
+    def __repr__(self) -> str:
+        return f"{self.prefix}{self.name}"
+
+
+class _Region():
+    "async context manager timing a region of an instrumented task"
+    __slots__ = ('counter', 'clock', '_task_clock', '_start', '_running')
+
+    def __init__(self, counter: AsyncCounter, clock: Clock):
+        self.counter = counter
+        self.clock = clock
+
+    async def __aenter__(self) -> '_Region':
+        self._task_clock = _task_clock.get()
+        self._start = self.clock()
+        if self._task_clock is not None:
+            self._running = self._task_clock.running_now()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        wall = self.clock() - self._start
+        if self._task_clock is not None:
+            running = self._task_clock.running_now() - self._running
+        else:
+            # task not instrumented: running and suspended time can't be
+            # told apart.
+            running = wall
+        self.counter.add(wall, running)
+
+
+class AsyncTimeCounters():
+    """Time counters splitting asyncio wall time into time spent running on
+    the event loop and time suspended in awaits.
+
+    Coroutines are instrumented by `instrument()`, or for every task
+    created on a loop with `install()`. The running time of the current task
+    lives in a context variable so regions timed with `region()` know how
+    much of their wall time the task actually spent running.
+    """
+
+    def __init__(self, prefix: str = "", clock: str = DEFAULT_CLOCK) -> None:
+        self.prefix = prefix
+        self.clock = get_clock(clock)
+        self.counters: Dict[str, AsyncCounter] = {}
+
+    def _counter(self, name: str) -> AsyncCounter:
+        counter = self.counters.get(name)
+        if counter is None:
+            counter = AsyncCounter(name=name, prefix=self.prefix)
+            self.counters[name] = counter
+        return counter
+
+    def region(self, name: str) -> _Region:
+        """Return an async context manager timing a region
+
+            async with acnts.region("db"):
+                await query()
+
+        Args:
+            name: name of the counter. Created on first use.
+
+        Returns:
+            async context manager.
+        """
+        return _Region(self._counter(name), self.clock)
+
+    async def instrument(self, coro: Coroutine, name: Optional[str] = None):
+        """Run a coroutine recording its wall and running times
+
+        Args:
+            coro: coroutine to run.
+
+            name: name of the counter. Defaults to the coroutine qualified
+            name.
+
+        Returns:
+            the coroutine result.
+        """
+        if name is None:
+            name = str(getattr(coro, '__qualname__', coro))
+        counter = self._counter(name)
+        task_clock = TaskClock(self.clock)
+        token = _task_clock.set(task_clock)
+        start = self.clock()
+        try:
+            return await _drive(coro, task_clock)
+        finally:
+            counter.add(self.clock() - start, task_clock.running)
+            _task_clock.reset(token)
+
+    def install(self, loop: Optional[asyncio.AbstractEventLoop] = None
+                ) -> None:
+        """Instrument every task created on a loop
+
+        Args:
+            loop: event loop. Defaults to the running loop.
+        """
+        loop = loop or asyncio.get_running_loop()
+        previous = loop.get_task_factory()
+
+        def factory(loop, coro, **kwargs):
+            coro = self.instrument(coro)
+            if previous is not None:
+                return previous(loop, coro, **kwargs)
+            return asyncio.Task(coro, loop=loop, **kwargs)
+
+        factory.previous = previous  # type: ignore
+        loop.set_task_factory(factory)
+
+    def uninstall(self, loop: Optional[asyncio.AbstractEventLoop] = None
+                  ) -> None:
+        """Stop instrumenting the tasks created on a loop
+
+        Args:
+            loop: event loop. Defaults to the running loop.
+        """
+        loop = loop or asyncio.get_running_loop()
+        factory = loop.get_task_factory()
+        loop.set_task_factory(getattr(factory, 'previous', None))
+
+    def reset(self, name: str) -> None:
+        "reset a given counter"
+        if name not in self.counters:
+            raise ValueError(f"Unknown counter {name}")
+        self.counters[name].reset()
+
+    def reset_all(self) -> None:
+        "reset all counters"
+        for cnt in self.counters.values():
+            cnt.reset()
+
+    def get(self, name: str, format: str = "s",
+            rounding: int = 2) -> Dict[str, AnyNum]:
+        """Return a counter count, wall, running and suspended times
+
+        Args:
+            name: name of the counter.
+
+            format: time reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            counter times in requested format.
+        """
+        if name not in self.counters:
+            raise ValueError(f"Unknown counter {name}")
+        values = self.counters[name].get(format=format, rounding=rounding)
+        return dict(zip(['count', 'wall', 'running', 'suspended'], values))
+
+    def get_all(self, format: str = "s",
+                rounding: int = 2) -> Dict[str, List[AnyNum]]:
+        """Return all counters [count, wall, running, suspended] as a
+        dictionary
+
+        Args:
+            format: time reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            Dictionary of counters
+        """
+        cnts = {}
+        # iterate over a copy so counters can be read from another thread
+        # while new ones are created.
+        for name, cnt in list(self.counters.items()):
+            cnts[f'{self.prefix}{name}'] = cnt.get(format=format,
+                                                   rounding=rounding)
+        return cnts
+
+    def report(self, format: str = "s", rounding: int = 2) -> None:
+        "pretty print counters "
+        print(self._format(output_type='rounded_outline', format=format,
+                           rounding=rounding))
+
+    def to_json(self, format: str = "s", rounding: int = 2) -> str:
+        "Return counters a json string"
+        return self._format(output_type='json', format=format,
+                            rounding=rounding)
+
+    def to_html(self, format: str = "s", rounding: int = 2) -> str:
+        "Return counters as html table"
+        return self._format(output_type='html', format=format,
+                            rounding=rounding)
+
+    def to_md(self, format: str = "s", rounding: int = 2) -> str:
+        "Return counters as markdown table"
+        return self._format(output_type='github', format=format,
+                            rounding=rounding)
+
+    def to_latex(self, format: str = "s", rounding: int = 2) -> str:
+        "Return counters as latex table"
+        return self._format(output_type='latex', format=format,
+                            rounding=rounding)
+
+    def _format(self, output_type: str, format: str, rounding: int) -> str:
+        cnts = self.get_all(format=format, rounding=rounding)
+        headers = ['Name', 'Count', f"Wall ({format})",
+                   f"Running ({format})", f"Suspended ({format})"]
+        return format_counters(cnts, headers=headers, format=output_type)
+
+    def __len__(self):
+        return len(self.counters)
@@ -0,0 +1,349 @@
+"""Benchmark runner with baseline regression detection.
+
+Benchmarks are registered on a runner, the `benchmark` decorator registers
+them on the default runner used by the `perfcounters-bench` command:
+
+    from perfcounters.bench import benchmark
+
+    @benchmark
+    def parse():
+        json.loads(DOC)
+
+    $ perfcounters-bench benchmarks.py --save current.json \\
+        --baseline baseline.json
+"""
+import argparse
+import json
+import runpy
+import sys
+from typing import Any, Callable, Dict, List, Optional
+
+from .clocks import DEFAULT_CLOCK, convert_ns, get_clock
+from .format import format_counters
+from .stats import bootstrap_ci, mad, mann_whitney, median
+from .time_counters import TimeCounters
+
+Results = Dict[str, Dict[str, Any]]
+
+
+class BenchmarkRunner():
+    """Run registered callables and compute robust statistics of their
+    timings.
+
+    Each benchmark is warmed up, its iteration count is calibrated so a
+    repetition lasts at least `min_time`, then every repetition is
+    recorded as a lap of a `TimeCounters` counter named after the
+    benchmark.
+    """
+
+    def __init__(self, warmup: int = 1, repeat: int = 10,
+                 min_time: float = 0.05, clock: str = DEFAULT_CLOCK,
+                 confidence: float = 0.95) -> None:
+        """
+        Args:
+            warmup: untimed repetitions run first. Defaults to 1.
+
+            repeat: timed repetitions. Defaults to 10.
+
+            min_time: minimum duration of a repetition in seconds, used to
+            calibrate the number of iterations. Defaults to 0.05.
+
+            clock: clock used to time the repetitions. Defaults to
+            perf_counter.
+
+            confidence: median confidence interval level. Defaults to 0.95.
+        """
+        if repeat < 1:
+            raise ValueError("repeat must be at least 1")
+        self.warmup = warmup
+        self.repeat = repeat
+        self.min_time = min_time
+        self.confidence = confidence
+        self.counters = TimeCounters(clock=clock)
+        self._clock = get_clock(clock)
+        self.benchmarks: Dict[str, Callable[[], Any]] = {}
+        self.results: Results = {}
+
+    def register(self, func: Optional[Callable[[], Any]] = None,
+                 name: Optional[str] = None) -> Any:
+        """Register a benchmark, usable as a decorator with or without
+        arguments
+
+        Args:
+            func: callable taking no argument.
+
+            name: name of the benchmark. Defaults to the function qualified
+            name.
+
+        Returns:
+            the callable, or a decorator.
+        """
+        def decorator(func: Callable[[], Any]) -> Callable[[], Any]:
+            bench_name = name or func.__qualname__
+            if bench_name in self.benchmarks:
+                raise ValueError(f"Benchmark {bench_name} already exist")
+            self.benchmarks[bench_name] = func
+            return func
+
+        if func is not None:
+            return decorator(func)
+        return decorator
+
+    def calibrate(self, func: Callable[[], Any]) -> int:
+        """Return the number of iterations lasting at least min_time
+
+        Args:
+            func: benchmarked callable.
+
+        Returns:
+            number of iterations per repetition.
+        """
+        min_ns = self.min_time * 1e9
+        number = 1
+        while True:
+            elapsed = _time_loop(func, number, self._clock)
+            if elapsed >= min_ns or number >= 1 << 30:
+                return number
+            # aim directly for the target with some margin
+            if elapsed:
+                number = max(number * 2,
+                             int(number * min_ns * 1.2 / elapsed))
+            else:
+                number *= 10
+
+    def run(self, names: Optional[List[str]] = None) -> Results:
+        """Run benchmarks
+
+        Args:
+            names: benchmarks to run. Defaults to all.
+
+        Returns:
+            results keyed by benchmark name: number of iterations,
+            repetitions, median, MAD, confidence interval and samples, the
+            time per iteration of each repetition in nanoseconds.
+        """
+        names = names if names is not None else list(self.benchmarks)
+        for name in names:
+            if name not in self.benchmarks:
+                raise ValueError(f"Unknown benchmark {name}")
+            self.results[name] = self._run(name, self.benchmarks[name])
+        return {name: self.results[name] for name in names}
+
+    def _run(self, name: str, func: Callable[[], Any]) -> Dict[str, Any]:
+        for _ in range(self.warmup):
+            func()
+        number = self.calibrate(func)
+        for _ in range(self.warmup):
+            _time_loop(func, number, self._clock)
+
+        # a rerun starts a fresh counter
+        self.counters.counters.pop(name, None)
+        self.counters.start(name)
+        cnt = self.counters.handle(name)
+        for i in range(self.repeat):
+            for _ in range(number):
+                func()
+            if i < self.repeat - 1:
+                cnt.lap()
+        cnt.stop()
+
+        samples = [d / number
+                   for d in self.counters.get_laps(name, format='ns',
+                                                   rounding=0)]
+        low, high = bootstrap_ci(samples, confidence=self.confidence)
+        return {
+            "number": number,
+            "repeat": self.repeat,
+            "median": median(samples),
+            "mad": mad(samples),
+            "ci_low": low,
+            "ci_high": high,
+            "samples": samples
+        }
+
+    def report(self, format: str = 'us', rounding: int = 3) -> None:
+        "pretty print the results"
+        print(format_results(self.results, format=format, rounding=rounding))
+
+    def save(self, path: str) -> None:
+        """Save the results as json
+
+        Args:
+            path: results file path.
+        """
+        save_results(path, self.results)
+
+
+def _time_loop(func: Callable[[], Any], number: int,
+               clock: Callable[[], int]) -> int:
+    "time number calls of func in nanoseconds"
+    start = clock()
+    for _ in range(number):
+        func()
+    return clock() - start
+
+
+def save_results(path: str, results: Results) -> None:
+    "Save benchmark results as json"
+    with open(path, 'w') as f:
+        json.dump(results, f)
+
+
+def load_results(path: str) -> Results:
+    "Load benchmark results saved as json"
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: Results, baseline: Results, alpha: float = 0.05,
+            threshold: float = 0.02) -> Results:
+    """Compare benchmark results against a baseline
+
+    A benchmark regressed when its samples are significantly slower than
+    the baseline ones according to a one sided Mann-Whitney test and its
+    median slowed down by more than threshold.
+
+    Args:
+        results: current results.
+
+        baseline: baseline results.
+
+        alpha: significance level. Defaults to 0.05.
+
+        threshold: minimum relative median change to report, ignoring
+        statistically significant but negligible changes. Defaults to 0.02.
+
+    Returns:
+        comparison keyed by benchmark name: baseline and current medians,
+        relative change, p-value and status: regression, improvement,
+        unchanged or new.
+    """
+    comparison: Results = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            comparison[name] = {"baseline": None, "current": result['median'],
+                                "change": None, "p_value": None,
+                                "status": "new"}
+            continue
+        change = result['median'] / base['median'] - 1
+        _, p_slower = mann_whitney(result['samples'], base['samples'],
+                                   alternative='greater')
+        _, p_faster = mann_whitney(result['samples'], base['samples'],
+                                   alternative='less')
+        status = "unchanged"
+        p_value = min(p_slower, p_faster)
+        if p_slower < alpha and change > threshold:
+            status = "regression"
+        elif p_faster < alpha and change < -threshold:
+            status = "improvement"
+        comparison[name] = {"baseline": base['median'],
+                            "current": result['median'], "change": change,
+                            "p_value": p_value, "status": status}
+    return comparison
+
+
+def format_results(results: Results, format: str = 'us', rounding: int = 3,
+                   output_type: str = 'rounded_outline') -> str:
+    "Format benchmark results as a table"
+    rows = {}
+    for name, r in results.items():
+        rows[name] = [r['number'], r['repeat']] + [
+            convert_ns(r[k], format=format, rounding=rounding)
+            for k in ('median', 'mad', 'ci_low', 'ci_high')]
+    headers = ['Benchmark', 'Iterations', 'Repeat', f"Median ({format})",
+               f"MAD ({format})", "CI low", "CI high"]
+    return format_counters(rows, headers=headers, format=output_type)
+
+
+def format_comparison(comparison: Results, format: str = 'us',
+                      rounding: int = 3,
+                      output_type: str = 'rounded_outline') -> str:
+    "Format a baseline comparison as a table"
+    rows = {}
+    for name, c in comparison.items():
+        base = c['baseline']
+        change = c['change']
+        rows[name] = [
+            '' if base is None else convert_ns(base, format=format,
+                                               rounding=rounding),
+            convert_ns(c['current'], format=format, rounding=rounding),
+            '' if change is None else round(change * 100, 1),
+            '' if c['p_value'] is None else round(c['p_value'], 4),
+            c['status']]
+    headers = ['Benchmark', f"Baseline ({format})", f"Current ({format})",
+               'Change (%)', 'p-value', 'Status']
+    return format_counters(rows, headers=headers, format=output_type)
+
+
+# default runner used by the command line
+runner = BenchmarkRunner()
+benchmark = runner.register
+
+# exit code of a regression, distinct from the 1 of an uncaught error and
+# the 2 of a usage error so CI can tell them apart
+EXIT_REGRESSION = 3
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """perfcounters-bench command line entry point
+
+    Returns:
+        exit code: EXIT_REGRESSION (3) if a benchmark regressed against
+        the baseline.
+    """
+    parser = argparse.ArgumentParser(
+        prog='perfcounters-bench',
+        description='Run benchmarks and detect regressions',
+        epilog=f"Exits with status {EXIT_REGRESSION} when a benchmark "
+        "regressed against the baseline.")
+    parser.add_argument('files', nargs='+',
+                        help='python files registering benchmarks')
+    parser.add_argument('-b', '--baseline', help='baseline results to '
+                        'compare against')
+    parser.add_argument('-s', '--save', help='save the results to a file')
+    parser.add_argument('-k', '--select', action='append',
+                        help='only run benchmarks whose name contains it')
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help='minimum repetition duration in seconds')
+    parser.add_argument('--alpha', type=float, default=0.05,
+                        help='regression significance level')
+    parser.add_argument('--threshold', type=float, default=0.02,
+                        help='minimum relative change to report')
+    parser.add_argument('--format', default='us',
+                        help='time unit: m, s, ms, us or ns')
+    args = parser.parse_args(argv)
+
+    # register the files benchmarks from scratch
+    runner.benchmarks.clear()
+    runner.results.clear()
+    runner.warmup = args.warmup
+    runner.repeat = args.repeat
+    runner.min_time = args.min_time
+    for path in args.files:
+        runpy.run_path(path)
+
+    names = [name for name in runner.benchmarks
+             if not args.select or any(s in name for s in args.select)]
+    results = runner.run(names)
+    print(format_results(results, format=args.format))
+    if args.save:
+        save_results(args.save, results)
+
+    if not args.baseline:
+        return 0
+    comparison = compare(results, load_results(args.baseline),
+                         alpha=args.alpha, threshold=args.threshold)
+    print(format_comparison(comparison, format=args.format))
+    regressions = [n for n, c in comparison.items()
+                   if c['status'] == 'regression']
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return EXIT_REGRESSION
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Export counters as Chrome Trace Event Format JSON.
+
+Traces are loadable in chrome://tracing and https://ui.perfetto.dev. Each
+time counter is a slice from its start to its stop, with its laps nested
+slices, on the track of the thread that started it. Events are written by
+chunks so exporting millions of laps never builds them all in memory.
+"""
+import json
+import os
+from typing import IO, Any, Iterable, Iterator, List, Optional, Union
+
+from .spans import SpanCounters, SpanNode
+from .time_counters import SampledTimeCounter, TimeCounter, TimeCounters
+
+Collection = Union[TimeCounters, SpanCounters]
+
+# number of events written at once
+CHUNK_SIZE = 1 << 14
+
+
+def _us(ns: int) -> str:
+    "nanoseconds as trace microseconds"
+    return f"{ns / 1000:.3f}"
+
+
+def _metadata(pid: int, tid: Optional[int], kind: str, name: str) -> str:
+    thread = '' if tid is None else f',"tid":{tid}'
+    return (f'{{"name":"{kind}","ph":"M","pid":{pid}{thread},'
+            f'"args":{{"name":{json.dumps(name)}}}}}')
+
+
+def counter_events(cnt: TimeCounter, pid: int) -> Iterator[str]:
+    """Trace events of a time counter
+
+    Args:
+        cnt: time counter. Running counters end at the current time.
+
+        pid: process id of the events.
+
+    Returns:
+        iterator of json encoded events: the counter slice then its laps.
+        Bounded and sampled counters don't keep laps timestamps, only
+        their slice is exported.
+    """
+    name = json.dumps(str(cnt))
+    ids = f'"pid":{pid},"tid":{cnt.tid}'
+    start_ts = cnt.start_ts
+    stop_ts = cnt.stop_ts if cnt.stop_ts else cnt.clock()
+    yield (f'{{"name":{name},"cat":"counter","ph":"X",'
+           f'"ts":{_us(start_ts)},"dur":{_us(stop_ts - start_ts)},{ids}}}')
+    if (cnt.sketch is not None or isinstance(cnt, SampledTimeCounter)
+            or not cnt.laps):
+        return
+    head = f'{{"name":{name},"cat":"lap","ph":"X","ts":'
+    tail = f',{ids},"args":{{"lap":'
+    prev = start_ts
+    lap = 0
+    # hot loop, formatting inlined
+    for lap, ts in enumerate(cnt.laps):
+        yield (f'{head}{prev / 1000:.3f},"dur":{(ts - prev) / 1000:.3f}'
+               f'{tail}{lap}}}}}')
+        prev = ts
+    # final lap
+    yield (f'{{"name":{name},"cat":"lap","ph":"X","ts":{_us(prev)},'
+           f'"dur":{_us(stop_ts - prev)},{ids},"args":{{"lap":{lap + 1}}}}}')
+
+
+def span_events(spans: SpanCounters, pid: int, tid: int) -> Iterator[str]:
+    """Trace events of a spans call tree
+
+    Spans are aggregated, they don't keep when each call happened. The
+    tree is laid out as a flame chart starting at 0: each span lasts its
+    total time and its children follow each other from its start.
+
+    Args:
+        spans: spans collection.
+
+        pid: process id of the events.
+
+        tid: track id of the events.
+
+    Returns:
+        iterator of json encoded events.
+    """
+    ids = f'"pid":{pid},"tid":{tid}'
+
+    def node_events(node: SpanNode, name: str, start: int) -> Iterator[str]:
+        yield (f'{{"name":{json.dumps(name)},"cat":"span","ph":"X",'
+               f'"ts":{_us(start)},"dur":{_us(node.total)},{ids},'
+               f'"args":{{"count":{node.count},'
+               f'"self_us":{_us(node.self_time)}}}}}')
+        for child in list(node.children.values()):
+            yield from node_events(child, child.name, start)
+            start += child.total
+
+    start = 0
+    for node in list(spans.get_root().children.values()):
+        yield from node_events(node, f"{spans.prefix}{node.name}", start)
+        start += node.total
+
+
+def iter_events(*collections: Collection,
+                pid: Optional[int] = None) -> Iterator[str]:
+    """Trace events of counters collections
+
+    Args:
+        collections: TimeCounters and SpanCounters to export.
+
+        pid: process id of the events. Defaults to None, the current
+        process id.
+
+    Returns:
+        iterator of json encoded events.
+    """
+    pid = os.getpid() if pid is None else pid
+    yield _metadata(pid, None, 'process_name', 'perfcounters')
+    span_tid = 0
+    for collection in collections:
+        if isinstance(collection, TimeCounters):
+            for cnt in list(collection.counters.values()):
+                yield from counter_events(cnt, pid)
+        elif isinstance(collection, SpanCounters):
+            # spans have their own track, below the threads ones
+            yield _metadata(pid, span_tid, 'thread_name',
+                            f"{collection.prefix}spans")
+            yield from span_events(collection, pid, span_tid)
+            span_tid += 1
+        else:
+            raise ValueError("Only TimeCounters and SpanCounters can be "
+                             "exported as a trace")
+
+
+def _write(fp: IO[str], events: Iterable[str]) -> int:
+    "write the trace json by chunks, return the number of events"
+    fp.write('{"displayTimeUnit":"ns","traceEvents":[\n')
+    count = 0
+    chunk: List[str] = []
+    for event in events:
+        chunk.append(event)
+        if len(chunk) == CHUNK_SIZE:
+            fp.write((',\n' if count else '') + ',\n'.join(chunk))
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        fp.write((',\n' if count else '') + ',\n'.join(chunk))
+        count += len(chunk)
+    fp.write('\n]}\n')
+    return count
+
+
+def write_trace(dest: Union[str, IO[Any]], *collections: Collection,
+                compress: Optional[bool] = None) -> int:
+    """Write counters collections as a Chrome trace
+
+        write_trace("trace.json.gz", cnts, spans)
+
+    Args:
+        dest: path or file object. Text file objects receive the json,
+        binary ones its utf-8 encoding.
+
+        collections: TimeCounters and SpanCounters to export.
+
+        compress: gzip the trace. Defaults to None, compressing paths
+        ending in .gz.
+
+    Returns:
+        number of events written.
+    """
+    events = iter_events(*collections)
+    if isinstance(dest, str):
+        if compress is None:
+            compress = dest.endswith('.gz')
+        if compress:
+            import gzip
+            # level 6 compresses about as well as 9, much faster
+            with gzip.open(dest, 'wt', encoding='utf-8',
+                           compresslevel=6) as fp:
+                return _write(fp, events)
+        with open(dest, 'w', encoding='utf-8') as fp:
+            return _write(fp, events)
+
+    import io
+    binary = not isinstance(dest, io.TextIOBase)
+    if compress:
+        if not binary:
+            raise ValueError("Compressed traces need a binary file object")
+        import gzip
+        gz = gzip.GzipFile(fileobj=dest, mode='wb', compresslevel=6)
+        with io.TextIOWrapper(gz, encoding='utf-8') as text:
+            return _write(text, events)
+    if binary:
+        text = io.TextIOWrapper(dest, encoding='utf-8')  # type: ignore
+        try:
+            return _write(text, events)
+        finally:
+            # leave the caller file open
+            text.flush()
+            text.detach()
+    return _write(dest, events)
@@ -0,0 +1,81 @@
+import time
+from typing import Callable, Dict, Union
+
+AnyNum = Union[int, float]
+Clock = Callable[[], int]
+
+# All clocks return integer nanoseconds so timestamps never lose precision
+# through float rounding. perf_counter is the highest resolution monotonic
+# clock available and is the default.
+CLOCKS: Dict[str, Clock] = {
+    'perf_counter': time.perf_counter_ns,
+    'monotonic': time.monotonic_ns,
+    'process_time': time.process_time_ns,
+    'thread_time': time.thread_time_ns,
+}
+
+DEFAULT_CLOCK = 'perf_counter'
+
+# number of nanoseconds in each supported time unit.
+TIME_UNITS: Dict[str, int] = {
+    'm': 60_000_000_000,
+    's': 1_000_000_000,
+    'ms': 1_000_000,
+    'us': 1_000,
+    'ns': 1,
+}
+
+
+def get_clock(name: str) -> Clock:
+    """Return the clock function associated with a clock name
+
+    Args:
+        name: clock name. One of perf_counter, monotonic, process_time
+        or thread_time.
+
+    Returns:
+        clock function returning the current time in nanoseconds.
+    """
+    if name not in CLOCKS:
+        raise ValueError(f"Unknown clock {name}. Valid: {', '.join(CLOCKS)}")
+    return CLOCKS[name]
+
+
+def get_unit(format: str) -> int:
+    """Return the number of nanoseconds in a time unit
+
+    Args:
+        format: time unit. m for minute, s for second, ms for millisecond,
+        us for microsecond and ns for nanosecond.
+
+    Returns:
+        number of nanoseconds in the unit.
+    """
+    if format not in TIME_UNITS:
+        raise ValueError("Unsupported format. Valid: m, s, ms, us and ns")
+    return TIME_UNITS[format]
+
+
+def convert_ns(ns: AnyNum, format: str, rounding: int) -> AnyNum:
+    """Convert a nanoseconds duration into the requested unit
+
+    Args:
+        ns: duration in nanoseconds.
+
+        format: time unit. m for minute, s for second, ms for millisecond,
+        us for microsecond and ns for nanosecond.
+
+        rounding: rounding. 0 returns an int.
+
+    Returns:
+        converted duration.
+    """
+    unit = get_unit(format)
+    # nanoseconds are already exact integers
+    if unit == 1 and isinstance(ns, int):
+        return ns
+    ts = ns / unit
+    # if rounding to 0 then we want the int
+    if not rounding:
+        return int(ts)
+    return round(ts, rounding)
@@ -0,0 +1,315 @@
+"""Statistical comparison of the counters of two runs (A/B diff)."""
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from .clocks import convert_ns
+from .format import format_counters
+from .optional import get_numpy
+from .snapshot import Snapshot
+from .stats import bootstrap_change_ci, mann_whitney, median
+from .time_counters import SampledTimeCounter, TimeCounter, TimeCounters
+from .value_counters import ValueCounters
+
+AnyNum = Union[int, float]
+Collection = Union[TimeCounters, ValueCounters]
+Source = Union[Collection, Snapshot, str, bytes, Iterable[Collection]]
+# kind, samples or None when the counter is bounded, median, count
+Samples = Tuple[str, Any, float, int]
+
+STATUSES = ['regression', 'improvement', 'increase', 'decrease', 'unchanged',
+            'new', 'removed', 'untested']
+
+
+def _collections(source: Source) -> List[Collection]:
+    "collections of a comparison side"
+    if isinstance(source, (TimeCounters, ValueCounters)):
+        return [source]
+    if isinstance(source, Snapshot):
+        return source.to_collections()
+    if isinstance(source, (str, bytes)):
+        with Snapshot(source) as snap:
+            return snap.to_collections()
+    return list(source)
+
+
+def _samples(kind: str, sketch: Any, laps: Any) -> Samples:
+    "counter samples, as a NumPy array when NumPy is installed"
+    if sketch is not None:
+        # bounded counters only keep a sketch of their laps
+        return (kind, None, sketch.quantile(0.5), len(sketch))
+    np = get_numpy()
+    if np is not None:
+        values = np.asarray(laps, dtype=np.float64)
+        return (kind, values, float(np.median(values)), len(values))
+    values = list(laps)
+    return (kind, values, median(values), len(values))
+
+
+def _durations(cnt: TimeCounter) -> Any:
+    "laps durations, computed vectorized when NumPy is installed"
+    np = get_numpy()
+    if np is None or isinstance(cnt, SampledTimeCounter):
+        return cnt._laps_durations()
+    ts = np.empty(len(cnt.laps) + 2, dtype=np.int64)
+    ts[0] = cnt.start_ts
+    ts[1:-1] = cnt.laps
+    ts[-1] = cnt.stop_ts if cnt.stop_ts else cnt.clock()
+    return np.diff(ts)
+
+
+def collect(source: Source) -> Dict[str, Samples]:
+    """Return the samples of every counter of a comparison side
+
+    Time counters samples are their laps durations in nanoseconds,
+    including the final lap. Value counters samples are their laps values
+    and current value. Timers don't keep samples and are skipped.
+
+    Args:
+        source: TimeCounters, ValueCounters, a snapshot, a snapshot path or
+        bytes, or an iterable of collections.
+
+    Returns:
+        (kind, samples, median, count) keyed by counter name. kind is time
+        or value, samples is None for bounded counters.
+    """
+    samples: Dict[str, Samples] = {}
+    for collection in _collections(source):
+        if isinstance(collection, TimeCounters):
+            for name, cnt in list(collection.counters.items()):
+                laps = _durations(cnt) if cnt.sketch is None else None
+                samples[name] = _samples('time', cnt.sketch, laps)
+        elif isinstance(collection, ValueCounters):
+            counters = list(collection.counters.items())
+            for family in list(collection.families.values()):
+                counters.extend((c.name, c) for _, c in family.items())
+            for name, vcnt in counters:
+                values: Any = None
+                if vcnt.sketch is None:
+                    values = list(vcnt.laps)
+                    values.append(vcnt.value)
+                samples[name] = _samples('value', vcnt.sketch, values)
+        else:
+            raise ValueError("Only TimeCounters and ValueCounters can be "
+                             "compared")
+    return samples
+
+
+class Comparison():
+    """Per counter comparison of two runs
+
+    Counters are matched by name, their laps are the samples compared.
+    Each row holds both medians, their delta and relative change, the
+    bootstrap confidence interval of the change and the two sided
+    Mann-Whitney p-value. A change is significant when the p-value is
+    below alpha and the change is larger than threshold; its status is
+    then regression or improvement for time counters and increase or
+    decrease for value counters.
+    """
+
+    def __init__(self, a: Source, b: Source, alpha: float = 0.05,
+                 threshold: float = 0.02, confidence: float = 0.95,
+                 resamples: int = 1000, seed: Optional[int] = None) -> None:
+        """
+        Args:
+            a: baseline run. TimeCounters, ValueCounters, a snapshot, a
+            snapshot path or bytes, or an iterable of collections.
+
+            b: new run, same types as a.
+
+            alpha: significance level. Defaults to 0.05.
+
+            threshold: minimum relative change reported, ignoring
+            statistically significant but negligible changes.
+            Defaults to 0.02.
+
+            confidence: confidence level of the change interval.
+            Defaults to 0.95.
+
+            resamples: number of bootstrap resamples. Defaults to 1000.
+
+            seed: random seed, for reproducible intervals. Defaults to None.
+        """
+        self.alpha = alpha
+        self.threshold = threshold
+        self.confidence = confidence
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        base = collect(a)
+        new = collect(b)
+        for name in [*base, *(n for n in new if n not in base)]:
+            self.rows[name] = self._compare(base.get(name), new.get(name),
+                                            resamples, seed)
+
+    def _compare(self, base: Optional[Samples], new: Optional[Samples],
+                 resamples: int, seed: Optional[int]) -> Dict[str, Any]:
+        kind = base[0] if base is not None else new[0]  # type: ignore
+        row: Dict[str, Any] = {
+            'kind': kind, 'count_a': None, 'count_b': None,
+            'median_a': None, 'median_b': None, 'delta': None,
+            'change': None, 'ci_low': None, 'ci_high': None,
+            'p_value': None}
+        if base is not None:
+            row['count_a'], row['median_a'] = base[3], base[2]
+        if new is not None:
+            row['count_b'], row['median_b'] = new[3], new[2]
+        if base is None or new is None:
+            row['status'] = 'new' if base is None else 'removed'
+            return row
+        if base[0] != new[0]:
+            raise ValueError("Counters of different kinds can't be compared")
+        row['delta'] = new[2] - base[2]
+        if base[2]:
+            row['change'] = new[2] / base[2] - 1
+        if base[1] is None or new[1] is None:
+            row['status'] = 'untested'
+            return row
+        _, p_value = mann_whitney(base[1], new[1])
+        row['p_value'] = p_value
+        if base[2]:
+            row['ci_low'], row['ci_high'] = bootstrap_change_ci(
+                base[1], new[1], confidence=self.confidence,
+                resamples=resamples, seed=seed)
+        status = 'unchanged'
+        change = row['change']
+        if p_value < self.alpha and (change is None
+                                     or abs(change) > self.threshold):
+            if kind == 'time':
+                status = 'regression' if row['delta'] > 0 else 'improvement'
+            else:
+                status = 'increase' if row['delta'] > 0 else 'decrease'
+        row['status'] = status
+        return row
+
+    def get(self, name: str, format: str = 'ms',
+            rounding: int = 3) -> Dict[str, Any]:
+        """Return a counter comparison
+
+        Args:
+            name: name of the counter.
+
+            format: time counters reporting format. m for minute, s for
+            second, ms for millisecond, us for microsecond, ns for
+            nanosecond. Defaults to millisecond (ms).
+
+            rounding: rounding of medians and delta. Defaults to 3.
+
+        Returns:
+            kind, count_a, count_b, median_a, median_b, delta, change,
+            ci_low, ci_high (relative changes), p_value and status.
+        """
+        row = self.rows.get(name)
+        if row is None:
+            raise ValueError(f"Unknown counter {name}")
+        row = dict(row)
+        for key in ('median_a', 'median_b', 'delta'):
+            value = row[key]
+            if value is None:
+                continue
+            if row['kind'] == 'time':
+                row[key] = convert_ns(value, format=format,
+                                      rounding=rounding)
+            elif isinstance(value, float):
+                row[key] = round(value, rounding)
+        return row
+
+    def get_all(self, format: str = 'ms',
+                rounding: int = 3) -> Dict[str, List[Any]]:
+        """Return all counters comparisons as table rows
+
+        Args:
+            format: time counters reporting format. Defaults to
+            millisecond (ms).
+
+            rounding: rounding of medians and delta. Defaults to 3.
+
+        Returns:
+            Dictionary of counters [median a, median b, delta, change,
+            interval low, interval high, p-value, status]. The change and
+            its interval are percentages. Missing values are empty strings.
+        """
+        cnts = {}
+        for name in self.rows:
+            row = self.get(name, format=format, rounding=rounding)
+            cells: List[Any] = [
+                '' if row[k] is None else row[k]
+                for k in ('median_a', 'median_b', 'delta')]
+            for key in ('change', 'ci_low', 'ci_high'):
+                value = row[key]
+                cells.append('' if value is None else round(value * 100, 1))
+            p_value = row['p_value']
+            cells.append('' if p_value is None else round(p_value, 4))
+            cells.append(row['status'])
+            cnts[name] = cells
+        return cnts
+
+    def report(self, format: str = 'ms', rounding: int = 3) -> None:
+        "pretty print the comparison"
+        print(self._format(output_type='rounded_outline', format=format,
+                           rounding=rounding))
+
+    def to_json(self, format: str = 'ms', rounding: int = 3) -> str:
+        "Return the comparison as a json string"
+        import json
+        return json.dumps({name: self.get(name, format=format,
+                                          rounding=rounding)
+                           for name in self.rows})
+
+    def to_html(self, format: str = 'ms', rounding: int = 3) -> str:
+        "Return the comparison as html table"
+        return self._format(output_type='html', format=format,
+                            rounding=rounding)
+
+    def to_md(self, format: str = 'ms', rounding: int = 3) -> str:
+        "Return the comparison as markdown table"
+        return self._format(output_type='github', format=format,
+                            rounding=rounding)
+
+    def to_latex(self, format: str = 'ms', rounding: int = 3) -> str:
+        "Return the comparison as latex table"
+        return self._format(output_type='latex', format=format,
+                            rounding=rounding)
+
+    def _format(self, output_type: str, format: str, rounding: int) -> str:
+        cnts = self.get_all(format=format, rounding=rounding)
+        ci = f"{round(self.confidence * 100)}% CI"
+        # value counters are not converted, only time tables get a unit
+        unit = ''
+        if all(row['kind'] == 'time' for row in self.rows.values()):
+            unit = f" ({format})"
+        headers = ['Counter', f"A{unit}", f"B{unit}", f"Delta{unit}",
+                   'Change (%)', f"{ci} low", f"{ci} high", 'p-value',
+                   'Status']
+        return format_counters(cnts, headers=headers, format=output_type)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def compare(a: Source, b: Source, alpha: float = 0.05,
+            threshold: float = 0.02, confidence: float = 0.95,
+            resamples: int = 1000, seed: Optional[int] = None) -> Comparison:
+    """Compare the counters of two runs
+
+        diff = compare(before, after)
+        diff.report()
+
+    Args:
+        a: baseline run. TimeCounters, ValueCounters, a snapshot, a
+        snapshot path or bytes, or an iterable of collections.
+
+        b: new run, same types as a.
+
+        alpha: significance level. Defaults to 0.05.
+
+        threshold: minimum relative change reported. Defaults to 0.02.
+
+        confidence: confidence level of the change interval.
+        Defaults to 0.95.
+
+        resamples: number of bootstrap resamples. Defaults to 1000.
+
+        seed: random seed, for reproducible intervals. Defaults to None.
+
+    Returns:
+        the comparison.
+    """
+    return Comparison(a, b, alpha=alpha, threshold=threshold,
+                      confidence=confidence, resamples=resamples, seed=seed)
@@ -0,0 +1,335 @@
+import struct
+import threading
+from collections import deque
+from typing import (IO, TYPE_CHECKING, Any, Deque, Dict, Iterable, Iterator,
+                    List, Optional, Tuple, Union)
+
+from .clocks import DEFAULT_CLOCK, get_clock
+from .ingest import CHUNK_SIZE
+
+if TYPE_CHECKING:
+    from .time_counters import TimeCounters
+    from .value_counters import ValueCounters
+
+AnyNum = Union[int, float]
+# (timestamp ns, kind, operation, counter name, value)
+Event = Tuple[int, str, str, str, Optional[AnyNum]]
+
+FORMATS = ['jsonl', 'binary']
+
+# operations codes, as recorded in the ring buffer and the binary log
+OPS: List[Tuple[str, str]] = [
+    ('time', 'start'), ('time', 'lap'), ('time', 'stop'), ('time', 'reset'),
+    ('value', 'inc'), ('value', 'set'), ('value', 'lap'), ('value', 'reset'),
+    ('time', 'timer'),
+]
+TIME_START, TIME_LAP, TIME_STOP, TIME_RESET = 0, 1, 2, 3
+VALUE_INC, VALUE_SET, VALUE_LAP, VALUE_RESET = 4, 5, 6, 7
+# timer entry, timestamped at its exit, its value is the duration
+TIME_TIMER = 8
+
+# binary log: magic, then records of timestamp, operation code, value type,
+# name length, value and utf-8 name.
+MAGIC = b'PCEVLOG1'
+_RECORD = struct.Struct('<qBBH8s')
+_NONE, _INT, _FLOAT = 0, 1, 2
+_INT64 = struct.Struct('<q')
+_FLOAT64 = struct.Struct('<d')
+
+
+class EventLog():
+    """Record every counters operation to replay their timeline offline
+
+        log = EventLog("events.jsonl")
+        cnts = TimeCounters(event_log=log)
+        ...
+        log.close()
+
+    Recording appends a compact tuple to an in-memory ring buffer, it never
+    waits on I/O. A background thread flushes the buffer to the log file
+    every `interval`. When the buffer is full the oldest events are
+    dropped and counted in `dropped`.
+
+    The counters of a logged collection record their own operations, so
+    handles, timers, families children and ingested laps and values are
+    recorded too. Families children are recorded under their full name,
+    e.g. `http{status=200}`, and replayed as plain counters.
+    """
+
+    def __init__(self, path: str, format: str = 'jsonl',
+                 capacity: int = 1 << 16, interval: float = 0.5,
+                 clock: str = DEFAULT_CLOCK) -> None:
+        """
+        Args:
+            path: log file path. Overwritten.
+
+            format: jsonl, one json array per event, or binary, fixed
+            size records followed by the counter name. Defaults to jsonl.
+
+            capacity: maximum number of buffered events. Defaults to 65536.
+
+            interval: seconds between flushes. Defaults to 0.5.
+
+            clock: clock timestamping value counters events, time counters
+            events use their counter timestamps. Defaults to perf_counter.
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format {format}. "
+                             f"Valid: {', '.join(FORMATS)}")
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.path = path
+        self.format = format
+        self.capacity = capacity
+        self.interval = interval
+        self.clock = get_clock(clock)
+        self.dropped = 0
+        self.written = 0
+        # deque appends and pops are atomic, recording threads never lock
+        self._buffer: Deque[Tuple[int, int, str, Any]] = deque(
+            maxlen=capacity)
+        self._flush_lock = threading.Lock()
+        self._fp: IO[Any]
+        if format == 'binary':
+            self._fp = open(path, 'wb')
+            self._fp.write(MAGIC)
+        else:
+            self._fp = open(path, 'w')
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = threading.Thread(
+            target=self._run, daemon=True, name='perfcounters-eventlog')
+        self._thread.start()
+
+    def record(self, code: int, name: str, ts: int,
+               value: Optional[AnyNum] = None) -> None:
+        """Record an event
+
+        Args:
+            code: operation code, e.g. TIME_LAP.
+
+            name: counter name.
+
+            ts: event timestamp in nanoseconds.
+
+            value: value of value counters operations, duration of timer
+            entries.
+        """
+        buffer = self._buffer
+        if len(buffer) == self.capacity:
+            self.dropped += 1
+        buffer.append((ts, code, name, value))
+
+    def record_value(self, code: int, name: str,
+                     value: Optional[AnyNum] = None) -> None:
+        "record a value counter event timestamped with the log clock"
+        buffer = self._buffer
+        if len(buffer) == self.capacity:
+            self.dropped += 1
+        buffer.append((self.clock(), code, name, value))
+
+    def flush(self) -> int:
+        """Write the buffered events to the log
+
+        Returns:
+            number of events written.
+        """
+        with self._flush_lock:
+            buffer = self._buffer
+            events = []
+            # only drain what is there, recording goes on concurrently
+            for _ in range(len(buffer)):
+                events.append(buffer.popleft())
+            if not events:
+                return 0
+            if self.format == 'binary':
+                self._fp.write(b''.join(_pack(e) for e in events))
+            else:
+                # imported on first use to keep the package import fast
+                import json
+                lines = []
+                for ts, code, name, value in events:
+                    kind, op = OPS[code]
+                    if kind == 'time' and value is None:
+                        lines.append(json.dumps([ts, kind, op, name]))
+                    else:
+                        lines.append(json.dumps([ts, kind, op, name, value]))
+                self._fp.write('\n'.join(lines) + '\n')
+            self._fp.flush()
+            self.written += len(events)
+            return len(events)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def close(self) -> None:
+        "stop the flushing thread, flush the remaining events and close"
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if not self._fp.closed:
+            self.flush()
+            self._fp.close()
+
+    def __enter__(self) -> 'EventLog':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def _pack(event: Tuple[int, int, str, Any]) -> bytes:
+    "binary record of an event"
+    ts, code, name, value = event
+    raw = name.encode('utf-8')
+    if value is None:
+        vtype, packed = _NONE, bytes(8)
+    elif isinstance(value, int) and -(1 << 63) <= value < (1 << 63):
+        vtype, packed = _INT, _INT64.pack(value)
+    else:
+        vtype, packed = _FLOAT, _FLOAT64.pack(value)
+    return _RECORD.pack(ts, code, vtype, len(raw), packed) + raw
+
+
+def read_events(path: str) -> Iterator[Event]:
+    """Stream the events of a log, one at a time
+
+    Args:
+        path: log written by an `EventLog`, in jsonl or binary format.
+
+    Returns:
+        iterator of (timestamp, kind, operation, name, value) events.
+        kind is time or value, value is None for time events but timer
+        entries, whose value is their duration.
+    """
+    with open(path, 'rb') as fp:
+        if fp.read(len(MAGIC)) == MAGIC:
+            yield from _read_binary(fp)
+            return
+    import json
+    with open(path) as text:
+        for line in text:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if len(record) == 4:
+                record.append(None)
+            ts, kind, op, name, value = record
+            yield (ts, kind, op, name, value)
+
+
+def _read_binary(fp: IO[bytes]) -> Iterator[Event]:
+    size = _RECORD.size
+    while True:
+        header = fp.read(size)
+        if len(header) < size:
+            if header:
+                raise ValueError("Truncated event log")
+            return
+        ts, code, vtype, length, packed = _RECORD.unpack(header)
+        name = fp.read(length).decode('utf-8')
+        value: Optional[AnyNum] = None
+        if vtype == _INT:
+            value = _INT64.unpack(packed)[0]
+        elif vtype == _FLOAT:
+            value = _FLOAT64.unpack(packed)[0]
+        kind, op = OPS[code]
+        yield (ts, kind, op, name, value)
+
+
+def replay(events: Union[str, Iterable[Event]],
+           time_counters: Optional['TimeCounters'] = None,
+           value_counters: Optional['ValueCounters'] = None
+           ) -> Tuple['TimeCounters', 'ValueCounters']:
+    """Rebuild counters from a log, streamed without loading it whole
+
+    Passing bounded collections keeps the replay memory constant while
+    still reporting percentiles and statistics.
+
+    Args:
+        events: log path or events iterable.
+
+        time_counters: collection receiving the time counters. Defaults to
+        None, a new TimeCounters.
+
+        value_counters: collection receiving the value counters. Defaults
+        to None, a new ValueCounters.
+
+    Returns:
+        the time and value counters collections.
+    """
+    from .time_counters import TimeCounters
+    from .value_counters import ValueCounters
+    if isinstance(events, str):
+        events = read_events(events)
+    tcnts = time_counters if time_counters is not None else TimeCounters()
+    vcnts = value_counters if value_counters is not None else ValueCounters()
+    # laps timestamps are ingested by batches
+    pending: Dict[str, List[int]] = {}
+
+    def ingest(name: str, stop_ts: Optional[int] = None) -> None:
+        laps = pending.pop(name, [])
+        start_ts = None
+        if name not in tcnts.counters:
+            # started before the log, the counter begins at its first event
+            start_ts = laps.pop(0) if laps else stop_ts
+        tcnts.ingest_laps(name, laps, start_ts=start_ts, stop_ts=stop_ts)
+
+    for ts, kind, op, name, value in events:
+        if kind == 'value':
+            if op == 'inc':
+                vcnts.inc(name, value)
+            elif op == 'set':
+                vcnts.set(name, value)
+            elif op == 'lap':
+                vcnts.lap(name)
+            else:
+                vcnts.handle(name).reset()
+        elif op == 'timer':
+            tcnts.time(name).add(value)  # type: ignore
+        elif op == 'lap':
+            laps = pending.setdefault(name, [])
+            laps.append(ts)
+            if len(laps) >= CHUNK_SIZE:
+                ingest(name)
+        elif op == 'start':
+            tcnts.ingest_laps(name, (), start_ts=ts)
+        elif op == 'stop':
+            ingest(name, stop_ts=ts)
+        elif name in tcnts.timers:
+            tcnts.timers[name].reset()
+        else:
+            ingest(name)
+            cnt = tcnts.counters[name]
+            cnt.reset()
+            cnt.start_ts = cnt._last_lap_ts = ts
+    for name in list(pending):
+        ingest(name)
+    return tcnts, vcnts
+
+
+def iter_durations(events: Union[str, Iterable[Event]],
+                   name: str) -> Iterator[int]:
+    """Stream a time counter laps durations, including the final lap, e.g.
+    into a `QuantileSketch` or `stats` functions
+
+    Args:
+        events: log path or events iterable.
+
+        name: name of the time counter.
+
+    Returns:
+        iterator of laps durations in nanoseconds.
+    """
+    if isinstance(events, str):
+        events = read_events(events)
+    last_ts: Optional[int] = None
+    for ts, kind, op, event_name, _ in events:
+        if kind != 'time' or event_name != name or op == 'timer':
+            continue
+        if op in ('start', 'reset'):
+            last_ts = ts
+        elif last_ts is not None:
+            yield ts - last_ts
+            last_ts = ts if op == 'lap' else None
@@ -0,0 +1,259 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from .clocks import get_unit
+from .time_counters import TimeCounters
+from .value_counters import ValueCounters
+
+AnyNum = Union[int, float]
+Snapshot = Dict[str, Any]
+Sink = Callable[[Snapshot], None]
+
+
+class JsonLinesSink():
+    "Append each snapshot as a json line to a file"
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fp = open(path, 'a')
+
+    def __call__(self, snapshot: Snapshot) -> None:
+        self._fp.write(json.dumps(snapshot) + '\n')
+        self._fp.flush()
+
+    def close(self) -> None:
+        self._fp.close()
+
+
+class RotatingFileSink(JsonLinesSink):
+    """Append each snapshot as a json line to a file rotated when it grows
+    past max_bytes. Rotated files are named path.1 (newest) to
+    path.backup_count (oldest)."""
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 5) -> None:
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+    def __call__(self, snapshot: Snapshot) -> None:
+        line = json.dumps(snapshot) + '\n'
+        if self._fp.tell() and self._fp.tell() + len(line) > self.max_bytes:
+            self._rotate()
+        self._fp.write(line)
+        self._fp.flush()
+
+    def _rotate(self) -> None:
+        self._fp.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        self._fp = open(self.path, 'w')
+
+
+class StatsdSink():
+    """Send snapshots to a statsd server over UDP.
+
+    Time counters are converted to milliseconds. Totals are sent as gauges,
+    in delta mode time counters are sent as timings and value counters as
+    counters. A negative gauge is reset to 0 first, statsd would otherwise
+    read it as a decrement.
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 8125,
+                 prefix: str = "", max_packet_size: int = 512) -> None:
+        self.address = (host, port)
+        self.prefix = prefix
+        self.max_packet_size = max_packet_size
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def format(self, snapshot: Snapshot) -> List[str]:
+        "return the statsd lines of a snapshot"
+        lines: List[str] = []
+        delta = snapshot['delta']
+        # time counters are reported in the exporter format
+        scale = get_unit(snapshot.get('format', 'ms')) / get_unit('ms')
+        for name, value in snapshot['time'].items():
+            value = round(value * scale, 6)
+            self._line(lines, name, value, 'ms' if delta else 'g')
+        for name, value in snapshot['value'].items():
+            self._line(lines, name, value, 'c' if delta else 'g')
+        return lines
+
+    def _line(self, lines: List[str], name: str, value: AnyNum,
+              metric_type: str) -> None:
+        if metric_type == 'g' and value < 0:
+            lines.append(f"{self.prefix}{name}:0|g")
+        lines.append(f"{self.prefix}{name}:{value}|{metric_type}")
+
+    def __call__(self, snapshot: Snapshot) -> None:
+        # pack as many lines as possible per datagram
+        packet = ""
+        for line in self.format(snapshot):
+            if packet and len(packet) + len(line) + 1 > self.max_packet_size:
+                self._sock.sendto(packet.encode('utf-8'), self.address)
+                packet = ""
+            packet = f"{packet}\n{line}" if packet else line
+        if packet:
+            self._sock.sendto(packet.encode('utf-8'), self.address)
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+class Exporter():
+    """Periodically snapshot counters collections and hand the snapshots to
+    sinks, from a background thread or an asyncio task.
+
+    Snapshots are taken by reading the collections, instrumented code never
+    waits on the exporter. A snapshot is a dictionary:
+
+        {"timestamp": 1700000000.0, "delta": False, "format": "ms",
+         "time": {"db": 0.12}, "value": {"hits": 42}}
+
+    Time counters are reported in `format`.
+
+    Sinks are callables receiving each snapshot, for example
+    `JsonLinesSink`, `RotatingFileSink`, `StatsdSink` or any function.
+    """
+
+    def __init__(self, *collections: Union[TimeCounters, ValueCounters],
+                 sinks: List[Sink], interval: float = 10.0,
+                 delta: bool = False, format: str = 'ms',
+                 rounding: int = 3) -> None:
+        """
+        Args:
+            collections: counters collections to export.
+
+            sinks: callables receiving each snapshot.
+
+            interval: seconds between snapshots. Defaults to 10.
+
+            delta: export the increments since the last snapshot instead of
+            the totals. Counters that didn't change are omitted.
+            Defaults to False.
+
+            format: time counters reporting format. Defaults to
+            millisecond (ms).
+
+            rounding: Time rounding. Defaults to 3.
+        """
+        for collection in collections:
+            if not isinstance(collection, (TimeCounters, ValueCounters)):
+                raise ValueError("Only TimeCounters and ValueCounters "
+                                 "can be exported")
+        self.collections = collections
+        self.sinks = sinks
+        self.interval = interval
+        self.delta = delta
+        self.format = format
+        self.rounding = rounding
+        self.errors = 0
+        self._previous: Dict[str, Dict[str, AnyNum]] = {'time': {},
+                                                        'value': {}}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def collect(self) -> Snapshot:
+        "take a snapshot of the collections"
+        snapshot: Snapshot = {'timestamp': time.time(), 'delta': self.delta,
+                              'format': self.format, 'time': {},
+                              'value': {}}
+        for collection in self.collections:
+            if isinstance(collection, TimeCounters):
+                snapshot['time'].update(collection.get_all(
+                    format=self.format, rounding=self.rounding))
+            else:
+                snapshot['value'].update(collection.get_all(
+                    rounding=self.rounding))
+
+        if self.delta:
+            for kind in ('time', 'value'):
+                current = snapshot[kind]
+                previous = self._previous[kind]
+                self._previous[kind] = current
+                deltas = {}
+                for name, value in current.items():
+                    change = value - previous.get(name, 0)
+                    if change:
+                        deltas[name] = round(change, self.rounding)
+                snapshot[kind] = deltas
+        return snapshot
+
+    def flush(self) -> Snapshot:
+        "take a snapshot and send it to the sinks"
+        snapshot = self.collect()
+        for sink in self.sinks:
+            try:
+                sink(snapshot)
+            except Exception:
+                # a failing sink must not stop the export
+                self.errors += 1
+        return snapshot
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def start(self) -> None:
+        "start exporting from a daemon thread"
+        if self._thread is not None:
+            raise ValueError("Exporter already started")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='perfcounters-exporter')
+        self._thread.start()
+
+    def stop(self, flush: bool = True) -> None:
+        """stop the exporting thread
+
+        Args:
+            flush: export a final snapshot. Defaults to True.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if flush:
+            self.flush()
+
+    async def run(self) -> None:
+        """Export from an asyncio task until cancelled
+
+            task = asyncio.create_task(exporter.run())
+
+        Snapshots are taken on the loop, sinks run in the default executor
+        so their I/O never blocks the loop.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            snapshot = self.collect()
+            for sink in self.sinks:
+                try:
+                    await loop.run_in_executor(None, sink, snapshot)
+                except Exception:
+                    self.errors += 1
+
+    def close(self) -> None:
+        "stop exporting and close the sinks"
+        self.stop()
+        for sink in self.sinks:
+            close = getattr(sink, 'close', None)
+            if close is not None:
+                close()
+
+    def __enter__(self) -> 'Exporter':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -1,16 +1,54 @@
-import json
-from tabulate import tabulate
-from typing import List, Dict, Union
+from typing import Any, List, Dict, Optional, Union
+
+from .optional import get_tabulate
+from .render import FAST_FORMATS, TableRenderer
 
 AnyNum = Union[int, float]
-CNTS = Dict[str, AnyNum]
+CNTS = Dict[str, Any]
 
 def format_counters(cnts: CNTS, headers: List[str],
-                    format: str = 'rounded_outline') -> str:
+                    format: str = 'rounded_outline',
+                    renderer: Optional[TableRenderer] = None) -> str:
+    """Format counters as a table or a json string
+
+    Args:
+        cnts: counters values. A list or tuple value is expanded into
+        multiple columns.
+
+        headers: table headers.
+
+        format: json or any tabulate table format.
+        Defaults to rounded_outline.
+
+        renderer: renderer caching the rows between calls. Defaults to
+        None, rendering from scratch.
+
+    Returns:
+        formatted counters.
+    """
 
     if format == "json":
+        # imported on first use to keep the package import fast
+        import json
         return json.dumps(cnts)
     else:
-        rows = [[k, v] for k, v in cnts.items()]
-        return tabulate(rows, headers=headers, tablefmt=format)
+        # common formats are rendered without tabulate
+        renderer = renderer if renderer is not None else TableRenderer()
+        table = renderer.render(cnts, headers, format)
+        if table is not None:
+            return table
 
+        tabulate = get_tabulate()
+        if tabulate is None:
+            what = f"The {format} format"
+            if format in FAST_FORMATS:
+                what = "Multi-line and unprintable cells"
+            raise ImportError(f"{what} requires tabulate: "
+                              "pip install perfcounters[tabulate]")
+        rows = []
+        for k, v in cnts.items():
+            if isinstance(v, (list, tuple)):
+                rows.append([k, *v])
+            else:
+                rows.append([k, v])
+        return tabulate.tabulate(rows, headers=headers, tablefmt=format)
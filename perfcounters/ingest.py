@@ -0,0 +1,127 @@
+"""Bulk ingestion of recorded series into counters laps.
+
+Inputs can be lists, arrays, NumPy arrays, any buffer protocol object, raw
+bytes of native int64/float64 items, or iterators. Buffers whose layout
+matches a compact counter laps array are appended with a single copy,
+other inputs are streamed in chunks so large inputs, and generators, are
+never materialized as a whole.
+"""
+import sys
+from array import array
+from itertools import islice
+from typing import Any, Iterator, List, MutableSequence, Optional
+
+# number of items converted at once when streaming an input
+CHUNK_SIZE = 1 << 16
+
+# buffer formats sharing the memory layout of the laps arrays typecodes
+LAYOUTS = {'q': ('q', 'l'), 'd': ('d', )}
+
+
+def _buffer(data: Any, typecode: str) -> Optional[memoryview]:
+    "1-D view of a buffer protocol object, None for other objects"
+    if isinstance(data, (list, tuple)):
+        return None
+    try:
+        view = memoryview(data)
+    except TypeError:
+        return None
+    if view.format in ('B', 'b', 'c'):
+        # raw bytes of native items
+        if view.nbytes % array(typecode).itemsize:
+            raise ValueError(f"Buffer size is not a multiple of the "
+                             f"{typecode} item size")
+        if not view.c_contiguous:
+            view = memoryview(view.tobytes())
+        return view.cast('B').cast(typecode)  # type: ignore
+    fmt = view.format
+    if len(fmt) == 2 and fmt[0] in '<>!=':
+        # explicit byte order, e.g. NumPy '>i8', converted with one copy
+        items = array(fmt[1], view.tobytes())
+        if fmt[0] != '=' and (fmt[0] == '<') != (sys.byteorder == 'little'):
+            items.byteswap()
+        return memoryview(items)
+    if view.ndim != 1 or not view.c_contiguous:
+        # multi-dimensional or strided arrays are flattened with one copy
+        if not view.c_contiguous:
+            view = memoryview(view.tobytes()).cast(fmt)  # type: ignore
+        view = view.cast('B').cast(fmt)  # type: ignore
+    return view
+
+
+def extend_series(series: MutableSequence[Any], data: Any,
+                  typecode: str) -> MutableSequence[Any]:
+    """Append data to a laps series
+
+    Args:
+        series: laps list or array.
+
+        data: items to append.
+
+        typecode: array typecode of the items, q for int64 timestamps and
+        d for float64 values.
+
+    Returns:
+        the series. A copy when the series is an array whose buffer is
+        exported, e.g. by a laps view, so the view stays valid.
+    """
+    if not isinstance(series, array):
+        view = _buffer(data, typecode)
+        if view is None:
+            # list.extend() consumes iterators without materializing them
+            series.extend(data)
+        else:
+            for i in range(0, len(view), CHUNK_SIZE):
+                series.extend(view[i:i + CHUNK_SIZE].tolist())
+        return series
+
+    items = series
+
+    def append(method: str, chunk: Any) -> None:
+        nonlocal items
+        try:
+            getattr(items, method)(chunk)
+        except BufferError:
+            # the laps buffer is exported through a view, stop sharing it
+            # so the view stays valid.
+            items = array(items.typecode, items)
+            getattr(items, method)(chunk)
+
+    view = _buffer(data, typecode)
+    if (view is not None and view.format in LAYOUTS[items.typecode]
+            and view.itemsize == items.itemsize):
+        # same memory layout: a single copy
+        append('frombytes', view.cast('B'))
+    else:
+        for chunk in iter_chunks(data, typecode, view):
+            append('extend', array(items.typecode, chunk))
+    return items
+
+
+def iter_chunks(data: Any, typecode: str,
+                view: Optional[memoryview] = None) -> Iterator[List[Any]]:
+    """Iterate over the data items by chunks of at most CHUNK_SIZE items
+
+    Args:
+        data: items.
+
+        typecode: array typecode of the items, q or d, used to read raw
+        bytes.
+
+        view: data buffer view when already known.
+
+    Returns:
+        iterator of items lists.
+    """
+    if view is None:
+        view = _buffer(data, typecode)
+    if view is not None:
+        for i in range(0, len(view), CHUNK_SIZE):
+            yield view[i:i + CHUNK_SIZE].tolist()
+        return
+    it = iter(data)
+    while True:
+        chunk = list(islice(it, CHUNK_SIZE))
+        if not chunk:
+            return
+        yield chunk
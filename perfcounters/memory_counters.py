@@ -0,0 +1,430 @@
+import gc
+import os
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+from .format import format_counters
+from .render import TableRenderer
+
+AnyNum = Union[int, float]
+# (rss, traced, traced peak since the previous snapshot, gc collections)
+Snapshot = Tuple[int, int, int, int]
+
+# number of bytes in each supported memory unit.
+MEMORY_UNITS: Dict[str, int] = {
+    'B': 1,
+    'KiB': 1 << 10,
+    'MiB': 1 << 20,
+    'GiB': 1 << 30,
+}
+
+METRICS = ['rss', 'traced', 'peak', 'gc']
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+# /proc/self/statm descriptor, kept open so reading the RSS is a single
+# pread. It is reopened after a fork as /proc/self is resolved on open.
+_statm_fd = -1
+_statm_pid = 0
+_statm_lock = threading.Lock()
+
+# number of MemoryCounters sharing the tracemalloc tracing they started,
+# tracing is stopped when the last of them is closed.
+_tracers = 0
+_tracers_lock = threading.Lock()
+
+
+def _open_statm() -> int:
+    global _statm_fd, _statm_pid
+    with _statm_lock:
+        pid = os.getpid()
+        if _statm_pid != pid:
+            try:
+                # the parent descriptor is inherited but not owned after a
+                # fork, so it is left open.
+                _statm_fd = os.open('/proc/self/statm', os.O_RDONLY)
+            except OSError:
+                _statm_fd = -1
+            _statm_pid = pid
+    return _statm_fd
+
+
+def read_rss() -> int:
+    """Return the process resident set size in bytes
+
+    Read from /proc/self/statm. Returns 0 when /proc is not available,
+    e.g. on macOS or Windows.
+    """
+    fd = _statm_fd if _statm_pid == os.getpid() else _open_statm()
+    if fd < 0:
+        return 0
+    return int(os.pread(fd, 64, 0).split()[1]) * PAGE_SIZE
+
+
+def convert_bytes(value: AnyNum, format: str, rounding: int) -> AnyNum:
+    """Convert a number of bytes into the requested unit
+
+    Args:
+        value: number of bytes.
+
+        format: memory unit. B, KiB, MiB or GiB.
+
+        rounding: rounding of converted values.
+
+    Returns:
+        converted value, an int for bytes.
+    """
+    if format not in MEMORY_UNITS:
+        raise ValueError(f"Unsupported format. Valid: "
+                         f"{', '.join(MEMORY_UNITS)}")
+    if format == 'B':
+        return int(value)
+    return round(value / MEMORY_UNITS[format], rounding)
+
+
+def _start_tracing() -> bool:
+    "start tracemalloc if needed, return True if the caller owns the tracing"
+    global _tracers
+    import tracemalloc
+    with _tracers_lock:
+        if not _tracers:
+            if tracemalloc.is_tracing():
+                # started by the application, it is not ours to stop
+                return False
+            tracemalloc.start()
+        _tracers += 1
+        return True
+
+
+def _stop_tracing() -> None:
+    "release the tracing, stopped when its last owner releases it"
+    global _tracers
+    import tracemalloc
+    with _tracers_lock:
+        _tracers -= 1
+        if not _tracers:
+            tracemalloc.stop()
+
+
+def _gc_collections() -> int:
+    "number of garbage collections run by the process, all generations"
+    return sum(gen['collections'] for gen in gc.get_stats())
+
+
+def _snapshot_low() -> Snapshot:
+    return (read_rss(), 0, 0, 0)
+
+
+class MemoryCounter():
+    """Single memory counter
+
+    Records a memory snapshot on start, each lap and stop. Laps and totals
+    are the deltas between snapshots.
+    """
+    __slots__ = ('prefix', 'name', 'low_overhead', 'start_snapshot', 'laps',
+                 'stop_snapshot')
+
+    def __init__(self, name: str, prefix: str = "",
+                 low_overhead: bool = False):
+        self.prefix = prefix
+        self.name = name
+        self.low_overhead = low_overhead
+        self.laps: List[Snapshot] = []
+        self.stop_snapshot: Optional[Snapshot] = None
+        self.start_snapshot = self._snapshot()
+
+    def _snapshot(self, reset_peak: bool = True) -> Snapshot:
+        "current memory usage"
+        if self.low_overhead:
+            return _snapshot_low()
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        if reset_peak:
+            # the next snapshot peak only covers the memory since this one
+            tracemalloc.reset_peak()
+        return (read_rss(), current, peak, _gc_collections())
+
+    def lap(self) -> None:
+        "record lap memory"
+        self.laps.append(self._snapshot())
+
+    def stop(self) -> None:
+        "stop memory counter"
+        self.stop_snapshot = self._snapshot()
+
+    def reset(self) -> None:
+        "Reset counter"
+        self.laps = []
+        self.stop_snapshot = None
+        self.start_snapshot = self._snapshot()
+
+    def _snapshots(self) -> List[Snapshot]:
+        "start, laps and stop or current snapshots"
+        last = self.stop_snapshot
+        if last is None:
+            # the running region keeps its peak
+            last = self._snapshot(reset_peak=False)
+        return [self.start_snapshot, *self.laps, last]
+
+    def get(self, format: str = 'MiB',
+            rounding: int = 2) -> Dict[str, AnyNum]:
+        """Report memory deltas between start and stop
+
+        Args:
+            format: memory unit. B, KiB, MiB or GiB. Defaults to MiB.
+
+            rounding: Memory rounding. Defaults to 2.
+
+        Returns:
+            rss and traced memory deltas, traced peak above the start
+            traced memory and number of garbage collections. Only rss in
+            low overhead mode.
+        """
+        snapshots = self._snapshots()
+        first, last = snapshots[0], snapshots[-1]
+        rss = convert_bytes(last[0] - first[0], format, rounding)
+        if self.low_overhead:
+            return {'rss': rss}
+        peak = max(s[2] for s in snapshots[1:]) - first[1]
+        return {
+            'rss': rss,
+            'traced': convert_bytes(last[1] - first[1], format, rounding),
+            'peak': convert_bytes(max(peak, 0), format, rounding),
+            'gc': last[3] - first[3]
+        }
+
+    def get_laps(self, metric: str = 'rss', format: str = 'MiB',
+                 rounding: int = 2) -> List[AnyNum]:
+        """Report a metric laps deltas as a timeserie
+
+        Args:
+            metric: rss, traced, peak or gc. Defaults to rss.
+
+            format: memory unit. B, KiB, MiB or GiB. Defaults to MiB.
+
+            rounding: Memory rounding. Defaults to 2.
+
+        Returns:
+            laps deltas timeserie, including the final lap.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric}. "
+                             f"Valid: {', '.join(METRICS)}")
+        if self.low_overhead and metric != 'rss':
+            raise ValueError(f"Counter {self.name} is low overhead and only "
+                             "tracks rss")
+        snapshots = self._snapshots()
+        laps: List[AnyNum] = []
+        for prev, cur in zip(snapshots, snapshots[1:]):
+            if metric == 'rss':
+                delta = cur[0] - prev[0]
+            elif metric == 'traced':
+                delta = cur[1] - prev[1]
+            elif metric == 'peak':
+                delta = max(cur[2] - prev[1], 0)
+            else:
+                laps.append(cur[3] - prev[3])
+                continue
+            laps.append(convert_bytes(delta, format, rounding))
+        return laps
+
+    def __str__(self) -> str:
+        return f"{self.prefix}{self.name}"
+
+    def __repr__(self) -> str:
+        return f"{self.prefix}{self.name}"
+
+
+class MemoryCounters():
+    def __init__(self, prefix: str = "", low_overhead: bool = False,
+                 start_tracing: bool = False) -> None:
+        """Memory counters collection
+
+        Each counter records the process RSS, the memory traced by
+        `tracemalloc` and the garbage collections of a region, from
+        `start()` to `stop()` with optional laps in between. Traced peaks
+        are exact for regions that don't overlap, as each snapshot resets
+        the tracemalloc peak.
+
+        tracemalloc slows down every allocation of the process, so it is
+        only started on request: either by the application (or
+        `python -X tracemalloc`), or with `start_tracing=True` in which
+        case `close()` stops it.
+
+        Args:
+            prefix: prefix prepended to counter names when reporting.
+
+            low_overhead: only read the RSS from /proc, without
+            tracemalloc and gc statistics. Defaults to False.
+
+            start_tracing: start tracemalloc if it is not tracing, until
+            `close()`. Defaults to False.
+        """
+        self.prefix = prefix
+        self.low_overhead = low_overhead
+        # whether this collection holds the tracing it started
+        self._tracing = False
+        if not low_overhead:
+            import tracemalloc
+            if start_tracing:
+                self._tracing = _start_tracing()
+            elif not tracemalloc.is_tracing():
+                raise ValueError("tracemalloc is not tracing. Start it, pass "
+                                 "start_tracing=True or use "
+                                 "low_overhead=True")
+        self.counters: Dict[str, MemoryCounter] = {}
+        # reuses the unchanged rows between reports
+        self._renderer = TableRenderer()
+
+    def _counter(self, name: str) -> MemoryCounter:
+        cnt = self.counters.get(name)
+        if cnt is None:
+            raise ValueError(f"Unknown counter {name}")
+        return cnt
+
+    def start(self, name: str) -> None:
+        "start a counter"
+        if name in self.counters:
+            raise ValueError(f"Counter {name} already exist")
+        self.counters[name] = MemoryCounter(name=name, prefix=self.prefix,
+                                            low_overhead=self.low_overhead)
+
+    def lap(self, name: str) -> None:
+        "add lap"
+        self._counter(name).lap()
+
+    def stop(self, name: str) -> None:
+        "stop a counter"
+        self._counter(name).stop()
+
+    def stop_all(self) -> None:
+        "stop all counters"
+        for cnt in self.counters.values():
+            if cnt.stop_snapshot is None:
+                cnt.stop()
+
+    def reset(self, name: str) -> None:
+        "reset a given counter"
+        self._counter(name).reset()
+
+    def reset_all(self) -> None:
+        "reset all counters"
+        for cnt in self.counters.values():
+            cnt.reset()
+
+    def get(self, name: str, format: str = 'MiB',
+            rounding: int = 2) -> Dict[str, AnyNum]:
+        """Return a counter memory deltas
+
+        Args:
+            name: name of the counter.
+
+            format: memory unit. B, KiB, MiB or GiB. Defaults to MiB.
+
+            rounding: Memory rounding. Defaults to 2.
+
+        Returns:
+            rss, traced, peak and gc deltas. Only rss in low overhead mode.
+        """
+        return self._counter(name).get(format=format, rounding=rounding)
+
+    def get_laps(self, name: str, metric: str = 'rss', format: str = 'MiB',
+                 rounding: int = 2) -> List[AnyNum]:
+        """Return a counter metric laps timeserie
+
+        Args:
+            name: name of the counter.
+
+            metric: rss, traced, peak or gc. Defaults to rss.
+
+            format: memory unit. B, KiB, MiB or GiB. Defaults to MiB.
+
+            rounding: Memory rounding. Defaults to 2.
+
+        Returns:
+            laps deltas timeserie.
+        """
+        return self._counter(name).get_laps(metric=metric, format=format,
+                                            rounding=rounding)
+
+    def get_all(self, format: str = 'MiB',
+                rounding: int = 2) -> Dict[str, List[AnyNum]]:
+        """Return all counters deltas
+
+        Args:
+            format: memory unit. B, KiB, MiB or GiB. Defaults to MiB.
+
+            rounding: Memory rounding. Defaults to 2.
+
+        Returns:
+            Dictionary of counters [rss, traced, peak, gc] deltas, [rss]
+            in low overhead mode.
+        """
+        cnts = {}
+        # iterate over a copy so counters can be read from another thread
+        # while new ones are created.
+        for name, cnt in list(self.counters.items()):
+            values = cnt.get(format=format, rounding=rounding)
+            cnts[f"{self.prefix}{name}"] = list(values.values())
+        return cnts
+
+    def report(self, format: str = 'MiB', rounding: int = 2) -> None:
+        "pretty print counters"
+        print(self._format(output_type='rounded_outline', format=format,
+                           rounding=rounding))
+
+    def report_laps(self, name: str, metric: str = 'rss',
+                    format: str = 'MiB', rounding: int = 2) -> None:
+        "pretty print a counter metric laps"
+        laps = self.get_laps(name, metric=metric, format=format,
+                             rounding=rounding)
+        rows = {str(i): v for i, v in enumerate(laps)}
+        print(format_counters(rows, headers=['Lap', metric],
+                              format='rounded_outline'))
+
+    def to_json(self, format: str = 'MiB', rounding: int = 2) -> str:
+        "Return counters a json string"
+        return self._format(output_type='json', format=format,
+                            rounding=rounding)
+
+    def to_html(self, format: str = 'MiB', rounding: int = 2) -> str:
+        "Return counters as html table"
+        return self._format(output_type='html', format=format,
+                            rounding=rounding)
+
+    def to_md(self, format: str = 'MiB', rounding: int = 2) -> str:
+        "Return counters as markdown table"
+        return self._format(output_type='github', format=format,
+                            rounding=rounding)
+
+    def to_latex(self, format: str = 'MiB', rounding: int = 2) -> str:
+        "Return counters as latex table"
+        return self._format(output_type='latex', format=format,
+                            rounding=rounding)
+
+    def _format(self, output_type: str, format: str, rounding: int) -> str:
+        cnts = self.get_all(format=format, rounding=rounding)
+        headers = ['Name', f"RSS ({format})"]
+        if not self.low_overhead:
+            headers += [f"Traced ({format})", f"Peak ({format})", 'GC']
+        return format_counters(cnts, headers=headers, format=output_type,
+                               renderer=self._renderer)
+
+    def close(self) -> None:
+        """Stop tracemalloc if this collection started it and no other one
+        uses it. Traced memory is not updated anymore afterwards."""
+        if self._tracing:
+            self._tracing = False
+            _stop_tracing()
+
+    def __enter__(self) -> 'MemoryCounters':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def __len__(self):
+        return len(self.counters)
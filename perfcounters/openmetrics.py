@@ -0,0 +1,298 @@
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from .time_counters import TimeCounter, TimeCounters, Timer
+from .threadsafe import ThreadSafeValueCounters
+from .value_counters import ValueCounter, ValueCounters
+
+AnyNum = Union[int, float]
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+DEFAULT_QUANTILES = [0.5, 0.9, 0.99]
+NS_PER_S = 1_000_000_000
+INF = float('inf')
+# cached counter text: (state, text, exported names, counter name)
+Entry = Tuple[Any, str, Tuple[str, ...], str]
+
+_INVALID_CHARS = re.compile(r'[^a-zA-Z0-9_:]')
+
+
+def metric_name(*parts: str) -> str:
+    """Build a valid metric name from its parts
+
+    Args:
+        parts: namespace and name parts, joined by underscores.
+
+    Returns:
+        metric name.
+    """
+    name = '_'.join(p.strip('_') for p in parts if p.strip('_'))
+    name = _INVALID_CHARS.sub('_', name)
+    if not name or name[0].isdigit():
+        name = f"_{name}"
+    return name
+
+
+def _num(value: AnyNum) -> str:
+    "format a sample value"
+    if isinstance(value, float):
+        if value != value:
+            return 'NaN'
+        if value in (INF, -INF):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value)
+
+
+def _label_value(value: Any) -> str:
+    "escape a label value"
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+class OpenMetricsRenderer():
+    """Render counters collections in the OpenMetrics text format.
+
+    Value counters are exposed as gauges, or as counters for the names
+    listed in `counter_names`, and counter families as labeled samples.
+    Time counters and timers are exposed as summaries in seconds, with
+    quantiles computed from the laps. Collections prefixes are used as
+    metric namespaces.
+
+    The text of each counter is cached and only rebuilt when the counter
+    changes, so scraping a large and mostly idle collection is cheap.
+
+    Counter names are sanitized into metric names, `render()` raises a
+    ValueError when two counters end up with the same metric or sample
+    name, e.g. `a.b` and `a_b`.
+    """
+
+    def __init__(self, *collections: Union[TimeCounters, ValueCounters],
+                 namespace: str = "", counter_names: Iterable[str] = (),
+                 quantiles: List[float] = DEFAULT_QUANTILES) -> None:
+        """
+        Args:
+            collections: counters collections to render.
+
+            namespace: namespace prepended to every metric name.
+
+            counter_names: value counters to expose as monotonic counters
+            instead of gauges.
+
+            quantiles: quantiles exposed for time counters. Defaults to
+            [0.5, 0.9, 0.99].
+        """
+        for collection in collections:
+            if not isinstance(collection, (TimeCounters, ValueCounters)):
+                raise ValueError("Only TimeCounters and ValueCounters "
+                                 "can be rendered")
+        self.collections = collections
+        self.namespace = namespace
+        self.counter_names = set(counter_names)
+        self.quantiles = quantiles
+        # counter -> (state, text, exported names, counter name)
+        self._cache: Dict[Any, Entry] = {}
+        # family -> (exported names, family name)
+        self._families: Dict[Any, Tuple[Tuple[str, ...], str]] = {}
+
+    def render(self) -> str:
+        "Return the OpenMetrics exposition of the collections"
+        cache = self._cache
+        new_cache: Dict[Any, Entry] = {}
+        families: Dict[Any, Tuple[Tuple[str, ...], str]] = {}
+        blocks: List[str] = []
+        # names can only collide when a counter appeared since last render
+        added = False
+        for collection in self.collections:
+            namespace = metric_name(self.namespace, collection.prefix)
+            prefix = collection.prefix
+            if isinstance(collection, TimeCounters):
+                items: List[Tuple[str, Any]] = list(
+                    collection.counters.items())
+                items.extend(list(collection.timers.items()))
+                for name, cnt in items:
+                    state = self._state(cnt)
+                    entry = cache.get(cnt)
+                    if entry is None:
+                        added = True
+                        entry = (state, self._render(namespace, name, cnt),
+                                 self._names(namespace, name, 'summary'),
+                                 f"{prefix}{name}")
+                    elif state is None or entry[0] != state:
+                        entry = (state, self._render(namespace, name, cnt),
+                                 entry[2], entry[3])
+                    new_cache[cnt] = entry
+                    blocks.append(entry[1])
+            else:
+                if isinstance(collection, ThreadSafeValueCounters):
+                    # fold the threads shards into the counters
+                    collection.get_all()
+                # value counters fast path: the value is the state
+                for name, cnt in list(collection.counters.items()):
+                    entry = cache.get(cnt)
+                    if entry is None:
+                        added = True
+                        entry = (cnt.value,
+                                 self._render_value(namespace, name, cnt),
+                                 self._names(namespace, name),
+                                 f"{prefix}{name}")
+                    elif entry[0] != cnt.value:
+                        entry = (cnt.value,
+                                 self._render_value(namespace, name, cnt),
+                                 entry[2], entry[3])
+                    new_cache[cnt] = entry
+                    blocks.append(entry[1])
+                for name, family in list(collection.families.items()):
+                    names = self._families.get(family)
+                    if names is None:
+                        added = True
+                        names = (self._names(namespace, name),
+                                 f"{prefix}{name}")
+                    families[family] = names
+                    blocks.append(self._render_family(namespace, name))
+                    metric = self._family_metric(namespace, name)
+                    for values, cnt in family.items():
+                        entry = cache.get(cnt)
+                        if entry is None or entry[0] != cnt.value:
+                            entry = (cnt.value, self._render_labeled(
+                                metric, family.label_names, values, cnt),
+                                (), '')
+                        new_cache[cnt] = entry
+                        blocks.append(entry[1])
+        if added:
+            _check_names([*((e[2], e[3]) for e in new_cache.values()),
+                          *families.values()])
+        self._cache = new_cache
+        self._families = families
+        blocks.append('# EOF\n')
+        return ''.join(blocks)
+
+    def _names(self, namespace: str, name: str,
+               kind: Optional[str] = None) -> Tuple[str, ...]:
+        "metric and sample names exported for a counter"
+        if kind == 'summary':
+            family = metric_name(namespace, name, 'seconds')
+            return family, f"{family}_count", f"{family}_sum"
+        family = metric_name(namespace, name)
+        if name in self.counter_names:
+            return family, f"{family}_total"
+        return (family, )
+
+    def _state(self, cnt: Any) -> Any:
+        """cheap key telling whether a counter changed since its last render.
+        None means the counter must always be rendered."""
+        if isinstance(cnt, ValueCounter):
+            return cnt.value
+        if isinstance(cnt, Timer):
+            return cnt.count, cnt.total
+        if not cnt.stop_ts:
+            # a running counter changes all the time
+            return None
+        return cnt.start_ts, cnt.stop_ts, cnt.get_count()
+
+    def _render(self, namespace: str, name: str, cnt: Any) -> str:
+        if isinstance(cnt, ValueCounter):
+            return self._render_value(namespace, name, cnt)
+        if isinstance(cnt, Timer):
+            return self._render_timer(namespace, name, cnt)
+        return self._render_time(namespace, name, cnt)
+
+    def _render_value(self, namespace: str, name: str,
+                      cnt: ValueCounter) -> str:
+        family = metric_name(namespace, name)
+        if name in self.counter_names:
+            return (f"# TYPE {family} counter\n"
+                    f"{family}_total {_num(cnt.value)}\n")
+        return f"# TYPE {family} gauge\n{family} {_num(cnt.value)}\n"
+
+    def _family_metric(self, namespace: str, name: str) -> str:
+        "sample name of a family"
+        metric = metric_name(namespace, name)
+        if name in self.counter_names:
+            return f"{metric}_total"
+        return metric
+
+    def _render_family(self, namespace: str, name: str) -> str:
+        family = metric_name(namespace, name)
+        kind = 'counter' if name in self.counter_names else 'gauge'
+        return f"# TYPE {family} {kind}\n"
+
+    def _render_labeled(self, metric: str, label_names: Tuple[str, ...],
+                        values: Tuple[Any, ...], cnt: ValueCounter) -> str:
+        labels = ','.join(f'{metric_name(n)}="{_label_value(v)}"'
+                          for n, v in zip(label_names, values))
+        return f"{metric}{{{labels}}} {_num(cnt.value)}\n"
+
+    def _render_timer(self, namespace: str, name: str, cnt: Timer) -> str:
+        family = metric_name(namespace, name, 'seconds')
+        return (f"# TYPE {family} summary\n# UNIT {family} seconds\n"
+                f"{family}_count {cnt.count}\n"
+                f"{family}_sum {_num(cnt.get(format='ns') / NS_PER_S)}\n")
+
+    def _render_time(self, namespace: str, name: str,
+                     cnt: TimeCounter) -> str:
+        family = metric_name(namespace, name, 'seconds')
+        lines = [f"# TYPE {family} summary\n# UNIT {family} seconds\n"]
+        percentiles = [q * 100 for q in self.quantiles]
+        values = cnt.get_percentiles(percentiles, format='ns', rounding=0)
+        for q, v in zip(self.quantiles, values):
+            lines.append(f'{family}{{quantile="{q}"}} '
+                         f'{_num(v / NS_PER_S)}\n')
+        lines.append(f"{family}_count {cnt.get_count()}\n")
+        total = cnt.get(format='ns') / NS_PER_S
+        lines.append(f"{family}_sum {_num(total)}\n")
+        return ''.join(lines)
+
+
+def _check_names(exported: Iterable[Tuple[Tuple[str, ...], str]]) -> None:
+    "raise when two counters export the same metric or sample name"
+    owners: Dict[str, str] = {}
+    for names, owner in exported:
+        for name in names:
+            if name in owners:
+                raise ValueError(f"Counters {owners[name]} and {owner} are "
+                                 f"both exported as {name}")
+            owners[name] = owner
+
+
+def serve(renderer: OpenMetricsRenderer, port: int = 9464,
+          addr: str = '') -> ThreadingHTTPServer:
+    """Serve the metrics on http://addr:port/metrics from a daemon thread
+
+    Args:
+        renderer: renderer of the exposed collections.
+
+        port: listening port. 0 picks a free port. Defaults to 9464.
+
+        addr: listening address. Defaults to all interfaces.
+
+    Returns:
+        the running server, stop it with `shutdown()`.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = renderer.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # scrapes are too frequent to be logged
+            pass
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True,
+                              name='perfcounters-openmetrics')
+    thread.start()
+    return server
@@ -0,0 +1,63 @@
+from functools import lru_cache
+from types import ModuleType
+from typing import Optional
+
+
+@lru_cache(maxsize=None)
+def get_numpy() -> Optional[ModuleType]:
+    """Return the numpy module if installed.
+
+    numpy is imported on first use only so it doesn't slow down the package
+    import when it is not needed.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+@lru_cache(maxsize=None)
+def get_zstd() -> Optional[ModuleType]:
+    """Return a zstd module exposing compress() and decompress() if
+    available: the standard library one on Python 3.14+, the zstandard
+    package otherwise.
+    """
+    try:
+        from compression import zstd  # type: ignore
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard  # type: ignore
+    except ImportError:
+        return None
+    return zstandard
+
+
+@lru_cache(maxsize=None)
+def get_tabulate() -> Optional[ModuleType]:
+    """Return the tabulate module if installed.
+
+    tabulate is only needed to render the table formats the built-in
+    writer doesn't support, see `perfcounters.render`.
+    """
+    try:
+        import tabulate
+    except ImportError:
+        return None
+    return tabulate
+
+
+@lru_cache(maxsize=None)
+def get_wcwidth() -> Optional[ModuleType]:
+    """Return the wcwidth module if installed.
+
+    Like tabulate, the built-in table writer measures non-ascii text with
+    wcwidth when it is installed so wide characters stay aligned.
+    """
+    try:
+        import wcwidth  # type: ignore
+    except ImportError:
+        return None
+    return wcwidth
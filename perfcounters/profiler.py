@@ -0,0 +1,264 @@
+import os
+import sys
+import threading
+import weakref
+from fnmatch import fnmatchcase
+from types import CodeType, FrameType
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .clocks import get_clock
+from .time_counters import TimeCounters, Timer
+
+BACKENDS = ['auto', 'setprofile', 'monitoring']
+SELF_SUFFIX = ' (self)'
+
+# (cumulative timer, self timer) of a profiled code object
+Decision = Optional[Tuple[Timer, Timer]]
+
+# code objects whose events were disabled for the profiler tool, with their
+# module and qualified name. sys.monitoring keeps them disabled, even once
+# the tool id is freed, until the events of every tool are restarted.
+_disabled: 'weakref.WeakKeyDictionary[CodeType, Tuple[str, str]]' = \
+    weakref.WeakKeyDictionary()
+
+
+class Profiler():
+    """Opt-in function level profiler feeding a TimeCounters collection.
+
+    Only the functions matching the module and qualified name filters are
+    profiled. Each one gets two timers: `module.qualname` with its calls
+    cumulative time, recursive calls excluded, and `module.qualname (self)`
+    with all its calls and the time spent outside other profiled functions.
+    Results are reported with the collection `report()`, `to_json()`...
+
+        prof = Profiler(cnts, modules=["myapp.*"])
+        with prof:
+            run()
+        cnts.report()
+
+    The filter decision is cached per code object. With the sys.monitoring
+    backend, Python 3.12+, events of non matching code objects are disabled
+    so excluded functions run at full speed after their first call. They
+    stay disabled after the profiler stops, a later profiler matching some
+    of them restarts the events, which `sys.monitoring` only allows for
+    every tool at once.
+
+    Every thread is profiled into the same timers, updated under a lock.
+    """
+
+    def __init__(self, counters: Optional[TimeCounters] = None,
+                 modules: Iterable[str] = (), qualnames: Iterable[str] = (),
+                 backend: str = 'auto') -> None:
+        """
+        Args:
+            counters: collection receiving the timers. Defaults to a new
+            TimeCounters.
+
+            modules: module names patterns, e.g. "myapp.*". Defaults to all
+            modules.
+
+            qualnames: function qualified names patterns, e.g. "Parser.*".
+            Defaults to all functions.
+
+            backend: setprofile, monitoring (Python 3.12+) or auto which
+            picks monitoring when available. Defaults to auto.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}. "
+                             f"Valid: {', '.join(BACKENDS)}")
+        has_monitoring = hasattr(sys, 'monitoring')
+        if backend == 'auto':
+            backend = 'monitoring' if has_monitoring else 'setprofile'
+        elif backend == 'monitoring' and not has_monitoring:
+            raise ValueError("The monitoring backend requires Python 3.12+")
+        self.counters = counters if counters is not None else TimeCounters()
+        self.modules = list(modules)
+        self.qualnames = list(qualnames)
+        self.backend = backend
+        self.clock = get_clock(self.counters.clock)
+        self.running = False
+        self._decisions: Dict[CodeType, Decision] = {}
+        # excluded code objects module and qualified name
+        self._excluded: Dict[CodeType, Tuple[str, str]] = {}
+        # guards the timers, shared by the profiled threads
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # code filename -> module name, for the monitoring backend
+        self._filenames: Dict[str, str] = {}
+
+    def _match(self, module: str, qualname: str) -> bool:
+        "return True if a function passes the filters"
+        if self.modules and not any(fnmatchcase(module, p)
+                                    for p in self.modules):
+            return False
+        if self.qualnames and not any(fnmatchcase(qualname, p)
+                                      for p in self.qualnames):
+            return False
+        return True
+
+    def _decide(self, code: CodeType, module: str) -> Decision:
+        "filter a code object and cache the decision"
+        qualname = getattr(code, 'co_qualname', code.co_name)
+        decision: Decision = None
+        with self._lock:
+            if self._match(module, qualname):
+                name = f"{module}.{qualname}" if module else qualname
+                decision = (self.counters.time(name),
+                            self.counters.time(f"{name}{SELF_SUFFIX}"))
+            else:
+                self._excluded[code] = (module, qualname)
+            self._decisions[code] = decision
+        return decision
+
+    def _module_of(self, code: CodeType) -> str:
+        "module name of a code object, from its filename"
+        filename = code.co_filename
+        module = self._filenames.get(filename)
+        if module is None:
+            # map the loaded modules files, new modules may have been
+            # imported since the last lookup.
+            for name, mod in list(sys.modules.items()):
+                path = getattr(mod, '__file__', None)
+                if path:
+                    self._filenames[os.path.abspath(path)] = name
+            module = self._filenames.get(os.path.abspath(filename), '')
+            self._filenames[filename] = module
+        return module
+
+    def _state(self) -> Tuple[List[List[Any]], Dict[CodeType, int]]:
+        "calling thread stack of profiled frames and recursion depths"
+        try:
+            return self._local.stack, self._local.depths
+        except AttributeError:
+            self._local.stack = []
+            self._local.depths = {}
+            return self._local.stack, self._local.depths
+
+    def _enter(self, code: CodeType, decision: Tuple[Timer, Timer]) -> None:
+        stack, depths = self._state()
+        depths[code] = depths.get(code, 0) + 1
+        # code, timers, start, time spent in profiled children
+        stack.append([code, decision, self.clock(), 0])
+
+    def _exit(self, code: CodeType) -> None:
+        now = self.clock()
+        stack, depths = self._state()
+        if not stack or stack[-1][0] is not code:
+            # frame entered before the profiler started
+            return
+        _, (cumulative, self_timer), start, children = stack.pop()
+        elapsed = now - start
+        depth = depths[code] - 1
+        depths[code] = depth
+        lock = self._lock
+        lock.acquire()
+        try:
+            self_timer.add(elapsed - children)
+            if not depth:
+                cumulative.add(elapsed)
+        finally:
+            lock.release()
+        if stack:
+            stack[-1][3] += elapsed
+
+    # sys.setprofile backend
+    def _profile(self, frame: FrameType, event: str, arg: Any) -> None:
+        if event == 'call':
+            code = frame.f_code
+            try:
+                decision = self._decisions[code]
+            except KeyError:
+                decision = self._decide(
+                    code, frame.f_globals.get('__name__', ''))
+            if decision is not None:
+                self._enter(code, decision)
+        elif event == 'return':
+            code = frame.f_code
+            if self._decisions.get(code) is not None:
+                self._exit(code)
+
+    # sys.monitoring backend
+    def _mon_enter(self, code: CodeType, offset: int) -> Any:
+        try:
+            decision = self._decisions[code]
+        except KeyError:
+            decision = self._decide(code, self._module_of(code))
+        if decision is None:
+            _disabled[code] = self._excluded[code]
+            return sys.monitoring.DISABLE  # type: ignore
+        self._enter(code, decision)
+        return None
+
+    def _mon_exit(self, code: CodeType, offset: int, arg: Any) -> Any:
+        try:
+            decision = self._decisions[code]
+        except KeyError:
+            # entered before the profiler started, not decided yet
+            return None
+        if decision is None:
+            _disabled[code] = self._excluded[code]
+            return sys.monitoring.DISABLE  # type: ignore
+        self._exit(code)
+        return None
+
+    def _mon_unwind(self, code: CodeType, offset: int, exc: Any) -> None:
+        # unwind events can't be disabled
+        if self._decisions.get(code) is not None:
+            self._exit(code)
+
+    def _mon_events(self) -> List[Tuple[int, Any]]:
+        events = sys.monitoring.events  # type: ignore
+        return [(events.PY_START, self._mon_enter),
+                (events.PY_RESUME, self._mon_enter),
+                (events.PY_RETURN, self._mon_exit),
+                (events.PY_YIELD, self._mon_exit),
+                (events.PY_UNWIND, self._mon_unwind)]
+
+    def start(self) -> None:
+        "start profiling"
+        if self.running:
+            raise ValueError("Profiler already started")
+        if self.backend == 'monitoring':
+            monitoring = sys.monitoring  # type: ignore
+            tool = monitoring.PROFILER_ID
+            monitoring.use_tool_id(tool, 'perfcounters')
+            mask = 0
+            for event, callback in self._mon_events():
+                monitoring.register_callback(tool, event, callback)
+                mask |= event
+            monitoring.set_events(tool, mask)
+            # events disabled by a previous profiler stay disabled, only
+            # restart them when this one profiles some of those functions
+            if any(self._match(module, qualname)
+                   for module, qualname in list(_disabled.values())):
+                _disabled.clear()
+                monitoring.restart_events()
+        else:
+            # only the calling thread and threads started from now on are
+            # profiled.
+            threading.setprofile(self._profile)
+            sys.setprofile(self._profile)
+        self.running = True
+
+    def stop(self) -> None:
+        "stop profiling"
+        if not self.running:
+            raise ValueError("Profiler not started")
+        if self.backend == 'monitoring':
+            monitoring = sys.monitoring  # type: ignore
+            tool = monitoring.PROFILER_ID
+            monitoring.set_events(tool, 0)
+            for event, _ in self._mon_events():
+                monitoring.register_callback(tool, event, None)
+            monitoring.free_tool_id(tool)
+        else:
+            sys.setprofile(None)
+            threading.setprofile(None)  # type: ignore
+        self.running = False
+
+    def __enter__(self) -> 'Profiler':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
@@ -0,0 +1,490 @@
+"""Fast rendering of counters tables.
+
+tabulate handles any kind of table, which makes it slow on large counter
+sets: every cell is type sniffed, converted and padded on each call.
+Counters tables are simple: a text name column followed by numeric
+columns. `TableRenderer` renders those directly, producing the same output
+as tabulate for the plain, github, html, latex and rounded_outline formats.
+Other tables in those formats, e.g. with text cells, numeric names or no
+rows, go through `render_table`, a slower port of tabulate's column type
+deduction and alignment. Only the other formats need tabulate.
+"""
+import re
+from itertools import chain, zip_longest
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .optional import get_wcwidth
+
+CNTS = Dict[str, Any]
+
+FAST_FORMATS = ['plain', 'github', 'html', 'latex', 'rounded_outline']
+
+# same value as tabulate: headers get at least two spaces of padding
+MIN_PADDING = 2
+
+# kind of the supported value cells
+_KINDS = {int: 'i', float: 'f'}
+
+INF = float('inf')
+
+# column types, from the least to the most generic, as ordered by tabulate
+_GENERIC = 'nbifs'
+
+# same pattern as tabulate, e.g. 1,000.5
+_THOUSANDS = re.compile(
+    r"^(([+-]?[0-9]{1,3})(?:,([0-9]{3}))*)?(?(1)\.[0-9]*|\.[0-9]+)?$")
+
+LATEX_ESCAPES = str.maketrans({
+    "&": r"\&",
+    "%": r"\%",
+    "$": r"\$",
+    "#": r"\#",
+    "_": r"\_",
+    "^": r"\^{}",
+    "{": r"\{",
+    "}": r"\}",
+    "~": r"\textasciitilde{}",
+    "\\": r"\textbackslash{}",
+    "<": r"\ensuremath{<}",
+    ">": r"\ensuremath{>}",
+})
+
+# same escaping as html.escape(), without importing the html package
+HTML_ESCAPES = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#x27;",
+})
+
+HTML_ALIGN = ' style="text-align: right;"'
+
+# box lines of the rounded_outline format: (begin, fill, separator, end)
+ROUNDED_TOP = ("╭", "─", "┬", "╮")
+ROUNDED_MIDDLE = ("├", "─", "┼", "┤")
+ROUNDED_BOTTOM = ("╰", "─", "┴", "╯")
+
+
+class TableRenderer():
+    """Render counters tables, reusing the rows that didn't change.
+
+    Rows are cached between calls keyed by name: a row whose values are
+    the same as in the previous render, for the same output format and
+    column layout, reuses its formatted line as is. Reporting a large
+    collection periodically only formats the counters that changed.
+    """
+
+    def __init__(self) -> None:
+        # format -> name -> (values, kinds, name, cells, metrics, line)
+        # line is a (layout, string) tuple so it is replaced atomically.
+        self._rows: Dict[str, Dict[str, Tuple[Any, ...]]] = {}
+        # format -> column types of the cached cells
+        self._coltypes: Dict[str, Tuple[str, ...]] = {}
+
+    def render(self, cnts: CNTS, headers: List[str],
+               format: str) -> Optional[str]:
+        """Render counters as a table
+
+        Args:
+            cnts: counters values. A list or tuple value is expanded into
+            multiple columns.
+
+            headers: table headers.
+
+            format: table format.
+
+        Returns:
+            the table, or None if the format or the cells are not
+            supported, see `render_table`, and tabulate should be used
+            instead.
+        """
+        if format not in FAST_FORMATS:
+            return None
+        ncols = len(headers) - 1
+        if not cnts or ncols < 1 or not all(_is_plain(h) for h in headers):
+            return render_table(cnts, headers, format)
+
+        cache = self._rows.get(format, {})
+        rows = []
+        kinds_seen = set()
+        for name, v in cnts.items():
+            if type(v) is list or type(v) is tuple:
+                # cache a copy, the caller may mutate its list in place
+                v = tuple(v)
+                kinds: Any = tuple(map(_KINDS.get, map(type, v)))
+            else:
+                kinds = _KINDS.get(type(v))
+            entry = cache.get(name)
+            if (entry is None or entry[1] != kinds or entry[0] != v):
+                if type(name) is not str or not _is_plain(name):
+                    return render_table(cnts, headers, format)
+                entry = (v, kinds, name.strip(), None, None, None)
+            kinds_seen.add(kinds)
+            rows.append(entry)
+
+        # column types: a column holding a float is formatted as floats
+        floats = [False] * ncols
+        for kinds in kinds_seen:
+            if type(kinds) is not tuple:
+                kinds = (kinds, )
+            if len(kinds) != ncols or None in kinds:
+                return render_table(cnts, headers, format)
+            for i, kind in enumerate(kinds):
+                if kind == 'f':
+                    floats[i] = True
+        coltypes = tuple('f' if f else 'i' for f in floats)
+
+        # the name column must be text for tabulate to align it left
+        if not any(_is_text(entry[2]) for entry in rows):
+            return render_table(cnts, headers, format)
+
+        # format changed rows, or all of them if a column type changed
+        reformat = coltypes != self._coltypes.get(format)
+        for i, entry in enumerate(rows):
+            if reformat or entry[3] is None:
+                rows[i] = _format_row(entry, coltypes)
+
+        # columns width and decimal point alignment
+        maxima = [max(col) for col in zip(*[entry[4] for entry in rows])]
+        layout = [max(maxima[0], len(headers[0]) + MIN_PADDING)]
+        for i in range(ncols):
+            decimals = maxima[2 + 2 * i]
+            width = max(maxima[1 + 2 * i] + decimals,
+                        len(headers[i + 1]) + MIN_PADDING)
+            layout.extend((width, decimals))
+        layout_key = tuple(layout)
+
+        lines = _begin(format, headers, layout)
+        new_cache = {}
+        for name, entry in zip(cnts, rows):
+            line = entry[5]
+            if line is None or line[0] != layout_key:
+                line = (layout_key, _row(format, entry, layout))
+                entry = entry[:5] + (line, )
+            new_cache[name] = entry
+            lines.append(line[1])
+        lines.extend(_end(format, layout))
+
+        # removed counters are dropped from the cache
+        self._rows[format] = new_cache
+        self._coltypes[format] = coltypes
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        "drop the cached rows"
+        self._rows = {}
+        self._coltypes = {}
+
+
+def _is_plain(s: str) -> bool:
+    "single line ascii string, whose width is its length"
+    return s.isascii() and s.isprintable()
+
+
+def _is_text(s: str) -> bool:
+    "string that tabulate doesn't parse as a number or a boolean"
+    if not s or s in ('True', 'False'):
+        return False
+    try:
+        float(s.replace(',', ''))
+    except ValueError:
+        return True
+    return False
+
+
+def _afterpoint(s: str) -> int:
+    "number of characters after the decimal point, -1 without point"
+    pos = s.rfind('.')
+    if pos < 0:
+        pos = s.rfind('e')
+    return len(s) - pos - 1 if pos >= 0 else -1
+
+
+def _format_row(entry: Tuple[Any, ...],
+                coltypes: Tuple[str, ...]) -> Tuple[Any, ...]:
+    "format the row cells and compute their widths"
+    v, kinds, name = entry[:3]
+    values = v if type(kinds) is tuple else (v, )
+    cells = []
+    metrics = [len(name)]
+    for value, coltype in zip(values, coltypes):
+        s = format(float(value), 'g') if coltype == 'f' else str(value)
+        decimals = _afterpoint(s)
+        cells.append((s, decimals))
+        # width without the decimal padding and decimals
+        metrics.extend((len(s) - decimals, decimals))
+    return (v, kinds, name, cells, tuple(metrics), None)
+
+
+def _cells(entry: Tuple[Any, ...], layout: List[int]) -> List[str]:
+    "row cells padded to the columns width"
+    cells = [entry[2].ljust(layout[0])]
+    for i, (s, decimals) in enumerate(entry[3]):
+        padded = s + ' ' * (layout[2 + 2 * i] - decimals)
+        cells.append(padded.rjust(layout[1 + 2 * i]))
+    return cells
+
+
+def _headers(headers: List[str], layout: List[int]) -> List[str]:
+    "headers padded to the columns width"
+    cells = [headers[0].ljust(layout[0])]
+    for i, h in enumerate(headers[1:]):
+        cells.append(h.rjust(layout[1 + 2 * i]))
+    return cells
+
+
+def _html_row(tag: str, cells: List[str],
+              aligns: Optional[List[str]] = None) -> str:
+    "html row, counters tables only have their first column left aligned"
+    if aligns is None:
+        aligns = ['left'] + ['decimal'] * (len(cells) - 1)
+    row = "".join(f"<{tag}{'' if a == 'left' else HTML_ALIGN}>"
+                  f"{c.translate(HTML_ESCAPES)}</{tag}>"
+                  for c, a in zip(cells, aligns))
+    return f"<tr>{row.rstrip()}</tr>"
+
+
+def _latex_row(cells: List[str]) -> str:
+    return ("&".join(f" {c.translate(LATEX_ESCAPES)} " for c in cells)
+            + "\\\\").rstrip()
+
+
+def _join(format: str, cells: List[str],
+          aligns: Optional[List[str]] = None) -> str:
+    "join the padded cells of a row"
+    if format == 'rounded_outline':
+        return "│ " + " │ ".join(cells) + " │"
+    if format == 'github':
+        return "| " + " | ".join(cells) + " |"
+    if format == 'plain':
+        return "  ".join(cells).rstrip()
+    if format == 'latex':
+        return _latex_row(cells)
+    return _html_row('td', cells, aligns)
+
+
+def _row(format: str, entry: Tuple[Any, ...], layout: List[int]) -> str:
+    return _join(format, _cells(entry, layout))
+
+
+def _line(widths: List[int], chars: Tuple[str, str, str, str]) -> str:
+    "horizontal line, cells are padded by one space on each side"
+    begin, fill, sep, end = chars
+    return begin + sep.join(fill * (w + 2) for w in widths) + end
+
+
+def _begin(format: str, headers: List[str], layout: List[int]) -> List[str]:
+    "lines before the first row"
+    cells = _headers(headers, layout)
+    widths = [layout[0]] + layout[1::2]
+    if format == 'rounded_outline':
+        return [_line(widths, ROUNDED_TOP), _join(format, cells),
+                _line(widths, ROUNDED_MIDDLE)]
+    if format == 'github':
+        return [_join(format, cells), _line(widths, ("|", "-", "|", "|"))]
+    if format == 'plain':
+        return [_join(format, cells)]
+    if format == 'latex':
+        columns = 'l' + 'r' * (len(headers) - 1)
+        return ["\\begin{tabular}{" + columns + "}\n\\hline",
+                _latex_row(cells), "\\hline"]
+    return ["<table>\n<thead>\n" + _html_row('th', cells)
+            + "\n</thead>\n<tbody>"]
+
+
+def _end(format: str, layout: List[int]) -> List[str]:
+    "lines after the last row"
+    if format == 'rounded_outline':
+        return [_line([layout[0]] + layout[1::2], ROUNDED_BOTTOM)]
+    if format == 'latex':
+        return ["\\hline\n\\end{tabular}"]
+    if format == 'html':
+        return ["</tbody>\n</table>"]
+    return []
+
+
+def render_table(cnts: CNTS, headers: List[str],
+                 format: str) -> Optional[str]:
+    """Render a table of any cells as tabulate does
+
+    Columns types are deduced as tabulate does: empty cells are ignored,
+    numeric strings are numbers, numeric columns are aligned on their
+    decimal point and the other ones to the left. Non-ascii text is
+    measured with wcwidth when it is installed.
+
+    Args:
+        cnts: table rows keyed by their first cell. A list or tuple value
+        is expanded into multiple columns.
+
+        headers: table headers.
+
+        format: one of the FAST_FORMATS.
+
+    Returns:
+        the table, or None for byte strings and multi-line or unprintable
+        cells, e.g. ANSI colored, which need tabulate.
+    """
+    rows = [[k, *v] if isinstance(v, (list, tuple)) else [k, v]
+            for k, v in cnts.items()]
+    headers = list(map(str, headers))
+    if headers and rows:
+        # missing headers are added before the first column
+        headers = [''] * max(0, len(rows[0]) - len(headers)) + headers
+
+    cols: List[List[str]] = []
+    aligns = []
+    for col in zip_longest(*rows):
+        if any(isinstance(v, bytes) for v in col):
+            return None
+        coltype = max(map(_cell_type, col), key=_GENERIC.index, default='b')
+        # bool is the least generic type of a column of empty cells
+        coltype = coltype if coltype != 'n' else 'b'
+        cols.append([_format_cell(v, coltype) for v in col])
+        aligns.append('decimal' if coltype in 'if' else 'left')
+
+    texts = [*headers, *chain.from_iterable(cols)]
+    if not all(s.isprintable() for s in texts):
+        return None
+    width: Callable[[str], int] = len
+    if not all(s.isascii() for s in texts):
+        wcwidth = get_wcwidth()
+        if wcwidth is not None:
+            width = wcwidth.wcswidth
+
+    if headers:
+        minwidths = [width(h) + MIN_PADDING for h in headers]
+    else:
+        minwidths = [0] * len(cols)
+    cols = [_align(col, align, minwidth, width)
+            for col, align, minwidth in zip(cols, aligns, minwidths)]
+    header_aligns = aligns or ['left'] * len(headers)
+    widths = [max(minwidth, *map(width, col)) for minwidth, col
+              in zip(minwidths, cols or [['']] * len(headers))]
+    headers = [_pad(h, align, w, width) for h, align, w
+               in zip(headers, header_aligns, widths)]
+    table = list(zip(*cols))
+    if not headers and not table:
+        return ''
+
+    lines = []
+    if format == 'rounded_outline':
+        lines.append(_line(widths, ROUNDED_TOP))
+    elif format == 'github' and not headers:
+        lines.append(_line(widths, ("|", "-", "|", "|")))
+    elif format == 'latex':
+        columns = ''.join('l' if a == 'left' else 'r' for a in aligns)
+        lines.append("\\begin{tabular}{" + columns + "}\n\\hline")
+    elif format == 'html' and not headers:
+        lines.append("<table>\n<tbody>")
+    if headers:
+        if format == 'html':
+            lines.append("<table>\n<thead>\n"
+                         + _html_row('th', headers, header_aligns)
+                         + "\n</thead>\n<tbody>")
+        else:
+            lines.append(_join(format, headers))
+        if format == 'rounded_outline':
+            lines.append(_line(widths, ROUNDED_MIDDLE))
+        elif format == 'github':
+            lines.append(_line(widths, ("|", "-", "|", "|")))
+        elif format == 'latex':
+            lines.append("\\hline")
+    for row in table:
+        lines.append(_join(format, list(row), aligns))
+    if format == 'rounded_outline':
+        lines.append(_line(widths, ROUNDED_BOTTOM))
+    else:
+        lines.extend(_end(format, widths))
+    return "\n".join(lines)
+
+
+def _isnumber(v: Any) -> bool:
+    "same as tabulate: convertible to a float, without overflowing"
+    if type(v) in (float, int):
+        return True
+    try:
+        number = float(v)
+    except (ValueError, TypeError):
+        return False
+    return (not isinstance(v, str) or not (number != number
+                                           or number in (INF, -INF))
+            or v.lower() in ('inf', '-inf', 'nan'))
+
+
+def _isint(v: Any) -> bool:
+    "same as tabulate: an int, a NumPy int or an int string"
+    if type(v) is int:
+        return True
+    if str(type(v)).startswith("<class 'numpy.int"):
+        return True
+    if isinstance(v, str):
+        try:
+            int(v)
+        except ValueError:
+            return False
+        return True
+    return False
+
+
+def _cell_type(v: Any) -> str:
+    "least generic type of a cell, as deduced by tabulate"
+    if v is None or (isinstance(v, str) and not v):
+        return 'n'
+    if hasattr(v, 'isoformat'):
+        # dates and times
+        return 's'
+    if type(v) is bool or (isinstance(v, str) and v in ('True', 'False')):
+        return 'b'
+    thousands = isinstance(v, str) and _THOUSANDS.match(v) is not None
+    if _isint(v) or (thousands and '.' not in v):
+        return 'i'
+    if _isnumber(v) or thousands:
+        return 'f'
+    return 's'
+
+
+def _format_cell(v: Any, coltype: str) -> str:
+    "format a cell according to its column type"
+    if v is None or (isinstance(v, str) and not v):
+        return ''
+    if coltype == 'i':
+        return format(v, '')
+    if coltype == 'f':
+        if isinstance(v, str):
+            v = v.replace(',', '')
+        try:
+            return format(float(v), 'g')
+        except (ValueError, TypeError):
+            pass
+    return f"{v}"
+
+
+def _decimals(s: str) -> int:
+    "number of characters after the decimal point of a number, else -1"
+    if not (_isnumber(s) or _THOUSANDS.match(s)) or _isint(s):
+        return -1
+    pos = s.rfind('.')
+    if pos < 0:
+        pos = s.lower().rfind('e')
+    return len(s) - pos - 1 if pos >= 0 else -1
+
+
+def _pad(s: str, align: str, width: int,
+         measure: Callable[[str], int]) -> str:
+    "pad a cell to a visible width"
+    width += len(s) - measure(s)
+    return s.ljust(width) if align == 'left' else s.rjust(width)
+
+
+def _align(col: List[str], align: str, minwidth: int,
+           measure: Callable[[str], int]) -> List[str]:
+    "pad the cells of a column to the same visible width"
+    if align == 'decimal':
+        decimals = [_decimals(s) for s in col]
+        most = max(decimals)
+        col = [s + ' ' * (most - d) for s, d in zip(col, decimals)]
+    else:
+        col = [s.strip() for s in col]
+    width = max(minwidth, *map(measure, col))
+    return [_pad(s, align, width, measure) for s in col]
@@ -0,0 +1,177 @@
+"""Sampling of hot timed code.
+
+A sampler decides which events are timed. Events skipped by the sampler
+cost a decrement and a comparison instead of two clock reads and an append.
+Counts stay exact, totals are extrapolated from the timed events with a
+95% confidence error bound.
+"""
+import math
+import random
+from typing import Callable, Dict, Optional, Tuple
+
+# samples between two checks of the overhead budget
+ADAPT_EVERY = 32
+# lowest sampling rate the adaptive policy goes down to
+MIN_RATE = 1e-6
+# z-score of the 95% confidence interval
+Z_95 = 1.96
+
+_clock_costs: Dict[Callable[[], int], float] = {}
+
+
+def clock_cost(clock: Callable[[], int]) -> float:
+    """Estimate the cost of timing an event, two clock reads, in nanoseconds
+
+    Args:
+        clock: clock function returning nanoseconds.
+
+    Returns:
+        cost in nanoseconds. Measured once per clock.
+    """
+    cost = _clock_costs.get(clock)
+    if cost is None:
+        calls = 200
+        best = math.inf
+        for _ in range(5):
+            start = clock()
+            for _ in range(calls):
+                clock()
+            best = min(best, clock() - start)
+        cost = 2 * best / calls
+        _clock_costs[clock] = cost
+    return cost
+
+
+def estimate_total(count: int, sampled: int, total: int,
+                   total_sq: int) -> Tuple[float, float]:
+    """Extrapolate the total duration of events from a sample
+
+    Args:
+        count: number of events.
+
+        sampled: number of timed events.
+
+        total: sum of the timed durations.
+
+        total_sq: sum of the squared timed durations.
+
+    Returns:
+        (estimated total, 95% confidence error bound of the total)
+    """
+    if not sampled:
+        return 0.0, 0.0
+    mean = total / sampled
+    estimate = mean * count
+    if sampled < 2 or sampled >= count:
+        # nothing to extrapolate or no variance estimate
+        return float(total) if sampled >= count else estimate, 0.0
+    variance = max(total_sq / sampled - mean * mean, 0.0)
+    variance *= sampled / (sampled - 1)
+    # finite population correction: the error vanishes as the sample
+    # covers every event
+    fpc = math.sqrt(1 - sampled / count)
+    error = Z_95 * count * math.sqrt(variance / sampled) * fpc
+    return estimate, error
+
+
+class Sampler():
+    """Decide which events are timed and accumulate the timed durations.
+
+    Instrumented code decrements `countdown` on every event and only times
+    the event when it reaches zero, then calls `add()` with the duration.
+    """
+    __slots__ = ('rate', 'probabilistic', 'overhead_budget', 'countdown',
+                 'count', 'sampled', 'total', 'total_sq', 'min', 'max',
+                 '_cost')
+
+    def __init__(self, every: Optional[int] = None,
+                 rate: Optional[float] = None,
+                 overhead_budget: Optional[float] = None,
+                 clock: Optional[Callable[[], int]] = None):
+        """
+        Args:
+            every: time one event every `every` events.
+
+            rate: time each event with this probability, between 0 and 1.
+
+            overhead_budget: maximum instrumentation overhead as a fraction
+            of the measured time, e.g. 0.01 for 1%. The sampling rate is
+            lowered when exceeded. Requires the clock.
+
+            clock: clock used to time the events.
+        """
+        if (every is None) == (rate is None):
+            raise ValueError("Sample either every N events or at a rate")
+        if every is not None:
+            if every < 1:
+                raise ValueError("every must be at least 1")
+            rate = 1 / every
+        assert rate is not None
+        if not 0 < rate <= 1:
+            raise ValueError("rate must be between 0 and 1")
+        if overhead_budget is not None:
+            if overhead_budget <= 0:
+                raise ValueError("overhead_budget must be positive")
+            if clock is None:
+                raise ValueError("overhead_budget requires a clock")
+        self.rate = rate
+        self.probabilistic = every is None
+        self.overhead_budget = overhead_budget
+        self._cost = 0.0
+        if overhead_budget is not None and clock is not None:
+            self._cost = clock_cost(clock)
+        # the first event is always timed
+        self.countdown = 1
+        self.count = 0
+        self.sampled = 0
+        self.total = 0
+        self.total_sq = 0
+        self.min = 1 << 63
+        self.max = 0
+
+    def skip(self) -> int:
+        "number of events until the next timed one, included"
+        if not self.probabilistic:
+            return max(round(1 / self.rate), 1)
+        if self.rate >= 1:
+            return 1
+        # geometric distribution: gap between two successes
+        u = 1.0 - random.random()
+        return int(math.log(u) / math.log1p(-self.rate)) + 1
+
+    def add(self, duration: int) -> None:
+        "record a timed event duration in nanoseconds"
+        self.sampled += 1
+        self.total += duration
+        self.total_sq += duration * duration
+        if duration < self.min:
+            self.min = duration
+        if duration > self.max:
+            self.max = duration
+        if self.overhead_budget and not self.sampled % ADAPT_EVERY:
+            self._adapt()
+
+    def _adapt(self) -> None:
+        "lower the rate if timing events costs more than the budget"
+        mean = self.total / self.sampled
+        if not mean:
+            return
+        overhead = self._cost * self.rate / mean
+        if overhead > self.overhead_budget:  # type: ignore
+            rate = self.overhead_budget * mean / self._cost  # type: ignore
+            self.rate = max(min(rate, self.rate), MIN_RATE)
+
+    def estimate(self) -> Tuple[float, float]:
+        "return the estimated total and its 95% error bound"
+        return estimate_total(self.count, self.sampled, self.total,
+                              self.total_sq)
+
+    def reset(self) -> None:
+        "reset the sampled events"
+        self.countdown = 1
+        self.count = 0
+        self.sampled = 0
+        self.total = 0
+        self.total_sq = 0
+        self.min = 1 << 63
+        self.max = 0
@@ -0,0 +1,454 @@
+import multiprocessing
+import os
+import struct
+import sys
+import threading
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, Optional, Tuple, Union
+
+from .clocks import DEFAULT_CLOCK, convert_ns, get_clock
+from .format import format_counters
+from .time_counters import TimeCounters
+from .value_counters import ValueCounters
+
+AnyNum = Union[int, float]
+
+MAGIC = b'PCSH'
+VERSION = 1
+# magic, version, num_slots, num_rows, used_slots, used_rows. The header
+# is followed by the slots names, the pid owning each row, the values rows
+# and the retired row, where the values of exited processes are folded.
+HEADER = struct.Struct('<4sHxxIIII')
+HEADER_SIZE = 32
+NAME_SIZE = 64
+
+# slot kinds. Float values are stored as float64, integer values and times
+# in nanoseconds as int64 so they don't lose precision above 2**53.
+VALUE = 0
+TIME = 1
+INT = 2
+
+
+def _alive(pid: int) -> bool:
+    "whether a process is running"
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # running under another user
+        return True
+    return True
+
+
+def _open(name: str) -> SharedMemory:
+    "attach to an existing shared memory block"
+    if sys.version_info >= (3, 13):
+        # only the creator is responsible for unlinking the block
+        return SharedMemory(name=name, track=False)
+    return SharedMemory(name=name)
+
+
+class SharedCounters():
+    """Counters shared between processes through shared memory.
+
+    The shared memory holds a fixed table of named slots and one row of
+    values per process. Each process only ever writes to its own row so
+    incrementing requires neither an inter-process lock nor an IPC round
+    trip, only a per-process lock shared by its threads. Reading sums every
+    row to return the aggregated view. The inter-process lock is only taken
+    the first time a process uses a counter name or writes a value.
+
+    When every row is used, the row of an exited process is reused: its
+    values are first added to a retired row so totals are kept. Integer
+    counters are stored as int64, a counter incremented by an int first is
+    an integer counter and can't be incremented by floats afterwards.
+
+    Create the counters in the parent before forking the workers, or pass
+    them as an argument to a `multiprocessing.Process`.
+    """
+
+    def __init__(self, num_slots: int = 1024, num_rows: int = 64,
+                 prefix: str = "", clock: str = DEFAULT_CLOCK,
+                 name: Optional[str] = None, create: bool = True,
+                 lock: Optional[Any] = None) -> None:
+        """
+        Args:
+            num_slots: maximum number of counters. Defaults to 1024.
+
+            num_rows: maximum number of running processes writing
+            counters. Defaults to 64.
+
+            prefix: prefix prepended to counter names when reporting.
+
+            clock: clock used by `time()`. Defaults to perf_counter.
+
+            name: shared memory block name. Generated if not provided.
+
+            create: create the shared memory block, otherwise attach to
+            the existing block `name`. Defaults to True.
+
+            lock: multiprocessing lock protecting slots and rows allocation.
+            Created if not provided when creating the block. Attaching
+            without a lock gives a read only view.
+        """
+        self.prefix = prefix
+        self.clock = clock
+        self._clock = get_clock(clock)
+        self._owner = create
+        if create:
+            size = HEADER_SIZE + num_slots * NAME_SIZE + num_rows * 8 + \
+                (num_rows + 1) * num_slots * 8
+            self._shm = SharedMemory(name=name, create=True, size=size)
+            buf = self._shm.buf
+            assert buf is not None
+            HEADER.pack_into(buf, 0, MAGIC, VERSION, num_slots,
+                             num_rows, 0, 0)
+            self._lock = lock if lock is not None else multiprocessing.Lock()
+        else:
+            if name is None:
+                raise ValueError("name is required to attach counters")
+            self._shm = _open(name)
+            self._lock = lock
+        self._attach()
+
+    def _attach(self) -> None:
+        "map the shared memory block"
+        buf = self._shm.buf
+        assert buf is not None
+        self._buf: memoryview = buf
+        magic, version, num_slots, num_rows, _, _ = HEADER.unpack_from(
+            self._buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self._shm.name} is not a counters block")
+        self.num_slots = num_slots
+        self.num_rows = num_rows
+        offset = HEADER_SIZE + num_slots * NAME_SIZE
+        self._owners = self._buf[offset:offset + num_rows * 8].cast('q')
+        offset += num_rows * 8
+        # the same cells viewed as floats and as integers, each slot only
+        # uses the view of its kind
+        self._floats = self._buf[offset:].cast('d')
+        self._ints = self._buf[offset:].cast('q')
+        # cells and slot of the value counters resolved by this process
+        self._slots: Dict[str, Tuple[Any, int]] = {}
+        self._time_slots: Dict[str, int] = {}
+        self._row = -1
+        # threads of the process share its row
+        self._row_lock = threading.Lock()
+
+        # a forked child must claim its own row
+        ref = weakref.ref(self)
+
+        def forked() -> None:
+            counters = ref()
+            if counters is not None:
+                counters._row = -1
+                counters._row_lock = threading.Lock()
+        os.register_at_fork(after_in_child=forked)
+
+    @property
+    def name(self) -> str:
+        "shared memory block name"
+        return self._shm.name
+
+    def _used(self):
+        "return used slots and rows"
+        _, _, _, _, used_slots, used_rows = HEADER.unpack_from(
+            self._buf, 0)
+        return used_slots, used_rows
+
+    def _read_name(self, slot: int):
+        "return the kind and name of a slot"
+        offset = HEADER_SIZE + slot * NAME_SIZE
+        raw = bytes(self._buf[offset:offset + NAME_SIZE])
+        return raw[0], raw[1:].rstrip(b'\0').decode('utf-8')
+
+    def _require_lock(self) -> Any:
+        if self._lock is None:
+            raise ValueError("Counters attached without a lock are read only")
+        return self._lock
+
+    def _slot(self, name: str, kind: int) -> Tuple[int, int]:
+        """return the slot of a counter and its kind, registering it if
+        needed. Integer values go to float slots if registered as such."""
+        encoded = name.encode('utf-8')
+        if len(encoded) >= NAME_SIZE:
+            raise ValueError(f"Counter name {name} is too long")
+
+        with self._require_lock():
+            used_slots, used_rows = self._used()
+            # the counter may have been registered by another process
+            for slot in range(used_slots):
+                slot_kind, slot_name = self._read_name(slot)
+                if slot_name == name:
+                    if slot_kind == INT and kind == VALUE:
+                        raise ValueError(f"Counter {name} is an integer "
+                                         "counter")
+                    if (slot_kind == TIME) != (kind == TIME):
+                        raise ValueError(f"Counter {name} already exist "
+                                         "with a different kind")
+                    kind = slot_kind
+                    break
+            else:
+                if used_slots >= self.num_slots:
+                    raise ValueError("No free slot left")
+                offset = HEADER_SIZE + used_slots * NAME_SIZE
+                record = bytes([kind]) + encoded
+                self._buf[offset:offset + len(record)] = record
+                HEADER.pack_into(self._buf, 0, MAGIC, VERSION,
+                                 self.num_slots, self.num_rows,
+                                 used_slots + 1, used_rows)
+                slot = used_slots
+        return slot, kind
+
+    def _value_slot(self, name: str, value: AnyNum) -> Tuple[Any, int]:
+        "return the cells and slot of a value counter"
+        entry = self._slots.get(name)
+        if entry is not None:
+            return entry
+        slot, kind = self._slot(name, INT if isinstance(value, int)
+                                else VALUE)
+        entry = (self._ints if kind == INT else self._floats, slot)
+        self._slots[name] = entry
+        return entry
+
+    def _time_slot(self, name: str) -> int:
+        "return the slot of a time counter"
+        slot = self._time_slots.get(name)
+        if slot is None:
+            slot, _ = self._slot(name, TIME)
+            self._time_slots[name] = slot
+        return slot
+
+    def _claim_row(self) -> int:
+        "claim the values row of the current process"
+        with self._require_lock():
+            if self._row >= 0:
+                # claimed by another thread meanwhile
+                return self._row
+            used_slots, used_rows = self._used()
+            if used_rows < self.num_rows:
+                row = used_rows
+                HEADER.pack_into(self._buf, 0, MAGIC, VERSION,
+                                 self.num_slots, self.num_rows, used_slots,
+                                 used_rows + 1)
+            else:
+                row = self._reclaim_row(used_slots)
+            self._owners[row] = os.getpid()
+            self._row = row
+        return row
+
+    def _reclaim_row(self, used_slots: int) -> int:
+        "retire the row of an exited process, return it"
+        for row in range(self.num_rows):
+            if _alive(self._owners[row]):
+                continue
+            base = row * self.num_slots
+            retired = self.num_rows * self.num_slots
+            for slot in range(used_slots):
+                kind, _ = self._read_name(slot)
+                cells = self._floats if kind == VALUE else self._ints
+                cells[retired + slot] += cells[base + slot]
+                cells[base + slot] = 0
+            return row
+        raise ValueError("No free row left, increase num_rows")
+
+    def inc(self, name: str, value: AnyNum = 1) -> None:
+        "Increment a counter"
+        entry = self._slots.get(name)
+        if entry is None:
+            entry = self._value_slot(name, value)
+        cells, slot = entry
+        row = self._row
+        if row < 0:
+            row = self._claim_row()
+        # acquire() and release() cost half of a with statement
+        lock = self._row_lock
+        lock.acquire()
+        try:
+            cells[row * self.num_slots + slot] += value
+        except TypeError:
+            raise ValueError(f"Counter {name} is an integer counter") \
+                from None
+        finally:
+            lock.release()
+
+    def dec(self, name: str, value: AnyNum = 1) -> None:
+        "Decrement a counter"
+        self.inc(name, -value)
+
+    def add_time(self, name: str, elapsed: int) -> None:
+        "Add a duration expressed in nanoseconds to a time counter"
+        slot = self._time_slots.get(name)
+        if slot is None:
+            slot = self._time_slot(name)
+        row = self._row
+        if row < 0:
+            row = self._claim_row()
+        lock = self._row_lock
+        lock.acquire()
+        try:
+            self._ints[row * self.num_slots + slot] += elapsed
+        finally:
+            lock.release()
+
+    def time(self, name: str) -> '_SharedTimer':
+        """Return a context manager adding the time spent in a region to a
+        time counter"""
+        return _SharedTimer(self, name)
+
+    def publish(self, counters: Union[ValueCounters, TimeCounters]) -> None:
+        """Write the current process totals of a counters collection.
+
+        The process contribution to each counter is overwritten with the
+        collection value, so workers can periodically publish their local
+        collection. Don't mix with `inc()` on the same counter names.
+
+        Args:
+            counters: counters collection to publish.
+        """
+        row = self._row
+        if row < 0:
+            row = self._claim_row()
+        base = row * self.num_slots
+        ints = self._ints
+        with self._row_lock:
+            if isinstance(counters, ValueCounters):
+                for name, cnt in counters.counters.items():
+                    cells, slot = self._value_slot(name, cnt.value)
+                    try:
+                        cells[base + slot] = cnt.value
+                    except TypeError:
+                        raise ValueError(f"Counter {name} is an integer "
+                                         "counter") from None
+            else:
+                for name, time_cnt in counters.counters.items():
+                    ints[base + self._time_slot(name)] = int(
+                        time_cnt.get(format='ns'))
+                for name, timer in counters.timers.items():
+                    ints[base + self._time_slot(name)] = timer.total
+
+    def get(self, name: str, format: str = 's',
+            rounding: int = 2) -> AnyNum:
+        """Return a counter aggregated value
+
+        Args:
+            name: name of the counter.
+
+            format: time reporting format used for time counters.
+            Defaults to second (s).
+
+            rounding: rounding. Defaults to 2.
+
+        Returns:
+            aggregated value.
+        """
+        used_slots, used_rows = self._used()
+        for slot in range(used_slots):
+            kind, slot_name = self._read_name(slot)
+            if slot_name == name:
+                return self._aggregate(slot, kind, used_rows, format,
+                                       rounding)
+        raise ValueError(f"Unknown counter {name}")
+
+    def _aggregate(self, slot: int, kind: int, used_rows: int, format: str,
+                   rounding: int) -> AnyNum:
+        "sum a slot across all processes rows and the retired row"
+        cells: Any = self._floats if kind == VALUE else self._ints
+        num_slots = self.num_slots
+        total = cells[self.num_rows * num_slots + slot]
+        for row in range(used_rows):
+            total += cells[row * num_slots + slot]
+        if kind == TIME:
+            return convert_ns(total, format=format, rounding=rounding)
+        if kind == INT or total.is_integer():
+            return int(total)
+        return round(total, rounding)
+
+    def get_all(self, format: str = 's',
+                rounding: int = 2) -> Dict[str, AnyNum]:
+        """Return all counters aggregated values as a dictionary
+
+        Args:
+            format: time reporting format used for time counters.
+            Defaults to second (s).
+
+            rounding: rounding. Defaults to 2.
+
+        Returns:
+            Dictionary of counters
+        """
+        cnts = {}
+        used_slots, used_rows = self._used()
+        for slot in range(used_slots):
+            kind, name = self._read_name(slot)
+            cnts[f"{self.prefix}{name}"] = self._aggregate(
+                slot, kind, used_rows, format, rounding)
+        return cnts
+
+    def report(self, format: str = 's', rounding: int = 2) -> None:
+        "pretty print counters "
+        print(self._format(output_type='rounded_outline', format=format,
+                           rounding=rounding))
+
+    def to_json(self, format: str = 's', rounding: int = 2) -> str:
+        "Return counters a json string"
+        return self._format(output_type='json', format=format,
+                            rounding=rounding)
+
+    def _format(self, output_type: str, format: str, rounding: int) -> str:
+        cnts = self.get_all(format=format, rounding=rounding)
+        return format_counters(cnts, headers=['Name', 'Value'],
+                               format=output_type)
+
+    def close(self) -> None:
+        "detach from the shared memory, unlinking it if we created it"
+        self._owners.release()
+        self._floats.release()
+        self._ints.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self) -> 'SharedCounters':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # only the block name and lock are sent to the child process
+        return {'name': self._shm.name, 'lock': self._lock,
+                'prefix': self.prefix, 'clock': self.clock}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.prefix = state['prefix']
+        self.clock = state['clock']
+        self._clock = get_clock(self.clock)
+        self._owner = False
+        self._lock = state['lock']
+        self._shm = _open(state['name'])
+        self._attach()
+
+    def __len__(self) -> int:
+        return self._used()[0]
+
+
+class _SharedTimer():
+    "context manager timing a region into a shared time counter"
+    __slots__ = ('counters', 'name', '_start')
+
+    def __init__(self, counters: SharedCounters, name: str) -> None:
+        self.counters = counters
+        self.name = name
+        self._start = 0
+
+    def __enter__(self) -> '_SharedTimer':
+        self._start = self.counters._clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = self.counters._clock() - self._start
+        self.counters.add_time(self.name, elapsed)
@@ -0,0 +1,210 @@
+import math
+from typing import Dict, Iterable, List, Sequence, Union
+
+AnyNum = Union[int, float]
+
+DEFAULT_PERCENTILES = [50, 90, 99, 99.9]
+
+
+class QuantileSketch():
+    """Mergeable quantile sketch with bounded memory.
+
+    DDSketch style: values are mapped into logarithmic buckets so every
+    quantile estimate is within `relative_accuracy` of the true value.
+    The number of buckets is capped by `max_buckets`, when exceeded the
+    lowest buckets are collapsed together, so memory stays constant no
+    matter how many values are added. Count, sum, mean, stddev, min and max
+    are tracked exactly.
+    """
+    __slots__ = ('relative_accuracy', 'max_buckets', '_gamma', '_log_gamma',
+                 'positive', 'negative', 'zero_count', 'count', 'sum',
+                 '_mean', '_m2', 'min', 'max')
+
+    def __init__(self, relative_accuracy: float = 0.01,
+                 max_buckets: int = 2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum: AnyNum = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min: AnyNum = math.inf
+        self.max: AnyNum = -math.inf
+
+    def add(self, value: AnyNum) -> None:
+        "add a value to the sketch"
+        self.count += 1
+        self.sum += value
+        # Welford online variance
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+        if value > 0:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.positive[key] = self.positive.get(key, 0) + 1
+            if len(self.positive) > self.max_buckets:
+                self._collapse(self.positive)
+        elif value < 0:
+            key = math.ceil(math.log(-value) / self._log_gamma)
+            self.negative[key] = self.negative.get(key, 0) + 1
+            if len(self.negative) > self.max_buckets:
+                self._collapse(self.negative)
+        else:
+            self.zero_count += 1
+
+    def _collapse(self, bins: Dict[int, int]) -> None:
+        "merge the two lowest buckets to keep memory bounded"
+        lowest, second = sorted(bins)[:2]
+        bins[second] += bins.pop(lowest)
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        "merge another sketch into this one"
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Can't merge sketches with different accuracy")
+        if not other.count:
+            return
+        # parallel variance combination
+        total = self.count + other.count
+        delta = other._mean - self._mean
+        self._m2 += other._m2 + delta ** 2 * self.count * other.count / total
+        self._mean += delta * other.count / total
+        self.count = total
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        for src, dst in ((other.positive, self.positive),
+                         (other.negative, self.negative)):
+            for key, cnt in src.items():
+                dst[key] = dst.get(key, 0) + cnt
+            while len(dst) > self.max_buckets:
+                self._collapse(dst)
+
+    def _bucket_value(self, key: int) -> float:
+        "representative value of a bucket"
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile
+
+        Args:
+            q: quantile between 0 and 1.
+
+        Returns:
+            estimated value.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be between 0 and 1")
+        if not self.count:
+            return 0
+        rank = q * (self.count - 1)
+
+        seen = 0
+        # most negative values first
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return self._clamp(-self._bucket_value(key))
+        seen += self.zero_count
+        if seen > rank:
+            return 0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._clamp(self._bucket_value(key))
+        return self.max
+
+    def _clamp(self, value: float) -> float:
+        return min(max(value, self.min), self.max)
+
+    def percentiles(self, percentiles: Iterable[float]) -> List[float]:
+        "Estimate a list of percentiles expressed between 0 and 100"
+        return [self.quantile(p / 100) for p in percentiles]
+
+    @property
+    def mean(self) -> float:
+        return self._mean if self.count else 0
+
+    @property
+    def stddev(self) -> float:
+        "population standard deviation"
+        return math.sqrt(self._m2 / self.count) if self.count else 0
+
+    def __len__(self) -> int:
+        return self.count
+
+
+def percentiles(values: Sequence[AnyNum],
+                percentiles: Iterable[float]) -> List[AnyNum]:
+    """Compute exact percentiles using linear interpolation
+
+    Args:
+        values: values.
+
+        percentiles: percentiles expressed between 0 and 100.
+
+    Returns:
+        percentiles values.
+    """
+    serie = sorted(values)
+    results: List[AnyNum] = []
+    for p in percentiles:
+        if not 0 <= p <= 100:
+            raise ValueError("Percentile must be between 0 and 100")
+        if not serie:
+            results.append(0)
+            continue
+        rank = p / 100 * (len(serie) - 1)
+        low = math.floor(rank)
+        high = math.ceil(rank)
+        frac = rank - low
+        results.append(serie[low] + (serie[high] - serie[low]) * frac)
+    return results
+
+
+def summary(values: Sequence[AnyNum]) -> Dict[str, AnyNum]:
+    """Compute count, mean, stddev, min and max of values
+
+    Args:
+        values: values.
+
+    Returns:
+        statistics dictionary.
+    """
+    count = len(values)
+    if not count:
+        return {"count": 0, "mean": 0, "stddev": 0, "min": 0, "max": 0}
+    mean = sum(values) / count
+    variance = sum((v - mean) ** 2 for v in values) / count
+    return {
+        "count": count,
+        "mean": mean,
+        "stddev": math.sqrt(variance),
+        "min": min(values),
+        "max": max(values)
+    }
+
+
+def sketch_summary(sketch: QuantileSketch) -> Dict[str, AnyNum]:
+    "Return count, mean, stddev, min and max of a sketch"
+    if not sketch.count:
+        return summary([])
+    return {
+        "count": sketch.count,
+        "mean": sketch.mean,
+        "stddev": sketch.stddev,
+        "min": sketch.min,
+        "max": sketch.max
+    }
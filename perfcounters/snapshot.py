@@ -0,0 +1,791 @@
+"""Binary snapshots of counters collections.
+
+A snapshot stores the full state of `TimeCounters` and `ValueCounters`
+collections, laps and sketches included, in a compact versioned format:
+
+    header       <4sHBxI  magic b'PCSN', version, compression, collections
+    body         collections records, optionally gzip or zstd compressed
+
+    collection   <BBBxdII4x  kind, bounded, compact, relative accuracy,
+                          number of counters and of families, then prefix
+                          and clock strings, the counters and the families
+    counter      <BBxxI   type, payload, name length, then the name, the
+                          counter fields and its payload
+    family       <IIQQB7x number of labels, max cardinality, overflowed
+                          calls, number of children, overflow child flag,
+                          then the name and labels names strings, each
+                          child label values strings and counter, and the
+                          overflow child counter
+
+Strings are stored as a <H length followed by utf-8 bytes. Every record
+starts on an 8 bytes boundary so laps are stored as raw little endian int64
+or float64 arrays. Value counters laps are stored as int64 when they are
+all integers fitting an int64, as float64 otherwise. Integer values which
+don't fit an int64 are stored as decimal strings. Uncompressed snapshots are memory-mapped when loaded and
+laps are read through memoryviews without being copied.
+"""
+import gzip
+import mmap
+import struct
+import sys
+from array import array
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .analytics import durations
+from .clocks import get_clock
+from .optional import get_numpy, get_zstd
+from .sketch import QuantileSketch
+from .time_counters import (SampledTimeCounter, SampledTimer, TimeCounter,
+                            TimeCounters, Timer)
+from .value_counters import CounterFamily, ValueCounter, ValueCounters
+
+AnyNum = Union[int, float]
+Collection = Union[TimeCounters, ValueCounters]
+
+MAGIC = b'PCSN'
+VERSION = 1
+HEADER = struct.Struct('<4sHBxI')
+COLLECTION = struct.Struct('<BBBxdII4x')
+FAMILY = struct.Struct('<IIQQB7x')
+COUNTER = struct.Struct('<BBxxI')
+STRING = struct.Struct('<H')
+INT64 = struct.Struct('<q')
+FLOAT64 = struct.Struct('<d')
+COUNT = struct.Struct('<Q')
+TIME_FIELDS = struct.Struct('<qqq')
+TIMER_FIELDS = struct.Struct('<qqqq')
+SKETCH_FIELDS = struct.Struct('<QdddddQQQQ')
+
+COMPRESSIONS = {None: 0, 'gzip': 1, 'zstd': 2}
+
+# collection kinds
+VALUE_COLLECTION = 0
+TIME_COLLECTION = 1
+
+# counter types
+INT_VALUE = 0
+FLOAT_VALUE = 1
+TIME_COUNTER = 2
+TIMER = 3
+# integer value beyond int64, stored as a decimal string
+BIG_INT_VALUE = 4
+
+# counter payloads
+NO_PAYLOAD = 0
+LAPS = 1
+SKETCH = 2
+# value counters laps which are all int64
+INT_LAPS = 3
+
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def _pad(size: int) -> int:
+    "padding needed to align a size on 8 bytes"
+    return -size % 8
+
+
+def _string(value: str) -> bytes:
+    data = value.encode('utf-8')
+    data = STRING.pack(len(data)) + data
+    return data + b'\0' * _pad(len(data))
+
+
+def _laps(laps: Any, typecode: str) -> bytes:
+    "laps as a count followed by their raw little endian array"
+    if not isinstance(laps, array):
+        laps = array(typecode, laps)
+    if not _LITTLE_ENDIAN:
+        laps = array(typecode, laps)
+        laps.byteswap()
+    return COUNT.pack(len(laps)) + laps.tobytes()
+
+
+def _is_int64(value: Any) -> bool:
+    return isinstance(value, int) and INT64_MIN <= value <= INT64_MAX
+
+
+def _sketch(sketch: QuantileSketch) -> bytes:
+    chunks = [SKETCH_FIELDS.pack(
+        sketch.count, sketch.sum, sketch._mean, sketch._m2, sketch.min,
+        sketch.max, sketch.zero_count, sketch.max_buckets,
+        len(sketch.positive), len(sketch.negative))]
+    for bins in (sketch.positive, sketch.negative):
+        chunks.append(_laps(list(bins.keys()), 'q')[COUNT.size:])
+        chunks.append(_laps(list(bins.values()), 'q')[COUNT.size:])
+    return b''.join(chunks)
+
+
+def _counter(cnt: Any, clock_ts: int) -> bytes:
+    "serialize a counter"
+    if isinstance(cnt, (SampledTimeCounter, SampledTimer)):
+        raise ValueError(f"Counter {cnt.name} is sampled and can't be "
+                         "snapshotted")
+    payload = NO_PAYLOAD
+    if isinstance(cnt, ValueCounter):
+        if isinstance(cnt.value, float):
+            kind, fields = FLOAT_VALUE, FLOAT64.pack(cnt.value)
+        elif _is_int64(cnt.value):
+            kind, fields = INT_VALUE, INT64.pack(cnt.value)
+        else:
+            kind, fields = BIG_INT_VALUE, _string(str(cnt.value))
+        # compact laps are float64 arrays, lists of ints are kept exact
+        typecode = 'd'
+        if (not isinstance(cnt.laps, array)
+                and all(map(_is_int64, cnt.laps))):
+            typecode = 'q'
+    elif isinstance(cnt, Timer):
+        kind = TIMER
+        # the min of an empty timer doesn't fit an int64
+        min_ts = cnt.min if cnt.count else 0
+        fields = TIMER_FIELDS.pack(cnt.count, cnt.total, min_ts, cnt.max)
+        typecode = ''
+    else:
+        kind = TIME_COUNTER
+        # the clock at save time lets running counters be restored
+        fields = TIME_FIELDS.pack(cnt.start_ts, cnt.stop_ts, clock_ts)
+        typecode = 'q'
+
+    data = b''
+    if typecode:
+        if cnt.sketch is not None:
+            payload, data = SKETCH, _sketch(cnt.sketch)
+        else:
+            payload = INT_LAPS if kind != TIME_COUNTER and typecode == 'q' \
+                else LAPS
+            data = _laps(cnt.laps, typecode)
+    name = cnt.name.encode('utf-8')
+    header = COUNTER.pack(kind, payload, len(name)) + name
+    header += b'\0' * _pad(len(header))
+    return header + fields + data
+
+
+def _family(family: CounterFamily) -> bytes:
+    "serialize a counter family"
+    children = family.items()
+    if family.overflow is not None:
+        children.pop()
+    chunks = [FAMILY.pack(len(family.label_names), family.max_cardinality,
+                          family.overflowed, len(children),
+                          family.overflow is not None),
+              _string(family.name)]
+    chunks.extend(_string(n) for n in family.label_names)
+    for values, child in children:
+        chunks.extend(_string(v) for v in values)
+        chunks.append(_counter(child, 0))
+    if family.overflow is not None:
+        chunks.append(_counter(family.overflow, 0))
+    return b''.join(chunks)
+
+
+def _collection(collection: Collection) -> bytes:
+    "serialize a collection"
+    families: List[CounterFamily] = []
+    if isinstance(collection, TimeCounters):
+        if collection.sampled:
+            raise ValueError("Sampled counters can't be snapshotted")
+        kind, clock = TIME_COLLECTION, collection.clock
+        counters: List[Any] = list(collection.counters.values())
+        counters.extend(list(collection.timers.values()))
+        clock_ts = get_clock(clock)()
+    elif isinstance(collection, ValueCounters):
+        # fold thread safe collections shards into their counters
+        collection.get_all()
+        kind, clock, clock_ts = VALUE_COLLECTION, '', 0
+        counters = list(collection.counters.values())
+        families = list(collection.families.values())
+    else:
+        raise ValueError("Only TimeCounters and ValueCounters can be "
+                         "snapshotted")
+    chunks = [COLLECTION.pack(kind, collection.bounded, collection.compact,
+                              collection.relative_accuracy, len(counters),
+                              len(families)),
+              _string(collection.prefix), _string(clock)]
+    for cnt in counters:
+        chunks.append(_counter(cnt, clock_ts))
+    for family in families:
+        chunks.append(_family(family))
+    return b''.join(chunks)
+
+
+def dumps(*collections: Collection, compression: Optional[str] = None
+          ) -> bytes:
+    """Serialize collections into a snapshot
+
+    Args:
+        collections: TimeCounters and ValueCounters collections.
+
+        compression: None, gzip or zstd. Defaults to None.
+
+    Returns:
+        snapshot bytes.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError("Unsupported compression. Valid: gzip and zstd")
+    body = b''.join(_collection(c) for c in collections)
+    if compression == 'gzip':
+        body = gzip.compress(body, compresslevel=6)
+    elif compression == 'zstd':
+        body = _zstd().compress(body)
+    header = HEADER.pack(MAGIC, VERSION, COMPRESSIONS[compression],
+                         len(collections))
+    return header + b'\0' * _pad(HEADER.size) + body
+
+
+def save(path: str, *collections: Collection,
+         compression: Optional[str] = None) -> None:
+    """Save collections into a snapshot file
+
+    Args:
+        path: snapshot file path.
+
+        collections: TimeCounters and ValueCounters collections.
+
+        compression: None, gzip or zstd. Defaults to None.
+    """
+    data = dumps(*collections, compression=compression)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _zstd() -> Any:
+    zstd = get_zstd()
+    if zstd is None:
+        raise ValueError("zstd compression requires Python 3.14+ or the "
+                         "zstandard package")
+    return zstd
+
+
+class SnapshotCounter():
+    "Counter stored in a snapshot, laps are views over the snapshot buffer"
+    __slots__ = ('name', 'kind', 'fields', 'laps', 'sketch')
+
+    def __init__(self, name: str, kind: int, fields: Tuple[Any, ...],
+                 laps: Any = None,
+                 sketch: Optional[QuantileSketch] = None):
+        self.name = name
+        self.kind = kind
+        self.fields = fields
+        self.laps = laps
+        self.sketch = sketch
+
+
+class SnapshotFamily():
+    "Counter family stored in a snapshot"
+    __slots__ = ('name', 'label_names', 'max_cardinality', 'overflowed',
+                 'children', 'overflow')
+
+    def __init__(self, name: str, label_names: Tuple[str, ...],
+                 max_cardinality: int, overflowed: int):
+        self.name = name
+        self.label_names = label_names
+        self.max_cardinality = max_cardinality
+        self.overflowed = overflowed
+        self.children: Dict[Tuple[str, ...], SnapshotCounter] = {}
+        self.overflow: Optional[SnapshotCounter] = None
+
+    def counters(self) -> List[SnapshotCounter]:
+        "children counters, the overflow child last"
+        counters = list(self.children.values())
+        if self.overflow is not None:
+            counters.append(self.overflow)
+        return counters
+
+
+class SnapshotCollection():
+    "Collection stored in a snapshot"
+    __slots__ = ('kind', 'prefix', 'clock', 'bounded', 'compact',
+                 'relative_accuracy', 'counters', 'families')
+
+    def __init__(self, kind: int, prefix: str, clock: str, bounded: bool,
+                 compact: bool, relative_accuracy: float):
+        self.kind = kind
+        self.prefix = prefix
+        self.clock = clock
+        self.bounded = bounded
+        self.compact = compact
+        self.relative_accuracy = relative_accuracy
+        self.counters: Dict[str, SnapshotCounter] = {}
+        self.families: Dict[str, SnapshotFamily] = {}
+
+
+class Snapshot():
+    """Read a snapshot without materializing its counters.
+
+    Uncompressed snapshot files are memory-mapped, counters laps are
+    memoryviews over the mapping which stay valid until the snapshot is
+    closed.
+
+        with Snapshot("run.pcs") as snap:
+            cnts = snap.to_collections()
+    """
+
+    def __init__(self, source: Union[str, bytes]) -> None:
+        """
+        Args:
+            source: snapshot file path or snapshot bytes.
+        """
+        self._mmap: Optional[mmap.mmap] = None
+        buf: Any
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            buf = memoryview(source)
+        else:
+            with open(source, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            buf = memoryview(self._mmap)
+        if len(buf) < HEADER.size or bytes(buf[:4]) != MAGIC:
+            self._release(buf)
+            raise ValueError("Not a perfcounters snapshot")
+        _, version, compression, num = HEADER.unpack_from(buf)
+        if version > VERSION:
+            self._release(buf)
+            raise ValueError(f"Unsupported snapshot version {version}")
+        body = buf[HEADER.size + _pad(HEADER.size):]
+        if compression:
+            # compressed snapshots are decompressed in memory
+            data = bytes(body)
+            body.release()
+            self._release(buf)
+            if compression == COMPRESSIONS['gzip']:
+                data = gzip.decompress(data)
+            else:
+                data = _zstd().decompress(data)
+            buf = body = memoryview(data)
+        self._buf = buf
+        self._body = body
+        self.collections: List[SnapshotCollection] = []
+        offset = 0
+        for _ in range(num):
+            offset = self._read_collection(body, offset)
+
+    def _release(self, buf: memoryview) -> None:
+        buf.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def _read_string(self, buf: memoryview, offset: int) -> Tuple[str, int]:
+        size, = STRING.unpack_from(buf, offset)
+        start = offset + STRING.size
+        value = bytes(buf[start:start + size]).decode('utf-8')
+        return value, offset + STRING.size + size + _pad(STRING.size + size)
+
+    def _read_array(self, buf: memoryview, offset: int, size: int,
+                    typecode: str) -> Tuple[Any, int]:
+        end = offset + size * 8
+        view = buf[offset:end].cast(typecode)  # type: ignore
+        if not _LITTLE_ENDIAN:
+            swapped = array(typecode, view)
+            swapped.byteswap()
+            view = memoryview(swapped)
+        return view, end
+
+    def _read_collection(self, buf: memoryview, offset: int) -> int:
+        (kind, bounded, compact, accuracy, num,
+         num_families) = COLLECTION.unpack_from(buf, offset)
+        offset += COLLECTION.size
+        prefix, offset = self._read_string(buf, offset)
+        clock, offset = self._read_string(buf, offset)
+        collection = SnapshotCollection(kind, prefix, clock, bool(bounded),
+                                        bool(compact), accuracy)
+        for _ in range(num):
+            cnt, offset = self._read_counter(buf, offset, accuracy)
+            collection.counters[cnt.name] = cnt
+        for _ in range(num_families):
+            family, offset = self._read_family(buf, offset, accuracy)
+            collection.families[family.name] = family
+        self.collections.append(collection)
+        return offset
+
+    def _read_family(self, buf: memoryview, offset: int,
+                     accuracy: float) -> Tuple[SnapshotFamily, int]:
+        (num_labels, max_cardinality, overflowed, num,
+         overflow) = FAMILY.unpack_from(buf, offset)
+        offset += FAMILY.size
+        name, offset = self._read_string(buf, offset)
+        label_names = []
+        for _ in range(num_labels):
+            label, offset = self._read_string(buf, offset)
+            label_names.append(label)
+        family = SnapshotFamily(name, tuple(label_names), max_cardinality,
+                                overflowed)
+        for _ in range(num):
+            values = []
+            for _ in range(num_labels):
+                value, offset = self._read_string(buf, offset)
+                values.append(value)
+            cnt, offset = self._read_counter(buf, offset, accuracy)
+            family.children[tuple(values)] = cnt
+        if overflow:
+            family.overflow, offset = self._read_counter(buf, offset,
+                                                         accuracy)
+        return family, offset
+
+    def _read_counter(self, buf: memoryview, offset: int,
+                      accuracy: float) -> Tuple[SnapshotCounter, int]:
+        kind, payload, size = COUNTER.unpack_from(buf, offset)
+        start = offset + COUNTER.size
+        name = bytes(buf[start:start + size]).decode('utf-8')
+        offset = start + size + _pad(COUNTER.size + size)
+        fields: Tuple[Any, ...]
+        if kind == INT_VALUE:
+            fields = INT64.unpack_from(buf, offset)
+            offset += INT64.size
+        elif kind == FLOAT_VALUE:
+            fields = FLOAT64.unpack_from(buf, offset)
+            offset += FLOAT64.size
+        elif kind == BIG_INT_VALUE:
+            value, offset = self._read_string(buf, offset)
+            fields = (int(value), )
+        elif kind == TIME_COUNTER:
+            fields = TIME_FIELDS.unpack_from(buf, offset)
+            offset += TIME_FIELDS.size
+        else:
+            fields = TIMER_FIELDS.unpack_from(buf, offset)
+            offset += TIMER_FIELDS.size
+
+        cnt = SnapshotCounter(name, kind, fields)
+        if payload in (LAPS, INT_LAPS):
+            num, = COUNT.unpack_from(buf, offset)
+            typecode = 'q' if kind == TIME_COUNTER or payload == INT_LAPS \
+                else 'd'
+            cnt.laps, offset = self._read_array(buf, offset + COUNT.size,
+                                                num, typecode)
+        elif payload == SKETCH:
+            cnt.sketch, offset = self._read_sketch(buf, offset, accuracy)
+        return cnt, offset
+
+    def _read_sketch(self, buf: memoryview, offset: int,
+                     accuracy: float) -> Tuple[QuantileSketch, int]:
+        (count, total, mean, m2, min_value, max_value, zero_count,
+         max_buckets, num_pos, num_neg) = SKETCH_FIELDS.unpack_from(
+            buf, offset)
+        offset += SKETCH_FIELDS.size
+        sketch = QuantileSketch(relative_accuracy=accuracy,
+                                max_buckets=max_buckets)
+        sketch.count = count
+        sketch.sum = total
+        sketch._mean = mean
+        sketch._m2 = m2
+        sketch.min = min_value
+        sketch.max = max_value
+        sketch.zero_count = zero_count
+        for bins, num in ((sketch.positive, num_pos),
+                          (sketch.negative, num_neg)):
+            keys, offset = self._read_array(buf, offset, num, 'q')
+            counts, offset = self._read_array(buf, offset, num, 'q')
+            bins.update(zip(keys.tolist(), counts.tolist()))
+        return sketch, offset
+
+    def to_collections(self) -> List[Collection]:
+        """Materialize the snapshot collections
+
+        Returns:
+            TimeCounters and ValueCounters collections. Running time
+            counters keep running, rebased on the current clock.
+        """
+        return [_materialize(c) for c in self.collections]
+
+    def close(self) -> None:
+        "release the snapshot buffer"
+        for collection in self.collections:
+            counters = list(collection.counters.values())
+            for family in collection.families.values():
+                counters.extend(family.counters())
+            for cnt in counters:
+                if isinstance(cnt.laps, memoryview):
+                    cnt.laps.release()
+        self._body.release()
+        self._release(self._buf)
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def _copy_laps(view: memoryview, typecode: str, compact: bool) -> Any:
+    "copy laps out of the snapshot buffer"
+    laps = array(typecode)
+    laps.frombytes(view.cast('B'))
+    return laps if compact else laps.tolist()
+
+
+def _new_collection(snap: SnapshotCollection) -> Collection:
+    if snap.kind == TIME_COLLECTION:
+        return TimeCounters(prefix=snap.prefix, clock=snap.clock,
+                            bounded=snap.bounded,
+                            relative_accuracy=snap.relative_accuracy,
+                            compact=snap.compact)
+    return ValueCounters(prefix=snap.prefix, bounded=snap.bounded,
+                         relative_accuracy=snap.relative_accuracy,
+                         compact=snap.compact)
+
+
+def _value_counter(scnt: SnapshotCounter,
+                   snap: SnapshotCollection) -> ValueCounter:
+    vcnt = ValueCounter(name=scnt.name, value=scnt.fields[0],
+                        prefix=snap.prefix, bounded=snap.bounded,
+                        relative_accuracy=snap.relative_accuracy,
+                        compact=snap.compact)
+    if scnt.laps is None:
+        pass
+    elif scnt.laps.format == 'd':
+        vcnt.laps = _copy_laps(scnt.laps, 'd', snap.compact)
+    else:
+        laps = scnt.laps.tolist()
+        vcnt.laps = array('d', laps) if snap.compact else laps
+    vcnt.sketch = scnt.sketch
+    return vcnt
+
+
+def _add_family(collection: ValueCounters, snap: SnapshotFamily,
+                children: Dict[Tuple[str, ...], ValueCounter],
+                overflow: Optional[ValueCounter]) -> None:
+    "add a family and its children to a collection"
+    family = collection.family(snap.name, snap.label_names,
+                               max_cardinality=snap.max_cardinality)
+    family.overflowed = snap.overflowed
+    family.children.update(children)
+    family._interned.update(children)
+    family.overflow = overflow
+
+
+def _materialize(snap: SnapshotCollection) -> Collection:
+    collection = _new_collection(snap)
+    now = get_clock(snap.clock)() if snap.clock else 0
+    for name, scnt in snap.counters.items():
+        if isinstance(collection, ValueCounters):
+            collection.counters[name] = _value_counter(scnt, snap)
+        elif scnt.kind == TIMER:
+            timer = Timer(name=name, prefix=snap.prefix, clock=snap.clock)
+            count, total, min_ts, max_ts = scnt.fields
+            if count:
+                timer.count, timer.total = count, total
+                timer.min, timer.max = min_ts, max_ts
+            collection.timers[name] = timer
+        else:
+            start_ts, stop_ts, saved_ts = scnt.fields
+            tcnt = TimeCounter(name=name, prefix=snap.prefix,
+                               clock=snap.clock, bounded=snap.bounded,
+                               relative_accuracy=snap.relative_accuracy,
+                               compact=snap.compact)
+            # running counters timestamps come from the saving process
+            # clock, rebase them so they keep running from where they were.
+            offset = 0 if stop_ts else now - saved_ts
+            tcnt.start_ts = start_ts + offset
+            tcnt.stop_ts = stop_ts
+            tcnt._last_lap_ts = tcnt.start_ts
+            if scnt.laps is not None:
+                laps = _copy_laps(scnt.laps, 'q', True)
+                if offset:
+                    laps = array('q', [ts + offset for ts in laps])
+                tcnt.laps = laps if snap.compact else laps.tolist()
+                if len(laps):
+                    tcnt._last_lap_ts = laps[-1]
+            tcnt.sketch = scnt.sketch
+            collection.counters[name] = tcnt
+    for family in snap.families.values():
+        overflow = None
+        if family.overflow is not None:
+            overflow = _value_counter(family.overflow, snap)
+        _add_family(collection, family,  # type: ignore
+                    {values: _value_counter(scnt, snap)
+                     for values, scnt in family.children.items()},
+                    overflow)
+    return collection
+
+
+def load(path: str) -> List[Collection]:
+    """Load the collections of a snapshot file
+
+    Args:
+        path: snapshot file path.
+
+    Returns:
+        TimeCounters and ValueCounters collections.
+    """
+    with Snapshot(path) as snap:
+        return snap.to_collections()
+
+
+def _durations(cnt: SnapshotCounter) -> Any:
+    "laps durations of a time counter, stopped at save time if running"
+    start_ts, stop_ts, saved_ts = cnt.fields
+    stop_ts = stop_ts or saved_ts
+    np = get_numpy()
+    if np is not None:
+        ts = np.empty(len(cnt.laps) + 2, dtype=np.int64)
+        ts[0] = start_ts
+        ts[1:-1] = cnt.laps
+        ts[-1] = stop_ts
+        return np.diff(ts)
+    return durations(start_ts, cnt.laps, stop_ts)  # type: ignore
+
+
+def _merge_sketch(cnts: List[SnapshotCounter],
+                  first: SnapshotCollection) -> Optional[QuantileSketch]:
+    "merged sketch of bounded counters, None for unbounded ones"
+    if not first.bounded:
+        return None
+    sketch = QuantileSketch(relative_accuracy=first.relative_accuracy)
+    for c in cnts:
+        if c.sketch is not None:
+            sketch.merge(c.sketch)
+    return sketch
+
+
+def _merge_values(name: str, cnts: List[SnapshotCounter],
+                  first: SnapshotCollection) -> ValueCounter:
+    "sum value counters and concatenate their laps"
+    vcnt = ValueCounter(name=name, value=sum(c.fields[0] for c in cnts),
+                        prefix=first.prefix, bounded=first.bounded,
+                        relative_accuracy=first.relative_accuracy,
+                        compact=not first.bounded)
+    sketch = _merge_sketch(cnts, first)
+    if sketch is not None:
+        vcnt.sketch = sketch
+    else:
+        for c in cnts:
+            if c.laps.format == 'd':
+                vcnt.laps.frombytes(c.laps.cast('B'))  # type: ignore
+            else:
+                # merged laps are float64 arrays
+                vcnt.laps.extend(c.laps.tolist())
+    return vcnt
+
+
+def _merge_families(collection: ValueCounters,
+                    group: List[SnapshotCollection]) -> None:
+    "merge the families of value collections, summing the same children"
+    families: Dict[str, List[SnapshotFamily]] = {}
+    for snap in group:
+        for name, family in snap.families.items():
+            families.setdefault(name, []).append(family)
+    first = group[0]
+    for name, fams in families.items():
+        if any(f.label_names != fams[0].label_names for f in fams):
+            raise ValueError(f"Family {name} has different labels")
+        children: Dict[Tuple[str, ...], List[SnapshotCounter]] = {}
+        overflows = []
+        for f in fams:
+            for values, cnt in f.children.items():
+                children.setdefault(values, []).append(cnt)
+            if f.overflow is not None:
+                overflows.append(f.overflow)
+        merged = SnapshotFamily(name, fams[0].label_names,
+                                max(f.max_cardinality for f in fams),
+                                sum(f.overflowed for f in fams))
+        overflow = None
+        if overflows:
+            overflow = _merge_values(overflows[0].name, overflows, first)
+        _add_family(collection, merged,
+                    {values: _merge_values(cnts[0].name, cnts, first)
+                     for values, cnts in children.items()},
+                    overflow)
+
+
+def _merge_group(group: List[SnapshotCollection]) -> Collection:
+    first = group[0]
+    if any(s.bounded != first.bounded for s in group):
+        raise ValueError("Can't merge bounded and unbounded counters")
+    # merged laps are kept in arrays
+    merged = SnapshotCollection(first.kind, first.prefix, first.clock,
+                                first.bounded, not first.bounded,
+                                first.relative_accuracy)
+    collection = _new_collection(merged)
+    names: Dict[str, List[SnapshotCounter]] = {}
+    for snap in group:
+        for name, cnt in snap.counters.items():
+            names.setdefault(name, []).append(cnt)
+
+    np = get_numpy()
+    for name, cnts in names.items():
+        if len({c.kind == TIMER for c in cnts}) > 1:
+            raise ValueError(f"Counter {name} is both a timer and a counter")
+        if isinstance(collection, ValueCounters):
+            collection.counters[name] = _merge_values(name, cnts, first)
+        elif cnts[0].kind == TIMER:
+            timer = Timer(name=name, prefix=first.prefix, clock=first.clock)
+            for c in cnts:
+                count, total, min_ts, max_ts = c.fields
+                if not count:
+                    continue
+                timer.count += count
+                timer.total += total
+                timer.min = min(timer.min, min_ts)
+                timer.max = max(timer.max, max_ts)
+            collection.timers[name] = timer
+        else:
+            # laps durations of every run one after the other: the merged
+            # counter starts at 0 and its total is the sum of the totals.
+            tcnt = TimeCounter(name=name, prefix=first.prefix,
+                               clock=first.clock, bounded=first.bounded,
+                               relative_accuracy=first.relative_accuracy,
+                               compact=not first.bounded)
+            sketch = _merge_sketch(cnts, first)
+            total = sum((c.fields[1] or c.fields[2]) - c.fields[0]
+                        for c in cnts)
+            tcnt.start_ts = 0
+            tcnt.stop_ts = total
+            tcnt._last_lap_ts = total
+            if sketch is not None:
+                tcnt.sketch = sketch
+            elif np is not None:
+                serie = np.concatenate([_durations(c) for c in cnts])
+                tcnt.laps = array('q', np.cumsum(serie[:-1]).tobytes())
+            else:
+                serie = []
+                for c in cnts:
+                    serie.extend(_durations(c))
+                laps = array('q')
+                ts = 0
+                for d in serie[:-1]:
+                    ts += d
+                    laps.append(ts)
+                tcnt.laps = laps
+            collection.counters[name] = tcnt
+    if isinstance(collection, ValueCounters):
+        _merge_families(collection, group)
+    return collection
+
+
+def merge(*sources: Union[str, bytes, Snapshot]) -> List[Collection]:
+    """Merge snapshots of many runs or hosts
+
+    Collections with the same kind and prefix are merged: value counters
+    and the children of families with the same label values are summed and
+    their laps concatenated, timers counts and totals are
+    summed, time counters totals are summed and their laps durations
+    concatenated. Laps are copied from the snapshots buffers into arrays
+    without being converted into Python objects when NumPy is installed.
+
+    Args:
+        sources: snapshot file paths, snapshot bytes or opened snapshots.
+
+    Returns:
+        merged TimeCounters and ValueCounters collections.
+    """
+    snapshots = []
+    opened = []
+    try:
+        for source in sources:
+            if isinstance(source, Snapshot):
+                snapshots.append(source)
+            else:
+                snap = Snapshot(source)
+                opened.append(snap)
+                snapshots.append(snap)
+        groups: Dict[Tuple[int, str], List[SnapshotCollection]] = {}
+        for snap in snapshots:
+            for collection in snap.collections:
+                key = (collection.kind, collection.prefix)
+                groups.setdefault(key, []).append(collection)
+        return [_merge_group(group) for group in groups.values()]
+    finally:
+        for snap in opened:
+            snap.close()
+
@@ -0,0 +1,329 @@
+import threading
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
+
+from .clocks import DEFAULT_CLOCK, Clock, convert_ns, get_clock
+from .format import format_counters
+
+AnyNum = Union[int, float]
+F = TypeVar('F', bound=Callable[..., Any])
+
+ROOT = '<root>'
+
+
+class SpanNode():
+    "Aggregated timings of a call path"
+    __slots__ = ('name', 'parent', 'children', 'count', 'total',
+                 'child_total', '_start')
+
+    def __init__(self, name: str, parent: Optional['SpanNode'] = None):
+        self.name = name
+        self.parent = parent
+        self.children: Dict[str, SpanNode] = {}
+        self.count = 0
+        self.total = 0
+        self.child_total = 0
+        self._start = 0
+
+    @property
+    def self_time(self) -> int:
+        "time spent in the span itself, excluding its children"
+        return self.total - self.child_total
+
+    def merge(self, other: 'SpanNode') -> None:
+        "add another tree into this one"
+        self.count += other.count
+        self.total += other.total
+        self.child_total += other.child_total
+        for name, child in list(other.children.items()):
+            node = self.children.get(name)
+            if node is None:
+                node = SpanNode(name, self)
+                self.children[name] = node
+            node.merge(child)
+
+    def reset(self) -> None:
+        "reset the tree timings"
+        self.count = 0
+        self.total = 0
+        self.child_total = 0
+        for child in list(self.children.values()):
+            child.reset()
+
+
+class _SpanContext():
+    "Per thread stack of the active spans"
+    __slots__ = ('clock', 'stack', 'spans')
+
+    def __init__(self, clock: Clock, root: SpanNode):
+        self.clock = clock
+        self.stack = [root]
+        # span context managers returned to this thread, by name
+        self.spans: Dict[str, _Span] = {}
+
+    def enter(self, name: str) -> None:
+        parent = self.stack[-1]
+        node = parent.children.get(name)
+        if node is None:
+            node = SpanNode(name, parent)
+            parent.children[name] = node
+        self.stack.append(node)
+        node._start = self.clock()
+
+    def exit(self) -> None:
+        end = self.clock()
+        node = self.stack.pop()
+        elapsed = end - node._start
+        node.count += 1
+        node.total += elapsed
+        node.parent.child_total += elapsed  # type: ignore
+
+
+class _Span():
+    """Context manager of a span, bound to its name only: it is entered in
+    the context of the thread entering it, so spans can be created before
+    being entered and shared between threads."""
+    __slots__ = ('spans', 'name')
+
+    def __init__(self, spans: 'SpanCounters', name: str):
+        self.spans = spans
+        self.name = name
+
+    def __enter__(self) -> '_Span':
+        try:
+            ctx = self.spans._local.ctx
+        except AttributeError:
+            ctx = self.spans._context()
+        ctx.enter(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.spans._local.ctx.exit()
+
+
+class SpanCounters():
+    """Nested time counters building a call tree.
+
+    Each thread keeps a stack of its active spans, a span entered while
+    another is active is attributed to it as a child. Repeated call paths
+    are aggregated into the same tree node which records the count, total
+    time and self time (total minus time spent in children spans).
+
+        with spans.span("request"):
+            with spans.span("db"):
+                ...
+            with spans.span("render"):
+                ...
+    """
+
+    def __init__(self, prefix: str = "", clock: str = DEFAULT_CLOCK) -> None:
+        self.prefix = prefix
+        self.clock = get_clock(clock)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # each thread tree root
+        self._roots: List[SpanNode] = []
+
+    def _context(self) -> _SpanContext:
+        "return the calling thread context"
+        try:
+            return self._local.ctx
+        except AttributeError:
+            root = SpanNode(ROOT)
+            with self._lock:
+                self._roots.append(root)
+            ctx = _SpanContext(self.clock, root)
+            self._local.ctx = ctx
+            return ctx
+
+    def span(self, name: str) -> _Span:
+        """Return a context manager timing a span nested in the one active
+        when it is entered
+
+        Args:
+            name: name of the span.
+
+        Returns:
+            context manager.
+        """
+        try:
+            return self._local.ctx.spans[name]
+        except (AttributeError, KeyError):
+            span = _Span(self, name)
+            self._context().spans[name] = span
+            return span
+
+    def spanned(self, name: Optional[str] = None) -> Callable[[F], F]:
+        """Decorator timing every call of a function as a span
+
+        Args:
+            name: name of the span. Defaults to the function qualified name.
+
+        Returns:
+            decorator.
+        """
+        def decorator(func: F) -> F:
+            span_name = name or func.__qualname__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper  # type: ignore
+
+        return decorator
+
+    def get_root(self) -> SpanNode:
+        "Return the call tree of all threads merged"
+        merged = SpanNode(ROOT)
+        with self._lock:
+            roots = list(self._roots)
+        for root in roots:
+            merged.merge(root)
+        return merged
+
+    def reset_all(self) -> None:
+        "reset all spans"
+        with self._lock:
+            for root in self._roots:
+                root.reset()
+
+    def _walk(self, node: SpanNode, depth: int = 0):
+        "yield (depth, node) depth first"
+        for child in node.children.values():
+            yield depth, child
+            yield from self._walk(child, depth + 1)
+
+    def get_all(self, format: str = "s",
+                rounding: int = 2) -> Dict[str, List[AnyNum]]:
+        """Return all spans [count, total, self] keyed by call path
+
+        Args:
+            format: time reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            Dictionary of spans, call path names separated by /.
+        """
+        cnts = {}
+        path: List[str] = []
+        for depth, node in self._walk(self.get_root()):
+            del path[depth:]
+            path.append(node.name)
+            cnts[f"{self.prefix}{'/'.join(path)}"] = self._values(
+                node, format, rounding)
+        return cnts
+
+    def _values(self, node: SpanNode, format: str,
+                rounding: int) -> List[AnyNum]:
+        return [node.count,
+                convert_ns(node.total, format=format, rounding=rounding),
+                convert_ns(node.self_time, format=format, rounding=rounding)]
+
+    def get_tree(self, format: str = "s",
+                 rounding: int = 2) -> List[Dict[str, Any]]:
+        """Return the call tree as nested dictionaries
+
+        Args:
+            format: time reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            list of top level spans, each a dictionary with name, count,
+            total, self and children keys.
+        """
+        def tree(node: SpanNode) -> Dict[str, Any]:
+            count, total, self_time = self._values(node, format, rounding)
+            return {'name': node.name, 'count': count, 'total': total,
+                    'self': self_time,
+                    'children': [tree(c) for c in node.children.values()]}
+
+        spans = [tree(node) for node in self.get_root().children.values()]
+        for span in spans:
+            span['name'] = f"{self.prefix}{span['name']}"
+        return spans
+
+    def to_collapsed(self, format: str = "us") -> str:
+        """Return spans self time in the collapsed stack format used by
+        flamegraph tools: one `parent;child value` line per call path.
+
+        Args:
+            format: unit of the values. Defaults to microsecond (us).
+
+        Returns:
+            collapsed stacks.
+        """
+        lines = []
+        path: List[str] = []
+        for depth, node in self._walk(self.get_root()):
+            del path[depth:]
+            path.append(node.name)
+            value = convert_ns(node.self_time, format=format, rounding=0)
+            if value > 0:
+                lines.append(f"{self.prefix}{';'.join(path)} {value}")
+        return '\n'.join(lines)
+
+    def to_trace(self, path: str, compress: Optional[bool] = None) -> int:
+        """Write the call tree as a Chrome trace flame chart, viewable in
+        chrome://tracing or Perfetto
+
+        Args:
+            path: trace file path.
+
+            compress: gzip the trace. Defaults to None, compressing paths
+            ending in .gz.
+
+        Returns:
+            number of trace events written.
+        """
+        from .chrome_trace import write_trace
+        return write_trace(path, self, compress=compress)
+
+    def report(self, format: str = "s", rounding: int = 2) -> None:
+        "pretty print the call tree"
+        print(self._format(output_type='rounded_outline', format=format,
+                           rounding=rounding))
+
+    def to_json(self, format: str = "s", rounding: int = 2) -> str:
+        "Return the call tree as a json string"
+        import json
+        return json.dumps(self.get_tree(format=format, rounding=rounding))
+
+    def to_html(self, format: str = "s", rounding: int = 2) -> str:
+        "Return the call tree as html table"
+        return self._format(output_type='html', format=format,
+                            rounding=rounding)
+
+    def to_md(self, format: str = "s", rounding: int = 2) -> str:
+        "Return the call tree as markdown table"
+        return self._format(output_type='github', format=format,
+                            rounding=rounding)
+
+    def to_latex(self, format: str = "s", rounding: int = 2) -> str:
+        "Return the call tree as latex table"
+        return self._format(output_type='latex', format=format,
+                            rounding=rounding)
+
+    def _format(self, output_type: str, format: str, rounding: int) -> str:
+        # indent span names by depth. Not with spaces as tables strip them.
+        rows = {}
+        for depth, node in self._walk(self.get_root()):
+            if depth:
+                name = f"{'. ' * depth}{node.name}"
+            else:
+                name = f"{self.prefix}{node.name}"
+            # keep rows with the same indented name apart
+            while name in rows:
+                name += ' '
+            rows[name] = self._values(node, format, rounding)
+        headers = ['Span', 'Count', f"Total ({format})", f"Self ({format})"]
+        return format_counters(rows, headers=headers, format=output_type)
+
+    def __len__(self):
+        return sum(1 for _ in self._walk(self.get_root()))
@@ -0,0 +1,251 @@
+"""Robust statistics to compare performance measurements."""
+import math
+import random
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+
+from .optional import get_numpy
+from .sketch import percentiles
+
+AnyNum = Union[int, float]
+Serie = Sequence[AnyNum]
+
+ALTERNATIVES = ['two-sided', 'less', 'greater']
+
+# largest number of values resampled at once by the vectorized bootstrap.
+# Larger series bootstrap their median from its order statistic.
+BOOTSTRAP_CHUNK = 1 << 22
+# largest number of values resampled by the pure Python bootstrap
+PY_BOOTSTRAP_CHUNK = 1 << 16
+
+
+def median(values: Serie) -> float:
+    "Median of values"
+    if not len(values):
+        raise ValueError("median of an empty serie")
+    return percentiles(values, [50])[0]
+
+
+def mad(values: Serie) -> float:
+    "Median absolute deviation of values"
+    center = median(values)
+    return median([abs(v - center) for v in values])
+
+
+def bootstrap_ci(values: Serie, statistic: Callable[[Serie], float] = median,
+                 confidence: float = 0.95, resamples: int = 1000,
+                 seed: Optional[int] = None) -> Tuple[float, float]:
+    """Bootstrap confidence interval of a statistic
+
+    Args:
+        values: values serie.
+
+        statistic: statistic of a serie. Defaults to the median, computed
+        vectorized when NumPy is installed.
+
+        confidence: interval confidence level. Defaults to 0.95.
+
+        resamples: number of bootstrap resamples. Defaults to 1000.
+
+        seed: random seed, for reproducible intervals. Defaults to None.
+
+    Returns:
+        (low, high) interval bounds.
+    """
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+    if not len(values):
+        raise ValueError("bootstrap of an empty serie")
+    alpha = (1 - confidence) / 2 * 100
+    np = get_numpy()
+    if np is not None and statistic is median:
+        rng = np.random.default_rng(seed)
+        stats = _bootstrap_medians(np, values, resamples, rng)
+        low, high = np.percentile(stats, [alpha, 100 - alpha])
+        return float(low), float(high)
+
+    rnd = random.Random(seed)
+    if statistic is median:
+        stats = _py_bootstrap_medians(values, resamples, rnd)
+    else:
+        stats = [statistic(rnd.choices(values, k=len(values)))
+                 for _ in range(resamples)]
+    low, high = percentiles(stats, [alpha, 100 - alpha])
+    return float(low), float(high)
+
+
+def _bootstrap_medians(np: Any, values: Serie, resamples: int,
+                       rng: Any) -> Any:
+    "medians of bootstrap resamples of values, as a NumPy array"
+    arr = np.asarray(values, dtype=np.float64)
+    n = len(arr)
+    if n * resamples <= BOOTSTRAP_CHUNK:
+        samples = arr[rng.integers(0, n, (resamples, n))]
+        return np.median(samples, axis=1)
+    # a resample is the sorted values taken at n uniform ranks, its median
+    # is taken at the median rank of n uniforms which follows a
+    # Beta(m, n + 1 - m) distribution: one draw per resample.
+    arr = np.sort(arr)
+    m = (n + 1) // 2
+    ranks = rng.beta(m, n + 1 - m, resamples)
+    return arr[np.minimum((ranks * n).astype(np.int64), n - 1)]
+
+
+def _py_bootstrap_medians(values: Serie, resamples: int,
+                          rnd: random.Random) -> List[float]:
+    "medians of bootstrap resamples of values, without NumPy"
+    n = len(values)
+    if n * resamples <= PY_BOOTSTRAP_CHUNK:
+        return [median(rnd.choices(values, k=n)) for _ in range(resamples)]
+    # same order statistic draw as _bootstrap_medians. For even sizes the
+    # upper middle rank is the lowest of the n - m uniforms above the lower
+    # one: one more Beta(1, n - m) draw.
+    ordered = sorted(values)
+    m = (n + 1) // 2
+    last = n - 1
+    medians = []
+    for _ in range(resamples):
+        rank = rnd.betavariate(m, n + 1 - m)
+        low = ordered[min(int(rank * n), last)]
+        if n % 2:
+            medians.append(low)
+        else:
+            rank += (1 - rank) * rnd.betavariate(1, n - m)
+            medians.append((low + ordered[min(int(rank * n), last)]) / 2)
+    return medians
+
+
+def bootstrap_change_ci(a: Serie, b: Serie, confidence: float = 0.95,
+                        resamples: int = 1000,
+                        seed: Optional[int] = None) -> Tuple[float, float]:
+    """Bootstrap confidence interval of the relative change of the median
+    from a to b, median(b) / median(a) - 1
+
+    Args:
+        a: baseline serie.
+
+        b: new serie.
+
+        confidence: interval confidence level. Defaults to 0.95.
+
+        resamples: number of bootstrap resamples. Defaults to 1000.
+
+        seed: random seed, for reproducible intervals. Defaults to None.
+
+    Returns:
+        (low, high) interval bounds. Resamples whose baseline median is 0
+        are ignored, the bounds are nan if they all are.
+    """
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+    if not len(a) or not len(b):
+        raise ValueError("bootstrap of an empty serie")
+    alpha = (1 - confidence) / 2 * 100
+    np = get_numpy()
+    if np is not None:
+        rng = np.random.default_rng(seed)
+        base = _bootstrap_medians(np, a, resamples, rng)
+        new = _bootstrap_medians(np, b, resamples, rng)
+        valid = base != 0
+        if not valid.any():
+            return math.nan, math.nan
+        low, high = np.percentile(new[valid] / base[valid] - 1,
+                                  [alpha, 100 - alpha])
+        return float(low), float(high)
+
+    rnd = random.Random(seed)
+    base = _py_bootstrap_medians(a, resamples, rnd)
+    new = _py_bootstrap_medians(b, resamples, rnd)
+    changes = [n / m - 1 for m, n in zip(base, new) if m]
+    if not changes:
+        return math.nan, math.nan
+    low, high = percentiles(changes, [alpha, 100 - alpha])
+    return float(low), float(high)
+
+
+def mann_whitney(a: Serie, b: Serie,
+                 alternative: str = 'two-sided') -> Tuple[float, float]:
+    """Mann-Whitney U test, a rank test making no normality assumption.
+
+    The p-value uses the normal approximation with tie correction, which is
+    accurate from about 8 values per serie.
+
+    Args:
+        a: first serie.
+
+        b: second serie.
+
+        alternative: two-sided, less (a tends to be lower than b) or
+        greater (a tends to be greater than b). Defaults to two-sided.
+
+    Returns:
+        (U statistic of a, p-value)
+    """
+    if alternative not in ALTERNATIVES:
+        raise ValueError(f"Unknown alternative {alternative}. "
+                         f"Valid: {', '.join(ALTERNATIVES)}")
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        raise ValueError("Mann-Whitney test of an empty serie")
+
+    n = n1 + n2
+    rank_a, ties = _rank_sum(a, b)
+    u = rank_a - n1 * (n1 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))) if n > 1 else 0
+    if variance <= 0:
+        return u, 1.0
+    # continuity correction
+    if alternative == 'two-sided':
+        z = (abs(u - mean) - 0.5) / math.sqrt(variance)
+        p = 2 * _normal_sf(max(z, 0))
+    elif alternative == 'greater':
+        z = (u - mean - 0.5) / math.sqrt(variance)
+        p = _normal_sf(z)
+    else:
+        z = (u - mean + 0.5) / math.sqrt(variance)
+        p = 1 - _normal_sf(z)
+    return u, min(p, 1.0)
+
+
+def _rank_sum(a: Serie, b: Serie) -> Tuple[float, float]:
+    "sum of a ranks in a + b, ties getting their average rank, and ties term"
+    n = len(a) + len(b)
+    np = get_numpy()
+    if np is not None:
+        values = np.concatenate([np.asarray(a, dtype=np.float64),
+                                 np.asarray(b, dtype=np.float64)])
+        order = np.argsort(values)
+        ordered = values[order]
+        # start index and size of each group of tied values
+        new_group = np.empty(n, dtype=bool)
+        new_group[0] = True
+        new_group[1:] = ordered[1:] != ordered[:-1]
+        starts = np.flatnonzero(new_group)
+        sizes = np.diff(np.append(starts, n))
+        ranks = np.empty(n, dtype=np.float64)
+        ranks[order] = np.repeat(starts + (sizes - 1) / 2 + 1, sizes)
+        sizes = sizes.astype(np.float64)
+        return (float(ranks[:len(a)].sum()),
+                float((sizes ** 3 - sizes).sum()))
+
+    values = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    rank_a = 0.0
+    ties = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and values[j + 1][0] == values[i][0]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        size = j - i + 1
+        ties += size ** 3 - size
+        for k in range(i, j + 1):
+            if not values[k][1]:
+                rank_a += rank
+        i = j + 1
+    return rank_a, ties
+
+
+def _normal_sf(z: float) -> float:
+    "standard normal survival function"
+    return 0.5 * math.erfc(z / math.sqrt(2))
@@ -0,0 +1,235 @@
+import threading
+import weakref
+from typing import (Any, Callable, Dict, Iterable, List, Mapping, Optional,
+                    Tuple, Union)
+
+from .sketch import DEFAULT_PERCENTILES
+from .value_counters import (AnyNum, CounterFamily, ValueCounters,
+                             _increments)
+
+
+class ShardHandle():
+    """Counter handle bound to the shard of the thread which created it.
+
+    Only use it from that thread, other threads must get their own handle.
+    """
+    __slots__ = ('name', 'shard')
+
+    def __init__(self, name: str, shard: Dict[str, AnyNum]):
+        self.name = name
+        self.shard = shard
+
+    def inc(self, value: AnyNum = 1) -> AnyNum:
+        "increment the counter, returns the thread total"
+        self.shard[self.name] += value
+        return self.shard[self.name]
+
+    def dec(self, value: AnyNum = 1) -> AnyNum:
+        "decrement the counter, returns the thread total"
+        self.shard[self.name] -= value
+        return self.shard[self.name]
+
+
+class ThreadSafeValueCounters(ValueCounters):
+    """Value counters that can be updated concurrently from many threads.
+
+    Each thread increments its own shard, a plain dict only written by that
+    thread, so `inc()` and `dec()` never take a lock once the counter is
+    known by the thread. Shards are merged into the counters when they are
+    read, the shards of exited threads are then folded into a retired total
+    and dropped so thread pools recycling their workers don't grow them. `set()`, `lap()` and `reset()` take a lock as they need a
+    consistent view of every shard.
+
+    Note: the `value` of the objects in `counters` is only refreshed when
+    the collection is read, use `get()` or `get_all()` to read the merged
+    values.
+    """
+
+    def __init__(self, prefix: str = "", bounded: bool = False,
+                 relative_accuracy: float = 0.01,
+                 compact: bool = False) -> None:
+        super().__init__(prefix=prefix, bounded=bounded,
+                         relative_accuracy=relative_accuracy, compact=compact)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # (weak reference to the owner thread, shard)
+        self._shards: List[Tuple[Callable[[], Optional[threading.Thread]],
+                                 Dict[str, AnyNum]]] = []
+        # sum of the shards of exited threads
+        self._retired: Dict[str, AnyNum] = {}
+        # sum of the shards already folded into each counter value
+        self._offsets: Dict[str, AnyNum] = {}
+
+    def _shard(self) -> Dict[str, AnyNum]:
+        "return the calling thread shard"
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: Dict[str, AnyNum] = {}
+            owner = weakref.ref(threading.current_thread())
+            with self._lock:
+                self._shards.append((owner, shard))
+            self._local.shard = shard
+            return shard
+
+    def _register(self, name: str) -> None:
+        "create the counter if needed. Caller must hold the lock"
+        if name not in self.counters:
+            self._init_counter(name=name, value=0)
+            self._offsets[name] = 0
+
+    def _shards_totals(self) -> Dict[str, AnyNum]:
+        """sum all shards, folding the shards of exited threads into the
+        retired totals. Caller must hold the lock"""
+        totals = dict(self._retired)
+        shards = []
+        for owner, shard in self._shards:
+            thread = owner()
+            alive = thread is not None and thread.is_alive()
+            # copying the items is atomic, the owner thread may be writing
+            items = list(shard.items())
+            for name, value in items:
+                totals[name] = totals.get(name, 0) + value
+            if alive:
+                shards.append((owner, shard))
+            else:
+                # an exited thread no longer writes its shard
+                for name, value in items:
+                    self._retired[name] = self._retired.get(name, 0) + value
+        self._shards = shards
+        return totals
+
+    def _sync(self) -> None:
+        "fold the shards increments into the counters. Caller must hold the lock"
+        for name, total in self._shards_totals().items():
+            self.counters[name].value += total - self._offsets[name]
+            self._offsets[name] = total
+
+    def inc(self, name: str, value=1) -> AnyNum:
+        """Increment a counter
+
+        Returns:
+            the total the calling thread added to the counter. Use `get()`
+            for the counter value.
+        """
+        shard = self._shard()
+        if name in shard:
+            shard[name] += value
+        else:
+            with self._lock:
+                self._register(name)
+            shard[name] = value
+        return shard[name]
+
+    def handle(self, name: str) -> ShardHandle:  # type: ignore
+        """Return a handle incrementing a counter from the calling thread
+        without looking up the thread shard nor checking the name
+
+        Args:
+            name: name of the counter. Created if needed.
+
+        Returns:
+            handle bound to the calling thread.
+        """
+        shard = self._shard()
+        if name not in shard:
+            with self._lock:
+                self._register(name)
+            shard[name] = 0
+        return ShardHandle(name, shard)
+
+    def family(self, name: str, labels: Iterable[str],
+               max_cardinality: int = 1000) -> CounterFamily:
+        "Families children are plain counters, not safe to share"
+        raise ValueError("Counter families are not thread safe, "
+                         "use ValueCounters.family()")
+
+    def inc_many(self, names: Union[Mapping[str, AnyNum], Iterable[str]],
+                 values: Optional[Iterable[AnyNum]] = None) -> None:
+        """Increment many counters at once
+
+        Args:
+            names: mapping of counter names to increments, or counter names.
+
+            values: increments of the counter names. Defaults to 1 each.
+        """
+        shard = self._shard()
+        for name, value in _increments(names, values):
+            if name in shard:
+                shard[name] += value
+            else:
+                with self._lock:
+                    self._register(name)
+                shard[name] = value
+
+    def dec(self, name: str, value=1) -> AnyNum:
+        """Decrement a counter
+
+        Returns:
+            the total the calling thread added to the counter. Use `get()`
+            for the counter value.
+        """
+        return self.inc(name, -value)
+
+    def set(self, name: str, value=1) -> AnyNum:
+        "set a counter"
+        with self._lock:
+            self._register(name)
+            self._sync()
+            self.counters[name].set(value)
+        return value
+
+    def lap(self, name: str):
+        "record intermediate value"
+        with self._lock:
+            self._register(name)
+            self._sync()
+            self.counters[name].lap()
+
+    def ingest_values(self, name: str, values: Any) -> None:
+        "record laps from values collected elsewhere"
+        with self._lock:
+            self._register(name)
+            self._sync()
+            self.counters[name].ingest_values(values)
+
+    def reset(self, name) -> None:
+        "reset a given counter"
+        with self._lock:
+            if name not in self.counters:
+                raise ValueError(f"Unknown counter {name}")
+            self._sync()
+            self.counters[name].reset()
+
+    def reset_all(self) -> None:
+        "reset all counters"
+        with self._lock:
+            self._sync()
+            for cnt in self.counters.values():
+                cnt.reset()
+
+    def get(self, name: str, rounding: int = 2) -> AnyNum:
+        with self._lock:
+            self._sync()
+            return super().get(name, rounding=rounding)
+
+    def get_laps(self, name: str, rounding: int = 2) -> List[AnyNum]:
+        with self._lock:
+            self._sync()
+            return super().get_laps(name, rounding=rounding)
+
+    def get_percentiles(self, name: str,
+                        percentiles: List[float] = DEFAULT_PERCENTILES,
+                        rounding: int = 2) -> List[AnyNum]:
+        with self._lock:
+            return super().get_percentiles(name, percentiles,
+                                           rounding=rounding)
+
+    def get_stats(self, name: str, rounding: int = 2) -> Dict[str, AnyNum]:
+        with self._lock:
+            return super().get_stats(name, rounding=rounding)
+
+    def get_all(self, rounding: int = 2) -> Dict[str, AnyNum]:
+        with self._lock:
+            self._sync()
+            return super().get_all(rounding=rounding)
@@ -1,39 +1,114 @@
-from time import time
-from typing import List, Dict, Union
-
+import threading
+from array import array
+from functools import wraps
+from typing import (TYPE_CHECKING, Any, Callable, Iterator, List, Dict,
+                    MutableSequence, Optional, TypeVar, Union)
+
+from .analytics import convert, durations
+from .clocks import DEFAULT_CLOCK, convert_ns, get_clock
+from .eventlog import (TIME_LAP, TIME_RESET, TIME_START, TIME_STOP,
+                       TIME_TIMER)
 from .format import format_counters
+from .ingest import extend_series, iter_chunks
+from .optional import get_numpy
+from .render import TableRenderer
+from .sampling import Sampler, estimate_total
+from .sketch import QuantileSketch, DEFAULT_PERCENTILES, sketch_summary, summary
+from .sketch import percentiles as exact_percentiles
+
+if TYPE_CHECKING:
+    from .eventlog import EventLog
 AnyNum = Union[int, float]
+F = TypeVar('F', bound=Callable[..., Any])
+
+# initial min value of timers. Larger than any measurable duration.
+_NO_MIN = 1 << 63
 
 
 class TimeCounter():
     "Single time counter"
-
-    def __init__(self, name: str, prefix: str = ""):
+    __slots__ = ('prefix', 'name', 'clock', 'start_ts', 'laps', 'stop_ts',
+                 'sketch', '_last_lap_ts', 'tid')
+
+    def __init__(self, name: str, prefix: str = "",
+                 clock: str = DEFAULT_CLOCK, bounded: bool = False,
+                 relative_accuracy: float = 0.01, compact: bool = False):
+        if bounded and compact:
+            raise ValueError("A counter can't be both bounded and compact")
         self.prefix = prefix
         self.name = name
-        self.start_ts: float = time()
-        self.laps: List[float] = []
-        self.stop_ts: float = 0
+        self.clock = get_clock(clock)
+        self.start_ts: int = self.clock()
+        # native id of the starting thread, to place the counter on a trace
+        self.tid = threading.get_native_id()
+        # compact mode: laps are stored as raw int64 instead of boxed ints
+        self.laps: MutableSequence[int] = array('q') if compact else []
+        self.stop_ts: int = 0
+
+        # bounded mode: lap durations go into a constant memory sketch
+        # instead of the laps list.
+        self.sketch: Optional[QuantileSketch] = None
+        self._last_lap_ts = self.start_ts
+        if bounded:
+            self.sketch = QuantileSketch(relative_accuracy=relative_accuracy)
 
     def lap(self) -> None:
         "record lap time"
-        self.laps.append(time())
+        if self.sketch is not None:
+            ts = self.clock()
+            self.sketch.add(ts - self._last_lap_ts)
+            self._last_lap_ts = ts
+        else:
+            try:
+                self.laps.append(self.clock())
+            except BufferError:
+                # compact laps are exported through a view, stop sharing
+                # the buffer so the view stays valid.
+                self.laps = array('q', self.laps)
+                self.laps.append(self.clock())
+
+    def ingest_laps(self, timestamps: Any) -> None:
+        """Record laps from timestamps collected elsewhere
+
+        Args:
+            timestamps: laps timestamps in nanoseconds of the counter
+            clock, in increasing order. A list, array, NumPy int64 array,
+            buffer of native int64 or any iterable, which is streamed.
+        """
+        if self.sketch is not None:
+            sketch = self.sketch
+            last_ts = self._last_lap_ts
+            for chunk in iter_chunks(timestamps, 'q'):
+                for ts in chunk:
+                    sketch.add(ts - last_ts)
+                    last_ts = ts
+            self._last_lap_ts = last_ts
+        else:
+            self.laps = extend_series(self.laps, timestamps, 'q')
+            if self.laps:
+                self._last_lap_ts = self.laps[-1]
 
     def stop(self) -> None:
         "stop time counter"
-        self.stop_ts = time()
+        self.stop_ts = self.clock()
+        # account for the final lap
+        if self.sketch is not None:
+            self.sketch.add(self.stop_ts - self._last_lap_ts)
+            self._last_lap_ts = self.stop_ts
 
     def reset(self):
         "Reset counter"
-        self.start_ts = time()
+        self.start_ts = self.clock()
+        self._last_lap_ts = self.start_ts
         self.stop_ts = 0
 
-    def get(self, format: str ='s', rounding: int = 2) -> float:
+    def get(self, format: str ='s', rounding: int = 2) -> AnyNum:
         """Report total elapsed time
 
         Args:
             format: reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -43,18 +118,29 @@ class TimeCounter():
         """
 
         # compute current elapsed if stop not available
-        stop_ts = self.stop_ts if self.stop_ts else time()
-
+        stop_ts = self.stop_ts if self.stop_ts else self.clock()
 
         ts = stop_ts - self.start_ts
         return self._convert_time(ts, format=format, rounding=rounding)
 
-    def get_laps(self, format: str, rounding: int) -> List[float]:
+    def get_count(self) -> int:
+        """Report the number of laps
+
+        Returns:
+            number of completed laps, the final lap is counted once the
+            counter is stopped.
+        """
+        if self.sketch is not None:
+            return self.sketch.count
+        return len(self.laps) + (1 if self.stop_ts else 0)
+
+    def get_laps(self, format: str, rounding: int) -> List[AnyNum]:
         """Report laps time as a timeserie
 
         Args:
             format: reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -62,43 +148,86 @@ class TimeCounter():
             laps timeserie.
 
         """
+        if self.sketch is not None:
+            raise ValueError(f"Counter {self.name} is bounded and doesn't "
+                             "keep its laps timeserie")
 
-        serie: List[float] = []
+        return convert(self._laps_durations(), format=format,
+                       rounding=rounding)
 
-        # go through the laps
-        prev_ts = self.start_ts
-        for lap in self.laps:
-            ts = lap - prev_ts
-            ts = self._convert_time(ts, format=format, rounding=rounding)
-            serie.append(ts)
-            prev_ts = lap
+    def _laps_durations(self) -> List[int]:
+        "laps durations in nanoseconds, including the final lap"
+        # compute current elapsed if stop not available
+        stop_ts = self.stop_ts if self.stop_ts else self.clock()
+        return durations(self.start_ts, self.laps, stop_ts)
 
+    def get_laps_view(self) -> Any:
+        """Return the raw laps timestamps of a compact counter without copy
 
-        # final lap
-        # compute current elapsed if stop not available
-        stop_ts = self.stop_ts if self.stop_ts else time()
-        ts = stop_ts - prev_ts
-        ts = self._convert_time(ts, format=format, rounding=rounding)
-        serie.append(prev_ts - self.stop_ts)
+        Returns:
+            laps timestamps in nanoseconds as a NumPy int64 array if NumPy
+            is installed, as a memoryview otherwise. The view shares the
+            counter memory and must not be modified.
+        """
+        if not isinstance(self.laps, array):
+            raise ValueError(f"Counter {self.name} is not compact")
+        np = get_numpy()
+        if np is not None:
+            return np.frombuffer(self.laps, dtype=np.int64)
+        return memoryview(self.laps)
+
+    def get_percentiles(self, percentiles: List[float], format: str = 's',
+                        rounding: int = 2) -> List[AnyNum]:
+        """Report laps time percentiles
+
+        Args:
+            percentiles: percentiles to compute expressed between 0 and 100.
 
-        return serie
+            format: reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            laps percentiles. Estimated within the sketch relative accuracy
+            for bounded counters.
+        """
+        if self.sketch is not None:
+            values = self.sketch.percentiles(percentiles)
+        else:
+            values = exact_percentiles(self._laps_durations(), percentiles)
+        return [self._convert_time(v, format=format, rounding=rounding)
+                for v in values]
 
+    def get_stats(self, format: str = 's',
+                  rounding: int = 2) -> Dict[str, AnyNum]:
+        """Report laps time count, mean, stddev, min and max
 
-    def _convert_time(self, ts: float, format: str, rounding: int) -> AnyNum:
-        "convert time to requested format"
-        if format not in ['m', 's', 'ms']:
-            raise ValueError("Unsupported format. Valid: m , s and ms")
+        Args:
+            format: reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
-        if format == 'm':
-            ts /= 60
-        if format == 'ms':
-            ts *= 1000
+            rounding: Time rounding. Defaults to 2.
 
-        # if rounding to 0 then we want the int
-        if not rounding:
-            return int(ts)
+        Returns:
+            laps statistics.
+        """
+        if self.sketch is not None:
+            stats = sketch_summary(self.sketch)
         else:
-            return round(ts, rounding)
+            stats = summary(self._laps_durations())
+        for k, v in stats.items():
+            if k != 'count':
+                stats[k] = self._convert_time(v, format=format,
+                                              rounding=rounding)
+        return stats
+
+    def _convert_time(self, ts: AnyNum, format: str,
+                      rounding: int) -> AnyNum:
+        "convert nanoseconds time to requested format"
+        return convert_ns(ts, format=format, rounding=rounding)
 
     def __str__(self) -> str:
         if self.prefix:
@@ -113,22 +242,641 @@ class TimeCounter():
             return self.name
 
 
+class Timer():
+    """Persistent accumulator for a repeatedly timed region.
+
+    A timer is used as a context manager and adds each enter/exit duration
+    into its count, total, min and max. The same object is reused on every
+    entry so timing a hot region doesn't allocate a new counter per call.
+
+    Note: a timer is not reentrant, nesting the same timer within itself or
+    using it concurrently from multiple threads overwrites its start time.
+    """
+    __slots__ = ('name', 'prefix', 'clock', 'count', 'total', 'min', 'max',
+                 '_start')
+
+    def __init__(self, name: str, prefix: str = "",
+                 clock: str = DEFAULT_CLOCK):
+        self.name = name
+        self.prefix = prefix
+        self.clock = get_clock(clock)
+        self.count = 0
+        self.total = 0
+        self.min = _NO_MIN
+        self.max = 0
+        self._start = 0
+
+    def __enter__(self) -> 'Timer':
+        self._start = self.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = self.clock() - self._start
+        self.count += 1
+        self.total += elapsed
+        if elapsed < self.min:
+            self.min = elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def add(self, elapsed: int) -> None:
+        "record a duration expressed in nanoseconds"
+        self.count += 1
+        self.total += elapsed
+        if elapsed < self.min:
+            self.min = elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def reset(self) -> None:
+        "Reset timer"
+        self.count = 0
+        self.total = 0
+        self.min = _NO_MIN
+        self.max = 0
+
+    def get(self, format: str = 's', rounding: int = 2) -> AnyNum:
+        """Report total time spent in the timed region
+
+        Args:
+            format: reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            total time.
+        """
+        return convert_ns(self.total, format=format, rounding=rounding)
+
+    def get_stats(self, format: str = 's',
+                  rounding: int = 2) -> Dict[str, AnyNum]:
+        """Report timer count, total, mean, min and max
+
+        Args:
+            format: reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            timer statistics.
+        """
+        min_ts = self.min if self.count else 0
+        mean = self.total // self.count if self.count else 0
+        return {
+            "count": self.count,
+            "total": convert_ns(self.total, format=format, rounding=rounding),
+            "mean": convert_ns(mean, format=format, rounding=rounding),
+            "min": convert_ns(min_ts, format=format, rounding=rounding),
+            "max": convert_ns(self.max, format=format, rounding=rounding)
+        }
+
+    def __str__(self) -> str:
+        return f"{self.prefix}{self.name}"
+
+    def __repr__(self) -> str:
+        return f"{self.prefix}{self.name}"
+
+
+class SampledTimeCounter(TimeCounter):
+    """Time counter timing only a sample of its laps.
+
+    Skipped laps only cost a countdown, timed laps record their duration
+    instead of a timestamp so `laps` holds the sampled laps durations. The
+    counter total and laps count stay exact, laps percentiles and
+    statistics are computed from the sample.
+    """
+    __slots__ = ('sampler', '_armed_ts')
+
+    def __init__(self, name: str, sampler: Sampler, prefix: str = "",
+                 clock: str = DEFAULT_CLOCK, bounded: bool = False,
+                 relative_accuracy: float = 0.01, compact: bool = False):
+        super().__init__(name=name, prefix=prefix, clock=clock,
+                         bounded=bounded, relative_accuracy=relative_accuracy,
+                         compact=compact)
+        self.sampler = sampler
+        # timestamp of the lap being timed, 0 when the lap is skipped
+        self._armed_ts = self.start_ts
+        sampler.countdown = sampler.skip()
+
+    def lap(self) -> None:
+        "record lap time if the lap is sampled"
+        sampler = self.sampler
+        sampler.count += 1
+        ts = 0
+        if self._armed_ts:
+            ts = self.clock()
+            self._record(ts - self._armed_ts)
+            self._armed_ts = 0
+        sampler.countdown -= 1
+        if not sampler.countdown:
+            sampler.countdown = sampler.skip()
+            self._armed_ts = ts or self.clock()
+
+    def stop(self) -> None:
+        "stop time counter"
+        self.stop_ts = self.clock()
+        # account for the final lap
+        self.sampler.count += 1
+        if self._armed_ts:
+            self._record(self.stop_ts - self._armed_ts)
+            self._armed_ts = 0
+
+    def ingest_laps(self, timestamps: Any) -> None:
+        "Sampled counters only keep durations of the laps they time"
+        raise ValueError(f"Counter {self.name} is sampled, laps can't be "
+                         "ingested")
+
+    def _record(self, duration: int) -> None:
+        self.sampler.add(duration)
+        if self.sketch is not None:
+            self.sketch.add(duration)
+            return
+        try:
+            self.laps.append(duration)
+        except BufferError:
+            self.laps = array('q', self.laps)
+            self.laps.append(duration)
+
+    def reset(self) -> None:
+        "Reset counter, its sampled laps and its sampler counts"
+        super().reset()
+        # laps are sampled durations of the previous run, unlike timestamps
+        # they can't be told apart from the new ones
+        self.laps = array('q') if isinstance(self.laps, array) else []
+        if self.sketch is not None:
+            self.sketch = QuantileSketch(
+                relative_accuracy=self.sketch.relative_accuracy,
+                max_buckets=self.sketch.max_buckets)
+        self.sampler.reset()
+        self._armed_ts = self.start_ts
+        self.sampler.countdown = self.sampler.skip()
+
+    def get_count(self) -> int:
+        "Report the number of laps, timed or not"
+        return self.sampler.count
+
+    def _laps_durations(self) -> List[int]:
+        "sampled laps durations in nanoseconds"
+        return list(self.laps)
+
+    def get_estimate(self, format: str = 's',
+                     rounding: int = 2) -> Dict[str, AnyNum]:
+        """Report the laps count, total and sampling rate
+
+        Args:
+            format: reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            count, sampled, rate, total and error. The total of a laps
+            counter is measured, so its error is always 0.
+        """
+        return {
+            "count": self.sampler.count,
+            "sampled": self.sampler.sampled,
+            "rate": self.sampler.rate,
+            "total": self.get(format=format, rounding=rounding),
+            "error": 0
+        }
+
+
+class SampledTimer(Timer):
+    """Timer timing only a sample of the region entries.
+
+    Skipped entries only cost a countdown. The count is exact, the total is
+    extrapolated from the timed entries with a 95% confidence error bound.
+    """
+    __slots__ = ('sampler',)
+
+    def __init__(self, name: str, sampler: Sampler, prefix: str = "",
+                 clock: str = DEFAULT_CLOCK):
+        super().__init__(name=name, prefix=prefix, clock=clock)
+        self.sampler = sampler
+
+    def __enter__(self) -> 'SampledTimer':
+        sampler = self.sampler
+        sampler.countdown -= 1
+        if not sampler.countdown:
+            sampler.countdown = sampler.skip()
+            self._start = self.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.count += 1
+        if self._start:
+            elapsed = self.clock() - self._start
+            self._start = 0
+            self.sampler.add(elapsed)
+
+    def add(self, elapsed: int) -> None:
+        "record a duration expressed in nanoseconds"
+        self.count += 1
+        self.sampler.add(elapsed)
+
+    def reset(self) -> None:
+        "Reset timer"
+        super().reset()
+        self.sampler.reset()
+
+    def _estimate(self):
+        sampler = self.sampler
+        return estimate_total(self.count, sampler.sampled, sampler.total,
+                              sampler.total_sq)
+
+    def get(self, format: str = 's', rounding: int = 2) -> AnyNum:
+        """Report the estimated total time spent in the timed region
+
+        Args:
+            format: reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            estimated total time.
+        """
+        return convert_ns(self._estimate()[0], format=format,
+                          rounding=rounding)
+
+    def get_stats(self, format: str = 's',
+                  rounding: int = 2) -> Dict[str, AnyNum]:
+        """Report timer count, estimated total, mean, min and max
+
+        Args:
+            format: reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            timer statistics. mean, min and max are the timed entries ones.
+        """
+        sampler = self.sampler
+        total, _ = self._estimate()
+        min_ts = sampler.min if sampler.sampled else 0
+        mean = sampler.total / sampler.sampled if sampler.sampled else 0
+        return {
+            "count": self.count,
+            "total": convert_ns(total, format=format, rounding=rounding),
+            "mean": convert_ns(mean, format=format, rounding=rounding),
+            "min": convert_ns(min_ts, format=format, rounding=rounding),
+            "max": convert_ns(sampler.max, format=format, rounding=rounding)
+        }
+
+    def get_estimate(self, format: str = 's',
+                     rounding: int = 2) -> Dict[str, AnyNum]:
+        """Report the entries count, estimated total and its error bound
+
+        Args:
+            format: reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            count, sampled, rate, total and error, the half width of the
+            total 95% confidence interval.
+        """
+        total, error = self._estimate()
+        return {
+            "count": self.count,
+            "sampled": self.sampler.sampled,
+            "rate": self.sampler.rate,
+            "total": convert_ns(total, format=format, rounding=rounding),
+            "error": convert_ns(error, format=format, rounding=rounding)
+        }
+
+
+class LoggedTimeCounter(TimeCounter):
+    """Time counter recording its laps, stop and reset to an event log.
+
+    Used by the collections with an event log, so operations on handles
+    and ingested laps are recorded like the collection ones.
+    """
+    __slots__ = ('event_log',)
+
+    def __init__(self, name: str, event_log: 'EventLog', prefix: str = "",
+                 clock: str = DEFAULT_CLOCK, bounded: bool = False,
+                 relative_accuracy: float = 0.01, compact: bool = False):
+        super().__init__(name=name, prefix=prefix, clock=clock,
+                         bounded=bounded, relative_accuracy=relative_accuracy,
+                         compact=compact)
+        self.event_log = event_log
+
+    def lap(self) -> None:
+        "record lap time"
+        super().lap()
+        # the lap timestamp, as recorded by the counter
+        ts = self._last_lap_ts if self.sketch is not None else self.laps[-1]
+        self.event_log.record(TIME_LAP, self.name, ts)
+
+    def ingest_laps(self, timestamps: Any) -> None:
+        "Record laps from timestamps collected elsewhere"
+        super().ingest_laps(self._logged(timestamps))
+
+    def _logged(self, timestamps: Any) -> Iterator[int]:
+        "stream the timestamps, recording each of them as a lap"
+        record = self.event_log.record
+        name = self.name
+        for chunk in iter_chunks(timestamps, 'q'):
+            for ts in chunk:
+                record(TIME_LAP, name, ts)
+                yield ts
+
+    def stop(self) -> None:
+        "stop time counter"
+        super().stop()
+        self.event_log.record(TIME_STOP, self.name, self.stop_ts)
+
+    def reset(self) -> None:
+        "Reset counter"
+        super().reset()
+        self.event_log.record(TIME_RESET, self.name, self.start_ts)
+
+
+class LoggedTimer(Timer):
+    """Timer recording each entry duration to an event log, timestamped at
+    its exit."""
+    __slots__ = ('event_log',)
+
+    def __init__(self, name: str, event_log: 'EventLog', prefix: str = "",
+                 clock: str = DEFAULT_CLOCK):
+        super().__init__(name=name, prefix=prefix, clock=clock)
+        self.event_log = event_log
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        ts = self.clock()
+        elapsed = ts - self._start
+        Timer.add(self, elapsed)
+        self.event_log.record(TIME_TIMER, self.name, ts, elapsed)
+
+    def add(self, elapsed: int) -> None:
+        "record a duration expressed in nanoseconds"
+        super().add(elapsed)
+        self.event_log.record(TIME_TIMER, self.name, self.clock(), elapsed)
+
+    def reset(self) -> None:
+        "Reset timer"
+        super().reset()
+        self.event_log.record(TIME_RESET, self.name, self.clock())
+
+
 class TimeCounters():
-    def __init__(self, prefix: str = "") -> None:
+    def __init__(self, prefix: str = "", clock: str = DEFAULT_CLOCK,
+                 bounded: bool = False, relative_accuracy: float = 0.01,
+                 compact: bool = False, sample_every: Optional[int] = None,
+                 sample_rate: Optional[float] = None,
+                 overhead_budget: Optional[float] = None,
+                 event_log: Optional['EventLog'] = None) -> None:
+        """Collection of time counters
+
+        Args:
+            prefix: prefix prepended to counter names when reporting.
+
+            clock: clock used to timestamp counters. One of perf_counter,
+            monotonic, process_time or thread_time. Defaults to perf_counter.
+
+            bounded: keep laps durations in a constant memory quantile sketch
+            instead of an ever growing list. Laps timeseries are then not
+            available but percentiles and statistics are. Defaults to False.
+
+            relative_accuracy: percentiles relative accuracy of bounded
+            counters. Defaults to 0.01.
+
+            compact: store laps timestamps in an int64 array instead of a
+            list of ints, using 8 bytes per lap. Defaults to False.
+
+            sample_every: only time one lap, or timer entry, every
+            `sample_every`. Timers totals are then extrapolated. Defaults to
+            None, everything is timed.
+
+            sample_rate: only time laps, or timer entries, with this
+            probability. Defaults to None, everything is timed.
+
+            overhead_budget: maximum instrumentation overhead as a fraction
+            of the measured time, e.g. 0.01 for 1%. The sampling rate of
+            each counter is lowered when its timing overhead exceeds the
+            budget. Starts by timing everything unless a sampling is set.
+            Defaults to None.
+
+            event_log: log recording every start, lap, stop and reset with
+            its timestamp, including those of handles and ingested laps,
+            and every timer entry duration. Defaults to None.
+        """
+        if bounded and compact:
+            raise ValueError("Counters can't be both bounded and compact")
+        if overhead_budget is not None and sample_rate is None:
+            sample_every = sample_every or 1
+        if event_log is not None and (sample_every or sample_rate):
+            raise ValueError("Sampled counters events can't be recorded")
+        self.event_log = event_log
+        self.sample_every = sample_every
+        self.sample_rate = sample_rate
+        self.overhead_budget = overhead_budget
+        self.sampled = sample_every is not None or sample_rate is not None
         self.prefix = prefix
+        self.clock = clock
+        self.bounded = bounded
+        self.relative_accuracy = relative_accuracy
+        self.compact = compact
+        # validate early so a typo doesn't surface on first start()
+        get_clock(clock)
+        if self.sampled:
+            self._sampler()
         self.counters: Dict[str, TimeCounter] = {}
+        self.timers: Dict[str, Timer] = {}
+        # reuses the unchanged rows between reports
+        self._renderer = TableRenderer()
+
+    def _sampler(self) -> Sampler:
+        "return a new sampler, each counter samples independently"
+        return Sampler(every=self.sample_every, rate=self.sample_rate,
+                       overhead_budget=self.overhead_budget,
+                       clock=get_clock(self.clock))
 
     def start(self, name: str) -> None:
         "start a counter"
-        if name in self.counters:
+        self._start(name)
+
+    def _start(self, name: str, start_ts: Optional[int] = None) -> TimeCounter:
+        "start a counter, at start_ts if set"
+        if name in self.counters or name in self.timers:
             raise ValueError(f"Counter {name} already exist")
-        self.counters[name] = TimeCounter(name=name, prefix=self.prefix)
+        cnt: TimeCounter
+        if self.sampled:
+            cnt = SampledTimeCounter(
+                name=name, sampler=self._sampler(), prefix=self.prefix,
+                clock=self.clock, bounded=self.bounded,
+                relative_accuracy=self.relative_accuracy,
+                compact=self.compact)
+        elif self.event_log is not None:
+            cnt = LoggedTimeCounter(
+                name=name, event_log=self.event_log, prefix=self.prefix,
+                clock=self.clock, bounded=self.bounded,
+                relative_accuracy=self.relative_accuracy,
+                compact=self.compact)
+        else:
+            cnt = TimeCounter(
+                name=name, prefix=self.prefix, clock=self.clock,
+                bounded=self.bounded,
+                relative_accuracy=self.relative_accuracy,
+                compact=self.compact)
+        if start_ts is not None:
+            cnt.start_ts = cnt._last_lap_ts = start_ts
+        self.counters[name] = cnt
+        if self.event_log is not None:
+            self.event_log.record(TIME_START, name, cnt.start_ts)
+        return cnt
+
+    def time(self, name: str) -> Timer:
+        """Return the timer used to time a region with a `with` statement
+
+        Repeated entries accumulate into the same timer, so unlike
+        `start()` a region can be timed as many times as needed:
+
+            with cnts.time("db"):
+                query()
+
+        Args:
+            name: name of the timer. Created on first use.
+
+        Returns:
+            the timer context manager.
+        """
+        timer = self.timers.get(name)
+        if timer is None:
+            if name in self.counters:
+                raise ValueError(f"Counter {name} already exist")
+            if self.sampled:
+                timer = SampledTimer(name=name, sampler=self._sampler(),
+                                     prefix=self.prefix, clock=self.clock)
+            elif self.event_log is not None:
+                timer = LoggedTimer(name=name, event_log=self.event_log,
+                                    prefix=self.prefix, clock=self.clock)
+            else:
+                timer = Timer(name=name, prefix=self.prefix, clock=self.clock)
+            self.timers[name] = timer
+        return timer
+
+    def timed(self, name: Optional[str] = None) -> Callable[[F], F]:
+        """Decorator timing every call of a function
+
+        Args:
+            name: name of the timer. Defaults to the function qualified name.
+
+        Returns:
+            decorator.
+        """
+        def decorator(func: F) -> F:
+            timer = self.time(name or func.__qualname__)
+            clock = timer.clock
+
+            if isinstance(timer, (SampledTimer, LoggedTimer)):
+                @wraps(func)
+                def sampled_wrapper(*args, **kwargs):
+                    with timer:
+                        return func(*args, **kwargs)
+                return sampled_wrapper  # type: ignore
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = clock()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    # Timer.add() inlined, saves a call per function call
+                    elapsed = clock() - start
+                    timer.count += 1
+                    timer.total += elapsed
+                    if elapsed < timer.min:
+                        timer.min = elapsed
+                    if elapsed > timer.max:
+                        timer.max = elapsed
+            return wrapper  # type: ignore
+
+        return decorator
+
+    def get_timer(self, name: str, format: str = "s",
+                  rounding: int = 2) -> Dict[str, AnyNum]:
+        """Return a timer count, total, mean, min and max
+
+        Args:
+            name: name of the timer.
+
+            format: time reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            timer statistics in the requested format.
+        """
+        if name not in self.timers:
+            raise ValueError(f"Unknown timer {name}")
+        return self.timers[name].get_stats(format=format, rounding=rounding)
+
+    def get_estimate(self, name: str, format: str = "s",
+                     rounding: int = 2) -> Dict[str, AnyNum]:
+        """Return a sampled counter or timer count and estimated total
+
+        Args:
+            name: name of the counter or timer.
+
+            format: time reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            count, sampled, rate, total and error, the half width of the
+            total 95% confidence interval.
+        """
+        cnt: Any = self.timers.get(name) or self.counters.get(name)
+        if cnt is None:
+            raise ValueError(f"Unknown counter {name}")
+        if not isinstance(cnt, (SampledTimeCounter, SampledTimer)):
+            raise ValueError(f"Counter {name} is not sampled")
+        return cnt.get_estimate(format=format, rounding=rounding)
+
+    def handle(self, name: str) -> TimeCounter:
+        """Return a started counter to lap or stop it without looking up
+        its name
+
+            loop = cnts.handle("loop")
+            for item in items:
+                process(item)
+                loop.lap()
+            loop.stop()
+
+        Args:
+            name: name of the counter.
+
+        Returns:
+            the counter.
+        """
+        cnt = self.counters.get(name)
+        if cnt is None:
+            raise ValueError(f"Unknown counter {name}")
+        return cnt
 
     def stop(self, name: str) -> None:
         "stop a counter"
-        if name not in self.counters:
+        cnt = self.counters.get(name)
+        if cnt is None:
             raise ValueError(f"Unknown counter {name}")
-        return self.counters[name].stop()
+        cnt.stop()
 
 
     def stop_all(self) -> None:
@@ -138,13 +886,54 @@ class TimeCounters():
 
     def lap(self, name: str) -> None:
         "add lap"
-        if name not in self.counters:
+        cnt = self.counters.get(name)
+        if cnt is None:
             raise ValueError(f"Unknown counter {name}")
-        return self.counters[name].lap()
+        cnt.lap()
 
+    def ingest_laps(self, name: str, timestamps: Any,
+                    start_ts: Optional[int] = None,
+                    stop_ts: Optional[int] = None) -> None:
+        """Record laps from timestamps collected elsewhere, e.g. by a C
+        extension or read from a log
+
+            cnts.ingest_laps("io", timestamps, start_ts=t0, stop_ts=t1)
+
+        Buffers of native int64, such as NumPy int64 arrays, are appended
+        to compact counters with a single copy. Other inputs are streamed
+        by chunks, a generator is never materialized.
+
+        Args:
+            name: name of the counter. Started if needed.
+
+            timestamps: laps timestamps in nanoseconds of the collection
+            clock, in increasing order. A list, array, NumPy array, buffer
+            of native int64 or any iterable.
+
+            start_ts: start timestamp of the counter if it is created.
+            Defaults to None, the current time.
+
+            stop_ts: stop the counter at this timestamp. Defaults to None,
+            the counter keeps running.
+        """
+        if self.sampled:
+            raise ValueError("Sampled counters laps can't be ingested")
+        cnt = self.counters.get(name)
+        if cnt is None:
+            cnt = self._start(name, start_ts)
+        cnt.ingest_laps(timestamps)
+        if stop_ts is not None:
+            cnt.stop_ts = stop_ts
+            if cnt.sketch is not None:
+                cnt.sketch.add(stop_ts - cnt._last_lap_ts)
+                cnt._last_lap_ts = stop_ts
+            if self.event_log is not None:
+                self.event_log.record(TIME_STOP, name, stop_ts)
 
     def reset(self, name: str) -> None:
         "reset a given counter"
+        if name in self.timers:
+            return self.timers[name].reset()
         if name not in self.counters:
             raise ValueError(f"Unknown counter {name}")
         self.counters[name].reset()
@@ -154,16 +943,19 @@ class TimeCounters():
         "reset all counters"
         for cnt in self.counters.values():
             cnt.reset()
+        for timer in self.timers.values():
+            timer.reset()
 
 
-    def get(self, name: str, format: str = "s", rounding : int = 2) -> float:
+    def get(self, name: str, format: str = "s", rounding : int = 2) -> AnyNum:
         """Return a counter total time
 
         Args:
             name: name of the counter.
 
             format: time reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -171,20 +963,23 @@ class TimeCounters():
             total time in requested format.
 
         """
+        if name in self.timers:
+            return self.timers[name].get(format=format, rounding=rounding)
         if name not in self.counters:
             raise ValueError(f"Unknown counter {name}")
         return self.counters[name].get(format=format, rounding=rounding)
 
 
     def get_laps(self, name: str, format: str = "s",
-                rounding : int = 2) -> List[float]:
+                rounding : int = 2) -> List[AnyNum]:
         """Return a counter laps timeserie.
 
         Args:
             name: name of the counter.
 
             format: time reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -196,13 +991,77 @@ class TimeCounters():
             raise ValueError(f"Unknown counter {name}")
         return self.counters[name].get_laps(format=format, rounding=rounding)
 
-    def get_all(self, format: str = "s", rounding : int = 2) -> Dict[str, float]:
+    def get_laps_view(self, name: str) -> Any:
+        """Return a compact counter raw laps timestamps without copy.
+
+        Args:
+            name: name of the counter.
+
+        Returns:
+            laps timestamps in nanoseconds as a NumPy int64 array if NumPy
+            is installed, as a memoryview otherwise.
+
+        """
+        if name not in self.counters:
+            raise ValueError(f"Unknown counter {name}")
+        return self.counters[name].get_laps_view()
+
+    def get_percentiles(self, name: str,
+                        percentiles: List[float] = DEFAULT_PERCENTILES,
+                        format: str = "s",
+                        rounding: int = 2) -> List[AnyNum]:
+        """Return a counter laps percentiles.
+
+        Args:
+            name: name of the counter.
+
+            percentiles: percentiles expressed between 0 and 100.
+            Defaults to [50, 90, 99, 99.9].
+
+            format: time reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            laps percentiles in the request format.
+
+        """
+        if name not in self.counters:
+            raise ValueError(f"Unknown counter {name}")
+        return self.counters[name].get_percentiles(percentiles, format=format,
+                                                   rounding=rounding)
+
+    def get_stats(self, name: str, format: str = "s",
+                  rounding: int = 2) -> Dict[str, AnyNum]:
+        """Return a counter laps count, mean, stddev, min and max.
+
+        Args:
+            name: name of the counter.
+
+            format: time reporting format. m for minute, s for second,
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
+
+            rounding: Time rounding. Defaults to 2.
+
+        Returns:
+            laps statistics in the request format.
+
+        """
+        if name not in self.counters:
+            raise ValueError(f"Unknown counter {name}")
+        return self.counters[name].get_stats(format=format, rounding=rounding)
+
+    def get_all(self, format: str = "s", rounding : int = 2) -> Dict[str, AnyNum]:
         """Return all counters elapsed times as a dictionary
 
         Args:
 
             format: time reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -211,8 +1070,13 @@ class TimeCounters():
 
         """
         cnts = {}
-        for name, cnt in self.counters.items():
+        # iterate over a copy so counters can be read from another thread
+        # while new ones are created.
+        for name, cnt in list(self.counters.items()):
             cnts[f'{self.prefix}{name}'] = cnt.get(format=format, rounding=rounding)
+        for name, timer in list(self.timers.items()):
+            cnts[f'{self.prefix}{name}'] = timer.get(format=format,
+                                                     rounding=rounding)
         return cnts
 
 
@@ -236,7 +1100,8 @@ class TimeCounters():
         Args:
 
             format: time reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -254,7 +1119,8 @@ class TimeCounters():
         Args:
             name: name of the counter.
             format: time reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -265,6 +1131,22 @@ class TimeCounters():
         return self._format_laps(name=name, output_type='json',
                                  format=format, rounding=rounding)
 
+    def to_trace(self, path: str, compress: Optional[bool] = None) -> int:
+        """Write counters and their laps as a Chrome trace, viewable in
+        chrome://tracing or Perfetto
+
+        Args:
+            path: trace file path.
+
+            compress: gzip the trace. Defaults to None, compressing paths
+            ending in .gz.
+
+        Returns:
+            number of trace events written.
+        """
+        from .chrome_trace import write_trace
+        return write_trace(path, self, compress=compress)
+
 
     def to_html(self, format: str = "s",
                 rounding : int = 2) -> str:
@@ -273,7 +1155,8 @@ class TimeCounters():
         Args:
 
             format: time reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -291,7 +1174,8 @@ class TimeCounters():
         Args:
             name: name of the counter.
             format: time reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -311,7 +1195,8 @@ class TimeCounters():
         Args:
 
             format: time reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -329,7 +1214,8 @@ class TimeCounters():
         Args:
             name: name of the counter.
             format: time reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -347,7 +1233,8 @@ class TimeCounters():
         Args:
 
             format: time reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -366,7 +1253,8 @@ class TimeCounters():
         Args:
             name: name of the counter.
             format: time reporting format. m for minute, s for second,
-            ms for millisecond. Defaults to second (s).
+            ms for millisecond, us for microsecond,
+            ns for nanosecond. Defaults to second (s).
 
             rounding: Time rounding. Defaults to 2.
 
@@ -380,7 +1268,7 @@ class TimeCounters():
     def _format(self, output_type: str, format: str, rounding: int) -> str:
         cnts = self.get_all(format=format, rounding=rounding)
         return format_counters(cnts, headers=['Name', f"Time ({format})"],
-                               format=output_type)
+                               format=output_type, renderer=self._renderer)
 
 
 
@@ -399,5 +1287,5 @@ class TimeCounters():
 
 
     def __len__(self):
-        return len(self.counters)
+        return len(self.counters) + len(self.timers)
 
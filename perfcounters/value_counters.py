@@ -1,19 +1,91 @@
+from array import array
+from .analytics import round_values
+from .eventlog import VALUE_INC, VALUE_LAP, VALUE_RESET, VALUE_SET
 from .format import format_counters
-from typing import List, Union, Dict
+from .ingest import extend_series, iter_chunks
+from .optional import get_numpy
+from .render import TableRenderer
+from .sketch import QuantileSketch, DEFAULT_PERCENTILES, sketch_summary, summary
+from .sketch import percentiles as exact_percentiles
+from typing import (TYPE_CHECKING, Any, Callable, Iterable, List, Mapping,
+                    MutableSequence, Optional, Tuple, Union, Dict)
+
+if TYPE_CHECKING:
+    from .eventlog import EventLog
 AnyNum = Union[int, float]
 
+
+def _increments(names: Union[Mapping[str, AnyNum], Iterable[str]],
+                values: Optional[Iterable[AnyNum]]
+                ) -> Iterable[Tuple[str, AnyNum]]:
+    "pair counter names with their increments"
+    # checking dict first avoids the slow abstract class check
+    if isinstance(names, dict) or isinstance(names, Mapping):
+        if values is not None:
+            raise ValueError("values must not be set when names is a mapping")
+        return names.items()
+    if values is None:
+        return ((name, 1) for name in names)
+    names = list(names)
+    values = list(values)
+    if len(names) != len(values):
+        raise ValueError("names and values must have the same length")
+    return zip(names, values)
+
+
 class ValueCounter():
     "Single value counter"
+    __slots__ = ('name', 'prefix', 'value', 'laps', 'sketch')
 
-    def __init__(self, name: str, value: AnyNum = 0, prefix: str = ""):
+    def __init__(self, name: str, value: AnyNum = 0, prefix: str = "",
+                 bounded: bool = False, relative_accuracy: float = 0.01,
+                 compact: bool = False):
+        if bounded and compact:
+            raise ValueError("A counter can't be both bounded and compact")
         self.name = name
         self.prefix = prefix
         self.value: AnyNum = value
-        self.laps: List[AnyNum] = []
+        # compact mode: laps are stored as raw doubles instead of boxed
+        # numbers
+        self.laps: MutableSequence[AnyNum] = array('d') if compact else []
+
+        # bounded mode: laps values go into a constant memory sketch
+        # instead of the laps list.
+        self.sketch: Optional[QuantileSketch] = None
+        if bounded:
+            self.sketch = QuantileSketch(relative_accuracy=relative_accuracy)
 
     def lap(self) -> None:
         "record intermediate value"
-        self.laps.append(self.value)
+        if self.sketch is not None:
+            self.sketch.add(self.value)
+        else:
+            try:
+                self.laps.append(self.value)
+            except BufferError:
+                # compact laps are exported through a view, stop sharing
+                # the buffer so the view stays valid.
+                self.laps = array('d', self.laps)
+                self.laps.append(self.value)
+
+    def ingest_values(self, values: Any) -> None:
+        """Record laps from values collected elsewhere, as if each value
+        was set then lapped. The counter value is set to the last one.
+
+        Args:
+            values: laps values. A list, array, NumPy array, buffer of
+            native float64 or any iterable, which is streamed.
+        """
+        if self.sketch is not None:
+            sketch = self.sketch
+            for chunk in iter_chunks(values, 'd'):
+                for value in chunk:
+                    sketch.add(value)
+                    self.value = value
+        else:
+            self.laps = extend_series(self.laps, values, 'd')
+            if self.laps:
+                self.value = self.laps[-1]
 
     def inc(self, value: AnyNum = 1) -> AnyNum:
         "increment counter by X"
@@ -61,22 +133,70 @@ class ValueCounter():
             laps timeserie.
 
         """
+        if self.sketch is not None:
+            raise ValueError(f"Counter {self.name} is bounded and doesn't "
+                             "keep its laps timeserie")
 
-        serie: List[AnyNum] = []
-
-        for val in self.laps:
-            # round if need be
-            val = round(val, rounding) if isinstance(val, float) else val
-            serie.append(val)
+        serie = round_values(self.laps, rounding)
 
         # final val
-        # compute current elapsed if stop not available
         val = self.value
         val = round(val, rounding) if isinstance(val, float) else val
         serie.append(val)
 
         return serie
 
+    def get_laps_view(self) -> Any:
+        """Return the raw laps values of a compact counter without copy
+
+        Returns:
+            laps values as a NumPy float64 array if NumPy is installed,
+            as a memoryview otherwise. The view shares the counter memory
+            and must not be modified.
+        """
+        if not isinstance(self.laps, array):
+            raise ValueError(f"Counter {self.name} is not compact")
+        np = get_numpy()
+        if np is not None:
+            return np.frombuffer(self.laps, dtype=np.float64)
+        return memoryview(self.laps)
+
+    def get_percentiles(self, percentiles: List[float],
+                        rounding: int = 2) -> List[AnyNum]:
+        """Report laps values percentiles
+
+        Args:
+            percentiles: percentiles to compute expressed between 0 and 100.
+
+            rounding: Value rounding. Defaults to 2.
+
+        Returns:
+            laps percentiles. Estimated within the sketch relative accuracy
+            for bounded counters.
+        """
+        if self.sketch is not None:
+            values = self.sketch.percentiles(percentiles)
+        else:
+            values = exact_percentiles(self.laps, percentiles)
+        return [round(v, rounding) if isinstance(v, float) else v
+                for v in values]
+
+    def get_stats(self, rounding: int = 2) -> Dict[str, AnyNum]:
+        """Report laps values count, mean, stddev, min and max
+
+        Args:
+            rounding: Value rounding. Defaults to 2.
+
+        Returns:
+            laps statistics.
+        """
+        if self.sketch is not None:
+            stats = sketch_summary(self.sketch)
+        else:
+            stats = summary(self.laps)
+        return {k: round(v, rounding) if isinstance(v, float) else v
+                for k, v in stats.items()}
+
     def __str__(self) -> str:
         if self.prefix:
             return f"{self.prefix}{self.name}"
@@ -89,42 +209,400 @@ class ValueCounter():
         else:
             return self.name
 
+
+# the value slot of plain counters, wrapped by the logged ones
+_VALUE: Any = ValueCounter.__dict__['value']
+
+
+class LoggedValueCounter(ValueCounter):
+    """Value counter recording its operations to an event log.
+
+    Used by the collections with an event log, so operations on handles,
+    families children and ingested values are recorded like the collection
+    ones. Assigning `value` directly is recorded as a set.
+    """
+    __slots__ = ('event_log',)
+
+    def __init__(self, name: str, event_log: 'EventLog', value: AnyNum = 0,
+                 prefix: str = "", bounded: bool = False,
+                 relative_accuracy: float = 0.01, compact: bool = False):
+        # the initial value is not an operation, don't record it
+        self.event_log: Optional['EventLog'] = None
+        super().__init__(name=name, value=value, prefix=prefix,
+                         bounded=bounded, relative_accuracy=relative_accuracy,
+                         compact=compact)
+        self.event_log = event_log
+
+    def _record(self, code: int, value: Optional[AnyNum] = None) -> None:
+        if self.event_log is not None:
+            self.event_log.record_value(code, self.name, value)
+
+    @property
+    def value(self) -> AnyNum:
+        return _VALUE.__get__(self)
+
+    @value.setter
+    def value(self, value: AnyNum) -> None:
+        _VALUE.__set__(self, value)
+        self._record(VALUE_SET, value)
+
+    def inc(self, value: AnyNum = 1) -> AnyNum:
+        "increment counter by X"
+        total = _VALUE.__get__(self) + value
+        _VALUE.__set__(self, total)
+        self._record(VALUE_INC, value)
+        return total
+
+    def dec(self, value: AnyNum = 1) -> AnyNum:
+        "Decrement counter by X"
+        total = _VALUE.__get__(self) - value
+        _VALUE.__set__(self, total)
+        self._record(VALUE_INC, -value)
+        return total
+
+    def lap(self) -> None:
+        "record intermediate value"
+        super().lap()
+        self._record(VALUE_LAP, self.value)
+
+    def ingest_values(self, values: Any) -> None:
+        "Record laps from values collected elsewhere, recording each"
+        for chunk in iter_chunks(values, 'd'):
+            for value in chunk:
+                self.value = value
+                self.lap()
+
+    def reset(self, value: int = 0) -> None:
+        "reset counter."
+        _VALUE.__set__(self, 0)
+        self._record(VALUE_RESET)
+
+
+# label value of the child counting the label sets over the cardinality limit
+OVERFLOW = '__overflow__'
+
+
+class CounterFamily():
+    """Value counters sharing a name, one per set of label values
+
+        http = cnts.family("http", labels=("status", "route"))
+        http.labels(200, "/api").inc()
+
+    Label values are normalized with str(), so 200 and "200" are the same
+    child. Each label values tuple is interned to its child counter on
+    first use: later calls are a single dict lookup returning the same
+    counter, which can also be kept as a handle. Once `max_cardinality`
+    children exist, new label values are counted by an overflow child whose
+    labels are all OVERFLOW, so a label with unbounded values can't exhaust
+    memory.
+    """
+    __slots__ = ('name', 'label_names', 'max_cardinality', 'children',
+                 'overflow', 'overflowed', '_interned', '_new_counter')
+
+    def __init__(self, name: str, label_names: Tuple[str, ...],
+                 max_cardinality: int,
+                 new_counter: Callable[[str], ValueCounter]):
+        self.name = name
+        self.label_names = label_names
+        self.max_cardinality = max_cardinality
+        # children by their normalized label values
+        self.children: Dict[Tuple[str, ...], ValueCounter] = {}
+        self.overflow: Optional[ValueCounter] = None
+        # number of labels() calls sent to the overflow child
+        self.overflowed = 0
+        # children by the label values as passed, so labels() doesn't
+        # normalize known values
+        self._interned: Dict[Tuple[Any, ...], ValueCounter] = {}
+        self._new_counter = new_counter
+
+    def labels(self, *values: Any, **labels: Any) -> ValueCounter:
+        """Return the child counter of a set of label values
+
+        Args:
+            values: label values, in the family labels order.
+
+            labels: label values by label name, instead of values.
+
+        Returns:
+            the child counter, created if needed.
+        """
+        child = self._interned.get(values)
+        if child is None:
+            return self._child(values, labels)
+        return child
+
+    def _child(self, values: Tuple[Any, ...],
+               labels: Dict[str, Any]) -> ValueCounter:
+        if labels:
+            if values or set(labels) != set(self.label_names):
+                raise ValueError(f"Family {self.name} labels are "
+                                 f"{', '.join(self.label_names)}")
+            values = tuple(labels[n] for n in self.label_names)
+            child = self._interned.get(values)
+            if child is not None:
+                return child
+        if len(values) != len(self.label_names):
+            raise ValueError(f"Family {self.name} labels are "
+                             f"{', '.join(self.label_names)}")
+        key = tuple(map(str, values))
+        child = self.children.get(key)
+        if child is None:
+            if len(self.children) >= self.max_cardinality:
+                self.overflowed += 1
+                if self.overflow is None:
+                    overflow = (OVERFLOW, ) * len(values)
+                    self.overflow = self._new_counter(
+                        self._child_name(overflow))
+                return self.overflow
+            child = self._new_counter(self._child_name(key))
+            self.children[key] = child
+        self._interned[values] = child
+        return child
+
+    def _child_name(self, values: Tuple[str, ...]) -> str:
+        labels = ','.join(f"{n}={v}" for n, v in zip(self.label_names, values))
+        return f"{self.name}{{{labels}}}"
+
+    def items(self) -> List[Tuple[Tuple[str, ...], ValueCounter]]:
+        "children by label values, the overflow child last"
+        items = list(self.children.items())
+        if self.overflow is not None:
+            items.append(((OVERFLOW, ) * len(self.label_names),
+                          self.overflow))
+        return items
+
+    def group_by(self, *label_names: str,
+                 where: Optional[Mapping[str, Any]] = None,
+                 rounding: int = 2) -> Dict[Tuple[str, ...], AnyNum]:
+        """Sum the children values by a subset of the labels
+
+            http.group_by("status")  # {("200",): 12, ("404",): 3}
+            http.group_by("route", where={"status": 500})
+
+        Args:
+            label_names: labels to group by. None rolls up all the
+            children into a single () group.
+
+            where: only sum the children with these label values.
+
+            rounding: Float rounding. Defaults to 2.
+
+        Returns:
+            sums by normalized label values tuple.
+        """
+        indexes = [self._index(n) for n in label_names]
+        filters = [(self._index(n), str(v)) for n, v in (where or {}).items()]
+        groups: Dict[Tuple[str, ...], AnyNum] = {}
+        for values, child in self.items():
+            if any(values[i] != v for i, v in filters):
+                continue
+            key = tuple(values[i] for i in indexes)
+            groups[key] = groups.get(key, 0) + child.value
+        return {k: round(v, rounding) if isinstance(v, float) else v
+                for k, v in groups.items()}
+
+    def _index(self, label_name: str) -> int:
+        if label_name not in self.label_names:
+            raise ValueError(f"Unknown label {label_name}. Valid: "
+                             f"{', '.join(self.label_names)}")
+        return self.label_names.index(label_name)
+
+    def total(self, rounding: int = 2) -> AnyNum:
+        "Return the sum of all the children values"
+        return self.group_by(rounding=rounding).get((), 0)
+
+    def reset(self) -> None:
+        "reset the children values, the children handles remain valid"
+        for _, child in self.items():
+            child.reset()
+
+    def __len__(self):
+        return len(self.children)
+
+
 class ValueCounters():
-    def __init__(self, prefix: str = "") -> None:
+    def __init__(self, prefix: str = "", bounded: bool = False,
+                 relative_accuracy: float = 0.01,
+                 compact: bool = False,
+                 event_log: Optional['EventLog'] = None) -> None:
+        """Collection of value counters
+
+        Args:
+            prefix: prefix prepended to counter names when reporting.
+
+            bounded: keep laps values in a constant memory quantile sketch
+            instead of an ever growing list. Laps timeseries are then not
+            available but percentiles and statistics are. Defaults to False.
+
+            relative_accuracy: percentiles relative accuracy of bounded
+            counters. Defaults to 0.01.
+
+            compact: store laps values in a float64 array instead of a list,
+            using 8 bytes per lap. Defaults to False.
+
+            event_log: log recording every inc, dec, set, lap and reset
+            with its timestamp, including those of handles, families
+            children and ingested values. Defaults to None.
+        """
+        if bounded and compact:
+            raise ValueError("Counters can't be both bounded and compact")
+        self.event_log = event_log
         self.prefix = prefix
+        self.bounded = bounded
+        self.relative_accuracy = relative_accuracy
+        self.compact = compact
         self.counters: Dict[str, ValueCounter] = {}
+        self.families: Dict[str, CounterFamily] = {}
+        # reuses the unchanged rows between reports
+        self._renderer = TableRenderer()
+
+    def _new_counter(self, name: str, value: AnyNum = 0) -> ValueCounter:
+        "return a counter with the collection settings"
+        if self.event_log is not None:
+            return LoggedValueCounter(
+                name=name, event_log=self.event_log, value=value,
+                prefix=self.prefix, bounded=self.bounded,
+                relative_accuracy=self.relative_accuracy,
+                compact=self.compact)
+        return ValueCounter(
+            name=name, value=value, prefix=self.prefix, bounded=self.bounded,
+            relative_accuracy=self.relative_accuracy, compact=self.compact)
 
     def _init_counter(self, name: str, value: AnyNum = 0) -> None:
         "init a counter"
         if name in self.counters:
             raise ValueError(f"Counter {name} already exist")
-        self.counters[name] = ValueCounter(name=name, value=value,
-                                           prefix=self.prefix)
+        self.counters[name] = self._new_counter(name, value)
+
+    def family(self, name: str, labels: Iterable[str],
+               max_cardinality: int = 1000) -> CounterFamily:
+        """Return a family of counters distinguished by label values
+
+            http = cnts.family("http", labels=("status", "route"))
+            http.labels(200, "/api").inc()
+            http.group_by("status")
+
+        Args:
+            name: name of the family.
+
+            labels: labels names.
+
+            max_cardinality: maximum number of children, label values past
+            it are counted in a single overflow child. Defaults to 1000.
+
+        Returns:
+            the family, created if needed.
+        """
+        label_names = tuple(labels)
+        family = self.families.get(name)
+        if family is not None:
+            if family.label_names != label_names:
+                raise ValueError(f"Family {name} labels are "
+                                 f"{', '.join(family.label_names)}")
+            return family
+        if not label_names:
+            raise ValueError("A family needs at least one label")
+        if max_cardinality < 1:
+            raise ValueError("max_cardinality must be at least 1")
+        if name in self.counters:
+            raise ValueError(f"Counter {name} already exist")
+        family = CounterFamily(name, label_names, max_cardinality,
+                               self._new_counter)
+        self.families[name] = family
+        return family
+
+    def _counter(self, name: str) -> ValueCounter:
+        "return a counter, created if needed"
+        cnt = self.counters.get(name)
+        if cnt is None:
+            self._init_counter(name=name, value=0)
+            cnt = self.counters[name]
+        return cnt
+
+    def handle(self, name: str) -> ValueCounter:
+        """Return a counter to update it without looking up its name
+
+            hits = cnts.handle("hits")
+            for _ in range(n):
+                hits.value += 1  # or hits.inc()
+
+        Args:
+            name: name of the counter. Created if needed.
+
+        Returns:
+            the counter.
+        """
+        return self._counter(name)
 
     def inc(self, name: str, value=1) -> AnyNum:
         "Imcrement a counter"
-        if name not in self.counters:
-            self._init_counter(name=name, value=0)
-        return self.counters[name].inc(value=value)
+        cnt = self.counters.get(name)
+        if cnt is None:
+            cnt = self._counter(name)
+        if self.event_log is not None:
+            # logged counters record their own operations
+            return cnt.inc(value)
+        cnt.value += value
+        return cnt.value
+
+    def inc_many(self, names: Union[Mapping[str, AnyNum], Iterable[str]],
+                 values: Optional[Iterable[AnyNum]] = None) -> None:
+        """Increment many counters at once
+
+            cnts.inc_many({"hits": 1, "bytes": 512})
+            cnts.inc_many(["hits", "bytes"], [1, 512])
+
+        Args:
+            names: mapping of counter names to increments, or counter names.
+
+            values: increments of the counter names. Defaults to 1 each.
+        """
+        counters = self.counters
+        for name, value in _increments(names, values):
+            cnt = counters.get(name)
+            if cnt is None:
+                cnt = self._counter(name)
+            if self.event_log is not None:
+                cnt.inc(value)
+            else:
+                cnt.value += value
 
     def dec(self, name: str, value=1) -> AnyNum:
         "decrement a counter"
-        if name not in self.counters:
-            self._init_counter(name=name, value=0)
-        return self.counters[name].dec(value=value)
+        cnt = self.counters.get(name)
+        if cnt is None:
+            cnt = self._counter(name)
+        if self.event_log is not None:
+            return cnt.dec(value)
+        cnt.value -= value
+        return cnt.value
 
     def set(self, name: str, value=1) -> AnyNum:
         "decrement a counter"
-        if name not in self.counters:
-            self._init_counter(name=name, value=0)
-        return self.counters[name].set(value=value)
+        return self._counter(name).set(value=value)
 
 
     def lap(self, name: str):
         "record intermediate value"
-        if name not in self.counters:
-            self._init_counter(name=name)
-        return self.counters[name].lap()
+        self._counter(name).lap()
+
+    def ingest_values(self, name: str, values: Any) -> None:
+        """Record laps from values collected elsewhere, as if each value
+        was set then lapped
+
+            cnts.ingest_values("queue_size", sizes)
+
+        Buffers of native float64, such as NumPy float64 arrays, are
+        appended to compact counters with a single copy. Other inputs are
+        streamed by chunks, a generator is never materialized.
+
+        Args:
+            name: name of the counter. Created if needed.
+
+            values: laps values. A list, array, NumPy array, buffer of
+            native float64 or any iterable.
+        """
+        self._counter(name).ingest_values(values)
 
 
     def reset(self, name) -> None:
@@ -138,6 +616,8 @@ class ValueCounters():
         "reset all counters"
         for cnt in self.counters.values():
             cnt.reset()
+        for family in self.families.values():
+            family.reset()
 
 
     def get(self, name: str, rounding : int = 2) -> AnyNum:
@@ -175,6 +655,59 @@ class ValueCounters():
             raise ValueError(f"Unknown counter {name}")
         return self.counters[name].get_laps(rounding=rounding)
 
+    def get_laps_view(self, name: str) -> Any:
+        """Return a compact counter raw laps values without copy.
+
+        Args:
+            name: name of the counter.
+
+        Returns:
+            laps values as a NumPy float64 array if NumPy is installed,
+            as a memoryview otherwise.
+
+        """
+        if name not in self.counters:
+            raise ValueError(f"Unknown counter {name}")
+        return self.counters[name].get_laps_view()
+
+    def get_percentiles(self, name: str,
+                        percentiles: List[float] = DEFAULT_PERCENTILES,
+                        rounding: int = 2) -> List[AnyNum]:
+        """Return a counter laps percentiles.
+
+        Args:
+            name: name of the counter.
+
+            percentiles: percentiles expressed between 0 and 100.
+            Defaults to [50, 90, 99, 99.9].
+
+            rounding: Value rounding. Defaults to 2.
+
+        Returns:
+            laps percentiles.
+
+        """
+        if name not in self.counters:
+            raise ValueError(f"Unknown counter {name}")
+        return self.counters[name].get_percentiles(percentiles,
+                                                   rounding=rounding)
+
+    def get_stats(self, name: str, rounding: int = 2) -> Dict[str, AnyNum]:
+        """Return a counter laps count, mean, stddev, min and max.
+
+        Args:
+            name: name of the counter.
+
+            rounding: Value rounding. Defaults to 2.
+
+        Returns:
+            laps statistics.
+
+        """
+        if name not in self.counters:
+            raise ValueError(f"Unknown counter {name}")
+        return self.counters[name].get_stats(rounding=rounding)
+
     def get_all(self, rounding : int = 2) -> Dict[str, AnyNum]:
         """Return all counters values as a dictionary
 
@@ -187,8 +720,14 @@ class ValueCounters():
 
         """
         cnts = {}
-        for name, cnt in self.counters.items():
+        # iterate over a copy so counters can be read from another thread
+        # while new ones are created.
+        for name, cnt in list(self.counters.items()):
             cnts[f"{self.prefix}{name}"] = cnt.get(rounding=rounding)
+        for family in list(self.families.values()):
+            for _, child in family.items():
+                cnts[f"{self.prefix}{child.name}"] = child.get(
+                    rounding=rounding)
         return cnts
 
     def report(self, rounding : int = 2) -> None:
@@ -263,8 +802,9 @@ class ValueCounters():
     def _format(self, output_type: str, rounding: int) -> str:
         cnts = self.get_all(rounding=rounding)
         return format_counters(cnts, headers=['Name', "Value"],
-                               format=output_type)
+                               format=output_type, renderer=self._renderer)
 
 
     def __len__(self):
-        return len(self.counters)
+        return len(self.counters) + sum(len(family)
+                                        for family in self.families.values())
@@ -0,0 +1,372 @@
+import math
+from typing import Callable, Dict, List, Optional, Union
+
+from .clocks import get_clock
+from .format import format_counters
+from .sketch import DEFAULT_PERCENTILES
+from .sketch import percentiles as exact_percentiles
+
+AnyNum = Union[int, float]
+NS_PER_S = 1_000_000_000
+
+
+class WindowedCounter():
+    """Counter over a sliding time window.
+
+    Increments land in a ring of `num_buckets` time buckets of
+    `bucket_width` seconds, e.g. 60 buckets of 1s for the last minute.
+    Buckets are rotated lazily from the clock on each access, without a
+    background thread, so `inc()` is O(1) and memory is constant.
+    """
+    __slots__ = ('name', 'prefix', 'num_buckets', 'bucket_width', 'clock',
+                 'sums', 'counts', '_width_ns', '_bucket', '_index',
+                 '_start_ts')
+
+    def __init__(self, name: str, prefix: str = "", num_buckets: int = 60,
+                 bucket_width: float = 1.0,
+                 clock: Union[str, Callable[[], int]] = 'monotonic'):
+        """
+        Args:
+            name: name of the counter.
+
+            prefix: prefix prepended to the name when reporting.
+
+            num_buckets: number of buckets of the window. Defaults to 60.
+
+            bucket_width: bucket duration in seconds. Defaults to 1.
+
+            clock: clock name or a function returning nanoseconds.
+            Defaults to monotonic.
+        """
+        if num_buckets < 1:
+            raise ValueError("num_buckets must be at least 1")
+        if bucket_width <= 0:
+            raise ValueError("bucket_width must be positive")
+        self.name = name
+        self.prefix = prefix
+        self.num_buckets = num_buckets
+        self.bucket_width = bucket_width
+        self.clock = get_clock(clock) if isinstance(clock, str) else clock
+        self._width_ns = int(bucket_width * NS_PER_S)
+        self.sums: List[AnyNum] = [0] * num_buckets
+        self.counts: List[int] = [0] * num_buckets
+        self._start_ts = self.clock()
+        # absolute number of the current bucket and its ring index
+        self._bucket = self._start_ts // self._width_ns
+        self._index = self._bucket % num_buckets
+
+    def _rotate(self, now: int) -> int:
+        "advance the ring to now, clearing expired buckets"
+        bucket = now // self._width_ns
+        last = self._bucket
+        if bucket > last:
+            n = self.num_buckets
+            if bucket - last >= n:
+                self.sums = [0] * n
+                self.counts = [0] * n
+            else:
+                for b in range(last + 1, bucket + 1):
+                    self.sums[b % n] = 0
+                    self.counts[b % n] = 0
+            self._bucket = bucket
+            self._index = bucket % n
+        return bucket
+
+    def inc(self, value: AnyNum = 1) -> None:
+        "add a value to the current bucket"
+        now = self.clock()
+        if now // self._width_ns != self._bucket:
+            self._rotate(now)
+        self.sums[self._index] += value
+        self.counts[self._index] += 1
+
+    def _buckets(self, window: Optional[float], now: int) -> List[int]:
+        "ring indexes of the buckets covering the window, newest first"
+        bucket = self._rotate(now)
+        k = self.num_buckets
+        if window is not None:
+            if window <= 0:
+                raise ValueError("window must be positive")
+            k = min(math.ceil(window / self.bucket_width), k)
+        # don't cover buckets older than the counter
+        k = min(k, bucket - self._start_ts // self._width_ns + 1)
+        n = self.num_buckets
+        return [(bucket - j) % n for j in range(k)]
+
+    def sum_over(self, window: Optional[float] = None) -> AnyNum:
+        """Sum of the values over the last `window` seconds
+
+        Args:
+            window: window in seconds, rounded up to whole buckets.
+            Defaults to the full window.
+
+        Returns:
+            sum of the values.
+        """
+        buckets = self._buckets(window, self.clock())
+        sums = self.sums
+        return sum(sums[i] for i in buckets)
+
+    def count_over(self, window: Optional[float] = None) -> int:
+        """Number of increments over the last `window` seconds
+
+        Args:
+            window: window in seconds, rounded up to whole buckets.
+            Defaults to the full window.
+
+        Returns:
+            number of increments.
+        """
+        buckets = self._buckets(window, self.clock())
+        counts = self.counts
+        return sum(counts[i] for i in buckets)
+
+    def rate(self, window: Optional[float] = None) -> float:
+        """Sum of the values per second over the last `window` seconds
+
+        Args:
+            window: window in seconds, rounded up to whole buckets.
+            Defaults to the full window.
+
+        Returns:
+            values per second.
+        """
+        now = self.clock()
+        buckets = self._buckets(window, now)
+        total = sum(self.sums[i] for i in buckets)
+        # the current bucket is only partially elapsed
+        elapsed = ((len(buckets) - 1) * self._width_ns
+                   + now % self._width_ns)
+        elapsed = min(elapsed, now - self._start_ts)
+        if elapsed <= 0:
+            return 0.0
+        return total * NS_PER_S / elapsed
+
+    def mean(self, window: Optional[float] = None) -> float:
+        """Moving average of the values over the last `window` seconds
+
+        Args:
+            window: window in seconds, rounded up to whole buckets.
+            Defaults to the full window.
+
+        Returns:
+            average value per increment.
+        """
+        buckets = self._buckets(window, self.clock())
+        count = sum(self.counts[i] for i in buckets)
+        if not count:
+            return 0.0
+        return sum(self.sums[i] for i in buckets) / count
+
+    def get_buckets(self, window: Optional[float] = None) -> List[AnyNum]:
+        """Per bucket sums over the last `window` seconds
+
+        Args:
+            window: window in seconds, rounded up to whole buckets.
+            Defaults to the full window.
+
+        Returns:
+            buckets sums, oldest first.
+        """
+        buckets = self._buckets(window, self.clock())
+        return [self.sums[i] for i in reversed(buckets)]
+
+    def get_percentiles(self, percentiles: List[float] = DEFAULT_PERCENTILES,
+                        window: Optional[float] = None) -> List[float]:
+        """Percentiles of the per bucket sums over the last `window` seconds,
+        e.g. the p99 of requests per second over the last minute.
+
+        Args:
+            percentiles: percentiles expressed between 0 and 100.
+            Defaults to [50, 90, 99, 99.9].
+
+            window: window in seconds, rounded up to whole buckets.
+            Defaults to the full window.
+
+        Returns:
+            buckets sums percentiles.
+        """
+        return exact_percentiles(self.get_buckets(window), percentiles)
+
+    def reset(self) -> None:
+        "Reset counter"
+        self.sums = [0] * self.num_buckets
+        self.counts = [0] * self.num_buckets
+        self._start_ts = self.clock()
+        self._bucket = self._start_ts // self._width_ns
+        self._index = self._bucket % self.num_buckets
+
+    def __str__(self) -> str:
+        return f"{self.prefix}{self.name}"
+
+    def __repr__(self) -> str:
+        return f"{self.prefix}{self.name}"
+
+
+class WindowedCounters():
+    def __init__(self, prefix: str = "", num_buckets: int = 60,
+                 bucket_width: float = 1.0,
+                 clock: Union[str, Callable[[], int]] = 'monotonic') -> None:
+        """Collection of counters over a sliding time window
+
+        Args:
+            prefix: prefix prepended to counter names when reporting.
+
+            num_buckets: number of buckets of the window. Defaults to 60.
+
+            bucket_width: bucket duration in seconds. Defaults to 1, a one
+            minute window with the default 60 buckets.
+
+            clock: clock name or a function returning nanoseconds.
+            Defaults to monotonic.
+        """
+        self.prefix = prefix
+        self.num_buckets = num_buckets
+        self.bucket_width = bucket_width
+        self.clock = clock
+        # validate early
+        WindowedCounter('', num_buckets=num_buckets,
+                        bucket_width=bucket_width, clock=clock)
+        self.counters: Dict[str, WindowedCounter] = {}
+
+    def _counter(self, name: str) -> WindowedCounter:
+        if name not in self.counters:
+            raise ValueError(f"Unknown counter {name}")
+        return self.counters[name]
+
+    def inc(self, name: str, value: AnyNum = 1) -> None:
+        "add a value to a counter current bucket"
+        cnt = self.counters.get(name)
+        if cnt is None:
+            cnt = WindowedCounter(name=name, prefix=self.prefix,
+                                  num_buckets=self.num_buckets,
+                                  bucket_width=self.bucket_width,
+                                  clock=self.clock)
+            self.counters[name] = cnt
+        cnt.inc(value)
+
+    def sum_over(self, name: str, window: Optional[float] = None) -> AnyNum:
+        "Return a counter sum over the last `window` seconds"
+        return self._counter(name).sum_over(window)
+
+    def count_over(self, name: str, window: Optional[float] = None) -> int:
+        "Return a counter number of increments over the last `window` seconds"
+        return self._counter(name).count_over(window)
+
+    def rate(self, name: str, window: Optional[float] = None) -> float:
+        "Return a counter values per second over the last `window` seconds"
+        return self._counter(name).rate(window)
+
+    def mean(self, name: str, window: Optional[float] = None) -> float:
+        "Return a counter average value over the last `window` seconds"
+        return self._counter(name).mean(window)
+
+    def get_percentiles(self, name: str,
+                        percentiles: List[float] = DEFAULT_PERCENTILES,
+                        window: Optional[float] = None) -> List[float]:
+        """Return a counter per bucket sums percentiles
+
+        Args:
+            name: name of the counter.
+
+            percentiles: percentiles expressed between 0 and 100.
+            Defaults to [50, 90, 99, 99.9].
+
+            window: window in seconds. Defaults to the full window.
+
+        Returns:
+            buckets sums percentiles.
+        """
+        return self._counter(name).get_percentiles(percentiles, window)
+
+    def reset(self, name: str) -> None:
+        "reset a given counter"
+        self._counter(name).reset()
+
+    def reset_all(self) -> None:
+        "reset all counters"
+        for cnt in self.counters.values():
+            cnt.reset()
+
+    def get(self, name: str, window: Optional[float] = None,
+            rounding: int = 2) -> AnyNum:
+        """Return a counter sum over the window
+
+        Args:
+            name: name of the counter.
+
+            window: window in seconds. Defaults to the full window.
+
+            rounding: Value rounding. Defaults to 2.
+
+        Returns:
+            sum of the values.
+        """
+        value = self._counter(name).sum_over(window)
+        if isinstance(value, float):
+            return round(value, rounding)
+        return value
+
+    def get_all(self, window: Optional[float] = None,
+                rounding: int = 2) -> Dict[str, List[AnyNum]]:
+        """Return all counters [sum, rate, mean] over the window
+
+        Args:
+            window: window in seconds. Defaults to the full window.
+
+            rounding: Value rounding. Defaults to 2.
+
+        Returns:
+            Dictionary of counters
+        """
+        cnts = {}
+        # iterate over a copy so counters can be read from another thread
+        # while new ones are created.
+        for name, cnt in list(self.counters.items()):
+            total = cnt.sum_over(window)
+            if isinstance(total, float):
+                total = round(total, rounding)
+            cnts[f"{self.prefix}{name}"] = [
+                total, round(cnt.rate(window), rounding),
+                round(cnt.mean(window), rounding)]
+        return cnts
+
+    def report(self, window: Optional[float] = None,
+               rounding: int = 2) -> None:
+        "pretty print counters "
+        print(self._format(output_type='rounded_outline', window=window,
+                           rounding=rounding))
+
+    def to_json(self, window: Optional[float] = None,
+                rounding: int = 2) -> str:
+        "Return counters a json string"
+        return self._format(output_type='json', window=window,
+                            rounding=rounding)
+
+    def to_html(self, window: Optional[float] = None,
+                rounding: int = 2) -> str:
+        "Return counters as html table"
+        return self._format(output_type='html', window=window,
+                            rounding=rounding)
+
+    def to_md(self, window: Optional[float] = None,
+              rounding: int = 2) -> str:
+        "Return counters as markdown table"
+        return self._format(output_type='github', window=window,
+                            rounding=rounding)
+
+    def to_latex(self, window: Optional[float] = None,
+                 rounding: int = 2) -> str:
+        "Return counters as latex table"
+        return self._format(output_type='latex', window=window,
+                            rounding=rounding)
+
+    def _format(self, output_type: str, window: Optional[float],
+                rounding: int) -> str:
+        cnts = self.get_all(window=window, rounding=rounding)
+        return format_counters(cnts, headers=['Name', 'Sum', 'Rate (/s)',
+                                              'Mean'],
+                               format=output_type)
+
+    def __len__(self):
+        return len(self.counters)
@@ -24,5 +24,14 @@ setup(name='perfcounters',
           'Topic :: Software Development :: Debuggers',
           'Topic :: Software Development :: Testing'
       ],
-      install_requires=['tabulate'],
+      install_requires=[],
+      extras_require={
+          # only needed for the table formats without a built-in writer
+          'tabulate': ['tabulate']
+      },
+      entry_points={
+          'console_scripts': [
+              'perfcounters-bench=perfcounters.bench:main'
+          ]
+      },
       packages=find_packages())
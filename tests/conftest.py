@@ -0,0 +1,14 @@
+import sys
+
+import pytest
+
+from perfcounters.optional import get_tabulate
+
+
+@pytest.fixture
+def no_tabulate(monkeypatch):
+    "tabulate not installed"
+    monkeypatch.setitem(sys.modules, 'tabulate', None)
+    get_tabulate.cache_clear()
+    yield
+    get_tabulate.cache_clear()
@@ -0,0 +1,70 @@
+import math
+from array import array
+import pytest
+from perfcounters import analytics
+from perfcounters.analytics import (convert, diff, durations, outliers,
+                                    rate_of_change, rolling_mean, round_values)
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    "run tests with the vectorized path forced on, and with NumPy missing"
+    if request.param == 'python':
+        monkeypatch.setattr(analytics, 'get_numpy', lambda: None)
+    else:
+        pytest.importorskip('numpy')
+        monkeypatch.setattr(analytics, 'NUMPY_MIN_SIZE', 0)
+    return request.param
+
+
+def test_durations(backend):
+    assert durations(10, [15, 30], 31) == [5, 15, 1]
+    assert durations(10, array('q', [15]), 20) == [5, 5]
+    assert durations(10, [], 20) == [10]
+
+
+def test_diff(backend):
+    assert diff([1, 4, 9]) == [3, 5]
+    assert diff([1]) == []
+
+
+def test_convert(backend):
+    assert convert([1_500_000_000, 500_000_000], 's', 2) == [1.5, 0.5]
+    assert convert([1_500_000_000], 's', 0) == [1]
+    assert convert([1_500], 'us', 1) == [1.5]
+    assert convert([1_500], 'ns', 2) == [1_500]
+    with pytest.raises(ValueError):
+        convert([1], 'h', 2)
+
+
+def test_round_values(backend):
+    assert round_values([1.234, 2.345], 1) == [1.2, 2.3]
+    assert round_values([1, 2], 1) == [1, 2]
+    assert round_values(array('d', [1.25]), 1) == [1.2]
+
+
+def test_rolling_mean(backend):
+    assert rolling_mean([1, 2, 3, 4], 2) == [1.5, 2.5, 3.5]
+    assert rolling_mean([1, 2], 3) == []
+    with pytest.raises(ValueError):
+        rolling_mean([1], 0)
+
+
+def test_rate_of_change(backend):
+    assert rate_of_change([1, 3, 6]) == [2, 3]
+    assert rate_of_change([0, 10, 30], [2, 4]) == [5, 5]
+    rates = rate_of_change([0, 10, 10], [0, 0])
+    assert rates[0] == math.inf
+    assert math.isnan(rates[1])
+    with pytest.raises(ValueError):
+        rate_of_change([1, 2], [1, 2])
+
+
+def test_outliers(backend):
+    values = [10, 11, 9, 10, 12, 10, 100, 11, 9]
+    assert outliers(values) == [6]
+    assert outliers(values, method='iqr', threshold=1.5) == [6]
+    assert outliers([5, 5, 5]) == []
+    assert outliers([]) == []
+    with pytest.raises(ValueError):
+        outliers(values, method='error')
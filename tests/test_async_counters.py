@@ -0,0 +1,119 @@
+import asyncio
+from time import sleep
+import pytest
+from perfcounters import AsyncTimeCounters
+
+D = 0.05
+
+
+async def busy_then_wait():
+    sleep(D)  # blocks the loop: running time
+    await asyncio.sleep(D)  # suspended time
+    return 42
+
+
+def test_instrument():
+    acnts = AsyncTimeCounters()
+
+    async def main():
+        return await acnts.instrument(busy_then_wait())
+
+    assert asyncio.run(main()) == 42
+    stats = acnts.get('busy_then_wait', format='ms')
+    assert stats['count'] == 1
+    assert stats['wall'] >= 2 * D * 1000
+    assert D * 1000 <= stats['running'] < 2 * D * 1000
+    assert stats['suspended'] >= D * 1000 * 0.9
+
+
+def test_region_splits_concurrent_tasks():
+    acnts = AsyncTimeCounters()
+
+    async def worker():
+        async with acnts.region('work'):
+            await asyncio.sleep(D)
+            sleep(D)
+
+    async def main():
+        acnts.install()
+        await asyncio.gather(worker(), worker())
+        acnts.uninstall()
+
+    asyncio.run(main())
+    stats = acnts.get('work', format='ms')
+    assert stats['count'] == 2
+    # each region waits for the other task blocking the loop
+    assert stats['running'] >= 2 * D * 1000
+    assert stats['running'] < 3 * D * 1000
+    assert stats['suspended'] >= 2 * D * 1000
+    assert acnts.get('test_region_splits_concurrent_tasks.<locals>.worker')
+
+
+def test_region_not_instrumented():
+    acnts = AsyncTimeCounters()
+
+    async def main():
+        async with acnts.region('a'):
+            await asyncio.sleep(0)
+
+    asyncio.run(main())
+    stats = acnts.get('a', format='ns')
+    assert stats['running'] == stats['wall']
+    assert stats['suspended'] == 0
+
+
+def test_exception_propagation():
+    acnts = AsyncTimeCounters()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise KeyError('a')
+
+    async def main():
+        await acnts.instrument(fail(), name='fail')
+
+    with pytest.raises(KeyError):
+        asyncio.run(main())
+    assert acnts.get('fail')['count'] == 1
+
+
+def test_cancel():
+    acnts = AsyncTimeCounters()
+
+    async def forever():
+        await asyncio.sleep(100)
+
+    async def main():
+        task = asyncio.ensure_future(acnts.instrument(forever(), 'f'))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert acnts.get('f')['count'] == 1
+
+
+def test_report():
+    acnts = AsyncTimeCounters(prefix='test_')
+
+    async def main():
+        await acnts.instrument(asyncio.sleep(0), name='a')
+
+    asyncio.run(main())
+    assert 'test_a' in acnts.get_all()
+    assert 'test_a' in acnts.to_json()
+    assert 'Suspended' in acnts.to_md()
+    assert '<table>' in acnts.to_html()
+    assert 'test' in acnts.to_latex()
+    acnts.report()
+    acnts.reset_all()
+    assert acnts.get('a')['count'] == 0
+    assert len(acnts) == 1
+
+
+def test_wrong_name():
+    with pytest.raises(ValueError):
+        AsyncTimeCounters().get('a')
+    with pytest.raises(ValueError):
+        AsyncTimeCounters().reset('a')
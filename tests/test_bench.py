@@ -0,0 +1,119 @@
+import json
+import time
+
+import pytest
+
+from perfcounters.bench import (EXIT_REGRESSION, BenchmarkRunner, compare,
+                                format_comparison, load_results, main)
+
+
+def _results(samples):
+    return {"median": sorted(samples)[len(samples) // 2], "samples": samples}
+
+
+def test_runner():
+    runner = BenchmarkRunner(warmup=1, repeat=5, min_time=0.001)
+    calls = []
+
+    @runner.register
+    def noop():
+        calls.append(1)
+
+    @runner.register(name='sleep')
+    def sleepy():
+        time.sleep(0.0001)
+
+    with pytest.raises(ValueError):
+        runner.register(noop)
+
+    results = runner.run()
+    assert list(results) == ['test_runner.<locals>.noop', 'sleep']
+    res = results['sleep']
+    assert res['repeat'] == 5
+    assert len(res['samples']) == 5
+    assert res['number'] >= 1
+    assert res['ci_low'] <= res['median'] <= res['ci_high']
+    assert res['median'] >= 100_000  # 100us in ns
+    assert res['mad'] >= 0
+
+    # each repetition is a lap
+    laps = runner.counters.get_laps('sleep', format='ns', rounding=0)
+    assert len(laps) == 5
+
+    # rerun
+    runner.run(['sleep'])
+    assert len(runner.counters.get_laps('sleep')) == 5
+
+    with pytest.raises(ValueError):
+        runner.run(['unknown'])
+
+
+def test_compare():
+    base = [100 + i for i in range(10)]
+    baseline = {'same': _results(base), 'slow': _results(base),
+                'fast': _results(base)}
+    results = {'same': _results([v + 0.5 for v in base]),
+               'slow': _results([v * 2 for v in base]),
+               'fast': _results([v / 2 for v in base]),
+               'new': _results(base)}
+    comparison = compare(results, baseline)
+    assert comparison['same']['status'] == 'unchanged'
+    assert comparison['slow']['status'] == 'regression'
+    assert comparison['slow']['change'] > 0.9
+    assert comparison['fast']['status'] == 'improvement'
+    assert comparison['new']['status'] == 'new'
+
+    # below threshold
+    comparison = compare({'slow': _results([v * 1.01 for v in base])},
+                         {'slow': _results(base)}, threshold=0.05)
+    assert comparison['slow']['status'] == 'unchanged'
+
+    table = format_comparison(comparison)
+    assert 'unchanged' in table
+
+
+def test_cli(tmp_path, capsys):
+    bench_file = tmp_path / 'bench_file.py'
+    bench_file.write_text(
+        "from perfcounters.bench import benchmark\n"
+        "@benchmark(name='cli_sum')\n"
+        "def cli_sum():\n"
+        "    sum(range(100))\n")
+    results_file = tmp_path / 'results.json'
+    args = [str(bench_file), '--repeat', '3', '--min-time', '0.001',
+            '-k', 'cli_sum']
+    assert main(args + ['--save', str(results_file)]) == 0
+    results = load_results(str(results_file))
+    assert len(results['cli_sum']['samples']) == 3
+
+    # a baseline 10x faster flags a regression
+    baseline = {'cli_sum': {**results['cli_sum'],
+                            'median': results['cli_sum']['median'] / 10,
+                            'samples': [s / 10 for s in
+                                        results['cli_sum']['samples']] * 4}}
+    baseline_file = tmp_path / 'baseline.json'
+    baseline_file.write_text(json.dumps(baseline))
+    assert main(args + ['--baseline', str(baseline_file),
+                        '--repeat', '10']) == EXIT_REGRESSION
+    assert 'regression' in capsys.readouterr().out
+
+
+def test_cli_without_tabulate(tmp_path, capsys, no_tabulate):
+    bench_file = tmp_path / 'bench_file.py'
+    bench_file.write_text(
+        "from perfcounters.bench import benchmark\n"
+        "@benchmark(name='cli_sum')\n"
+        "def cli_sum():\n"
+        "    sum(range(100))\n")
+    args = [str(bench_file), '--repeat', '3', '--min-time', '0.001']
+    results_file = tmp_path / 'results.json'
+    assert main(args + ['--save', str(results_file)]) == 0
+    baseline = load_results(str(results_file))
+    baseline['cli_sum']['median'] /= 10
+    baseline['cli_sum']['samples'] = [
+        s / 10 for s in baseline['cli_sum']['samples']] * 4
+    baseline_file = tmp_path / 'baseline.json'
+    baseline_file.write_text(json.dumps(baseline))
+    assert main(args + ['--baseline', str(baseline_file)]) == EXIT_REGRESSION
+    out = capsys.readouterr().out
+    assert '│ regression │' in out
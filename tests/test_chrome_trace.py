@@ -0,0 +1,106 @@
+import gzip
+import io
+import json
+import threading
+
+import pytest
+
+from perfcounters import SpanCounters, TimeCounters, ValueCounters
+from perfcounters.chrome_trace import iter_events, write_trace
+
+
+def _slices(trace, cat):
+    return [e for e in trace['traceEvents'] if e.get('cat') == cat]
+
+
+def test_counter_laps(tmp_path):
+    cnts = TimeCounters(prefix='t_')
+    cnts.ingest_laps('a', [10_000, 30_000], start_ts=0, stop_ts=60_000)
+    path = str(tmp_path / 'trace.json')
+    assert cnts.to_trace(path) == 5
+    with open(path) as fp:
+        trace = json.load(fp)
+    counter, = _slices(trace, 'counter')
+    assert counter['name'] == 't_a'
+    assert (counter['ts'], counter['dur']) == (0, 60)
+    laps = _slices(trace, 'lap')
+    assert [(e['ts'], e['dur']) for e in laps] == [(0, 10), (10, 20),
+                                                   (30, 30)]
+    assert [e['args']['lap'] for e in laps] == [0, 1, 2]
+    assert {e['tid'] for e in laps} == {threading.get_native_id()}
+
+
+def test_thread_ids():
+    cnts = TimeCounters()
+    cnts.start('main')
+    thread = threading.Thread(target=cnts.start, args=('worker',))
+    thread.start()
+    thread.join()
+    cnts.stop_all()
+    events = [json.loads(e) for e in iter_events(cnts, pid=42)]
+    tids = {e['name']: e['tid'] for e in events if e['ph'] == 'X'}
+    assert tids['main'] == threading.get_native_id()
+    assert tids['worker'] != tids['main']
+    assert {e['pid'] for e in events} == {42}
+
+
+def test_compressed(tmp_path, monkeypatch):
+    monkeypatch.setattr('perfcounters.chrome_trace.CHUNK_SIZE', 3)
+    cnts = TimeCounters(compact=True)
+    cnts.ingest_laps('a', range(1, 11), start_ts=0, stop_ts=11)
+    path = str(tmp_path / 'trace.json.gz')
+    assert cnts.to_trace(path) == 13
+    with gzip.open(path, 'rt') as fp:
+        trace = json.load(fp)
+    assert len(_slices(trace, 'lap')) == 11
+
+    buffer = io.BytesIO()
+    write_trace(buffer, cnts, compress=True)
+    trace = json.loads(gzip.decompress(buffer.getvalue()))
+    assert len(trace['traceEvents']) == 13
+
+
+def test_file_objects():
+    cnts = TimeCounters()
+    cnts.start('a')
+    text = io.StringIO()
+    assert write_trace(text, cnts) == 2
+    assert len(json.loads(text.getvalue())['traceEvents']) == 2
+    binary = io.BytesIO()
+    write_trace(binary, cnts)
+    assert not binary.closed
+    assert json.loads(binary.getvalue())['traceEvents'][1]['name'] == 'a'
+    with pytest.raises(ValueError):
+        write_trace(io.StringIO(), cnts, compress=True)
+
+
+def test_bounded_counter_slice_only():
+    cnts = TimeCounters(bounded=True)
+    cnts.ingest_laps('a', [10, 20], start_ts=0, stop_ts=30)
+    events = [json.loads(e) for e in iter_events(cnts)]
+    assert [e['cat'] for e in events[1:]] == ['counter']
+
+
+def test_spans_flame_chart(tmp_path):
+    spans = SpanCounters()
+    for _ in range(2):
+        with spans.span('request'):
+            with spans.span('db'):
+                pass
+            with spans.span('render'):
+                pass
+    path = str(tmp_path / 'spans.json')
+    spans.to_trace(path)
+    with open(path) as fp:
+        trace = json.load(fp)
+    request, db, render = _slices(trace, 'span')
+    assert request['name'] == 'request'
+    assert request['args']['count'] == 2
+    assert db['ts'] == request['ts'] == 0
+    assert render['ts'] == pytest.approx(db['dur'], abs=0.001)
+    assert render['ts'] + render['dur'] <= request['dur'] + 0.001
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        list(iter_events(ValueCounters()))
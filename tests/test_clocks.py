@@ -0,0 +1,26 @@
+import pytest
+from perfcounters.clocks import convert_ns, get_clock, get_unit
+
+
+def test_get_clock():
+    clock = get_clock('perf_counter')
+    assert isinstance(clock(), int)
+
+
+def test_invalid_clock():
+    with pytest.raises(ValueError):
+        get_clock('error')
+
+
+def test_invalid_unit():
+    with pytest.raises(ValueError):
+        get_unit('h')
+
+
+def test_convert_ns():
+    assert convert_ns(1_500_000_000, 's', 2) == 1.5
+    assert convert_ns(1_500_000_000, 's', 0) == 1
+    assert convert_ns(1_500_000_000, 'ms', 2) == 1500
+    assert convert_ns(1_500, 'us', 1) == 1.5
+    assert convert_ns(1_500, 'ns', 2) == 1_500
+    assert convert_ns(90_000_000_000, 'm', 2) == 1.5
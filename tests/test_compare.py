@@ -0,0 +1,113 @@
+import json
+import random
+
+import pytest
+
+from perfcounters import TimeCounters, ValueCounters
+from perfcounters.compare import Comparison, collect, compare
+from perfcounters.snapshot import dumps
+
+
+def _timings(scale, n=200, seed=0):
+    "time counters with lognormal laps durations"
+    rnd = random.Random(seed)
+    cnts = TimeCounters()
+    ts = 0
+    laps = []
+    for _ in range(n):
+        ts += int(rnd.lognormvariate(13, 0.2) * scale)
+        laps.append(ts)
+    cnts.ingest_laps('loop', laps, start_ts=0, stop_ts=ts + 400_000)
+    cnts.ingest_laps('flat', laps, start_ts=0, stop_ts=ts + 400_000)
+    return cnts
+
+
+def test_time_counters():
+    a = _timings(1)
+    b = _timings(1.2, seed=1)
+    b.counters['flat'] = _timings(1, seed=2).counters['flat']
+    b.start('fresh')
+    a.start('gone')
+    diff = compare(a, b, seed=1)
+    assert isinstance(diff, Comparison)
+    assert len(diff) == 4
+
+    loop = diff.get('loop', format='ns')
+    assert loop['status'] == 'regression'
+    assert 0.1 < loop['ci_low'] < loop['change'] < loop['ci_high'] < 0.3
+    assert loop['p_value'] < 0.001
+    assert loop['count_a'] == loop['count_b'] == 201
+    assert loop['delta'] == pytest.approx(loop['median_b'] - loop['median_a'],
+                                          abs=1)
+    assert diff.get('flat')['status'] == 'unchanged'
+    assert diff.get('fresh')['status'] == 'new'
+    assert diff.get('gone')['status'] == 'removed'
+    assert compare(b, a, seed=1).get('loop')['status'] == 'improvement'
+    with pytest.raises(ValueError):
+        diff.get('unknown')
+
+
+def test_value_counters_and_families():
+    a = ValueCounters()
+    b = ValueCounters()
+    a.ingest_values('queue', range(100))
+    b.ingest_values('queue', range(50, 150))
+    for cnts, value in ((a, 1), (b, 1)):
+        cnts.family('http', labels=('status',)).labels(200).inc(value)
+    diff = compare(a, b)
+    assert diff.get('queue')['status'] == 'increase'
+    assert diff.get('http{status=200}')['status'] == 'unchanged'
+    assert diff.get('queue')['median_a'] == 50
+
+
+def test_snapshots_and_bounded():
+    a = _timings(1)
+    b = _timings(1.2, seed=1)
+    diff = compare(dumps(a), [b], seed=1)
+    assert diff.get('loop')['status'] == 'regression'
+
+    bounded = TimeCounters(bounded=True)
+    bounded.ingest_laps('loop', [10, 20], start_ts=0, stop_ts=30)
+    row = compare(bounded, b).get('loop')
+    assert row['status'] == 'untested'
+    assert row['p_value'] is None
+    assert row['change'] is not None
+
+
+def test_formats():
+    diff = compare(_timings(1), _timings(1.2, seed=1), seed=1)
+    md = diff.to_md()
+    assert '| loop' in md and 'regression' in md
+    assert 'A (ms)' in md
+    assert '<table>' in diff.to_html()
+    assert 'tabular' in diff.to_latex()
+    data = json.loads(diff.to_json(format='us'))
+    assert data['loop']['status'] == 'regression'
+    assert set(diff.get_all()) == {'loop', 'flat'}
+
+    a, b = ValueCounters(), ValueCounters()
+    a.set('v', 1)
+    b.set('v', 2)
+    assert 'A (ms)' not in compare(a, b).to_md()
+
+
+def test_formats_without_tabulate(no_tabulate, capsys):
+    diff = compare(_timings(1), _timings(1.2, seed=1), seed=1)
+    diff.report()
+    assert 'regression' in capsys.readouterr().out
+    assert '| loop' in diff.to_md()
+    assert '<table>' in diff.to_html()
+    assert 'tabular' in diff.to_latex()
+    # change and interval cells are numbers
+    assert all(isinstance(c, float) for c in diff.get_all()['loop'][3:6])
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        collect([object()])
+    a = ValueCounters()
+    a.set('x', 1)
+    b = TimeCounters()
+    b.start('x')
+    with pytest.raises(ValueError):
+        compare(a, b)
@@ -0,0 +1,133 @@
+import pytest
+
+from perfcounters import TimeCounters, ValueCounters
+from perfcounters.eventlog import (EventLog, iter_durations, read_events,
+                                   replay)
+from perfcounters.sketch import QuantileSketch
+
+
+@pytest.mark.parametrize('format', ['jsonl', 'binary'])
+def test_record_and_replay(tmp_path, format):
+    path = str(tmp_path / 'events.log')
+    with EventLog(path, format=format) as log:
+        tcnts = TimeCounters(event_log=log)
+        vcnts = ValueCounters(event_log=log)
+        tcnts.start('loop')
+        for i in range(5):
+            tcnts.lap('loop')
+            vcnts.inc('hits')
+            vcnts.set('ratio', i / 2)
+            vcnts.lap('ratio')
+        vcnts.dec('hits', 2)
+        tcnts.stop('loop')
+    assert log.written == 1 + 5 * 4 + 2
+    assert log.dropped == 0
+
+    events = list(read_events(path))
+    assert events[0][1:] == ('time', 'start', 'loop', None)
+    assert events[-1][1:] == ('time', 'stop', 'loop', None)
+    assert ('value', 'inc', 'hits', -2) in [e[1:] for e in events]
+
+    rcnts, rvals = replay(path)
+    assert rcnts.get_laps('loop', format='ns') == \
+        tcnts.get_laps('loop', format='ns')
+    assert rcnts.get('loop', format='ns') == tcnts.get('loop', format='ns')
+    assert rvals.get_all() == vcnts.get_all()
+    assert rvals.get_laps('ratio') == vcnts.get_laps('ratio')
+    assert type(rvals.get('hits')) is int
+
+
+def test_record_handles_timers_and_families(tmp_path):
+    path = str(tmp_path / 'events.log')
+    with EventLog(path) as log:
+        tcnts = TimeCounters(event_log=log)
+        vcnts = ValueCounters(event_log=log)
+        tcnts.start('loop')
+        loop = tcnts.handle('loop')
+        loop.lap()
+        loop.stop()
+        tcnts.ingest_laps('io', [10, 20, 30], start_ts=5, stop_ts=45)
+        with tcnts.time('db'):
+            pass
+        tcnts.timed('parse')(lambda: None)()
+        hits = vcnts.handle('hits')
+        hits.inc(2)
+        hits.value += 1
+        http = vcnts.family('http', labels=('status',))
+        http.labels(200).inc()
+        http.labels(404).set(3)
+        vcnts.ingest_values('size', [1.5, 2.5])
+
+    ops = [(e[2], e[3]) for e in read_events(path)]
+    assert ops.count(('lap', 'loop')) == 1
+    assert ('stop', 'loop') in ops
+    assert ops.count(('lap', 'io')) == 3
+    assert ('stop', 'io') in ops
+    assert ('timer', 'db') in ops and ('timer', 'parse') in ops
+    assert ('inc', 'http{status=200}') in ops
+    assert ops.count(('lap', 'size')) == 2
+
+    rcnts, rvals = replay(path)
+    for name in ('loop', 'io'):
+        assert (rcnts.get_laps(name, format='ns')
+                == tcnts.get_laps(name, format='ns'))
+    assert rcnts.get_laps('io', format='ns') == [5, 10, 10, 15]
+    for name in ('db', 'parse'):
+        assert rcnts.get_timer(name, format='ns') == \
+            tcnts.get_timer(name, format='ns')
+    assert rvals.get('hits') == 3
+    assert rvals.get('http{status=404}') == 3
+    assert rvals.get_laps('size') == vcnts.get_laps('size')
+
+
+def test_replay_bounded(tmp_path):
+    path = str(tmp_path / 'events.jsonl')
+    log = EventLog(path)
+    cnts = TimeCounters(event_log=log, compact=True)
+    cnts.start('a')
+    for _ in range(100):
+        cnts.lap('a')
+    cnts.stop('a')
+    laps = cnts.get_laps('a', format='ns')
+    cnts.reset('a')
+    log.close()
+
+    bounded, _ = replay(path, time_counters=TimeCounters(bounded=True))
+    assert bounded.get_stats('a')['count'] == 101
+    durations = list(iter_durations(path, 'a'))
+    assert len(durations) == 101
+    assert durations == laps
+    sketch = QuantileSketch()
+    for d in iter_durations(read_events(path), 'a'):
+        sketch.add(d)
+    assert len(sketch) == 101
+
+
+def test_replay_log_started_late():
+    events = [(10, 'time', 'lap', 'a', None), (20, 'time', 'lap', 'a', None),
+              (35, 'time', 'stop', 'a', None),
+              (40, 'value', 'reset', 'v', None)]
+    cnts, vals = replay(events)
+    assert cnts.get_laps('a', format='ns') == [10, 15]
+    assert vals.get('v') == 0
+
+
+def test_ring_buffer_drops_oldest(tmp_path):
+    log = EventLog(str(tmp_path / 'events.jsonl'), capacity=4, interval=60)
+    cnts = ValueCounters(event_log=log)
+    for _ in range(10):
+        cnts.inc('a')
+    assert log.dropped == 6
+    log.close()
+    assert log.written == 4
+
+
+def test_errors(tmp_path):
+    path = str(tmp_path / 'events.jsonl')
+    with pytest.raises(ValueError):
+        EventLog(path, format='xml')
+    with pytest.raises(ValueError):
+        EventLog(path, capacity=0)
+    with EventLog(path) as log:
+        with pytest.raises(ValueError):
+            TimeCounters(event_log=log, sample_every=2)
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import socket
+from time import sleep
+import pytest
+from perfcounters import TimeCounters, ValueCounters
+from perfcounters.exporter import (Exporter, JsonLinesSink, RotatingFileSink,
+                                   StatsdSink)
+
+
+def test_collect():
+    tcnts = TimeCounters()
+    vcnts = ValueCounters(prefix='app_')
+    tcnts.start('a')
+    tcnts.stop('a')
+    vcnts.inc('hits', 3)
+    snapshots = []
+    exporter = Exporter(tcnts, vcnts, sinks=[snapshots.append])
+    snapshot = exporter.flush()
+    assert snapshots == [snapshot]
+    assert snapshot['value'] == {'app_hits': 3}
+    assert 'a' in snapshot['time']
+    assert not snapshot['delta']
+    assert snapshot['timestamp'] > 0
+
+
+def test_delta():
+    vcnts = ValueCounters()
+    vcnts.inc('a', 3)
+    vcnts.inc('b', 1)
+    exporter = Exporter(vcnts, sinks=[], delta=True)
+    assert exporter.flush()['value'] == {'a': 3, 'b': 1}
+    vcnts.inc('a', 2)
+    assert exporter.flush()['value'] == {'a': 2}
+    assert exporter.flush()['value'] == {}
+
+
+def test_thread():
+    vcnts = ValueCounters()
+    snapshots = []
+    with Exporter(vcnts, sinks=[snapshots.append], interval=0.01):
+        for _ in range(20):
+            vcnts.inc('a')
+            sleep(0.005)
+    assert len(snapshots) >= 2
+    assert snapshots[-1]['value'] == {'a': 20}
+
+
+def test_async():
+    vcnts = ValueCounters()
+    snapshots = []
+    exporter = Exporter(vcnts, sinks=[snapshots.append], interval=0.01)
+
+    async def main():
+        task = asyncio.create_task(exporter.run())
+        vcnts.inc('a')
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(main())
+    assert snapshots
+    assert snapshots[0]['value'] == {'a': 1}
+
+
+def test_failing_sink():
+    def fail(snapshot):
+        raise IOError('down')
+
+    snapshots = []
+    exporter = Exporter(ValueCounters(), sinks=[fail, snapshots.append])
+    exporter.flush()
+    assert exporter.errors == 1
+    assert len(snapshots) == 1
+
+
+def test_jsonlines_sink(tmp_path):
+    path = str(tmp_path / 'counters.jsonl')
+    vcnts = ValueCounters()
+    vcnts.inc('a')
+    exporter = Exporter(vcnts, sinks=[JsonLinesSink(path)])
+    exporter.flush()
+    exporter.close()
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 2
+    assert lines[0]['value'] == {'a': 1}
+
+
+def test_rotating_sink(tmp_path):
+    path = str(tmp_path / 'counters.jsonl')
+    sink = RotatingFileSink(path, max_bytes=200, backup_count=2)
+    vcnts = ValueCounters()
+    vcnts.inc('a')
+    exporter = Exporter(vcnts, sinks=[sink])
+    for _ in range(10):
+        exporter.flush()
+    sink.close()
+    assert (tmp_path / 'counters.jsonl.1').exists()
+    assert (tmp_path / 'counters.jsonl.2').exists()
+    assert not (tmp_path / 'counters.jsonl.3').exists()
+    for name in ['counters.jsonl', 'counters.jsonl.1']:
+        assert (tmp_path / name).stat().st_size <= 200
+
+
+def test_statsd_sink():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(2)
+    port = server.getsockname()[1]
+
+    tcnts = TimeCounters()
+    tcnts.start('t')
+    vcnts = ValueCounters()
+    vcnts.inc('v', 5)
+    sink = StatsdSink('127.0.0.1', port, prefix='svc.')
+    Exporter(tcnts, vcnts, sinks=[sink], delta=True).flush()
+    lines = server.recv(4096).decode('utf-8').split('\n')
+    assert lines[0].startswith('svc.t:') and lines[0].endswith('|ms')
+    assert lines[1] == 'svc.v:5|c'
+    sink.close()
+    server.close()
+
+
+def test_statsd_packets():
+    sink = StatsdSink(max_packet_size=30)
+    snapshot = {'delta': False, 'time': {},
+                'value': {f"counter_{i}": i for i in range(10)}}
+    assert sink.format(snapshot)[0] == 'counter_0:0|g'
+    sink(snapshot)
+    sink.close()
+
+
+def test_statsd_units():
+    sink = StatsdSink()
+    for format, value in (('s', 0.25), ('ms', 250), ('ns', 250_000_000)):
+        snapshot = {'delta': True, 'format': format, 'time': {'db': value},
+                    'value': {}}
+        assert sink.format(snapshot) == ['db:250.0|ms']
+    sink.close()
+
+
+def test_statsd_totals_as_gauges():
+    tcnts = TimeCounters()
+    tcnts.start('t')
+    tcnts.stop('t')
+    vcnts = ValueCounters()
+    vcnts.dec('v', 5)
+    sink = StatsdSink()
+    snapshot = Exporter(tcnts, vcnts, sinks=[], format='s').collect()
+    lines = sink.format(snapshot)
+    assert lines[0].startswith('t:') and lines[0].endswith('|g')
+    assert lines[1:] == ['v:0|g', 'v:-5|g']
+    sink.close()
+
+
+def test_invalid_collection():
+    with pytest.raises(ValueError):
+        Exporter({}, sinks=[])
+
+
+def test_double_start():
+    exporter = Exporter(ValueCounters(), sinks=[], interval=10)
+    exporter.start()
+    with pytest.raises(ValueError):
+        exporter.start()
+    exporter.stop(flush=False)
@@ -0,0 +1,65 @@
+import subprocess
+import sys
+
+import pytest
+
+from perfcounters import ValueCounters
+
+# heavy modules only loaded on first use
+DEFERRED = ['tabulate', 'wcwidth', 'numpy', 'asyncio', 'json', 'gzip',
+            'multiprocessing', 'html']
+
+# package modules only loaded by the features using them
+LAZY_MODULES = ['perfcounters.shared', 'perfcounters.async_counters',
+                'perfcounters.snapshot', 'perfcounters.compare',
+                'perfcounters.stats', 'perfcounters.bench',
+                'perfcounters.chrome_trace', 'perfcounters.exporter',
+                'perfcounters.openmetrics', 'perfcounters.profiler']
+
+
+def _run(code):
+    return subprocess.run([sys.executable, '-c', code],
+                          capture_output=True, text=True, check=True)
+
+
+def _imported(names):
+    "names of the modules imported by import perfcounters"
+    code = ("import sys, perfcounters\n"
+            f"print(','.join(m for m in {names!r} if m in sys.modules))")
+    return _run(code).stdout.strip()
+
+
+def test_lazy_modules():
+    assert _imported(LAZY_MODULES) == ''
+
+
+def test_deferred_imports():
+    assert _imported(DEFERRED) == ''
+
+    # built-in table formats don't need tabulate
+    code = ("import sys, perfcounters\n"
+            "cnts = perfcounters.ValueCounters()\n"
+            "cnts.inc('a')\n"
+            "cnts.to_md()\n"
+            "cnts.report()\n"
+            "print('tabulate' in sys.modules)")
+    assert _run(code).stdout.strip().endswith('False')
+
+
+def test_lazy_collections():
+    import perfcounters
+    assert perfcounters.SharedCounters.__name__ == 'SharedCounters'
+    assert perfcounters.AsyncTimeCounters.__name__ == 'AsyncTimeCounters'
+    with pytest.raises(AttributeError):
+        perfcounters.Unknown
+
+
+def test_missing_tabulate(monkeypatch):
+    import perfcounters.format
+    monkeypatch.setattr(perfcounters.format, 'get_tabulate', lambda: None)
+    cnts = ValueCounters()
+    cnts.inc('a')
+    assert cnts.to_md()
+    with pytest.raises(ImportError):
+        perfcounters.format.format_counters(cnts.get_all(), ['Name', 'Value'],
+                                            format='grid')
@@ -0,0 +1,140 @@
+import gc
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+from perfcounters import MemoryCounters
+from perfcounters.memory_counters import convert_bytes, read_rss
+
+LINUX = sys.platform.startswith('linux')
+
+
+def test_read_rss():
+    rss = read_rss()
+    if LINUX:
+        assert rss > 0
+        data = bytearray(64 << 20)
+        data[::4096] = b'x' * len(data[::4096])  # touch the pages
+        assert read_rss() - rss >= 32 << 20
+        del data
+    else:
+        assert rss == 0
+
+
+def test_convert_bytes():
+    assert convert_bytes(3 << 20, 'MiB', 2) == 3
+    assert convert_bytes(1536, 'KiB', 2) == 1.5
+    assert convert_bytes(1536, 'B', 2) == 1536
+    with pytest.raises(ValueError):
+        convert_bytes(1, 'MB', 2)
+
+
+@pytest.fixture
+def cnts():
+    with MemoryCounters(prefix='mem.', start_tracing=True) as cnts:
+        yield cnts
+
+
+def test_full(cnts):
+    assert tracemalloc.is_tracing()
+    cnts.start('alloc')
+    data = [bytearray(1 << 20) for _ in range(8)]
+    cnts.lap('alloc')
+    del data
+    gc.collect()
+    cnts.stop('alloc')
+
+    res = cnts.get('alloc', format='KiB')
+    assert list(res) == ['rss', 'traced', 'peak', 'gc']
+    assert res['peak'] >= 8 * 1024
+    assert abs(res['traced']) < 1024
+    assert res['gc'] >= 1
+
+    traced = cnts.get_laps('alloc', metric='traced', format='KiB')
+    assert len(traced) == 2
+    assert traced[0] >= 8 * 1024
+    assert traced[1] <= -8 * 1024
+    assert cnts.get_laps('alloc', metric='peak', format='KiB')[0] >= 8 * 1024
+    assert cnts.get_laps('alloc', metric='gc')[1] >= 1
+
+    all_cnts = cnts.get_all()
+    assert list(all_cnts) == ['mem.alloc']
+    assert len(all_cnts['mem.alloc']) == 4
+    assert 'Peak (MiB)' in cnts.to_md()
+
+    with pytest.raises(ValueError):
+        cnts.get_laps('alloc', metric='unknown')
+    with pytest.raises(ValueError):
+        cnts.start('alloc')
+    with pytest.raises(ValueError):
+        cnts.lap('unknown')
+
+
+def test_running_counter(cnts):
+    cnts.start('run')
+    data = bytearray(4 << 20)
+    # reading a running counter doesn't stop it
+    assert cnts.get('run', format='KiB')['traced'] >= 4 * 1024
+    assert cnts.get('run', format='KiB')['peak'] >= 4 * 1024
+    del data
+    cnts.stop_all()
+    assert cnts.get('run', format='KiB')['peak'] >= 4 * 1024
+
+    cnts.reset('run')
+    assert cnts.get('run', format='KiB')['peak'] < 4 * 1024
+    assert len(cnts) == 1
+
+
+@pytest.mark.skipif(tracemalloc.is_tracing(), reason='tracemalloc is tracing')
+def test_tracing_opt_in():
+    with pytest.raises(ValueError):
+        MemoryCounters()
+    a = MemoryCounters(start_tracing=True)
+    b = MemoryCounters(start_tracing=True)
+    a.close()
+    # still used by b
+    assert tracemalloc.is_tracing()
+    b.close()
+    b.close()
+    assert not tracemalloc.is_tracing()
+
+    # tracing started by the application is left running
+    tracemalloc.start()
+    try:
+        MemoryCounters().close()
+        MemoryCounters(start_tracing=True).close()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_low_overhead():
+    cnts = MemoryCounters(low_overhead=True)
+    cnts.start('rss')
+    cnts.lap('rss')
+    cnts.stop('rss')
+    assert list(cnts.get('rss')) == ['rss']
+    assert len(cnts.get_laps('rss')) == 2
+    with pytest.raises(ValueError):
+        cnts.get_laps('rss', metric='traced')
+    assert 'Traced' not in cnts.to_md()
+    assert 'RSS (MiB)' in cnts.to_md()
+
+
+@pytest.mark.skipif(not LINUX or not hasattr(os, 'fork'),
+                    reason='requires /proc and fork')
+def test_rss_after_fork():
+    read_rss()
+    r, w = os.pipe()
+    pid = os.fork()
+    if not pid:
+        # the child reads its own statm
+        data = bytearray(64 << 20)
+        data[::4096] = b'x' * len(data[::4096])
+        os.write(w, str(read_rss()).encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    child_rss = int(os.read(r, 64))
+    assert child_rss - read_rss() >= 32 << 20
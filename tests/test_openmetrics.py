@@ -0,0 +1,167 @@
+import urllib.error
+import urllib.request
+import pytest
+from perfcounters import TimeCounters, ValueCounters
+from perfcounters.openmetrics import (CONTENT_TYPE, OpenMetricsRenderer,
+                                      metric_name, serve)
+
+
+def test_metric_name():
+    assert metric_name('app_', 'db') == 'app_db'
+    assert metric_name('', 'http.req-ms') == 'http_req_ms'
+    assert metric_name('', '2xx') == '_2xx'
+
+
+def test_render_values():
+    cnts = ValueCounters(prefix='app_')
+    cnts.inc('hits', 3)
+    cnts.set('temp', 1.5)
+    text = OpenMetricsRenderer(cnts, counter_names=['hits']).render()
+    assert '# TYPE app_hits counter\napp_hits_total 3\n' in text
+    assert '# TYPE app_temp gauge\napp_temp 1.5\n' in text
+    assert text.endswith('# EOF\n')
+
+
+def test_render_family():
+    cnts = ValueCounters(prefix='app_')
+    http = cnts.family('http', labels=('status', 'route'))
+    http.labels(200, '/api').inc(3)
+    http.labels(500, 'a"b').inc()
+    renderer = OpenMetricsRenderer(cnts, counter_names=['http'])
+    text = renderer.render()
+    assert ('# TYPE app_http counter\n'
+            'app_http_total{status="200",route="/api"} 3\n'
+            'app_http_total{status="500",route="a\\"b"} 1\n') in text
+    http.labels(200, '/api').inc()
+    assert 'route="/api"} 4\n' in renderer.render()
+
+
+def test_render_times():
+    cnts = TimeCounters()
+    cnts.start('db')
+    for _ in range(9):
+        cnts.lap('db')
+    cnts.stop('db')
+    with cnts.time('parse'):
+        pass
+    text = OpenMetricsRenderer(cnts, namespace='svc').render()
+    assert '# TYPE svc_db_seconds summary\n' in text
+    assert '# UNIT svc_db_seconds seconds\n' in text
+    assert 'svc_db_seconds{quantile="0.99"} ' in text
+    assert 'svc_db_seconds_count 10\n' in text
+    assert 'svc_db_seconds_sum ' in text
+    assert 'svc_parse_seconds_count 1\n' in text
+
+
+def test_render_sampled():
+    cnts = TimeCounters(sample_every=10)
+    cnts.start('db')
+    for _ in range(99):
+        cnts.lap('db')
+    cnts.stop('db')
+    cnts.start('running')
+    cnts.lap('running')
+    assert len(cnts.counters['db'].laps) == 10
+    text = OpenMetricsRenderer(cnts).render()
+    assert 'db_seconds_count 100\n' in text
+    assert 'running_seconds_count 1\n' in text
+
+    cnts = TimeCounters()
+    cnts.start('once')
+    cnts.stop('once')
+    cnts.start('running')
+    text = OpenMetricsRenderer(cnts).render()
+    assert 'once_seconds_count 1\n' in text
+    assert 'running_seconds_count 0\n' in text
+
+
+def test_render_bounded():
+    cnts = TimeCounters(bounded=True)
+    cnts.start('db')
+    cnts.lap('db')
+    cnts.stop('db')
+    text = OpenMetricsRenderer(cnts).render()
+    assert 'db_seconds_count 2\n' in text
+
+
+def test_cache():
+    cnts = ValueCounters()
+    cnts.inc('a')
+    cnts.inc('b')
+    tcnts = TimeCounters()
+    tcnts.start('stopped')
+    tcnts.stop('stopped')
+    tcnts.start('running')
+    renderer = OpenMetricsRenderer(cnts, tcnts)
+    renderer.render()
+    first = dict(renderer._cache)
+    cnts.inc('b')
+    text = renderer.render()
+    assert 'b 2\n' in text
+    a, b = cnts.counters['a'], cnts.counters['b']
+    assert renderer._cache[a] is first[a]
+    assert renderer._cache[b] is not first[b]
+    stopped = tcnts.counters['stopped']
+    running = tcnts.counters['running']
+    assert renderer._cache[stopped] is first[stopped]
+    assert renderer._cache[running] is not first[running]
+
+
+def test_name_collisions():
+    cnts = ValueCounters()
+    cnts.inc('a.b')
+    renderer = OpenMetricsRenderer(cnts)
+    renderer.render()
+    cnts.inc('a_b')
+    with pytest.raises(ValueError):
+        renderer.render()
+    tcnts = TimeCounters()
+    tcnts.start('x')
+    tcnts.stop('x')
+    vcnts = ValueCounters()
+    vcnts.set('x_seconds_count', 1)
+    with pytest.raises(ValueError):
+        OpenMetricsRenderer([tcnts, vcnts]).render()
+    first, second = ValueCounters(), ValueCounters()
+    first.inc('x.y')
+    second.inc('x.y')
+    with pytest.raises(ValueError):
+        OpenMetricsRenderer(first, second).render()
+    # a counter exports its _total sample, not the bare family name
+    vcnts = ValueCounters()
+    vcnts.inc('hits')
+    vcnts.family('http', labels=('status',)).labels(200).inc()
+    assert OpenMetricsRenderer(vcnts, counter_names=['hits']).render()
+
+
+def test_render_special_values():
+    cnts = ValueCounters()
+    cnts.set('high', float('inf'))
+    cnts.set('low', float('-inf'))
+    cnts.set('unknown', float('nan'))
+    text = OpenMetricsRenderer(cnts).render()
+    assert 'high +Inf\n' in text
+    assert 'low -Inf\n' in text
+    assert 'unknown NaN\n' in text
+
+
+def test_invalid_collection():
+    with pytest.raises(ValueError):
+        OpenMetricsRenderer({})
+
+
+def test_serve():
+    cnts = ValueCounters()
+    cnts.inc('hits')
+    server = serve(OpenMetricsRenderer(cnts), port=0, addr='127.0.0.1')
+    port = server.server_address[1]
+    try:
+        url = f"http://127.0.0.1:{port}/metrics"
+        with urllib.request.urlopen(url) as resp:
+            assert resp.headers['Content-Type'] == CONTENT_TYPE
+            assert b'hits 1\n' in resp.read()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,162 @@
+import json
+import sys
+import threading
+from time import sleep
+import pytest
+from perfcounters import TimeCounters
+from perfcounters.profiler import Profiler
+
+D = 0.01
+BACKENDS = ['setprofile']
+if sys.version_info >= (3, 12):
+    BACKENDS.append('monitoring')
+
+
+def leaf():
+    sleep(D)
+
+
+def parent():
+    leaf()
+    sleep(D)
+
+
+def fact(n):
+    return 1 if n <= 1 else n * fact(n - 1)
+
+
+def failing():
+    raise KeyError('x')
+
+
+def gen():
+    yield 1
+    yield 2
+
+
+def name(func):
+    return f"{__name__}.{func.__qualname__}"
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_self_and_cumulative(backend):
+    cnts = TimeCounters()
+    with Profiler(cnts, modules=[__name__], backend=backend):
+        for _ in range(2):
+            parent()
+    parent_timer = cnts.get_timer(name(parent), format='ms')
+    assert parent_timer['count'] == 2
+    assert parent_timer['total'] >= 4 * D * 1000
+    parent_self = cnts.get_timer(name(parent) + ' (self)', format='ms')
+    assert parent_self['count'] == 2
+    assert parent_self['total'] >= 2 * D * 1000
+    assert parent_self['total'] < parent_timer['total']
+    assert cnts.get_timer(name(leaf), format='ms')['count'] == 2
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_filters(backend):
+    cnts = TimeCounters()
+    with Profiler(cnts, modules=[__name__], qualnames=['le*'],
+                  backend=backend):
+        parent()
+    assert set(cnts.get_all()) == {name(leaf), name(leaf) + ' (self)'}
+
+    cnts = TimeCounters()
+    with Profiler(cnts, modules=['nomatch.*'], backend=backend):
+        parent()
+    assert len(cnts) == 0
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_recursion(backend):
+    cnts = TimeCounters()
+    with Profiler(cnts, qualnames=['fact'], backend=backend):
+        assert fact(5) == 120
+    # cumulative time only counts the outermost call
+    assert cnts.get_timer(name(fact))['count'] == 1
+    assert cnts.get_timer(name(fact) + ' (self)')['count'] == 5
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_exceptions_and_generators(backend):
+    cnts = TimeCounters()
+    with Profiler(cnts, qualnames=['failing', 'gen'], backend=backend):
+        with pytest.raises(KeyError):
+            failing()
+        assert list(gen()) == [1, 2]
+    assert cnts.get_timer(name(failing))['count'] == 1
+    # every resume is a call
+    assert cnts.get_timer(name(gen))['count'] == 3
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_restart(backend):
+    cnts = TimeCounters()
+    prof = Profiler(cnts, qualnames=['leaf'], backend=backend)
+    for _ in range(2):
+        prof.start()
+        parent()
+        prof.stop()
+    assert cnts.get_timer(name(leaf))['count'] == 2
+    with pytest.raises(ValueError):
+        prof.stop()
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_threads(backend):
+    cnts = TimeCounters()
+
+    def work():
+        for _ in range(500):
+            fact(5)
+
+    with Profiler(cnts, qualnames=['fact'], backend=backend):
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert cnts.get_timer(name(fact))['count'] == 4 * 500
+    assert cnts.get_timer(name(fact) + ' (self)')['count'] == 4 * 500 * 5
+
+
+@pytest.mark.skipif(sys.version_info < (3, 12), reason="Python 3.12+")
+def test_monitoring_restart(monkeypatch):
+    cnts = TimeCounters()
+    with Profiler(cnts, qualnames=['leaf'], backend='monitoring'):
+        parent()
+    restart = sys.monitoring.restart_events
+    restarts = []
+
+    def restart_events():
+        restarts.append(1)
+        restart()
+
+    monkeypatch.setattr(sys.monitoring, 'restart_events', restart_events)
+    # parent is disabled but not profiled: other tools events are left
+    # alone
+    with Profiler(cnts, qualnames=['leaf'], backend='monitoring'):
+        parent()
+    assert not restarts
+    with Profiler(cnts, qualnames=['parent'], backend='monitoring'):
+        parent()
+    assert restarts == [1]
+    assert cnts.get_timer(name(parent))['count'] == 1
+    assert cnts.get_timer(name(leaf))['count'] == 2
+
+
+def test_report():
+    prof = Profiler(qualnames=['leaf'])
+    with prof:
+        leaf()
+    assert name(leaf) in json.loads(prof.counters.to_json())
+    prof.counters.report()
+
+
+def test_invalid_backend():
+    with pytest.raises(ValueError):
+        Profiler(backend='dtrace')
+    if sys.version_info < (3, 12):
+        with pytest.raises(ValueError):
+            Profiler(backend='monitoring')
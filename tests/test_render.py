@@ -0,0 +1,204 @@
+import pytest
+from tabulate import tabulate
+
+from perfcounters import TimeCounters, ValueCounters
+from perfcounters.format import format_counters
+from perfcounters.render import FAST_FORMATS, TableRenderer, render_table
+
+TABLES = [
+    ({'a': 1, 'foo_bar': 12345678, 'neg': -3}, ['Name', 'Value']),
+    ({'a': 1.5, 'b': 2, 'c': 1e-07, 'd': 123456789.1}, ['Name', 'Time (s)']),
+    ({'x<y>&z': 0.25, '100%': float('inf'), 'a~b\\c': float('nan')},
+     ['Name', 'Value']),
+    ({'  spaced ': [1, 2.5, 3], '1': [4, 5, 6.125]},
+     ['Name', 'Sum', 'Rate (/s)', 'A long header']),
+]
+
+
+def _tabulate(cnts, headers, fmt):
+    rows = [[k, *v] if isinstance(v, list) else [k, v]
+            for k, v in cnts.items()]
+    return tabulate(rows, headers=headers, tablefmt=fmt)
+
+
+@pytest.mark.parametrize('fmt', FAST_FORMATS)
+@pytest.mark.parametrize('cnts,headers', TABLES)
+def test_same_output_as_tabulate(fmt, cnts, headers):
+    table = TableRenderer().render(cnts, headers, fmt)
+    assert table is not None
+    assert table == _tabulate(cnts, headers, fmt)
+
+
+@pytest.mark.parametrize('fmt', FAST_FORMATS)
+@pytest.mark.parametrize('cnts,headers', [
+    ({}, ['Name', 'Value']),
+    ({}, []),
+    ({'a': 1}, []),
+    ({'a': '1'}, ['Name', 'Value']),
+    ({'a': True, 'b': False}, ['Name', 'Value']),
+    ({'a': None, 'b': ''}, ['Name', 'Value']),
+    ({'é': 1, '日本語': 2.5}, ['Name', 'Value']),
+    ({'ｗｉｄｅ': '日本', 'b': 'x'}, ['名前', '値']),
+    ({'0': 1.5, '1': 2, '2': 3}, ['Lap', 'Value']),
+    ({'404': 3, '500': 1}, ['Name', 'Value']),
+    ({'a': [1, 2], 'b': [1]}, ['Name', 'A', 'B']),
+    ({'a': [1, 2]}, ['Name', 'A']),
+    ({'a': [True, 1], 'b': [2, None]}, ['Name', 'A', 'B']),
+    ({'a': '+5.0%', 'b': '', 'c': '-1.2%'}, ['Name', 'Change']),
+    ({'1,000': '1,000.5', 'x': 'nan', 'y': '1e5', 'z': ' 12 '},
+     ['Name', 'Value']),
+])
+def test_general_tables(fmt, cnts, headers):
+    assert TableRenderer().render(cnts, headers, fmt) == _tabulate(
+        cnts, headers, fmt)
+
+
+def test_general_tables_without_wcwidth(monkeypatch):
+    import tabulate as tabulate_module
+
+    import perfcounters.render
+    monkeypatch.setattr(tabulate_module, 'WIDE_CHARS_MODE', False)
+    monkeypatch.setattr(perfcounters.render, 'get_wcwidth', lambda: None)
+    cnts = {'日本語': 1, 'é': 2.5}
+    for fmt in FAST_FORMATS:
+        assert render_table(cnts, ['Name', 'Value'], fmt) == _tabulate(
+            cnts, ['Name', 'Value'], fmt)
+
+
+@pytest.mark.parametrize('cnts,headers,fmt', [
+    ({'a': 1}, ['Name', 'Value'], 'grid'),
+    ({'a\nb': 1}, ['Name', 'Value'], 'plain'),
+    ({'a': '\x1b[31m1\x1b[0m'}, ['Name', 'Value'], 'github'),
+    ({'a': b'1'}, ['Name', 'Value'], 'plain'),
+])
+def test_fallback(cnts, headers, fmt):
+    assert TableRenderer().render(cnts, headers, fmt) is None
+    # format_counters still renders them with tabulate
+    assert format_counters(cnts, headers, fmt) == _tabulate(cnts, headers,
+                                                            fmt)
+
+
+def test_cached_rows():
+    renderer = TableRenderer()
+    headers = ['Name', 'Value']
+    cnts = {'a': 1, 'b': 2}
+    for fmt in FAST_FORMATS:
+        renderer.render(cnts, headers, fmt)
+    rows = renderer._rows['plain']
+    line_b = rows['b'][5]
+
+    # unchanged rows are reused, changed ones reformatted
+    cnts = {'a': 3, 'b': 2}
+    assert renderer.render(cnts, headers, 'plain') == _tabulate(
+        cnts, headers, 'plain')
+    assert renderer._rows['plain']['b'][5] is line_b
+
+    # a wider row changes the layout of all the rows
+    cnts = {'a': 3, 'b': 2, 'long_name': 1000}
+    assert renderer.render(cnts, headers, 'plain') == _tabulate(
+        cnts, headers, 'plain')
+    assert renderer._rows['plain']['b'][5] is not line_b
+
+    # a float turns the column into a float column
+    cnts = {'a': 3, 'b': 12345678, 'c': 0.5}
+    assert renderer.render(cnts, headers, 'plain') == _tabulate(
+        cnts, headers, 'plain')
+
+    # removed counters are dropped
+    cnts = {'a': 3}
+    assert renderer.render(cnts, headers, 'plain') == _tabulate(
+        cnts, headers, 'plain')
+    assert list(renderer._rows['plain']) == ['a']
+
+    renderer.clear()
+    assert not renderer._rows
+
+
+def test_cached_rows_mutated_values():
+    renderer = TableRenderer()
+    headers = ['Name', 'Count', 'Total']
+    value = [1, 2]
+    cnts = {'a': value}
+    renderer.render(cnts, headers, 'plain')
+    line = renderer._rows['plain']['a'][5]
+    # unchanged lists values reuse their row
+    renderer.render({'a': [1, 2]}, headers, 'plain')
+    assert renderer._rows['plain']['a'][5] is line
+    value[1] = 5
+    assert renderer.render(cnts, headers, 'plain') == _tabulate(
+        cnts, headers, 'plain')
+
+
+def test_collections_reports():
+    cnts = ValueCounters()
+    cnts.inc('hits', 3)
+    cnts.set('ratio', 0.5)
+    expected = _tabulate(cnts.get_all(), ['Name', 'Value'], 'github')
+    assert cnts.to_md() == expected
+    cnts.inc('hits')
+    assert cnts.to_md() == _tabulate(cnts.get_all(), ['Name', 'Value'],
+                                     'github')
+
+    tcnts = TimeCounters()
+    tcnts.start('a')
+    tcnts.stop('a')
+    assert tcnts.to_latex() == _tabulate(tcnts.get_all(),
+                                         ['Name', 'Time (s)'], 'latex')
+
+
+def test_reports_without_tabulate(no_tabulate, capsys):
+    from perfcounters import (AsyncTimeCounters, MemoryCounters,
+                              SpanCounters, ThreadSafeValueCounters,
+                              WindowedCounters)
+
+    # empty collections
+    for collection in (TimeCounters(), ValueCounters(),
+                       ThreadSafeValueCounters(), WindowedCounters(),
+                       AsyncTimeCounters(), SpanCounters()):
+        collection.report()
+        for fmt in ('to_md', 'to_html', 'to_latex'):
+            assert getattr(collection, fmt)()
+
+    tcnts = TimeCounters()
+    tcnts.start('a')
+    tcnts.lap('a')
+    tcnts.stop('a')
+    tcnts.start('日本')
+    tcnts.stop('日本')
+    tcnts.report()
+    tcnts.report_laps('a')
+    for fmt in ('to_md', 'to_html', 'to_latex'):
+        assert getattr(tcnts, fmt)()
+    for fmt in ('laps_to_md', 'laps_to_html', 'laps_to_latex'):
+        assert getattr(tcnts, fmt)('a')
+
+    for vcnts in (ValueCounters(), ThreadSafeValueCounters()):
+        vcnts.inc('404')
+        vcnts.inc('é', 2)
+        vcnts.set('flag', True)
+        vcnts.report()
+        for fmt in ('to_md', 'to_html', 'to_latex'):
+            assert getattr(vcnts, fmt)()
+
+    wcnts = WindowedCounters()
+    wcnts.inc('200')
+    wcnts.report()
+    assert wcnts.to_md()
+
+    spans = SpanCounters()
+    with spans.span('outer'):
+        with spans.span('inner'):
+            pass
+    spans.report()
+    for fmt in ('to_md', 'to_html', 'to_latex'):
+        assert getattr(spans, fmt)()
+
+    with MemoryCounters(start_tracing=True) as mcnts:
+        mcnts.start('a')
+        mcnts.lap('a')
+        mcnts.stop('a')
+        mcnts.report()
+        mcnts.report_laps('a')
+        for fmt in ('to_md', 'to_html', 'to_latex'):
+            assert getattr(mcnts, fmt)()
+    assert capsys.readouterr().out
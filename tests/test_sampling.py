@@ -0,0 +1,142 @@
+import pytest
+from perfcounters import TimeCounters
+from perfcounters.sampling import Sampler, estimate_total
+
+
+def test_every():
+    sampler = Sampler(every=4)
+    assert [sampler.skip() for _ in range(3)] == [4, 4, 4]
+
+
+def test_rate():
+    sampler = Sampler(rate=0.1)
+    skips = [sampler.skip() for _ in range(10000)]
+    assert min(skips) >= 1
+    assert 9 < sum(skips) / len(skips) < 11
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        Sampler()
+    with pytest.raises(ValueError):
+        Sampler(every=2, rate=0.5)
+    with pytest.raises(ValueError):
+        Sampler(rate=1.5)
+    with pytest.raises(ValueError):
+        Sampler(every=0)
+    with pytest.raises(ValueError):
+        Sampler(every=2, overhead_budget=0.01)
+    with pytest.raises(ValueError):
+        TimeCounters(sample_every=0)
+
+
+def test_estimate_total():
+    # every duration sampled: exact
+    assert estimate_total(4, 4, 40, 400) == (40.0, 0.0)
+    # constant durations: no error
+    total, error = estimate_total(100, 10, 100, 1000)
+    assert total == 1000
+    assert error == 0
+    total, error = estimate_total(100, 10, 100, 2000)
+    assert total == 1000
+    assert error > 0
+    assert estimate_total(10, 0, 0, 0) == (0.0, 0.0)
+
+
+def test_sampled_timer():
+    cnts = TimeCounters(sample_every=10)
+    for _ in range(1000):
+        with cnts.time('loop'):
+            pass
+    timer = cnts.timers['loop']
+    assert timer.count == 1000
+    assert timer.sampler.sampled == 100
+    estimate = cnts.get_estimate('loop', format='ns')
+    assert estimate['count'] == 1000
+    assert estimate['sampled'] == 100
+    assert estimate['rate'] == 0.1
+    assert estimate['total'] > 0
+    assert estimate['error'] >= 0
+    assert cnts.get('loop', format='ns') == estimate['total']
+    stats = cnts.get_timer('loop', format='ns')
+    assert stats['count'] == 1000
+    assert stats['min'] <= stats['mean'] <= stats['max']
+    cnts.reset('loop')
+    assert cnts.get('loop') == 0
+
+
+def test_sampled_timed():
+    cnts = TimeCounters(sample_rate=0.5)
+
+    @cnts.timed('f')
+    def f():
+        return 1
+
+    assert sum(f() for _ in range(100)) == 100
+    assert cnts.timers['f'].count == 100
+    assert 0 < cnts.timers['f'].sampler.sampled < 100
+
+
+def test_sampled_laps():
+    cnts = TimeCounters(sample_every=10)
+    cnts.start('loop')
+    for _ in range(99):
+        cnts.lap('loop')
+    cnts.stop('loop')
+    estimate = cnts.get_estimate('loop', format='ns')
+    assert estimate['count'] == 100
+    assert estimate['sampled'] == 10
+    assert estimate['total'] == cnts.get('loop', format='ns')
+    assert estimate['error'] == 0
+    assert len(cnts.get_laps('loop', format='ns')) == 10
+    assert cnts.get_stats('loop')['count'] == 10
+    assert len(cnts.get_percentiles('loop')) == 4
+
+
+@pytest.mark.parametrize('mode', [{}, {'bounded': True}, {'compact': True}])
+def test_sampled_laps_reset(mode):
+    cnts = TimeCounters(sample_every=10, **mode)
+    cnts.start('loop')
+    for _ in range(99):
+        cnts.lap('loop')
+    cnts.reset('loop')
+    estimate = cnts.get_estimate('loop', format='ns')
+    assert estimate['count'] == 0
+    assert estimate['sampled'] == 0
+    assert cnts.counters['loop'].sampler.estimate() == (0.0, 0.0)
+    for _ in range(19):
+        cnts.lap('loop')
+    cnts.stop('loop')
+    estimate = cnts.get_estimate('loop', format='ns')
+    assert estimate['count'] == 20
+    assert estimate['sampled'] == 2
+    assert cnts.get_stats('loop')['count'] == 2
+
+
+@pytest.mark.parametrize('mode', [{'bounded': True}, {'compact': True}])
+def test_sampled_laps_storage(mode):
+    cnts = TimeCounters(sample_every=2, **mode)
+    cnts.start('loop')
+    for _ in range(9):
+        cnts.lap('loop')
+    cnts.stop('loop')
+    assert cnts.get_stats('loop')['count'] == 5
+
+
+def test_adaptive():
+    cnts = TimeCounters(overhead_budget=0.01)
+    # empty regions: timing overhead is way above 1%
+    for _ in range(10000):
+        with cnts.time('hot'):
+            pass
+    assert cnts.timers['hot'].sampler.rate < 1
+    assert cnts.timers['hot'].count == 10000
+
+
+def test_not_sampled():
+    cnts = TimeCounters()
+    cnts.start('a')
+    with pytest.raises(ValueError):
+        cnts.get_estimate('a')
+    with pytest.raises(ValueError):
+        cnts.get_estimate('b')
@@ -0,0 +1,139 @@
+import multiprocessing
+import threading
+
+import pytest
+from perfcounters import SharedCounters, TimeCounters, ValueCounters
+
+fork = multiprocessing.get_context('fork')
+
+
+def inc_worker(cnts, n):
+    for _ in range(n):
+        cnts.inc('hits')
+    cnts.inc('bytes', 2.5)
+    with cnts.time('work'):
+        pass
+
+
+def publish_worker(cnts, value):
+    local = ValueCounters()
+    local.set('items', value)
+    cnts.publish(local)
+    local.set('items', value * 2)
+    cnts.publish(local)
+
+
+def run_workers(target, args_list):
+    procs = [fork.Process(target=target, args=args) for args in args_list]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+
+def test_multiprocess_inc():
+    with SharedCounters(num_slots=8, num_rows=8, lock=fork.Lock()) as cnts:
+        run_workers(inc_worker, [(cnts, 1000)] * 4)
+        assert cnts.get('hits') == 4000
+        assert cnts.get('bytes') == 10
+        assert cnts.get('work', format='ns') > 0
+        cnts.inc('hits')
+        assert cnts.get_all(format='ns')['hits'] == 4001
+        assert len(cnts) == 3
+
+
+def test_multiprocess_publish():
+    with SharedCounters(num_slots=8, num_rows=8, lock=fork.Lock()) as cnts:
+        run_workers(publish_worker, [(cnts, 1), (cnts, 2), (cnts, 3)])
+        assert cnts.get('items') == 12
+
+
+def test_publish_time_counters():
+    with SharedCounters(prefix='app_') as cnts:
+        local = TimeCounters()
+        local.start('a')
+        local.stop('a')
+        with local.time('b'):
+            pass
+        cnts.publish(local)
+        assert cnts.get('a', format='ns') == local.get('a', format='ns')
+        assert cnts.get('b', format='ns') == local.get('b', format='ns')
+        assert set(cnts.get_all()) == {'app_a', 'app_b'}
+        assert 'app_a' in cnts.to_json()
+
+
+def test_spawn():
+    spawn = multiprocessing.get_context('spawn')
+    with SharedCounters(num_slots=8, num_rows=8, lock=spawn.Lock()) as cnts:
+        procs = [spawn.Process(target=inc_worker, args=(cnts, 10))
+                 for _ in range(2)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+            assert p.exitcode == 0
+        assert cnts.get('hits') == 20
+
+
+def test_attach_read_only():
+    with SharedCounters() as cnts:
+        cnts.inc('a', 3)
+        other = SharedCounters(name=cnts.name, create=False)
+        assert other.get('a') == 3
+        with pytest.raises(ValueError):
+            other.inc('a')
+        other.close()
+
+
+def test_limits():
+    with SharedCounters(num_slots=1) as cnts:
+        cnts.inc('a')
+        with pytest.raises(ValueError):
+            cnts.inc('b')
+        with pytest.raises(ValueError):
+            cnts.inc('x' * 100)
+        with pytest.raises(ValueError):
+            cnts.add_time('a', 10)
+        with pytest.raises(ValueError):
+            cnts.get('c')
+
+
+def test_integer_precision():
+    with SharedCounters(num_slots=4) as cnts:
+        cnts.inc('big', 1 << 53)
+        cnts.inc('big')
+        assert cnts.get('big') == (1 << 53) + 1
+        with pytest.raises(ValueError):
+            cnts.inc('big', 0.5)
+        # float counters accept integer increments
+        cnts.inc('ratio', 0.5)
+        cnts.inc('ratio', 1)
+        assert cnts.get('ratio') == 1.5
+        cnts.add_time('t', (1 << 53) + 1)
+        assert cnts.get('t', format='ns') == (1 << 53) + 1
+
+
+def test_threads():
+    def worker():
+        for _ in range(20000):
+            cnts.inc('hits')
+
+    with SharedCounters(num_slots=4) as cnts:
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert cnts.get('hits') == 8 * 20000
+
+
+def test_exited_rows_reused():
+    with SharedCounters(num_slots=8, num_rows=2, lock=fork.Lock()) as cnts:
+        for _ in range(3):
+            run_workers(inc_worker, [(cnts, 10)] * 2)
+        # rows of the exited workers were retired, not lost
+        assert cnts.get('hits') == 60
+        assert cnts.get('bytes') == 15
+        cnts.inc('hits')
+        assert cnts.get('hits') == 61
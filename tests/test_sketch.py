@@ -0,0 +1,77 @@
+import random
+import pytest
+from perfcounters.sketch import QuantileSketch, percentiles, summary
+
+
+def test_sketch_accuracy():
+    random.seed(42)
+    values = [random.lognormvariate(10, 2) for _ in range(20000)]
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for v in values:
+        sketch.add(v)
+    exact = percentiles(values, [50, 90, 99])
+    for est, real in zip(sketch.percentiles([50, 90, 99]), exact):
+        assert abs(est - real) / real < 0.02
+    stats = summary(values)
+    assert sketch.count == stats['count']
+    assert sketch.min == stats['min']
+    assert sketch.max == stats['max']
+    assert sketch.mean == pytest.approx(stats['mean'])
+    assert sketch.stddev == pytest.approx(stats['stddev'])
+
+
+def test_sketch_bounded_memory():
+    sketch = QuantileSketch(max_buckets=64)
+    for i in range(1, 100000):
+        sketch.add(i * 1.7)
+    assert len(sketch.positive) <= 64
+    assert len(sketch) == 99999
+    # high quantiles are kept accurate when low buckets are collapsed
+    assert abs(sketch.quantile(0.99) - 0.99 * 1.7 * 99999) / 170000 < 0.02
+
+
+def test_sketch_negative_and_zero():
+    sketch = QuantileSketch()
+    for v in [-10, -5, 0, 0, 5, 10]:
+        sketch.add(v)
+    assert sketch.quantile(0) == -10
+    assert sketch.quantile(1) == 10
+    assert sketch.quantile(0.5) == 0
+
+
+def test_sketch_merge():
+    a = QuantileSketch()
+    b = QuantileSketch()
+    full = QuantileSketch()
+    for i in range(1, 1000):
+        (a if i % 2 else b).add(i)
+        full.add(i)
+    a.merge(b)
+    assert a.count == full.count
+    assert a.mean == pytest.approx(full.mean)
+    assert a.stddev == pytest.approx(full.stddev)
+    assert a.percentiles([50, 99]) == full.percentiles([50, 99])
+
+
+def test_sketch_merge_accuracy_mismatch():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_empty_sketch():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.5) == 0
+    assert sketch.mean == 0
+    assert sketch.stddev == 0
+
+
+def test_invalid_quantile():
+    with pytest.raises(ValueError):
+        QuantileSketch().quantile(2)
+    with pytest.raises(ValueError):
+        percentiles([1, 2], [101])
+
+
+def test_exact_percentiles():
+    assert percentiles([1, 2, 3, 4], [0, 50, 100]) == [1, 2.5, 4]
+    assert percentiles([], [50]) == [0]
@@ -0,0 +1,209 @@
+import pytest
+from perfcounters import (ThreadSafeValueCounters, TimeCounters,
+                          ValueCounters)
+from perfcounters.optional import get_zstd
+from perfcounters import snapshot
+from perfcounters.snapshot import Snapshot
+
+
+def time_counters(**kwargs):
+    cnts = TimeCounters(prefix='t_', **kwargs)
+    cnts.start('loop')
+    for _ in range(5):
+        cnts.lap('loop')
+    cnts.stop('loop')
+    cnts.start('running')
+    with cnts.time('db'):
+        pass
+    cnts.time('unused')
+    return cnts
+
+
+def value_counters(**kwargs):
+    cnts = ValueCounters(prefix='v_', **kwargs)
+    for v in range(5):
+        cnts.set('size', v + 0.5)
+        cnts.lap('size')
+    cnts.inc('hits', 42)
+    return cnts
+
+
+@pytest.mark.parametrize('mode', [{}, {'compact': True}, {'bounded': True}])
+def test_roundtrip(tmp_path, mode):
+    tcnts = time_counters(**mode)
+    vcnts = value_counters(**mode)
+    path = str(tmp_path / 'run.pcs')
+    snapshot.save(path, tcnts, vcnts)
+    loaded_t, loaded_v = snapshot.load(path)
+
+    assert isinstance(loaded_t, TimeCounters)
+    assert loaded_t.prefix == 't_'
+    assert loaded_t.compact == tcnts.compact
+    assert loaded_t.get('loop', format='ns') == tcnts.get('loop', format='ns')
+    assert loaded_t.get_timer('db') == tcnts.get_timer('db')
+    assert loaded_t.get_timer('unused') == tcnts.get_timer('unused')
+    assert (loaded_t.get_percentiles('loop', format='ns')
+            == tcnts.get_percentiles('loop', format='ns'))
+    assert loaded_v.get_all() == vcnts.get_all()
+    assert loaded_v.get_stats('size') == vcnts.get_stats('size')
+    if not mode.get('bounded'):
+        assert (loaded_t.get_laps('loop', format='ns')
+                == tcnts.get_laps('loop', format='ns'))
+        assert loaded_v.get_laps('size') == vcnts.get_laps('size')
+
+
+def test_running_counter():
+    cnts = TimeCounters()
+    cnts.start('running')
+    cnts.lap('running')
+    before = cnts.get('running', format='ns')
+    loaded, = Snapshot(snapshot.dumps(cnts)).to_collections()
+    cnt = loaded.counters['running']
+    assert not cnt.stop_ts
+    assert loaded.get('running', format='ns') >= before
+    # still running
+    loaded.lap('running')
+    loaded.stop('running')
+    assert len(loaded.get_laps('running', format='ns')) == 3
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'zstd'])
+def test_compression(tmp_path, compression):
+    if compression == 'zstd' and get_zstd() is None:
+        pytest.skip('zstd not available')
+    cnts = value_counters()
+    for v in range(1000):
+        cnts.set('size', 1.0)
+        cnts.lap('size')
+    raw = snapshot.dumps(cnts)
+    data = snapshot.dumps(cnts, compression=compression)
+    assert len(data) < len(raw)
+    path = tmp_path / 'run.pcs'
+    path.write_bytes(data)
+    loaded, = snapshot.load(str(path))
+    assert loaded.get_laps('size') == cnts.get_laps('size')
+
+
+def test_views(tmp_path):
+    path = str(tmp_path / 'run.pcs')
+    snapshot.save(path, time_counters(), value_counters())
+    with Snapshot(path) as snap:
+        tcol, vcol = snap.collections
+        laps = tcol.counters['loop'].laps
+        assert isinstance(laps, memoryview)
+        assert len(laps) == 5
+        assert vcol.counters['size'].laps.tolist() == [0.5, 1.5, 2.5, 3.5,
+                                                       4.5]
+    with pytest.raises(ValueError):
+        laps.tolist()
+
+
+def test_merge(tmp_path):
+    runs = []
+    for i in range(3):
+        tcnts = time_counters()
+        vcnts = value_counters()
+        path = str(tmp_path / f'run{i}.pcs')
+        snapshot.save(path, tcnts, vcnts)
+        runs.append((path, tcnts, vcnts))
+
+    merged_t, merged_v = snapshot.merge(*[r[0] for r in runs])
+    assert merged_v.get('hits') == 3 * 42
+    # laps of every run followed by the merged value
+    assert len(merged_v.get_laps('size')) == 15 + 1
+    assert merged_t.get_timer('db')['count'] == 3
+    total = sum(r[1].get('loop', format='ns') for r in runs)
+    assert merged_t.get('loop', format='ns') == total
+    laps = []
+    for r in runs:
+        laps.extend(r[1].get_laps('loop', format='ns'))
+    assert merged_t.get_laps('loop', format='ns') == laps
+
+
+def test_int_laps():
+    cnts = ValueCounters()
+    cnts.ingest_values('ids', [1, 2**60 + 1])
+    cnts.set('big', 2**70)
+    cnts.lap('big')
+    cnts.set('neg', -2**64)
+    mixed = cnts.handle('mixed')
+    mixed.value = 1
+    mixed.lap()
+    mixed.value = 2.5
+    mixed.lap()
+    loaded, = Snapshot(snapshot.dumps(cnts)).to_collections()
+    laps = loaded.counters['ids'].laps
+    assert laps == [1, 2**60 + 1]
+    assert all(type(v) is int for v in laps)
+    assert loaded.get('big') == 2**70
+    assert loaded.get('neg') == -2**64
+    # laps beyond int64 fall back to float64
+    assert loaded.counters['big'].laps == [float(2**70)]
+    assert loaded.counters['mixed'].laps == [1.0, 2.5]
+
+    merged, = snapshot.merge(snapshot.dumps(cnts), snapshot.dumps(cnts))
+    assert merged.get('big') == 2**71
+    assert list(merged.counters['ids'].laps) == [1, 2**60, 1, 2**60]
+
+
+def test_merge_bounded():
+    a = snapshot.dumps(value_counters(bounded=True))
+    b = snapshot.dumps(value_counters(bounded=True))
+    merged, = snapshot.merge(a, Snapshot(b))
+    assert merged.get_stats('size')['count'] == 10
+    with pytest.raises(ValueError):
+        snapshot.merge(a, snapshot.dumps(value_counters()))
+
+
+def family_counters(statuses):
+    cnts = ValueCounters()
+    http = cnts.family('http', labels=('status', 'route'), max_cardinality=2)
+    for status in statuses:
+        http.labels(status, '/api').inc()
+    return cnts
+
+
+def test_families():
+    cnts = family_counters([200, 200, 404, 500, 503])
+    loaded, = Snapshot(snapshot.dumps(cnts)).to_collections()
+    http = loaded.families['http']
+    assert http.label_names == ('status', 'route')
+    assert http.max_cardinality == 2
+    assert http.overflowed == 2
+    assert http.group_by('status') == cnts.families['http'].group_by('status')
+    assert loaded.get_all() == cnts.get_all()
+    # children stay interned and new label values still overflow
+    assert http.labels('200', '/api') is http.labels(200, '/api')
+    http.labels(302, '/api').inc()
+    assert http.overflowed == 3
+    assert http.overflow.value == 3
+
+
+def test_merge_families():
+    a = snapshot.dumps(family_counters([200, 404]))
+    b = snapshot.dumps(family_counters([200, 200, 500, 503]))
+    merged, = snapshot.merge(a, b)
+    http = merged.families['http']
+    assert http.group_by('status') == {('200',): 3, ('404',): 1, ('500',): 1,
+                                       ('__overflow__',): 1}
+    assert http.overflowed == 1
+    other = ValueCounters()
+    other.family('http', labels=('status',)).labels(200).inc()
+    with pytest.raises(ValueError):
+        snapshot.merge(a, snapshot.dumps(other))
+
+
+def test_thread_safe():
+    cnts = ThreadSafeValueCounters()
+    cnts.inc('hits', 3)
+    loaded, = Snapshot(snapshot.dumps(cnts)).to_collections()
+    assert loaded.get('hits') == 3
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        Snapshot(b'not a snapshot')
+    with pytest.raises(ValueError):
+        snapshot.dumps(ValueCounters(), compression='lz4')
+    with pytest.raises(ValueError):
+        snapshot.dumps(TimeCounters(sample_every=2))
@@ -0,0 +1,161 @@
+import json
+import threading
+from time import sleep
+from perfcounters import SpanCounters
+
+D = 0.01
+
+
+def request(spans):
+    with spans.span('request'):
+        with spans.span('db'):
+            sleep(D)
+        with spans.span('render'):
+            sleep(D)
+        sleep(D)
+
+
+def test_tree():
+    spans = SpanCounters()
+    for _ in range(3):
+        request(spans)
+    cnts = spans.get_all(format='ms')
+    assert list(cnts) == ['request', 'request/db', 'request/render']
+    count, total, self_time = cnts['request']
+    assert count == 3
+    assert total >= 9 * D * 1000
+    assert self_time >= 3 * D * 1000
+    assert self_time < total - 6 * D * 1000 + 1
+    assert cnts['request/db'][0] == 3
+    assert len(spans) == 3
+
+
+def test_repeat_path_reuses_nodes():
+    spans = SpanCounters()
+    request(spans)
+    root = spans._local.ctx.stack[0]
+    node = root.children['request']
+    request(spans)
+    assert root.children['request'] is node
+    assert spans._local.ctx.stack == [root]
+
+
+def test_same_name_different_paths():
+    spans = SpanCounters()
+    with spans.span('a'):
+        with spans.span('db'):
+            pass
+    with spans.span('b'):
+        with spans.span('db'):
+            pass
+    assert set(spans.get_all()) == {'a', 'a/db', 'b', 'b/db'}
+
+
+def test_recursion():
+    spans = SpanCounters()
+
+    @spans.spanned()
+    def fib(n):
+        return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+    assert fib(4) == 3
+    cnts = spans.get_all()
+    assert cnts['test_recursion.<locals>.fib'][0] == 1
+    assert len(cnts) == 4
+
+
+def test_exception():
+    spans = SpanCounters()
+    try:
+        with spans.span('a'):
+            raise KeyError('a')
+    except KeyError:
+        pass
+    with spans.span('b'):
+        pass
+    assert set(spans.get_all()) == {'a', 'b'}
+
+
+def test_threads():
+    spans = SpanCounters()
+    threads = [threading.Thread(target=request, args=(spans,))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert spans.get_all()['request/db'][0] == 4
+
+
+def test_hoisted_span_threads():
+    spans = SpanCounters()
+    hoisted = spans.span('hoisted')
+    barrier = threading.Barrier(4)
+
+    def run():
+        for _ in range(10):
+            with hoisted:
+                barrier.wait()
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    cnts = spans.get_all()
+    assert list(cnts) == ['hoisted']
+    assert cnts['hoisted'][0] == 40
+
+
+def test_span_reused():
+    spans = SpanCounters()
+    assert spans.span('a') is spans.span('a')
+    assert spans.span('a') is not spans.span('b')
+
+
+def test_outputs():
+    spans = SpanCounters(prefix='app_')
+    request(spans)
+    tree = json.loads(spans.to_json(format='ms'))
+    assert tree[0]['name'] == 'app_request'
+    assert [c['name'] for c in tree[0]['children']] == ['db', 'render']
+    collapsed = spans.to_collapsed().split('\n')
+    assert collapsed[0].startswith('app_request ')
+    assert collapsed[1].startswith('app_request;db ')
+    assert int(collapsed[1].split(' ')[1]) >= D * 1_000_000
+    assert '. db' in spans.to_md()
+    assert '<table>' in spans.to_html()
+    assert 'render' in spans.to_latex()
+    spans.report()
+
+
+def test_spans_created_before_entered():
+    spans = SpanCounters()
+    outer = spans.span('outer')
+    inner = spans.span('inner')
+    with outer:
+        with inner:
+            pass
+    later = spans.span('later')
+    with spans.span('other'):
+        pass
+    with later:
+        pass
+    root = spans.get_root()
+    assert list(root.children) == ['outer', 'other', 'later']
+    assert list(root.children['outer'].children) == ['inner']
+
+
+def test_report_without_tabulate(no_tabulate, capsys):
+    spans = SpanCounters()
+    request(spans)
+    spans.report()
+    assert '. db' in capsys.readouterr().out
+    assert '. render' in spans.to_md()
+
+
+def test_reset():
+    spans = SpanCounters()
+    request(spans)
+    spans.reset_all()
+    assert spans.get_all()['request'] == [0, 0, 0]
@@ -0,0 +1,124 @@
+import math
+import random
+import time
+
+import pytest
+
+from perfcounters.stats import (bootstrap_change_ci, bootstrap_ci, mad,
+                                mann_whitney, median)
+
+
+def test_median_mad():
+    assert median([3, 1, 2]) == 2
+    assert median([1, 2, 3, 4]) == 2.5
+    assert mad([1, 1, 2, 2, 4, 6, 9]) == 1
+
+    with pytest.raises(ValueError):
+        median([])
+
+
+def test_bootstrap_ci():
+    values = list(range(100))
+    low, high = bootstrap_ci(values, seed=42)
+    assert low <= median(values) <= high
+    assert 30 < low < high < 70
+
+    # reproducible
+    assert bootstrap_ci(values, seed=1) == bootstrap_ci(values, seed=1)
+
+    # custom statistic
+    low, high = bootstrap_ci(values, statistic=lambda s: max(s), seed=1)
+    assert low <= high <= 99
+
+    with pytest.raises(ValueError):
+        bootstrap_ci(values, confidence=1.5)
+
+
+def test_mann_whitney():
+    a = [10, 11, 12, 13, 14, 15, 16, 17, 18, 19]
+    b = [v + 20 for v in a]
+
+    u, p = mann_whitney(a, b)
+    assert u == 0
+    assert p < 0.001
+
+    _, p = mann_whitney(a, b, alternative='less')
+    assert p < 0.001
+    _, p = mann_whitney(a, b, alternative='greater')
+    assert p > 0.99
+
+    # identical series
+    _, p = mann_whitney(a, a)
+    assert p > 0.9
+
+    # all ties
+    _, p = mann_whitney([1, 1, 1], [1, 1])
+    assert p == 1.0
+
+    with pytest.raises(ValueError):
+        mann_whitney(a, b, alternative='unknown')
+    with pytest.raises(ValueError):
+        mann_whitney([], b)
+
+
+def test_mann_whitney_numpy_matches_python(monkeypatch):
+    pytest.importorskip('numpy')
+    rnd = random.Random(0)
+    a = [rnd.randint(0, 50) for _ in range(300)]
+    b = [rnd.randint(5, 55) for _ in range(200)]
+    vectorized = mann_whitney(a, b)
+    monkeypatch.setattr('perfcounters.stats.get_numpy', lambda: None)
+    assert mann_whitney(a, b) == pytest.approx(vectorized)
+
+
+def test_bootstrap_ci_large_serie(monkeypatch):
+    pytest.importorskip('numpy')
+    rnd = random.Random(0)
+    values = [rnd.gauss(100, 10) for _ in range(5001)]
+    low, high = bootstrap_ci(values, seed=3)
+    # order statistic bootstrap agrees with resampling
+    monkeypatch.setattr('perfcounters.stats.BOOTSTRAP_CHUNK', 1 << 40)
+    assert bootstrap_ci(values, seed=3) == pytest.approx((low, high),
+                                                         rel=0.005)
+
+
+def test_bootstrap_ci_without_numpy(monkeypatch):
+    monkeypatch.setattr('perfcounters.stats.get_numpy', lambda: None)
+    rnd = random.Random(0)
+    for size in (5000, 5001):
+        values = [rnd.gauss(100, 10) for _ in range(size)]
+        low, high = bootstrap_ci(values, seed=3)
+        # order statistic bootstrap agrees with resampling
+        monkeypatch.setattr('perfcounters.stats.PY_BOOTSTRAP_CHUNK', 1 << 40)
+        assert bootstrap_ci(values, resamples=200, seed=3) == pytest.approx(
+            (low, high), rel=0.005)
+        monkeypatch.undo()
+        monkeypatch.setattr('perfcounters.stats.get_numpy', lambda: None)
+
+    # a million laps without NumPy
+    values = [rnd.random() for _ in range(1_000_000)]
+    start = time.perf_counter()
+    low, high = bootstrap_ci(values, seed=1)
+    assert time.perf_counter() - start < 5
+    assert low < median(values) < high
+    assert high - low < 0.01
+
+
+def test_bootstrap_change_ci():
+    a = list(range(100, 200))
+    b = [v * 1.5 for v in a]
+    low, high = bootstrap_change_ci(a, b, seed=1)
+    assert 0.3 < low < 0.5 < high < 0.7
+    low, high = bootstrap_change_ci(a, a, seed=1)
+    assert low < 0 < high
+    assert all(math.isnan(v) for v in bootstrap_change_ci([0, 0], a))
+    with pytest.raises(ValueError):
+        bootstrap_change_ci([], a)
+
+
+def test_bootstrap_change_ci_without_numpy(monkeypatch):
+    monkeypatch.setattr('perfcounters.stats.get_numpy', lambda: None)
+    a = list(range(100, 200))
+    low, high = bootstrap_change_ci(a, [v * 1.5 for v in a], resamples=200,
+                                    seed=1)
+    assert 0.3 < low < 0.5 < high < 0.7
@@ -0,0 +1,142 @@
+import threading
+import pytest
+from perfcounters import ThreadSafeValueCounters
+
+
+def run_threads(target, num_threads=8):
+    threads = [threading.Thread(target=target) for _ in range(num_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_concurrent_inc():
+    N = 20000
+    cnts = ThreadSafeValueCounters()
+
+    def work():
+        for _ in range(N):
+            cnts.inc('a')
+            cnts.dec('b', 2)
+
+    run_threads(work)
+    assert cnts.get('a') == 8 * N
+    assert cnts.get('b') == -16 * N
+    assert cnts.get_all() == {'a': 8 * N, 'b': -16 * N}
+
+
+def test_inc_returns_thread_total():
+    cnts = ThreadSafeValueCounters()
+    assert cnts.inc('a', 2) == 2
+    assert cnts.inc('a', 3) == 5
+
+
+def test_set_and_reset():
+    cnts = ThreadSafeValueCounters()
+    cnts.inc('a', 10)
+    cnts.set('a', 3)
+    assert cnts.get('a') == 3
+    cnts.inc('a', 2)
+    assert cnts.get('a') == 5
+
+    def work():
+        cnts.inc('a', 5)
+
+    run_threads(work, num_threads=2)
+    assert cnts.get('a') == 15
+    cnts.reset('a')
+    assert cnts.get('a') == 0
+    cnts.inc('a')
+    assert cnts.get('a') == 1
+    cnts.reset_all()
+    assert cnts.get('a') == 0
+
+
+def test_laps():
+    cnts = ThreadSafeValueCounters()
+    cnts.inc('a', 10)
+    cnts.lap('a')
+
+    def work():
+        cnts.inc('a', 1)
+
+    run_threads(work, num_threads=4)
+    cnts.lap('a')
+    assert cnts.get_laps('a') == [10, 14, 14]
+    assert cnts.get_stats('a')['count'] == 2
+    assert cnts.get_percentiles('a', [100]) == [14]
+
+
+def test_prefix_and_report():
+    cnts = ThreadSafeValueCounters(prefix='test_')
+    cnts.inc('a', 4)
+    assert cnts.get_all() == {'test_a': 4}
+    assert 'test_a' in cnts.to_json()
+    assert len(cnts) == 1
+
+
+def test_reset_wrong_name():
+    with pytest.raises(ValueError):
+        cnts = ThreadSafeValueCounters()
+        cnts.reset('a')
+
+
+def test_handle_threads():
+    cnts = ThreadSafeValueCounters()
+    num_threads = 8
+    n = 1000
+
+    def work():
+        hits = cnts.handle('hits')
+        for _ in range(n):
+            hits.inc()
+        hits.dec(n // 2)
+
+    threads = [threading.Thread(target=work) for _ in range(num_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cnts.get('hits') == num_threads * n // 2
+
+
+def test_exited_threads_shards_dropped():
+    cnts = ThreadSafeValueCounters()
+    cnts.inc('hits')
+
+    def work():
+        cnts.inc('hits')
+        cnts.handle('misses').inc(2)
+
+    for _ in range(5):
+        run_threads(work)
+        assert cnts.get_all() == {'hits': 1 + cnts._retired['hits'],
+                                  'misses': cnts._retired['misses']}
+    # only the main thread shard is left
+    assert len(cnts._shards) == 1
+    assert cnts.get_all() == {'hits': 41, 'misses': 80}
+    cnts.reset('hits')
+    run_threads(work)
+    assert cnts.get('hits') == 8
+
+
+def test_inc_many():
+    cnts = ThreadSafeValueCounters()
+    cnts.inc_many({'a': 1, 'b': 2})
+    cnts.inc_many(['a', 'b'])
+    assert cnts.get_all() == {'a': 2, 'b': 3}
+
+
+def test_no_family():
+    cnts = ThreadSafeValueCounters()
+    with pytest.raises(ValueError):
+        cnts.family('http', labels=('status',))
+
+
+def test_ingest_values():
+    cnts = ThreadSafeValueCounters()
+    cnts.inc('a', 5)
+    cnts.ingest_values('a', [1, 2])
+    assert cnts.get('a') == 2
+    assert cnts.get_laps('a') == [1, 2, 2]
@@ -1,5 +1,6 @@
 import pytest
 import json
+from array import array
 from time import sleep
 from perfcounters import TimeCounters
 
@@ -192,4 +193,295 @@ def test_lap_report():
     assert '0' in cnts.laps_to_json('b')
     assert '0' in cnts.laps_to_latex('b')
     assert '0' in cnts.laps_to_md('b')
-    cnts.get_laps('b')
\ No newline at end of file
+    cnts.get_laps('b')
+
+def test_clocks():
+    for clock in ['perf_counter', 'monotonic', 'process_time', 'thread_time']:
+        cnts = TimeCounters(clock=clock)
+        cnts.start('a')
+        cnts.stop('a')
+        assert cnts.get('a', format='ns') >= 0
+
+
+def test_invalid_clock():
+    with pytest.raises(ValueError):
+        TimeCounters(clock='error')
+
+
+def test_ns_precision():
+    cnts = TimeCounters()
+    cnts.start('a')
+    cnts.stop('a')
+    cnt = cnts.counters['a']
+    assert isinstance(cnt.start_ts, int)
+    assert isinstance(cnts.get('a', format='ns'), int)
+    assert cnts.get('a', format='ns') == cnt.stop_ts - cnt.start_ts
+    assert cnts.get('a', format='us', rounding=3) > 0
+
+
+def test_sub_units():
+    D = 0.2
+    cnts = TimeCounters()
+    cnts.start('a')
+    sleep(D)
+    cnts.stop('a')
+    assert cnts.get('a', format='us') >= D * 1_000_000
+    assert cnts.get('a', format='ns') >= D * 1_000_000_000
+
+
+def test_laps_durations():
+    D = 0.1
+    cnts = TimeCounters()
+    cnts.start('a')
+    sleep(D)
+    cnts.lap('a')
+    sleep(D)
+    cnts.stop('a')
+    laps = cnts.get_laps('a', format='ms')
+    assert len(laps) == 2
+    assert all(lap >= D * 1000 for lap in laps)
+
+
+def test_time_context_manager():
+    D = 0.01
+    cnts = TimeCounters()
+    for _ in range(3):
+        with cnts.time('a'):
+            sleep(D)
+    timer = cnts.timers['a']
+    assert cnts.time('a') is timer
+    stats = cnts.get_timer('a', format='ms')
+    assert stats['count'] == 3
+    assert stats['min'] >= D * 1000
+    assert stats['max'] >= stats['min']
+    assert stats['total'] >= 3 * D * 1000
+    assert cnts.get('a') >= 3 * D
+    assert 'a' in cnts.get_all()
+    assert len(cnts) == 1
+
+
+def test_time_exception():
+    cnts = TimeCounters()
+    with pytest.raises(KeyError):
+        with cnts.time('a'):
+            raise KeyError('a')
+    assert cnts.get_timer('a')['count'] == 1
+
+
+def test_timed():
+    cnts = TimeCounters()
+
+    @cnts.timed()
+    def f(x):
+        return x * 2
+
+    @cnts.timed('g')
+    def g():
+        return 1
+
+    assert f(2) == 4
+    assert f(3) == 6
+    g()
+    assert f.__name__ == 'f'
+    assert cnts.get_timer('test_timed.<locals>.f')['count'] == 2
+    assert cnts.get_timer('g')['count'] == 1
+
+
+def test_timer_name_collision():
+    cnts = TimeCounters()
+    cnts.start('a')
+    with pytest.raises(ValueError):
+        cnts.time('a')
+    cnts.time('b')
+    with pytest.raises(ValueError):
+        cnts.start('b')
+
+
+def test_timer_reset():
+    cnts = TimeCounters()
+    with cnts.time('a'):
+        pass
+    cnts.reset('a')
+    assert cnts.get_timer('a')['count'] == 0
+    assert cnts.get_timer('a')['min'] == 0
+    with cnts.time('a'):
+        pass
+    cnts.reset_all()
+    assert cnts.get('a') == 0
+
+
+def test_wrong_timer_name():
+    with pytest.raises(ValueError):
+        cnts = TimeCounters()
+        cnts.get_timer('a')
+
+
+def test_percentiles_and_stats():
+    cnts = TimeCounters()
+    cnts.start('a')
+    for _ in range(10):
+        cnts.lap('a')
+    cnts.stop('a')
+    p50, p99 = cnts.get_percentiles('a', [50, 99], format='ns')
+    assert 0 <= p50 <= p99
+    stats = cnts.get_stats('a', format='us')
+    assert stats['count'] == 11
+    assert stats['min'] <= stats['mean'] <= stats['max']
+
+
+def test_bounded():
+    D = 0.01
+    cnts = TimeCounters(bounded=True)
+    cnts.start('a')
+    for _ in range(5):
+        sleep(D)
+        cnts.lap('a')
+    cnts.stop('a')
+    cnt = cnts.counters['a']
+    assert cnt.laps == []
+    stats = cnts.get_stats('a', format='ms')
+    assert stats['count'] == 6
+    assert stats['max'] >= D * 1000
+    p50, p90, p99, p999 = cnts.get_percentiles('a', format='ms')
+    assert p50 >= D * 1000 * 0.99
+    assert p50 <= p90 <= p99 <= p999
+    with pytest.raises(ValueError):
+        cnts.get_laps('a')
+
+
+def test_wrong_percentiles_name():
+    with pytest.raises(ValueError):
+        cnts = TimeCounters()
+        cnts.get_percentiles('a')
+    with pytest.raises(ValueError):
+        cnts = TimeCounters()
+        cnts.get_stats('a')
+
+
+def test_compact():
+    cnts = TimeCounters(compact=True)
+    cnts.start('a')
+    for _ in range(10):
+        cnts.lap('a')
+    cnts.stop('a')
+    cnt = cnts.counters['a']
+    assert cnt.laps.typecode == 'q'
+    assert len(cnts.get_laps('a')) == 11
+    assert cnts.get_stats('a')['count'] == 11
+    view = cnts.get_laps_view('a')
+    assert len(view) == 10
+    assert list(view) == list(cnt.laps)
+
+
+def test_compact_view_stays_valid():
+    cnts = TimeCounters(compact=True)
+    cnts.start('a')
+    cnts.lap('a')
+    view = cnts.get_laps_view('a')
+    # the counter stops sharing its buffer instead of failing
+    cnts.lap('a')
+    assert len(view) == 1
+    assert len(cnts.get_laps_view('a')) == 2
+
+
+def test_compact_view_errors():
+    cnts = TimeCounters()
+    cnts.start('a')
+    with pytest.raises(ValueError):
+        cnts.get_laps_view('a')
+    with pytest.raises(ValueError):
+        cnts.get_laps_view('b')
+    with pytest.raises(ValueError):
+        TimeCounters(compact=True, bounded=True)
+
+
+def test_slots():
+    cnts = TimeCounters()
+    cnts.start('a')
+    with pytest.raises(AttributeError):
+        cnts.counters['a'].extra = 1
+
+
+def test_compact_view_without_numpy(monkeypatch):
+    monkeypatch.setattr('perfcounters.time_counters.get_numpy', lambda: None)
+    cnts = TimeCounters(compact=True)
+    cnts.start('a')
+    cnts.lap('a')
+    view = cnts.get_laps_view('a')
+    assert isinstance(view, memoryview)
+    assert view[0] == cnts.counters['a'].laps[0]
+
+
+def test_handle():
+    cnts = TimeCounters()
+    cnts.start('loop')
+    loop = cnts.handle('loop')
+    for _ in range(3):
+        loop.lap()
+    loop.stop()
+    assert len(cnts.get_laps('loop')) == 4
+    with pytest.raises(ValueError):
+        cnts.handle('unknown')
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_ingest_laps(compact):
+    np = pytest.importorskip('numpy')
+    inputs = {
+        'list': [10, 20, 30],
+        'array': array('q', [10, 20, 30]),
+        'numpy': np.array([10, 20, 30], dtype=np.int64),
+        'big_endian': np.array([10, 20, 30], dtype='>i8'),
+        'strided': np.array([[10, 0], [20, 0], [30, 0]])[:, 0],
+        'bytes': array('q', [10, 20, 30]).tobytes(),
+        'generator': (ts for ts in [10, 20, 30]),
+    }
+    cnts = TimeCounters(compact=compact)
+    for name, timestamps in inputs.items():
+        cnts.ingest_laps(name, timestamps, start_ts=0, stop_ts=45)
+        assert cnts.get_laps(name, format='ns') == [10, 10, 10, 15]
+        assert cnts.get(name, format='ns') == 45
+        assert all(type(ts) is int for ts in cnts.counters[name].laps)
+
+
+def test_ingest_laps_chunks(monkeypatch):
+    monkeypatch.setattr('perfcounters.ingest.CHUNK_SIZE', 3)
+    for compact in (False, True):
+        cnts = TimeCounters(compact=compact)
+        cnts.ingest_laps('a', iter(range(1, 11)), start_ts=0)
+        cnts.ingest_laps('a', range(11, 21))
+        assert list(cnts.counters['a'].laps) == list(range(1, 21))
+
+
+def test_ingest_laps_existing_counter():
+    cnts = TimeCounters()
+    cnts.start('a')
+    start_ts = cnts.counters['a'].start_ts
+    cnts.lap('a')
+    cnts.ingest_laps('a', [start_ts + 10**9])
+    assert len(cnts.get_laps('a')) == 3
+
+
+def test_ingest_laps_compact_view_stays_valid():
+    cnts = TimeCounters(compact=True)
+    cnts.ingest_laps('a', [1, 2], start_ts=0)
+    view = cnts.get_laps_view('a')
+    cnts.ingest_laps('a', array('q', [3, 4]))
+    assert list(view) == [1, 2]
+    assert list(cnts.get_laps_view('a')) == [1, 2, 3, 4]
+
+
+def test_ingest_laps_bounded():
+    cnts = TimeCounters(bounded=True)
+    cnts.ingest_laps('a', [10, 20, 30], start_ts=0, stop_ts=45)
+    stats = cnts.get_stats('a', format='ns')
+    assert stats['count'] == 4
+    assert stats['max'] == pytest.approx(15, rel=0.01)
+
+
+def test_ingest_laps_errors():
+    with pytest.raises(ValueError):
+        TimeCounters(sample_every=2).ingest_laps('a', [1])
+    with pytest.raises(ValueError):
+        # not a whole number of int64
+        TimeCounters().ingest_laps('a', b'123')
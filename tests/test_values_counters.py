@@ -1,5 +1,5 @@
 import pytest
-from perfcounters.value_counters import ValueCounters
+from perfcounters.value_counters import OVERFLOW, ValueCounters
 
 
 def test_prefix():
@@ -107,4 +107,194 @@ def test_report():
     assert 'b' in cnts.to_latex()
     assert 'b' in cnts.to_md()
 
-    cnts.report()
\ No newline at end of file
+    cnts.report()
+
+def test_percentiles_and_stats():
+    cnts = ValueCounters()
+    for i in range(1, 101):
+        cnts.set('a', i)
+        cnts.lap('a')
+    assert cnts.get_percentiles('a', [0, 50, 100]) == [1, 50.5, 100]
+    stats = cnts.get_stats('a')
+    assert stats['count'] == 100
+    assert stats['mean'] == 50.5
+    assert stats['min'] == 1
+    assert stats['max'] == 100
+
+
+def test_bounded():
+    cnts = ValueCounters(bounded=True)
+    for i in range(1, 10001):
+        cnts.set('a', i)
+        cnts.lap('a')
+    cnt = cnts.counters['a']
+    assert cnt.laps == []
+    p50, p99 = cnts.get_percentiles('a', [50, 99], rounding=0)
+    assert abs(p50 - 5000) / 5000 < 0.02
+    assert abs(p99 - 9900) / 9900 < 0.02
+    stats = cnts.get_stats('a')
+    assert stats['count'] == 10000
+    assert stats['mean'] == 5000.5
+    with pytest.raises(ValueError):
+        cnts.get_laps('a')
+
+
+def test_wrong_percentiles_name():
+    with pytest.raises(ValueError):
+        cnts = ValueCounters()
+        cnts.get_percentiles('a')
+    with pytest.raises(ValueError):
+        cnts = ValueCounters()
+        cnts.get_stats('a')
+
+
+def test_compact():
+    cnts = ValueCounters(compact=True)
+    for i in range(5):
+        cnts.set('a', i)
+        cnts.lap('a')
+    cnt = cnts.counters['a']
+    assert cnt.laps.typecode == 'd'
+    assert cnts.get_laps('a') == [0, 1, 2, 3, 4, 4]
+    view = cnts.get_laps_view('a')
+    assert list(view) == [0, 1, 2, 3, 4]
+    cnts.lap('a')
+    assert len(view) == 5
+    assert len(cnts.get_laps_view('a')) == 6
+
+
+def test_compact_view_errors():
+    cnts = ValueCounters()
+    cnts.lap('a')
+    with pytest.raises(ValueError):
+        cnts.get_laps_view('a')
+    with pytest.raises(ValueError):
+        cnts.get_laps_view('b')
+    with pytest.raises(ValueError):
+        ValueCounters(compact=True, bounded=True)
+
+
+def test_handle():
+    cnts = ValueCounters()
+    hits = cnts.handle('hits')
+    hits.value += 1
+    hits.inc(2)
+    assert cnts.get('hits') == 3
+    assert cnts.handle('hits') is hits
+    cnts.inc('hits')
+    assert hits.value == 4
+
+
+def test_inc_many():
+    cnts = ValueCounters()
+    cnts.inc_many({'a': 1, 'b': 2.5})
+    cnts.inc_many(['a', 'b'], [1, 1])
+    cnts.inc_many(['a', 'c'])
+    assert cnts.get_all() == {'a': 3, 'b': 3.5, 'c': 1}
+    with pytest.raises(ValueError):
+        cnts.inc_many(['a', 'b'], [1])
+    with pytest.raises(ValueError):
+        cnts.inc_many({'a': 1}, [1])
+
+
+def test_family():
+    cnts = ValueCounters(prefix='app.')
+    http = cnts.family('http', labels=('status', 'route'))
+    ok = http.labels(200, '/api')
+    ok.inc()
+    assert http.labels(200, '/api') is ok
+    assert http.labels(status=200, route='/api') is ok
+    http.labels(200, '/home').inc(2)
+    http.labels(500, '/api').inc(3)
+    assert cnts.family('http', labels=('status', 'route')) is http
+
+    # label values are normalized
+    assert http.labels('200', '/api') is ok
+    assert http.labels(status='200', route='/api') is ok
+    assert len(http) == 3
+
+    assert http.group_by('status') == {('200',): 3, ('500',): 3}
+    assert http.group_by('route') == {('/api',): 4, ('/home',): 2}
+    assert http.group_by('route', where={'status': 200}) == {
+        ('/api',): 1, ('/home',): 2}
+    assert http.group_by() == {(): 6}
+    assert http.total() == 6
+
+    assert cnts.get_all() == {'app.http{status=200,route=/api}': 1,
+                              'app.http{status=200,route=/home}': 2,
+                              'app.http{status=500,route=/api}': 3}
+    assert len(cnts) == 3
+    assert 'http{status=500,route=/api}' in cnts.to_md()
+
+    cnts.reset_all()
+    assert http.total() == 0
+    ok.inc()
+    assert http.total() == 1
+
+    with pytest.raises(ValueError):
+        http.labels(200)
+    with pytest.raises(ValueError):
+        http.labels(200, route='/api')
+    with pytest.raises(ValueError):
+        http.labels(status=200)
+    with pytest.raises(ValueError):
+        http.group_by('method')
+    with pytest.raises(ValueError):
+        cnts.family('http', labels=('status',))
+    with pytest.raises(ValueError):
+        cnts.family('empty', labels=())
+    cnts.inc('hits')
+    with pytest.raises(ValueError):
+        cnts.family('hits', labels=('a',))
+
+
+def test_family_overflow():
+    cnts = ValueCounters()
+    users = cnts.family('requests', labels=['user'], max_cardinality=2)
+    users.labels('a').inc()
+    users.labels('b').inc()
+    users.labels('c').inc()
+    users.labels('d').inc(2)
+    # existing children are still counted
+    users.labels('a').inc()
+    assert len(users) == 2
+    assert users.overflowed == 2
+    assert users.group_by('user') == {('a',): 2, ('b',): 1,
+                                      (OVERFLOW,): 3}
+    assert cnts.get_all()['requests{user=__overflow__}'] == 3
+    with pytest.raises(ValueError):
+        cnts.family('other', labels=['a'], max_cardinality=0)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_ingest_values(compact):
+    np = pytest.importorskip('numpy')
+    inputs = [
+        [1.5, 2.5, 3.5],
+        np.array([1.5, 2.5, 3.5]),
+        np.array([1.5, 2.5, 3.5], dtype='>f8'),
+        (v for v in [1.5, 2.5, 3.5]),
+    ]
+    for values in inputs:
+        cnts = ValueCounters(compact=compact)
+        cnts.ingest_values('a', values)
+        assert cnts.get('a') == 3.5
+        assert cnts.get_laps('a') == [1.5, 2.5, 3.5, 3.5]
+        assert all(type(v) is float for v in cnts.counters['a'].laps)
+
+
+def test_ingest_values_compact_view_stays_valid():
+    np = pytest.importorskip('numpy')
+    cnts = ValueCounters(compact=True)
+    cnts.ingest_values('a', np.arange(3.0))
+    view = cnts.get_laps_view('a')
+    cnts.ingest_values('a', np.arange(3.0, 5.0))
+    assert list(view) == [0, 1, 2]
+    assert list(cnts.get_laps_view('a')) == [0, 1, 2, 3, 4]
+
+
+def test_ingest_values_bounded():
+    cnts = ValueCounters(bounded=True)
+    cnts.ingest_values('a', iter(range(1, 101)))
+    assert cnts.get('a') == 100
+    assert cnts.get_stats('a')['count'] == 100
@@ -0,0 +1,122 @@
+import json
+import pytest
+from perfcounters import WindowedCounters
+from perfcounters.window import WindowedCounter
+
+S = 1_000_000_000
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 1000 * S
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += int(seconds * S)
+
+
+def test_sum_and_rotation():
+    clock = FakeClock()
+    cnt = WindowedCounter('reqs', num_buckets=10, clock=clock)
+    for _ in range(10):
+        cnt.inc()
+        clock.advance(1)
+    assert cnt.sum_over() == 9
+    assert cnt.sum_over(window=3) == 2
+    assert cnt.get_buckets(window=3) == [1, 1, 0]
+    clock.advance(5)
+    assert cnt.sum_over() == 4
+    # the whole window expired
+    clock.advance(60)
+    assert cnt.sum_over() == 0
+    cnt.inc(5)
+    assert cnt.sum_over() == 5
+
+
+def test_rate():
+    clock = FakeClock()
+    cnt = WindowedCounter('reqs', num_buckets=60, clock=clock)
+    for _ in range(120):
+        cnt.inc(2)
+        clock.advance(0.5)
+    # 4 per second over the last minute
+    assert cnt.rate() == pytest.approx(4, rel=0.05)
+    assert cnt.rate(window=10) == pytest.approx(4, rel=0.1)
+    # the oldest second slid out of the window
+    assert cnt.count_over() == 118
+
+
+def test_young_counter_rate():
+    clock = FakeClock()
+    cnt = WindowedCounter('reqs', clock=clock)
+    assert cnt.rate() == 0
+    clock.advance(0.5)
+    cnt.inc(10)
+    clock.advance(1.5)
+    assert cnt.rate() == pytest.approx(5)
+
+
+def test_mean_and_percentiles():
+    clock = FakeClock()
+    cnt = WindowedCounter('latency', num_buckets=5, clock=clock)
+    for v in range(1, 6):
+        cnt.inc(v)
+        cnt.inc(v)
+        clock.advance(1)
+    clock.advance(-0.5)
+    assert cnt.mean() == 3
+    assert cnt.get_percentiles([0, 50, 100]) == [2, 6, 10]
+
+
+def test_bucket_width():
+    clock = FakeClock()
+    cnt = WindowedCounter('x', num_buckets=60, bucket_width=60, clock=clock)
+    cnt.inc()
+    clock.advance(59 * 60)
+    cnt.inc()
+    assert cnt.sum_over() == 2
+    assert cnt.sum_over(window=60) == 1
+    clock.advance(60)
+    assert cnt.sum_over() == 1
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        WindowedCounter('x', num_buckets=0)
+    with pytest.raises(ValueError):
+        WindowedCounter('x', bucket_width=0)
+    with pytest.raises(ValueError):
+        WindowedCounter('x').sum_over(window=0)
+    with pytest.raises(ValueError):
+        WindowedCounters(clock='sundial')
+
+
+def test_collection():
+    clock = FakeClock()
+    cnts = WindowedCounters(prefix='web_', num_buckets=10, clock=clock)
+    cnts.inc('reqs')
+    cnts.inc('bytes', 100.5)
+    clock.advance(1)
+    cnts.inc('reqs')
+    assert len(cnts) == 2
+    assert cnts.get('reqs') == 2
+    assert cnts.sum_over('bytes') == 100.5
+    assert cnts.count_over('reqs') == 2
+    assert cnts.rate('reqs') == pytest.approx(2)
+    assert cnts.mean('bytes') == 100.5
+    assert len(cnts.get_percentiles('reqs')) == 4
+    assert cnts.get_all() == {'web_reqs': [2, 2.0, 1.0],
+                              'web_bytes': [100.5, 100.5, 100.5]}
+    assert json.loads(cnts.to_json())['web_reqs'] == [2, 2.0, 1.0]
+    assert 'web_bytes' in cnts.to_md()
+    assert '<table>' in cnts.to_html()
+    assert 'web' in cnts.to_latex()
+    cnts.report()
+    with pytest.raises(ValueError):
+        cnts.get('unknown')
+    cnts.reset('reqs')
+    assert cnts.get('reqs') == 0
+    cnts.reset_all()
+    assert cnts.get('bytes') == 0